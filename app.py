@@ -1,12 +1,15 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, send_file, url_for, Response, stream_with_context, g
+import io
 import os
+import time
 from dotenv import load_dotenv
-from utils.geocoder import Geocoder
-from utils.nasa_api import NasaPowerAPI
-from utils.calculations import SolarCalculator
-from utils.pdf_generator import PDFReportGenerator
-from utils.email_sender import EmailSender
-from utils.ai_generator import AIContentGenerator
+from utils.report_pipeline import get_pipeline, parse_report_params
+from utils.jobs import create_job_queue, public_job
+from utils.idempotency import IdempotencyStore, request_key
+from utils.bulk import BulkScorer, read_leads, detect_format, format_csv, format_ndjson
+from utils.metrics import REGISTRY, HTTP_REQUEST_SECONDS, QUOTE_REQUESTS, log_event, make_request_id
+from utils.profiling import RequestProfiler
+import threading
 import traceback
 from datetime import datetime
 
@@ -26,207 +29,619 @@ INSTALLATION_COST_PER_KW = float(os.getenv('INSTALLATION_COST_PER_KW', 3000))
 # FIX: Rename for clarity, as this 0.75 is typically a Performance Ratio/Derate Factor, not panel efficiency
 SYSTEM_PERFORMANCE_RATIO = float(os.getenv('SOLAR_PANEL_EFFICIENCY', 0.75)) 
 
-geocoder = Geocoder(GOOGLE_API_KEY)
-nasa_api = NasaPowerAPI(GOOGLE_API_KEY)
+# Battery sizing: every report compares system sizes and battery capacities
+# (BATTERY_SIZES, kWh) by NPV, valuing exports at EXPORT_RATE £/kWh
+BATTERY_OPTIMIZER = os.getenv('BATTERY_OPTIMIZER', '1').lower() in ('1', 'true', 'yes')
+BATTERY_SIZES = [float(s) for s in os.getenv('BATTERY_SIZES', '0,2.5,5,7.5,10,13.5,15,20').split(',') if s.strip()]
+EXPORT_RATE = float(os.getenv('EXPORT_RATE', 0.15))
+BATTERY_COST_PER_KWH = float(os.getenv('BATTERY_COST_PER_KWH', 450))
+BATTERY_FIXED_COST = float(os.getenv('BATTERY_FIXED_COST', 1000))
+DISCOUNT_RATE = float(os.getenv('DISCOUNT_RATE', 0.05))
+
+# Uncertainty mode: P10/P50/P90 payback and NPV from UNCERTAINTY_SCENARIOS
+# Monte Carlo draws (fixed UNCERTAINTY_SEED), shown as a fan chart in the PDF
+UNCERTAINTY_MODE = os.getenv('UNCERTAINTY_MODE', '0').lower() in ('1', 'true', 'yes')
+UNCERTAINTY_SCENARIOS = int(os.getenv('UNCERTAINTY_SCENARIOS', 5000))
+UNCERTAINTY_SEED = int(os.getenv('UNCERTAINTY_SEED', 42))
+
+# Report mode: 'sync' runs the pipeline inside the request, 'jobs' queues it
+# and returns a job id (clients can also pass async=1 per request).
+REPORT_MODE = os.getenv('REPORT_MODE', 'sync')
+# Processes serving requests: gunicorn.conf.py sets it from GUNICORN_WORKERS,
+# set it yourself for hypercorn --workers. With more than one, the next
+# request for a job or PDF may land on another worker.
+SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', 1))
+# Job backend: 'thread' or 'process' (in-process pool, job status is only
+# visible to the worker that queued it), 'sqlite' (durable queue shared by
+# every worker pointing at JOB_DB_PATH; the default with several workers)
+JOB_BACKEND = os.getenv('JOB_BACKEND', 'sqlite' if SERVER_WORKERS > 1 else 'thread')
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 4))
+JOB_DB_PATH = os.getenv('JOB_DB_PATH', 'temp/jobs.sqlite3')
+# Finished jobs keep the form's name, email and address; they are deleted
+# this many hours after they finish (0 keeps them)
+JOB_RETENTION_HOURS = float(os.getenv('JOB_RETENTION_HOURS', 24))
+
+# Instant quotes (/quote): geocode → solar → calculate only, the full report
+# is queued as a job on request. QUOTE_SLO_MS is the latency target; every
+# quote is counted as within or over it (solar_quote_requests_total)
+QUOTE_SLO_MS = float(os.getenv('QUOTE_SLO_MS', 1000))
+
+# Geocoding cache: in-memory LRU in front of SQLite (empty path = memory only)
+GEOCODE_CACHE_PATH = os.getenv('GEOCODE_CACHE_PATH', 'temp/geocode_cache.sqlite3')
+GEOCODE_CACHE_SIZE = int(os.getenv('GEOCODE_CACHE_SIZE', 2048))
+GEOCODE_CACHE_MAX_ROWS = int(os.getenv('GEOCODE_CACHE_MAX_ROWS', 200000))
+GEOCODE_CACHE_TTL = int(os.getenv('GEOCODE_CACHE_TTL', 30 * 24 * 3600))
+GEOCODE_CACHE_NEGATIVE_TTL = int(os.getenv('GEOCODE_CACHE_NEGATIVE_TTL', 24 * 3600))
+
+# Google geocoding calls: at most GEOCODE_QPS per process (bursts of
+# GEOCODE_BURST; 0 = unlimited), shared by single and batch lookups.
+# GOOGLE_GEOCODE_URL points at another endpoint, e.g.
+# scripts/geocode_stub_server.py for offline runs.
+GEOCODE_QPS = float(os.getenv('GEOCODE_QPS', 40))
+GEOCODE_BURST = int(os.getenv('GEOCODE_BURST', 10))
+GOOGLE_GEOCODE_URL = os.getenv('GOOGLE_GEOCODE_URL') or None
+# Another buildingInsights endpoint, e.g. the stub's /v1/buildingInsights:findClosest
+GOOGLE_SOLAR_URL = os.getenv('GOOGLE_SOLAR_URL') or None
+
+# buildingInsights cache: lookups within SOLAR_CACHE_RADIUS_M of a cached
+# building reuse its payload (empty path disables the cache)
+SOLAR_CACHE_PATH = os.getenv('SOLAR_CACHE_PATH', 'temp/solar_cache.sqlite3')
+SOLAR_CACHE_RADIUS_M = float(os.getenv('SOLAR_CACHE_RADIUS_M', 15))
+SOLAR_CACHE_CELL_M = float(os.getenv('SOLAR_CACHE_CELL_M', 25))
+SOLAR_CACHE_TTL = int(os.getenv('SOLAR_CACHE_TTL', 90 * 24 * 3600))
+SOLAR_CACHE_MAX_BUILDINGS = int(os.getenv('SOLAR_CACHE_MAX_BUILDINGS', 50000))
+
+# Offline irradiance grid (scripts/build_irradiance_grid.py): instant
+# preliminary estimates, and the fallback when the Solar API has no answer
+IRRADIANCE_GRID_PATH = os.getenv('IRRADIANCE_GRID_PATH', 'data/irradiance_grid.npy')
+SOLAR_GRID_FALLBACK = os.getenv('SOLAR_GRID_FALLBACK', '1').lower() in ('1', 'true', 'yes')
+
+# Offline postcode centroids (scripts/build_postcode_index.py): addresses
+# that are just a postcode, sector or outward code skip Google geocoding
+POSTCODE_INDEX_PATH = os.getenv('POSTCODE_INDEX_PATH', 'data/postcodes.npy')
+
+# Duplicate submissions: /generate-report and /quote run once per
+# idempotency key (Idempotency-Key header, else a hash of the form). Identical
+# requests in flight share one run; completed responses are replayed for
+# IDEMPOTENCY_TTL seconds. The SQLite store lets gunicorn workers coordinate.
+IDEMPOTENCY_DB_PATH = os.getenv('IDEMPOTENCY_DB_PATH', 'temp/idempotency.sqlite3')
+IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', 600))
+IDEMPOTENCY_WAIT = float(os.getenv('IDEMPOTENCY_WAIT', 120))
+
+# Bulk scoring: concurrent geocode/solar lookups per /bulk-report request
+BULK_CONCURRENCY = int(os.getenv('BULK_CONCURRENCY', 8))
+BULK_BATCH_SIZE = int(os.getenv('BULK_BATCH_SIZE', 200))
+
+# Batch PDF rendering on a pool of warm worker processes (0 = render in the
+# request thread). Workers are replaced after RENDER_MAX_JOBS_PER_WORKER
+# reports; a report taking longer than RENDER_TIMEOUT seconds fails.
+RENDER_WORKERS = int(os.getenv('RENDER_WORKERS', 0))
+RENDER_MAX_PENDING = int(os.getenv('RENDER_MAX_PENDING', 0))
+RENDER_TIMEOUT = float(os.getenv('RENDER_TIMEOUT', 60))
+RENDER_MAX_JOBS_PER_WORKER = int(os.getenv('RENDER_MAX_JOBS_PER_WORKER', 200))
+
+# Outbound HTTP to Google: pooled keep-alive session, retries with backoff,
+# per-host concurrency cap and circuit breaker
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', max(JOB_WORKERS, BULK_CONCURRENCY) * 2))
+HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', 3))
+HTTP_BACKOFF_BASE = float(os.getenv('HTTP_BACKOFF_BASE', 0.5))
+HTTP_MAX_PER_HOST = int(os.getenv('HTTP_MAX_PER_HOST', HTTP_POOL_SIZE))
+HTTP_BREAKER_THRESHOLD = int(os.getenv('HTTP_BREAKER_THRESHOLD', 5))
+HTTP_BREAKER_RESET = float(os.getenv('HTTP_BREAKER_RESET', 30))
+# ASGI mode (asgi.py) awaits Google calls on httpx instead: one event loop
+# holds many more requests in flight, so it gets its own connection limit
+ASYNC_HTTP_POOL_SIZE = int(os.getenv('ASYNC_HTTP_POOL_SIZE', 200))
+
+# Observability: METRICS_DIR lets every gunicorn worker contribute to /metrics;
+# PROFILE_SAMPLE_RATE (0-1) profiles that fraction of requests into PROFILE_DIR
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'temp/profiles')
+PROFILE_ENGINE = os.getenv('PROFILE_ENGINE', 'cprofile')
+
+# Generated PDFs: 'memory' (default for a single worker; this process only),
+# 'local' (directory with size/age eviction, shared by workers) or 'object'
+# (object store API, backed by a local stand-in). Several workers and the
+# process/SQLite job backends need 'local' or 'object' so another process
+# can serve the download.
+REPORT_STORAGE = os.getenv('REPORT_STORAGE', 'memory' if JOB_BACKEND == 'thread' and SERVER_WORKERS == 1 else 'local')
+REPORT_STORAGE_DIR = os.getenv('REPORT_STORAGE_DIR', 'temp/reports')
+REPORT_STORAGE_MAX_MB = int(os.getenv('REPORT_STORAGE_MAX_MB', 0))
+REPORT_STORAGE_MAX_AGE = int(os.getenv('REPORT_STORAGE_MAX_AGE', 0))
+
+if SERVER_WORKERS > 1 and REPORT_STORAGE == 'memory':
+    raise ValueError(f"REPORT_STORAGE=memory serves a PDF only from the worker that made it; "
+                     f"use 'local' or 'object' with {SERVER_WORKERS} workers")
+if SERVER_WORKERS > 1 and JOB_BACKEND != 'sqlite':
+    raise ValueError(f"JOB_BACKEND={JOB_BACKEND} shows a job only to the worker that queued it; "
+                     f"use 'sqlite' with {SERVER_WORKERS} workers")
+
+# AI text cache keyed on banded system size/savings/payback/CO2 and region
+# (empty path = memory only)
+AI_CACHE_PATH = os.getenv('AI_CACHE_PATH', 'temp/ai_cache.sqlite3')
+AI_CACHE_SIZE = int(os.getenv('AI_CACHE_SIZE', 1024))
+AI_CACHE_MAX_ROWS = int(os.getenv('AI_CACHE_MAX_ROWS', 50000))
+AI_CACHE_TTL = int(os.getenv('AI_CACHE_TTL', 30 * 24 * 3600))
+
+# Chart: 'raster' (matplotlib Figure API, PNGs cached by series hash) or
+# 'vector' (ReportLab graphics, no matplotlib)
+CHART_BACKEND = os.getenv('CHART_BACKEND', 'raster')
+CHART_CACHE_SIZE = int(os.getenv('CHART_CACHE_SIZE', 256))
+
+# AI text, chart and static PDF sections run concurrently on a shared pool of
+# STAGE_WORKERS threads; each has its own timeout in seconds. AI_TIMEOUT is
+# the AI latency budget: past it the report uses template text while the
+# model call finishes in the background (up to AI_REQUEST_TIMEOUT) to fill
+# the AI cache. A late chart is left out; layout and PDF fail the report.
+STAGE_WORKERS = int(os.getenv('STAGE_WORKERS', JOB_WORKERS * 3))
+AI_TIMEOUT = float(os.getenv('AI_TIMEOUT', 8))
+AI_REQUEST_TIMEOUT = float(os.getenv('AI_REQUEST_TIMEOUT', 60))
+
+# OpenAI client: 'sync' or 'async' (one event loop per process; late calls
+# are cancelled at AI_REQUEST_TIMEOUT). OPENAI_BASE_URL points at another
+# endpoint, e.g. scripts/openai_stub_server.py for offline runs. Bulk
+# scoring writes AI_BATCH_SIZE leads' text per prompt.
+AI_CLIENT_MODE = os.getenv('AI_CLIENT_MODE', 'async')
+OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-4o')
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL') or None
+AI_BATCH_SIZE = int(os.getenv('AI_BATCH_SIZE', 10))
+CHART_TIMEOUT = float(os.getenv('CHART_TIMEOUT', 15))
+LAYOUT_TIMEOUT = float(os.getenv('LAYOUT_TIMEOUT', 15))
+PDF_TIMEOUT = float(os.getenv('PDF_TIMEOUT', 60))
+
+# Outbound mail: 'queue' writes reports to the SQLite outbox at MAIL_DB_PATH
+# and sends them from background threads over reused SMTP connections, at
+# most MAIL_RATE_PER_MINUTE per process, retrying transient failures with
+# backoff up to MAIL_MAX_ATTEMPTS; 'direct' sends inside the request. Set
+# MAIL_SEND_IN_PROCESS=0 to leave delivery to mail_worker.py.
+SMTP_HOST = os.getenv('SMTP_HOST', 'smtp.gmail.com')
+SMTP_PORT = int(os.getenv('SMTP_PORT', 587))
+SMTP_SECURITY = os.getenv('SMTP_SECURITY', 'starttls')
+MAIL_MODE = os.getenv('MAIL_MODE', 'queue')
+MAIL_DB_PATH = os.getenv('MAIL_DB_PATH', 'temp/mail_queue.sqlite3')
+MAIL_SENDER_WORKERS = int(os.getenv('MAIL_SENDER_WORKERS', 1))
+MAIL_RATE_PER_MINUTE = float(os.getenv('MAIL_RATE_PER_MINUTE', 20))
+MAIL_BURST = int(os.getenv('MAIL_BURST', 5))
+MAIL_MAX_ATTEMPTS = int(os.getenv('MAIL_MAX_ATTEMPTS', 6))
+MAIL_BACKOFF_BASE = float(os.getenv('MAIL_BACKOFF_BASE', 30))
+MAIL_BACKOFF_MAX = float(os.getenv('MAIL_BACKOFF_MAX', 3600))
+MAIL_SEND_IN_PROCESS = os.getenv('MAIL_SEND_IN_PROCESS', '1').lower() in ('1', 'true', 'yes')
+
+PIPELINE_CONFIG = {
+    'google_api_key': GOOGLE_API_KEY,
+    'geocoder': {
+        'url': GOOGLE_GEOCODE_URL,
+        'qps': GEOCODE_QPS,
+        'burst': GEOCODE_BURST
+    },
+    'solar_api': {
+        'url': GOOGLE_SOLAR_URL
+    },
+    'openai_api_key': OPENAI_API_KEY,
+    'gmail_user': GMAIL_USER,
+    'gmail_app_password': GMAIL_APP_PASSWORD,
+    'default_electricity_rate': DEFAULT_ELECTRICITY_RATE,
+    'installation_cost_per_kw': INSTALLATION_COST_PER_KW,
+    'performance_ratio': SYSTEM_PERFORMANCE_RATIO,
+    'battery': {
+        'enabled': BATTERY_OPTIMIZER,
+        'sizes': BATTERY_SIZES,
+        'export_rate': EXPORT_RATE,
+        'battery_cost_per_kwh': BATTERY_COST_PER_KWH,
+        'battery_fixed_cost': BATTERY_FIXED_COST,
+        'discount_rate': DISCOUNT_RATE
+    },
+    'uncertainty': {
+        'enabled': UNCERTAINTY_MODE,
+        'scenarios': UNCERTAINTY_SCENARIOS,
+        'seed': UNCERTAINTY_SEED,
+        'discount_rate': DISCOUNT_RATE
+    },
+    'ai': {
+        'mode': AI_CLIENT_MODE,
+        'model': OPENAI_MODEL,
+        'base_url': OPENAI_BASE_URL,
+        'request_timeout': AI_REQUEST_TIMEOUT,
+        'batch_size': AI_BATCH_SIZE
+    },
+    'mail': {
+        'mode': MAIL_MODE,
+        'db_path': MAIL_DB_PATH,
+        'host': SMTP_HOST,
+        'port': SMTP_PORT,
+        'security': SMTP_SECURITY,
+        'workers': MAIL_SENDER_WORKERS,
+        'rate_per_minute': MAIL_RATE_PER_MINUTE,
+        'burst': MAIL_BURST,
+        'max_attempts': MAIL_MAX_ATTEMPTS,
+        'backoff_base': MAIL_BACKOFF_BASE,
+        'backoff_max': MAIL_BACKOFF_MAX,
+        'start_sender': MAIL_SEND_IN_PROCESS
+    },
+    'chart': {
+        'backend': CHART_BACKEND,
+        'cache_size': CHART_CACHE_SIZE
+    },
+    'stages': {
+        'workers': STAGE_WORKERS,
+        'timeouts': {'ai': AI_TIMEOUT, 'chart': CHART_TIMEOUT, 'layout': LAYOUT_TIMEOUT, 'pdf': PDF_TIMEOUT}
+    },
+    'report_storage': {
+        'backend': REPORT_STORAGE,
+        'directory': REPORT_STORAGE_DIR,
+        'max_bytes': REPORT_STORAGE_MAX_MB * 1024 * 1024 or None,
+        'max_age': REPORT_STORAGE_MAX_AGE or None
+    },
+    'http': {
+        'pool_size': HTTP_POOL_SIZE,
+        'max_retries': HTTP_MAX_RETRIES,
+        'backoff_base': HTTP_BACKOFF_BASE,
+        'max_per_host': HTTP_MAX_PER_HOST,
+        'failure_threshold': HTTP_BREAKER_THRESHOLD,
+        'reset_timeout': HTTP_BREAKER_RESET
+    },
+    'async_http': {
+        'pool_size': ASYNC_HTTP_POOL_SIZE,
+        'max_per_host': ASYNC_HTTP_POOL_SIZE
+    },
+    'geocode_cache': {
+        'db_path': GEOCODE_CACHE_PATH or None,
+        'max_memory_entries': GEOCODE_CACHE_SIZE,
+        'max_disk_entries': GEOCODE_CACHE_MAX_ROWS,
+        'ttl': GEOCODE_CACHE_TTL,
+        'negative_ttl': GEOCODE_CACHE_NEGATIVE_TTL
+    },
+    'ai_cache': {
+        'db_path': AI_CACHE_PATH or None,
+        'max_memory_entries': AI_CACHE_SIZE,
+        'max_disk_entries': AI_CACHE_MAX_ROWS,
+        'ttl': AI_CACHE_TTL
+    },
+    'solar_cache': {
+        'db_path': SOLAR_CACHE_PATH,
+        'radius_m': SOLAR_CACHE_RADIUS_M,
+        'cell_size_m': SOLAR_CACHE_CELL_M,
+        'ttl': SOLAR_CACHE_TTL,
+        'max_buildings': SOLAR_CACHE_MAX_BUILDINGS
+    } if SOLAR_CACHE_PATH else None,
+    'irradiance_grid': {
+        'path': IRRADIANCE_GRID_PATH or None,
+        'fallback': SOLAR_GRID_FALLBACK
+    },
+    'postcode_index': {
+        'path': POSTCODE_INDEX_PATH or None
+    },
+    'render_farm': {
+        'workers': RENDER_WORKERS,
+        'max_pending': RENDER_MAX_PENDING or None,
+        'timeout': RENDER_TIMEOUT,
+        'max_jobs_per_worker': RENDER_MAX_JOBS_PER_WORKER
+    }
+}
+
+os.makedirs('temp', exist_ok=True)
+pipeline = get_pipeline(PIPELINE_CONFIG)
+job_queue = None
+job_queue_lock = threading.Lock()
+
+def create_idempotency_store():
+    return IdempotencyStore(IDEMPOTENCY_DB_PATH or None, ttl=IDEMPOTENCY_TTL, wait_timeout=IDEMPOTENCY_WAIT)
+
+idempotency = create_idempotency_store()
+
+REGISTRY.configure(multiprocess_dir=METRICS_DIR or None)
+profiler = RequestProfiler(PROFILE_SAMPLE_RATE, PROFILE_DIR, PROFILE_ENGINE)
+
+def collect_client_metrics():
+    """Scrape-time gauges for the HTTP client and caches of this process."""
+    lines = []
+    http_stats = pipeline.http.metrics()
+    for key in ('requests', 'retries', 'failures', 'circuit_rejections', 'connections_opened', 'connections_reused'):
+        lines.append(f"solar_upstream_http_{key}{{pid=\"{os.getpid()}\"}} {http_stats[key]}")
+    async_stats = pipeline.async_http.metrics()
+    if async_stats['requests']:
+        for key in ('requests', 'retries', 'failures', 'circuit_rejections', 'in_flight', 'peak_in_flight'):
+            lines.append(f"solar_upstream_async_http_{key}{{pid=\"{os.getpid()}\"}} {async_stats[key]}")
+    for cache_name, cache in (('geocode', pipeline.geocoder.cache), ('solar', pipeline.nasa_api.cache),
+                              ('ai', pipeline.ai_cache), ('chart', pipeline.chart_renderer)):
+        if cache is not None:
+            for key, value in cache.stats().items():
+                if isinstance(value, (int, float)):
+                    lines.append(f"solar_{cache_name}_cache_{key}{{pid=\"{os.getpid()}\"}} {value}")
+    if pipeline.postcode_index is not None:
+        for key in ('lookups', 'misses'):
+            lines.append(f"solar_postcode_index_{key}{{pid=\"{os.getpid()}\"}} {getattr(pipeline.postcode_index, key)}")
+    mail_stats = pipeline.mail_stats()
+    if mail_stats:
+        for key, value in mail_stats.pop('sender', {}).items():
+            lines.append(f"solar_mail_sender_{key}{{pid=\"{os.getpid()}\"}} {value}")
+        for key, value in mail_stats.items():
+            lines.append(f"solar_mail_outbox_{key}{{pid=\"{os.getpid()}\"}} {value}")
+    for key, value in idempotency.stats().items():
+        lines.append(f"solar_idempotency_{key}{{pid=\"{os.getpid()}\"}} {value}")
+    for key, value in (pipeline.render_farm_stats() or {}).items():
+        lines.append(f"solar_render_farm_{key}{{pid=\"{os.getpid()}\"}} {value}")
+    return lines
+
+REGISTRY.register_collector(collect_client_metrics)
+
+@app.before_request
+def start_request_timer():
+    g.request_id = make_request_id(request.headers.get('X-Request-ID'))
+    g.request_started = time.perf_counter()
+    g.profiler = profiler.start() if request.endpoint != 'metrics' and profiler.should_sample() else None
+
+@app.after_request
+def finish_request_timer(response):
+    duration = time.perf_counter() - g.request_started
+    if g.profiler is not None:
+        path = profiler.stop(g.profiler, g.request_id, label=request.endpoint or 'request')
+        log_event('profile', request_id=g.request_id, path=path)
+        g.profiler = None
+    if request.endpoint != 'metrics':
+        HTTP_REQUEST_SECONDS.observe(duration, endpoint=request.endpoint or 'unknown',
+                                     method=request.method, status=response.status_code)
+        log_event('request', request_id=g.request_id, endpoint=request.endpoint, method=request.method,
+                  status=response.status_code, duration_ms=round(duration * 1000, 2))
+        REGISTRY.maybe_flush()
+    response.headers['X-Request-ID'] = g.request_id
+    return response
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+def get_job_queue():
+    """Create the job queue on first use so forked workers each get their own pool."""
+    global job_queue
+    with job_queue_lock:
+        if job_queue is None:
+            job_queue = create_job_queue(
+                PIPELINE_CONFIG,
+                backend=JOB_BACKEND,
+                max_workers=JOB_WORKERS,
+                db_path=JOB_DB_PATH,
+                retention=JOB_RETENTION_HOURS * 3600
+            )
+    return job_queue
+
+def start_job_queue():
+    """Start draining jobs at boot rather than on the first submission, so
+    jobs queued before a restart run (gunicorn post_worker_init)."""
+    get_job_queue().start()
+
+def reset_after_fork():
+    """Called in each gunicorn worker after fork (see gunicorn.conf.py)."""
+    global job_queue, job_queue_lock, idempotency
+    job_queue = None
+    job_queue_lock = threading.Lock()
+    idempotency = create_idempotency_store()
+    pipeline.after_fork()
+
+def request_flag(name, default=False):
+    value = request.args.get(name) or request.form.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes')
+
+def wants_async_job():
+    return request_flag('async', REPORT_MODE == 'jobs')
+
+def idempotent(scope, handler):
+    """Run `handler() -> (body, status)` once per idempotency key and
+    answer duplicates with the same response."""
+    fields = dict(request.args.items(), **request.form.to_dict())
+    key = request_key(scope, fields, request.headers.get('Idempotency-Key'))
+    body, status, outcome = idempotency.run(key, handler)
+    if outcome == 'busy':
+        response = jsonify({'success': False, 'error': 'An identical request is still being processed, try again shortly'})
+        response.status_code = 409
+        response.headers['Retry-After'] = '5'
+        return response
+    if outcome != 'executed':
+        print(f"[idempotency] {scope}: {outcome} response for {key[:12]}")
+    response = jsonify(body)
+    response.status_code = status
+    if outcome != 'executed':
+        response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+@app.route('/quote', methods=['POST'])
+def quote():
+    """Summary numbers in one round trip: no AI text, PDF or email.
+
+    Takes the report form; name and email are only needed with
+    send_report=1, which also queues the full report as a background job
+    (located at the quoted coordinates, so it does not geocode again).
+    instant=1 answers from the offline irradiance grid instead of the Solar
+    API when a grid is configured.
+    """
+    return idempotent('quote', run_quote)
+
+def run_quote():
+    started = time.perf_counter()
+    try:
+        send_report = request_flag('send_report')
+        params, error = parse_report_params(request.form, DEFAULT_ELECTRICITY_RATE, require_contact=send_report)
+        if error:
+            return {'success': False, 'error': error}, 400
+
+        result = pipeline.quote(params, request_id=g.request_id, instant=request_flag('instant'))
+        if not result['success']:
+            return {'success': False, 'error': result['error']}, result['status_code']
+
+        response = {
+            'success': True,
+            'summary': result['summary'],
+            'location': result['location'],
+            'solar_source': result['solar_source'],
+            'preliminary': result['preliminary'],
+            'uncertainty': result['uncertainty']
+        }
+        if send_report:
+            job_params = dict(params, latitude=result['location']['latitude'],
+                              longitude=result['location']['longitude'])
+            job_id = get_job_queue().submit(job_params)
+            print(f"[jobs] Queued {job_id} for {params['email']} after quote")
+            response['report'] = {
+                'job_id': job_id,
+                'status_url': url_for('job_status', job_id=job_id),
+                'pdf_url': url_for('job_pdf', job_id=job_id)
+            }
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        QUOTE_REQUESTS.inc(slo='met' if elapsed_ms <= QUOTE_SLO_MS else 'missed')
+        response['elapsed_ms'] = round(elapsed_ms, 1)
+        response['slo_ms'] = QUOTE_SLO_MS
+        return response, 200
+
+    except ValueError as e:
+        return {'success': False, 'error': f'Invalid input: {str(e)}'}, 400
+    except Exception as e:
+        print(traceback.format_exc())
+        return {'success': False, 'error': f'Server error: {str(e)}'}, 500
+
 @app.route('/generate-report', methods=['POST'])
 def generate_report():
+    return idempotent('generate-report', run_generate_report)
+
+def run_generate_report():
     try:
-        name = request.form.get('name', '').strip()
-        email = request.form.get('email', '').strip()
-        address = request.form.get('address', '').strip()
-        latitude_input = request.form.get('latitude', '').strip()
-        longitude_input = request.form.get('longitude', '').strip()
-        
-        monthly_bill_str = request.form.get('monthly_bill', '').strip()
-        monthly_bill = float(monthly_bill_str) if monthly_bill_str else 0.0
-        
-        roof_area_str = request.form.get('roof_area', '').strip()
-        roof_area = float(roof_area_str) if roof_area_str else None
-        
-        electricity_rate_str = request.form.get('electricity_rate', '').strip()
-        electricity_rate = float(electricity_rate_str) if electricity_rate_str else DEFAULT_ELECTRICITY_RATE
-        
-        if not name or not email or not address or monthly_bill <= 0:
-            return jsonify({
-                'success': False,
-                'error': 'Name, Email, Address and Monthly Bill (>£0) are required'
-            }), 400
-        
-        if '@' not in email:
-            return jsonify({'success': False, 'error': 'Invalid email address'}), 400
-        
-        print(f"\n{'='*60}")
-        print(f"Processing: {name} | {address}")
-        print(f"{'='*60}")
-        
-        # Step 1: Get coordinates
-        if latitude_input and longitude_input:
-            latitude = float(latitude_input)
-            longitude = float(longitude_input)
-            formatted_address = address
-            print(f"[1/6] Using coordinates: {latitude}, {longitude}")
-        else:
-            print(f"[1/6] Geocoding address...")
-            location_result = geocoder.geocode_address(address)
-            if not location_result['success']:
-                return jsonify({
-                    'success': False,
-                    'error': f"Address not found: {location_result['error']}"
-                }), 400
-            latitude = location_result['latitude']
-            longitude = location_result['longitude']
-            formatted_address = location_result['formatted_address']
-            print(f"      → {latitude}, {longitude}")
-        
-        # Step 2: Get solar data
-        print(f"[2/6] Fetching solar data from Google Solar API...")
-        solar_result = nasa_api.get_solar_data(latitude, longitude)
-        
-        if not solar_result['success']:
-            return jsonify({
-                'success': False,
-                'error': f"Solar data error: {solar_result['error']}"
-            }), 500
-        
-        peak_sun_hours = solar_result['data']['annual_average_kwh_m2_day']
-        print(f"      → Peak sun: {peak_sun_hours} kWh/m²/day")
-        
-        # Step 3: Calculate system
-        print(f"[3/6] Calculating solar system...")
-        # FIX: Use SYSTEM_PERFORMANCE_RATIO (0.75) for the panel_efficiency parameter.
-        # This aligns with the fixed SolarCalculator which uses the value of this parameter as the derate factor.
-        calculator = SolarCalculator(
-            electricity_rate=electricity_rate,
-            panel_efficiency=SYSTEM_PERFORMANCE_RATIO, 
-            installation_cost_per_kw=INSTALLATION_COST_PER_KW
-        )
-        
-        annual_consumption_kwh = (monthly_bill / DEFAULT_ELECTRICITY_RATE) * 12
-        print(f"      → Annual Consumption (estimated): {annual_consumption_kwh:,.0f} kWh")
-
-        report_data = calculator.generate_complete_report(
-            annual_consumption_kwh=annual_consumption_kwh,
-            peak_sun_hours=peak_sun_hours,
-            electricity_rate=electricity_rate,
-            monthly_solar_data=solar_result['data']['monthly']
-        )
-        
-        print(f"      → System: {report_data['system']['actual_size_kw']} kW")
-        print(f"      → Production: {report_data['production']['annual_production_kwh']:,.0f} kWh/year")
-        print(f"      → Savings: £{report_data['financial']['annual_savings']:,.2f}/year")
-        
-        # Step 4: Generate AI content
-        ai_content = {}
-        if OPENAI_API_KEY:
-            print(f"[4/6] Generating AI content...")
-            try:
-                ai_generator = AIContentGenerator(OPENAI_API_KEY)
-                ai_content = ai_generator.generate_report_content(
-                    report_data, formatted_address, peak_sun_hours
-                )
-                print(f"      → AI content generated")
-            except Exception as e:
-                print(f"      → AI failed: {str(e)}")
-                ai_content = {}
-        else:
-            print(f"[4/6] Skipping AI (no API key)")
-        
-        # Step 5: Generate PDF
-        print(f"[5/6] Creating PDF report...")
-        try:
-            user_data = {
-                'name': name,
-                'email': email,
-                'address': formatted_address
-            }
-            location_data = {
-                'latitude': latitude,
-                'longitude': longitude,
-                'annual_average': peak_sun_hours
-            }
-            
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"temp/solar_report_{name.replace(' ', '_')}_{timestamp}.pdf"
-            
-            pdf_generator = PDFReportGenerator(filename)
-            pdf_generator.generate(
-                user_data, location_data, 
-                solar_result['data'], report_data, ai_content
-            )
-            print(f"      → PDF created: {filename}")
-            
-        except Exception as pdf_error:
-            print(f"      → PDF ERROR: {str(pdf_error)}")
-            print(traceback.format_exc())
-            return jsonify({
-                'success': False,
-                'error': f'PDF generation failed: {str(pdf_error)}'
-            }), 500
-        
-        # Step 6: Send email
-        if GMAIL_USER and GMAIL_APP_PASSWORD:
-            print(f"[6/6] Sending email to {email}...")
-            try:
-                email_sender = EmailSender(GMAIL_USER, GMAIL_APP_PASSWORD)
-                email_result = email_sender.send_report(email, name, filename)
-                if email_result['success']:
-                    print(f"      → Email sent!")
-                else:
-                    print(f"      → Email failed: {email_result['error']}")
-            except Exception as email_error:
-                print(f"      → Email ERROR: {str(email_error)}")
-        else:
-            print(f"[6/6] Email skipped (not configured)")
-        
-        print(f"{'='*60}\n")
-        
+        params, error = parse_report_params(request.form, DEFAULT_ELECTRICITY_RATE)
+        if error:
+            return {'success': False, 'error': error}, 400
+
+        if wants_async_job():
+            job_id = get_job_queue().submit(params)
+            print(f"[jobs] Queued {job_id} for {params['email']}")
+            return {
+                'success': True,
+                'job_id': job_id,
+                'status_url': url_for('job_status', job_id=job_id),
+                'pdf_url': url_for('job_pdf', job_id=job_id)
+            }, 202
+
+        result = pipeline.run(params, request_id=g.request_id)
+        if not result['success']:
+            return {'success': False, 'error': result['error']}, result['status_code']
+
         # Return success
-        return jsonify({
+        return {
             'success': True,
-            'message': f'Solar report generated and sent to {email}!',
-            'summary': {
-                'system_size': report_data['system']['actual_size_kw'],
-                'num_panels': report_data['system']['num_panels'],
-                'annual_production': round(report_data['production']['annual_production_kwh'], 2),
-                'annual_savings': round(report_data['financial']['annual_savings'], 2),
-                'payback_period': report_data['financial']['payback_period_years'],
-                'co2_offset': report_data['environmental']['co2_offset_annual_tons']
-            }
-        }), 200
+            'message': result['message'],
+            'summary': result['summary'],
+            'report_id': result['report_id'],
+            'pdf_url': url_for('report_pdf', report_id=result['report_id'])
+        }, 200
     
     except ValueError as e:
         error_msg = f'Invalid input: {str(e)}'
         print(f"\nVALUE ERROR: {error_msg}")
         print(traceback.format_exc())
-        return jsonify({'success': False, 'error': error_msg}), 400
+        return {'success': False, 'error': error_msg}, 400
         
     except Exception as e:
         error_msg = f'Server error: {str(e)}'
         print(f"\nSERVER ERROR: {error_msg}")
         print(traceback.format_exc())
-        return jsonify({'success': False, 'error': error_msg}), 500
+        return {'success': False, 'error': error_msg}, 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify({'success': True, 'job': public_job(job)})
+
+@app.route('/jobs/<job_id>/pdf', methods=['GET'])
+def job_pdf(job_id):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    if job['status'] != 'succeeded':
+        return jsonify({'success': False, 'error': f"Report not ready (status: {job['status']})"}), 409
+    return send_report_pdf(job['report_id'])
+
+def send_report_pdf(report_id):
+    stored = pipeline.storage.get(report_id) if report_id else None
+    if stored is None:
+        return jsonify({'success': False, 'error': 'Report not found or expired'}), 404
+    pdf_bytes, filename = stored
+    return send_file(io.BytesIO(pdf_bytes), mimetype='application/pdf', as_attachment=True,
+                     download_name=filename)
+
+@app.route('/reports/<report_id>/pdf', methods=['GET'])
+def report_pdf(report_id):
+    return send_report_pdf(report_id)
+
+@app.route('/bulk-report', methods=['POST'])
+def bulk_report():
+    """Score a CSV/JSONL lead list, streaming NDJSON (default) or CSV rows back.
+
+    Upload as multipart `file` or as the raw request body. Query options:
+    format=csv|jsonl, output=ndjson|csv, pdf=1 and email=1 to allow per-row
+    generate_pdf / send_email columns.
+    """
+    upload = request.files.get('file')
+    if upload:
+        # Uploaded files are closed when this view returns, before the
+        # response generator reads them; the body is capped by MAX_CONTENT_LENGTH
+        stream = io.TextIOWrapper(io.BytesIO(upload.read()), encoding='utf-8', newline='')
+        input_format = request.args.get('format') or detect_format(upload.filename, upload.mimetype)
+    else:
+        stream = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+        input_format = request.args.get('format') or detect_format(content_type=request.content_type)
+
+    def flag(name):
+        return request.args.get(name, '').strip().lower() in ('1', 'true', 'yes')
+
+    scorer = BulkScorer(
+        pipeline,
+        max_concurrency=BULK_CONCURRENCY,
+        batch_size=BULK_BATCH_SIZE,
+        allow_pdf=flag('pdf'),
+        allow_email=flag('email'),
+        render_farm=pipeline.render_farm() if flag('pdf') else None
+    )
+    rows = scorer.score(read_leads(stream, input_format))
+
+    if request.args.get('output', 'ndjson') == 'csv':
+        return Response(stream_with_context(format_csv(rows)), mimetype='text/csv')
+    return Response(stream_with_context(format_ndjson(rows)), mimetype='application/x-ndjson')
 
 @app.route('/test-email', methods=['GET'])
 def test_email():
-    if not GMAIL_USER or not GMAIL_APP_PASSWORD:
-        return jsonify({'success': False, 'error': 'Gmail not configured'}), 400
-    email_sender = EmailSender(GMAIL_USER, GMAIL_APP_PASSWORD)
-    return jsonify(email_sender.test_connection())
+    if not pipeline.email_configured():
+        return jsonify({'success': False, 'error': 'Email not configured'}), 400
+    return jsonify(pipeline.email_sender().test_connection())
 
-@app.route('/health', methods=['GET'])
-def health_check():
-    return jsonify({
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+def health_status():
+    """The /health payload, shared with asgi.py."""
+    return {
         'status': 'healthy',
-        'gmail': '✓' if GMAIL_USER and GMAIL_APP_PASSWORD else '✗',
+        'gmail': '✓' if pipeline.email_configured() else '✗',
         'openai': '✓' if OPENAI_API_KEY else '✗',
         'google': '✓' if GOOGLE_API_KEY else '✗',
+        'geocode_cache': pipeline.geocoder.cache.stats() if pipeline.geocoder.cache else None,
+        'solar_cache': pipeline.nasa_api.cache.stats() if pipeline.nasa_api.cache else None,
+        'irradiance_grid': pipeline.irradiance_grid.stats() if pipeline.irradiance_grid else None,
+        'postcode_index': pipeline.postcode_index.stats() if pipeline.postcode_index else None,
+        'ai_cache': pipeline.ai_cache.stats() if pipeline.ai_cache else None,
+        'mail': pipeline.mail_stats(),
+        'idempotency': idempotency.stats(),
+        'render_farm': pipeline.render_farm_stats(),
+        'http': pipeline.http.metrics(),
+        'async_http': pipeline.async_http.metrics(),
         'timestamp': datetime.now().isoformat()
-    })
+    }
+
+@app.route('/health', methods=['GET'])
+def health_check():
+    return jsonify(health_status())
 os.makedirs('temp', exist_ok=True)
 
 if __name__ == '__main__':
@@ -234,13 +649,19 @@ if __name__ == '__main__':
     print("\n" + "="*60)
     print("SOLAR ENERGY REPORT SYSTEM (GOOGLE SOLAR API)")
     print("="*60)
-    print(f"Gmail:   {'✓' if GMAIL_USER and GMAIL_APP_PASSWORD else '✗'}")
+    print(f"Gmail:   {'✓' if pipeline.email_configured() else '✗'} (mail: {MAIL_MODE} via {SMTP_HOST}:{SMTP_PORT})")
     print(f"OpenAI: {'✓' if OPENAI_API_KEY else '✗'}")
     print(f"Google: {'✓' if GOOGLE_API_KEY else '✗ REQUIRED'}")
+    print(f"Grid:    {'✓' if pipeline.irradiance_grid else '✗'} ({IRRADIANCE_GRID_PATH or 'disabled'})")
+    print(f"Postcodes: {'✓' if pipeline.postcode_index else '✗'} ({POSTCODE_INDEX_PATH or 'disabled'})")
     print(f"Rate:    £{DEFAULT_ELECTRICITY_RATE}/kWh")
     print(f"Cost:    £{INSTALLATION_COST_PER_KW}/kW")
     print(f"Performance Ratio: {SYSTEM_PERFORMANCE_RATIO*100}%") 
+    print(f"Reports: {REPORT_MODE} (jobs: {JOB_BACKEND} x{JOB_WORKERS})")
     print("="*60)
     print("Server: http://localhost:5000")
     print("="*60 + "\n")
+    # The reloader runs the app in a child process; only that one drains jobs
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_job_queue()
     app.run(debug=True, host='0.0.0.0', port=5000)
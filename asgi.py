@@ -0,0 +1,243 @@
+"""The report endpoints as an ASGI app (Quart) for an asyncio request path.
+
+    pip install quart hypercorn httpx aiosmtplib
+    hypercorn asgi:app --bind 0.0.0.0:8000
+    SERVER_WORKERS=2 hypercorn asgi:app --bind 0.0.0.0:8000 --workers 2
+
+Same configuration (.env), pipeline, caches, idempotency store and job
+queue as app.py, but each request is a coroutine: geocoding and Solar API
+calls go over httpx, OpenAI over the async client, and direct mail over
+aiosmtplib, so a lead waiting on Google holds no thread and one process can
+hold hundreds of them. The calculation, chart and PDF stages are CPU-bound
+and run on the pipeline's stage executor (STAGE_WORKERS threads); they
+still share the GIL, so scale CPU with hypercorn --workers.
+
+Serves /, /quote, /generate-report, /jobs/<id>, /jobs/<id>/pdf,
+/reports/<id>/pdf, /health and /metrics. /bulk-report and /test-email stay
+on the Flask app (gunicorn -c gunicorn.conf.py app:app), as does request
+profiling. benchmarks/bench_asgi_load.py compares the two deployments.
+"""
+import functools
+import io
+import time
+import traceback
+
+from quart import Quart, Response, g, jsonify, render_template, request, send_file, url_for
+from quart.utils import run_sync
+
+import app as flask_app
+from app import DEFAULT_ELECTRICITY_RATE, QUOTE_SLO_MS, REPORT_MODE
+from utils.idempotency import request_key
+from utils.jobs import public_job
+from utils.metrics import REGISTRY, HTTP_REQUEST_SECONDS, QUOTE_REQUESTS, log_event, make_request_id
+from utils.report_pipeline import parse_report_params
+
+app = Quart(__name__)
+app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
+
+pipeline = flask_app.pipeline
+
+
+@app.before_request
+async def start_request_timer():
+    g.request_id = make_request_id(request.headers.get('X-Request-ID'))
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+async def finish_request_timer(response):
+    duration = time.perf_counter() - g.request_started
+    if request.endpoint != 'metrics':
+        HTTP_REQUEST_SECONDS.observe(duration, endpoint=request.endpoint or 'unknown',
+                                     method=request.method, status=response.status_code)
+        log_event('request', request_id=g.request_id, endpoint=request.endpoint, method=request.method,
+                  status=response.status_code, duration_ms=round(duration * 1000, 2))
+        REGISTRY.maybe_flush()
+    response.headers['X-Request-ID'] = g.request_id
+    return response
+
+
+@app.before_serving
+async def start_jobs():
+    await run_sync(flask_app.start_job_queue)()
+
+
+@app.after_serving
+async def close_clients():
+    await pipeline.async_http.aclose()
+
+
+@app.route('/')
+async def index():
+    return await render_template('index.html')
+
+
+def request_flag(form, name, default=False):
+    value = request.args.get(name) or form.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes')
+
+
+async def submit_job(params):
+    return await run_sync(flask_app.get_job_queue().submit)(params)
+
+
+async def idempotent(scope, form, handler):
+    """Await `handler() -> (body, status)` once per idempotency key and
+    answer duplicates with the same response (see app.idempotent)."""
+    fields = dict(request.args.items(), **form.to_dict())
+    key = request_key(scope, fields, request.headers.get('Idempotency-Key'))
+    body, status, outcome = await flask_app.idempotency.run_async(key, handler)
+    if outcome == 'busy':
+        response = jsonify({'success': False, 'error': 'An identical request is still being processed, try again shortly'})
+        response.status_code = 409
+        response.headers['Retry-After'] = '5'
+        return response
+    if outcome != 'executed':
+        print(f"[idempotency] {scope}: {outcome} response for {key[:12]}")
+    response = jsonify(body)
+    response.status_code = status
+    if outcome != 'executed':
+        response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+@app.route('/quote', methods=['POST'])
+async def quote():
+    """See app.quote."""
+    form = await request.form
+    return await idempotent('quote', form, functools.partial(run_quote, form))
+
+
+async def run_quote(form):
+    started = time.perf_counter()
+    try:
+        send_report = request_flag(form, 'send_report')
+        params, error = parse_report_params(form, DEFAULT_ELECTRICITY_RATE, require_contact=send_report)
+        if error:
+            return {'success': False, 'error': error}, 400
+
+        result = await pipeline.quote_async(params, request_id=g.request_id, instant=request_flag(form, 'instant'))
+        if not result['success']:
+            return {'success': False, 'error': result['error']}, result['status_code']
+
+        response = {
+            'success': True,
+            'summary': result['summary'],
+            'location': result['location'],
+            'solar_source': result['solar_source'],
+            'preliminary': result['preliminary'],
+            'uncertainty': result['uncertainty']
+        }
+        if send_report:
+            job_params = dict(params, latitude=result['location']['latitude'],
+                              longitude=result['location']['longitude'])
+            job_id = await submit_job(job_params)
+            print(f"[jobs] Queued {job_id} for {params['email']} after quote")
+            response['report'] = {
+                'job_id': job_id,
+                'status_url': url_for('job_status', job_id=job_id),
+                'pdf_url': url_for('job_pdf', job_id=job_id)
+            }
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        QUOTE_REQUESTS.inc(slo='met' if elapsed_ms <= QUOTE_SLO_MS else 'missed')
+        response['elapsed_ms'] = round(elapsed_ms, 1)
+        response['slo_ms'] = QUOTE_SLO_MS
+        return response, 200
+
+    except ValueError as e:
+        return {'success': False, 'error': f'Invalid input: {str(e)}'}, 400
+    except Exception as e:
+        print(traceback.format_exc())
+        return {'success': False, 'error': f'Server error: {str(e)}'}, 500
+
+
+@app.route('/generate-report', methods=['POST'])
+async def generate_report():
+    form = await request.form
+    return await idempotent('generate-report', form, functools.partial(run_generate_report, form))
+
+
+async def run_generate_report(form):
+    try:
+        params, error = parse_report_params(form, DEFAULT_ELECTRICITY_RATE)
+        if error:
+            return {'success': False, 'error': error}, 400
+
+        if request_flag(form, 'async', REPORT_MODE == 'jobs'):
+            job_id = await submit_job(params)
+            print(f"[jobs] Queued {job_id} for {params['email']}")
+            return {
+                'success': True,
+                'job_id': job_id,
+                'status_url': url_for('job_status', job_id=job_id),
+                'pdf_url': url_for('job_pdf', job_id=job_id)
+            }, 202
+
+        result = await pipeline.run_async(params, request_id=g.request_id)
+        if not result['success']:
+            return {'success': False, 'error': result['error']}, result['status_code']
+
+        return {
+            'success': True,
+            'message': result['message'],
+            'summary': result['summary'],
+            'report_id': result['report_id'],
+            'pdf_url': url_for('report_pdf', report_id=result['report_id'])
+        }, 200
+
+    except ValueError as e:
+        print(traceback.format_exc())
+        return {'success': False, 'error': f'Invalid input: {str(e)}'}, 400
+    except Exception as e:
+        print(traceback.format_exc())
+        return {'success': False, 'error': f'Server error: {str(e)}'}, 500
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+async def job_status(job_id):
+    job = await run_sync(flask_app.get_job_queue().get)(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify({'success': True, 'job': public_job(job)})
+
+
+@app.route('/jobs/<job_id>/pdf', methods=['GET'])
+async def job_pdf(job_id):
+    job = await run_sync(flask_app.get_job_queue().get)(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    if job['status'] != 'succeeded':
+        return jsonify({'success': False, 'error': f"Report not ready (status: {job['status']})"}), 409
+    return await send_report_pdf(job['report_id'])
+
+
+async def send_report_pdf(report_id):
+    stored = await run_sync(pipeline.storage.get)(report_id) if report_id else None
+    if stored is None:
+        return jsonify({'success': False, 'error': 'Report not found or expired'}), 404
+    pdf_bytes, filename = stored
+    return await send_file(io.BytesIO(pdf_bytes), mimetype='application/pdf', as_attachment=True,
+                           attachment_filename=filename)
+
+
+@app.route('/reports/<report_id>/pdf', methods=['GET'])
+async def report_pdf(report_id):
+    return await send_report_pdf(report_id)
+
+
+@app.route('/metrics', methods=['GET'])
+async def metrics():
+    return Response(await run_sync(REGISTRY.render)(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/health', methods=['GET'])
+async def health_check():
+    return jsonify(await run_sync(flask_app.health_status)())
+
+
+if __name__ == '__main__':
+    print("Development server; deploy with: hypercorn asgi:app --bind 0.0.0.0:8000")
+    app.run(host='0.0.0.0', port=5000)
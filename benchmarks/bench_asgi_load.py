@@ -0,0 +1,202 @@
+"""Load test: the sync deployment (gunicorn + Flask) against ASGI (hypercorn + Quart).
+
+    python benchmarks/bench_asgi_load.py [--concurrency 20,100,300] [--duration 15]
+        [--latency 0.2] [--workers 1] [--threads 4] [--paths quote] [--servers sync,asgi]
+
+Starts scripts/geocode_stub_server.py (Geocoding and Solar API, --latency
+per call, no quota) and, for --paths report, scripts/openai_stub_server.py,
+then each server in turn with the same configuration and --workers
+processes:
+
+- sync: gunicorn -c gunicorn.conf.py app:app, --threads threads per worker
+- asgi: hypercorn asgi:app
+
+Each is driven at every --concurrency for --duration seconds by that many
+clients on one event loop. Every request has its own address and the
+caches are off, so each quote geocodes and calls the Solar API (two
+upstream round trips). Reports throughput, latency percentiles, errors and
+the server's resident memory (all of its processes). Fails if the ASGI
+server answers with an error.
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENDPOINTS = {'quote': '/quote', 'report': '/generate-report'}
+
+
+def start(command, env, port):
+    """Start a server and wait until /health answers."""
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if httpx.get(f'http://127.0.0.1:{port}/health', timeout=2).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        if process.poll() is not None:
+            raise SystemExit(f"{' '.join(command)} exited with {process.returncode}")
+        time.sleep(0.25)
+    process.kill()
+    raise SystemExit(f"{' '.join(command)} did not start")
+
+
+def stop(process):
+    process.terminate()
+    try:
+        process.wait(20)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def tree_rss(pid):
+    """Resident MiB of a process and its descendants."""
+    total = 0
+    pending = [pid]
+    while pending:
+        pid = pending.pop()
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+            for task in os.listdir(f'/proc/{pid}/task'):
+                with open(f'/proc/{pid}/task/{task}/children') as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except OSError:
+            continue
+    return total / 1024
+
+
+async def drive(url, path, concurrency, duration, counter):
+    """`concurrency` clients posting for `duration` seconds; returns
+    (latencies_s, errors, elapsed_s), elapsed including the last responses."""
+    latencies = []
+    errors = []
+    started_at = time.perf_counter()
+    deadline = started_at + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=120) as client:
+        async def one_client():
+            while time.perf_counter() < deadline:
+                n = next(counter)
+                form = {
+                    'name': 'Load Test',
+                    'email': 'loadtest@example.com',
+                    'address': f'{n} Bench Street, Leeds',
+                    'monthly_bill': str(80 + n % 120),
+                    'electricity_rate': '0.28'
+                }
+                started = time.perf_counter()
+                try:
+                    response = await client.post(path, data=form)
+                    ok = response.status_code == 200 and response.json().get('success')
+                except Exception as e:
+                    errors.append(f'{type(e).__name__}: {e}')
+                    continue
+                if ok:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors.append(f'HTTP {response.status_code}: {response.text[:120]}')
+
+        await asyncio.gather(*(one_client() for _ in range(concurrency)))
+    return np.array(latencies), errors, time.perf_counter() - started_at
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', default='20,100,300')
+    parser.add_argument('--duration', type=float, default=15.0)
+    parser.add_argument('--latency', type=float, default=0.2, help='stub seconds per Google call')
+    parser.add_argument('--ai-latency', type=float, default=0.8, help='stub seconds per OpenAI call')
+    parser.add_argument('--workers', type=int, default=1, help='server processes for both deployments')
+    parser.add_argument('--threads', type=int, default=4, help='gunicorn threads per worker')
+    parser.add_argument('--paths', default='quote')
+    parser.add_argument('--servers', default='sync,asgi')
+    parser.add_argument('--port', type=int, default=8710, help='first of three local ports')
+    args = parser.parse_args()
+
+    stub_port, ai_port, server_port = args.port, args.port + 1, args.port + 2
+    levels = [int(c) for c in args.concurrency.split(',') if c.strip()]
+    paths = [p.strip() for p in args.paths.split(',') if p.strip()]
+    tmp = tempfile.TemporaryDirectory()
+    stubs = [subprocess.Popen([sys.executable, 'scripts/geocode_stub_server.py', '--port', str(stub_port),
+                               '--latency', str(args.latency), '--jitter', str(args.latency / 4), '--qps', '0'],
+                              cwd=ROOT, stdout=subprocess.DEVNULL)]
+    env = dict(os.environ,
+               GOOGLE_API_KEY='stub',
+               GOOGLE_GEOCODE_URL=f'http://127.0.0.1:{stub_port}/maps/api/geocode/json',
+               GOOGLE_SOLAR_URL=f'http://127.0.0.1:{stub_port}/v1/buildingInsights:findClosest',
+               OPENAI_API_KEY='', GMAIL_USER='', GEOCODE_QPS='0',
+               GEOCODE_CACHE_PATH='', SOLAR_CACHE_PATH='', AI_CACHE_PATH='',
+               POSTCODE_INDEX_PATH='', IRRADIANCE_GRID_PATH='', METRICS_DIR='', PROFILE_SAMPLE_RATE='0',
+               IDEMPOTENCY_DB_PATH=os.path.join(tmp.name, 'idempotency.sqlite3'),
+               JOB_DB_PATH=os.path.join(tmp.name, 'jobs.sqlite3'), SERVER_WORKERS=str(args.workers),
+               GUNICORN_BIND=f'127.0.0.1:{server_port}', GUNICORN_WORKERS=str(args.workers),
+               GUNICORN_THREADS=str(args.threads))
+    if 'report' in paths:
+        stubs.append(subprocess.Popen([sys.executable, 'scripts/openai_stub_server.py', '--port', str(ai_port),
+                                       '--latency', str(args.ai_latency), '--jitter', str(args.ai_latency / 4)],
+                                      cwd=ROOT, stdout=subprocess.DEVNULL))
+        env.update(OPENAI_API_KEY='stub', OPENAI_BASE_URL=f'http://127.0.0.1:{ai_port}/v1')
+
+    commands = {
+        'sync': ['gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+        'asgi': ['hypercorn', 'asgi:app', '--bind', f'127.0.0.1:{server_port}', '--workers', str(args.workers)]
+    }
+    url = f'http://127.0.0.1:{server_port}'
+    counter = itertools.count(1)
+
+    print(f"Stub latency {args.latency * 1000:.0f} ms per Google call; {args.workers} worker process(es), "
+          f"sync with {args.threads} threads each; {args.duration:.0f}s per run")
+    print(f"{'server':>6} {'path':>7} {'clients':>8} {'ok':>6} {'errors':>7} {'req/s':>7} {'p50':>8} {'p95':>8} "
+          f"{'p99':>8} {'RSS MiB':>8}")
+    failed = False
+    time.sleep(0.5)
+    try:
+        for server in [s.strip() for s in args.servers.split(',') if s.strip()]:
+            process = start(commands[server], env, server_port)
+            try:
+                for path in paths:
+                    # Warm up: lazy imports, pools, the first PDF
+                    asyncio.run(drive(url, ENDPOINTS[path], 2, 2.0, counter))
+                    for concurrency in levels:
+                        latencies, errors, elapsed = asyncio.run(drive(url, ENDPOINTS[path], concurrency, args.duration,
+                                                              counter))
+                        rss = tree_rss(process.pid)
+                        if not len(latencies):
+                            print(f"{server:>6} {path:>7} {concurrency:>8} {0:>6} {len(errors):>7}  "
+                                  f"no successful requests ({errors[:1]})")
+                            failed = failed or server == 'asgi'
+                            continue
+                        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+                        print(f"{server:>6} {path:>7} {concurrency:>8} {len(latencies):>6} {len(errors):>7} "
+                              f"{len(latencies) / elapsed:>7.1f} {p50:>6.0f}ms {p95:>6.0f}ms {p99:>6.0f}ms "
+                              f"{rss:>8.0f}")
+                        if errors:
+                            print(f"{'':>6} first error: {errors[0]}")
+                            # Dropped connections at saturation are the client's side of an
+                            # overloaded box; a non-200 answer is a server failure
+                            failed = failed or (server == 'asgi' and any(e.startswith('HTTP') for e in errors))
+            finally:
+                stop(process)
+    finally:
+        for stub in stubs:
+            stub.terminate()
+        tmp.cleanup()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
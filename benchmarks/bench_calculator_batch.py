@@ -0,0 +1,72 @@
+"""Scalar SolarCalculator loop vs the vectorised batch engine.
+
+    python benchmarks/bench_calculator_batch.py [num_leads]
+
+Also checks that both paths produce identical numbers for every lead.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.calculations import SolarCalculator
+
+
+def make_leads(n, seed=42):
+    rng = np.random.default_rng(seed)
+    return {
+        'annual_consumption_kwh': rng.uniform(1500, 12000, n),
+        'peak_sun_hours': rng.uniform(0.0, 5.0, n),
+        'electricity_rate': rng.uniform(0.15, 0.40, n)
+    }
+
+
+def run_scalar(calculator, leads):
+    reports = []
+    for consumption, psh, rate in zip(leads['annual_consumption_kwh'], leads['peak_sun_hours'], leads['electricity_rate']):
+        reports.append(calculator.generate_complete_report(float(consumption), float(psh), float(rate)))
+    return reports
+
+
+def check_identical(scalar_reports, batch_report):
+    mismatches = 0
+    for i, report in enumerate(scalar_reports):
+        for section, fields in report.items():
+            for field, value in fields.items():
+                if batch_report[section][field][i] != value:
+                    mismatches += 1
+                    if mismatches <= 5:
+                        print(f"  mismatch lead {i} {section}.{field}: scalar={value!r} batch={batch_report[section][field][i]!r}")
+    return mismatches
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    leads = make_leads(n)
+    calculator = SolarCalculator(electricity_rate=0.25, panel_efficiency=0.75, installation_cost_per_kw=3000)
+
+    start = time.perf_counter()
+    scalar_reports = run_scalar(calculator, leads)
+    scalar_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch_report = calculator.generate_batch_report(
+        leads['annual_consumption_kwh'], leads['peak_sun_hours'], leads['electricity_rate']
+    )
+    batch_s = time.perf_counter() - start
+
+    mismatches = check_identical(scalar_reports, batch_report)
+
+    print(f"Leads:        {n:,}")
+    print(f"Scalar loop:  {scalar_s*1000:9.1f} ms  ({n/scalar_s:,.0f} leads/s)")
+    print(f"Batch engine: {batch_s*1000:9.1f} ms  ({n/batch_s:,.0f} leads/s)")
+    print(f"Speed-up:     {scalar_s/batch_s:9.1f}x")
+    print(f"Mismatches:   {mismatches}")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
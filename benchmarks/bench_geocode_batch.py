@@ -0,0 +1,137 @@
+"""Batch geocoding against a local Google stand-in with a QPS quota.
+
+    python benchmarks/bench_geocode_batch.py [--addresses 600] [--duplicates 0.2]
+        [--concurrency 16] [--qps 50] [--rate 40] [--latency 0.08]
+
+Starts scripts/geocode_stub_server.py on a free port (--latency per call,
+OVER_QUERY_LIMIT beyond --qps in any second) and geocodes the same lead
+list, in which --duplicates of the rows repeat an earlier address, four
+ways:
+
+- serial: geocode_address() in a loop
+- threads: geocode_address() on --concurrency threads, no rate limit, as
+  a naive parallel import would
+- batch: Geocoder.geocode_batch() iterated, at --rate tokens per second
+  with bursts of --rate / 5 (a full bucket allows rate + burst calls in
+  one second, so keep that within the quota)
+- batch async: the same batch with async for
+
+Each run starts without a cache. Reports throughput, Google calls, quota
+rejections and the busiest second, and checks that every result matches
+its input row.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'scripts'))
+
+from geocode_stub_server import fake_location, reset_stats, serve
+from utils.geocoder import Geocoder
+from utils.http_client import HttpClient
+
+
+def make_addresses(n, duplicates, seed=11):
+    rng = np.random.default_rng(seed)
+    streets = ['High Street', 'Station Road', 'Church Lane', 'Mill Road', 'Park Avenue', 'Victoria Road']
+    towns = ['Bristol', 'Leeds', 'York', 'Norwich', 'Exeter', 'Cardiff', 'Oxford', 'Durham']
+    addresses = []
+    for i in range(n):
+        if addresses and rng.random() < duplicates:
+            # Same lead typed again, differently
+            previous = addresses[rng.integers(len(addresses))]
+            addresses.append(previous.upper() if i % 2 else previous.replace(', ', ' , '))
+        elif i % 50 == 49:
+            addresses.append(f'{i} Nowhere Close, Atlantis')
+        else:
+            addresses.append(f"{i + 1} {streets[i % len(streets)]}, {towns[rng.integers(len(towns))]}")
+    return addresses
+
+
+def check(addresses, results):
+    """Rows whose result is not the stub's answer for that address."""
+    wrong = 0
+    for address, result in zip(addresses, results):
+        if 'nowhere' in address.lower():
+            wrong += result['success']
+        elif result['success'] and (result['latitude'], result['longitude']) != fake_location(address):
+            wrong += 1
+    return wrong + abs(len(addresses) - len(results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--addresses', type=int, default=600)
+    parser.add_argument('--duplicates', type=float, default=0.2)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--qps', type=int, default=50, help="the stub's quota")
+    parser.add_argument('--rate', type=float, default=40, help='batch rate limit (calls/s)')
+    parser.add_argument('--latency', type=float, default=0.08)
+    args = parser.parse_args()
+
+    server = serve(port=0, latency=args.latency, jitter=args.latency / 2, qps=args.qps)
+    base = f'http://127.0.0.1:{server.server_port}'
+    addresses = make_addresses(args.addresses, args.duplicates)
+
+    def geocoder():
+        http = HttpClient(pool_size=args.concurrency * 2, max_per_host=args.concurrency * 2)
+        return Geocoder('stub', http_client=http, geocode_url=base + '/maps/api/geocode/json')
+
+    def serial():
+        g = geocoder()
+        return [g.geocode_address(a) for a in addresses], None
+
+    def threads():
+        g = geocoder()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            return list(executor.map(g.geocode_address, addresses)), None
+
+    def batch():
+        b = geocoder().geocode_batch(addresses, concurrency=args.concurrency, rate=args.rate, burst=args.rate / 5)
+        return list(b), b.stats()
+
+    def batch_async():
+        b = geocoder().geocode_batch(addresses, concurrency=args.concurrency, rate=args.rate, burst=args.rate / 5)
+
+        async def collect():
+            return [result async for result in b]
+        return asyncio.run(collect()), b.stats()
+
+    unique = len({' '.join(a.lower().replace(',', ' ').split()) for a in addresses})
+    print(f"{len(addresses)} addresses ({unique} unique), stub latency {args.latency * 1000:.0f} ms, "
+          f"quota {args.qps}/s; batch {args.concurrency} concurrent at {args.rate:g}/s")
+    print(f"{'mode':>12} {'seconds':>8} {'addr/s':>7} {'google':>7} {'over quota':>11} {'peak/s':>7} "
+          f"{'failed':>7} {'wrong':>6}")
+    failed = False
+    for name, run in (('serial', serial), ('threads', threads), ('batch', batch), ('batch async', batch_async)):
+        time.sleep(1.1)  # let the quota window empty
+        reset_stats()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            results, stats = run()
+        elapsed = time.perf_counter() - start
+        stub = requests.get(base + '/stats', timeout=5).json()
+        failures = sum(not r['success'] for r in results) - sum('nowhere' in a.lower() for a in addresses)
+        wrong = check(addresses, results)
+        print(f"{name:>12} {elapsed:>8.2f} {len(results) / elapsed:>7.1f} {stub['requests']:>7} "
+              f"{stub['over_query_limit']:>11} {stub['peak_qps']:>7} {failures:>7} {wrong:>6}")
+        if stats:
+            print(f"{'':>12} duplicates {stats['duplicates']}, throttled {stats['throttled_s']:.1f}s, "
+                  f"{stats['remote_per_second']:.1f} Google calls/s")
+            failed = failed or wrong or stub['over_query_limit'] > 0
+    server.shutdown()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
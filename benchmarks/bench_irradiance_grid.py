@@ -0,0 +1,88 @@
+"""Irradiance grid lookups: scalar, batch and full preliminary estimate.
+
+    python benchmarks/bench_irradiance_grid.py [grid.npy] [num_points]
+
+Without a grid path a synthetic UK grid is built in a temporary directory.
+Times opening the memory-mapped grid, a single bilinear lookup, the
+vectorised lookup and estimate_from_grid() (lookup plus production model),
+and checks that the scalar and vectorised lookups agree and that lookups
+on grid nodes return the stored values.
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'scripts'))
+
+from utils.irradiance_grid import ANNUAL, IrradianceGrid, save_grid
+from utils.nasa_api import NasaPowerAPI
+
+
+def synthetic_path(directory):
+    from build_irradiance_grid import UK_BOUNDS, synthetic_grid
+
+    path = os.path.join(directory, 'irradiance_grid.npy')
+    values, lat_min, lat_step, lon_min, lon_step = synthetic_grid(UK_BOUNDS, 0.25)
+    save_grid(path, values, lat_min, lat_step, lon_min, lon_step, source='synthetic')
+    return path
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else None
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    tmp = tempfile.TemporaryDirectory()
+    if path is None:
+        path = synthetic_path(tmp.name)
+
+    start = time.perf_counter()
+    grid = IrradianceGrid(path)
+    open_s = time.perf_counter() - start
+    bounds = grid.bounds
+    rng = np.random.default_rng(42)
+    lats = rng.uniform(bounds['lat_min'], bounds['lat_max'], n)
+    lons = rng.uniform(bounds['lon_min'], bounds['lon_max'], n)
+
+    scalar_n = min(n, 20000)
+    points = list(zip(lats[:scalar_n].tolist(), lons[:scalar_n].tolist()))
+    start = time.perf_counter()
+    scalar = [grid.interpolate(lat, lon) for lat, lon in points]
+    scalar_s = (time.perf_counter() - start) / scalar_n
+
+    start = time.perf_counter()
+    values, found = grid.interpolate_many(lats, lons)
+    batch_s = time.perf_counter() - start
+
+    api = NasaPowerAPI(irradiance_grid=grid)
+    api.estimate_from_grid(51.5, -0.13)
+    start = time.perf_counter()
+    runs = 200
+    for i in range(runs):
+        api.estimate_from_grid(lats[i], lons[i])
+    estimate_s = (time.perf_counter() - start) / runs
+
+    mismatch = max((np.nanmax(np.abs(s - values[i])) for i, s in enumerate(scalar) if s is not None), default=0.0)
+    i, j = grid.n_lat // 2, grid.n_lon // 3
+    node = grid.interpolate(grid.lat_min + i * grid.lat_step, grid.lon_min + j * grid.lon_step)
+    node_error = float(np.nanmax(np.abs(node - grid.values[i, j])))
+
+    print(f"Grid:                {grid.n_lat} x {grid.n_lon} points, {os.path.getsize(path) / 1024:.0f} KiB "
+          f"({grid.meta.get('source')})")
+    print(f"Open (mmap):         {open_s*1000:8.2f} ms")
+    print(f"Lookup (scalar):     {scalar_s*1e6:8.2f} µs")
+    print(f"Lookup (batch):      {batch_s/n*1e6:8.3f} µs/point  ({n:,} points in {batch_s*1000:.1f} ms)")
+    print(f"estimate_from_grid:  {estimate_s*1000:8.2f} ms")
+    print(f"Covered:             {found.mean():.1%} (annual GHI {np.nanmin(values[:, ANNUAL]):.2f}-"
+          f"{np.nanmax(values[:, ANNUAL]):.2f} kWh/m²/day)")
+    print(f"Scalar vs batch:     {mismatch:.2e}")
+    print(f"Grid node error:     {node_error:.2e}")
+    tmp.cleanup()
+    return 1 if mismatch > 1e-4 or node_error > 1e-4 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
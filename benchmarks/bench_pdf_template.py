@@ -0,0 +1,145 @@
+"""PDF reports/sec per core with and without the compiled report template.
+
+    python benchmarks/bench_pdf_template.py [--reports 200] [--leads 20]
+        [--backend raster|vector|both]
+
+Builds complete PDF reports (the build_pdf stage: sections, chart, AI text
+and page layout) for --leads synthetic leads spread over a synthetic UK
+irradiance grid, in one thread of one process, so the rate is per core.
+
+- per-report setup: every report builds its own stylesheet and table
+  styles, parses the fixed headings and ASCII85-encodes its page streams,
+  as PDFReportGenerator did before ReportTemplate
+- compiled template: the process-wide report_template(); reports only bind
+  their numbers
+
+Charts are cached by the chart renderer in both modes and are warmed
+before timing, so the difference is the template alone.
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'scripts'))
+
+from reportlab import rl_config
+
+from utils.irradiance_grid import save_grid
+from utils.pdf_generator import PDFReportGenerator, ReportTemplate, report_template
+from utils.report_pipeline import ReportPipeline
+
+AI_CONTENT = {
+    'executive_summary': (
+        'Your property is well suited to solar. A system sized to your roof and usage would cover a large '
+        'share of your electricity, pay for itself within the first decade and keep saving for the rest of '
+        'its 25-year life, while cutting your household carbon footprint.'
+    )
+}
+
+
+def make_pipeline(directory, backend):
+    from build_irradiance_grid import UK_BOUNDS, synthetic_grid
+
+    path = os.path.join(directory, 'irradiance_grid.npy')
+    if not os.path.exists(path):
+        values, lat_min, lat_step, lon_min, lon_step = synthetic_grid(UK_BOUNDS, 0.25)
+        save_grid(path, values, lat_min, lat_step, lon_min, lon_step, source='synthetic')
+    # Every optional section on, as in the longest report
+    return ReportPipeline({
+        'default_electricity_rate': 0.28,
+        'installation_cost_per_kw': 3000,
+        'performance_ratio': 0.75,
+        'battery': {'enabled': True},
+        'uncertainty': {'enabled': True, 'scenarios': 1000},
+        'irradiance_grid': {'path': path},
+        'chart': {'backend': backend}
+    })
+
+
+def make_leads(pipeline, n, seed=3):
+    """(params, location, solar_data, report_data) for n leads."""
+    rng = np.random.default_rng(seed)
+    leads = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(n):
+            latitude = float(rng.uniform(50.5, 55.0))
+            longitude = float(rng.uniform(-4.0, 0.5))
+            params = {
+                'name': f'Lead {i}',
+                'email': f'lead{i}@example.com',
+                'address': f'{i + 1} High Street',
+                'latitude': latitude,
+                'longitude': longitude,
+                'monthly_bill': float(rng.uniform(60, 250)),
+                'roof_area': None,
+                'electricity_rate': 0.28
+            }
+            location = {'latitude': latitude, 'longitude': longitude,
+                        'formatted_address': f'{i + 1} High Street, United Kingdom'}
+            solar_data = pipeline.nasa_api.estimate_from_grid(latitude, longitude)['data']
+            leads.append((params, location, solar_data, pipeline.calculate(params, solar_data)))
+    return leads
+
+
+def build(pipeline, lead, template):
+    params, location, solar_data, report_data = lead
+    generator = PDFReportGenerator(chart_renderer=pipeline.chart_renderer, template=template)
+    return generator.generate(pipeline._pdf_user_data(params, location), location, solar_data, report_data,
+                              AI_CONTENT, chart=pipeline.chart_renderer.render(solar_data))
+
+
+def measure(pipeline, leads, reports, template_for):
+    sizes = []
+    start = time.perf_counter()
+    for i in range(reports):
+        sizes.append(len(build(pipeline, leads[i % len(leads)], template_for())))
+    elapsed = time.perf_counter() - start
+    return reports / elapsed, elapsed / reports, sum(sizes) / len(sizes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reports', type=int, default=200)
+    parser.add_argument('--leads', type=int, default=20)
+    parser.add_argument('--backend', default='both', choices=['raster', 'vector', 'both'])
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    backends = ['raster', 'vector'] if args.backend == 'both' else [args.backend]
+    print(f"{args.reports} reports over {args.leads} leads, one thread")
+    print(f"{'chart':>7} {'mode':>18} {'reports/s/core':>15} {'per report':>11} {'PDF size':>9}")
+    for backend in backends:
+        pipeline = make_pipeline(tmp.name, backend)
+        leads = make_leads(pipeline, args.leads)
+
+        # Per-report setup runs first: report_template() switches the
+        # process to binary page streams the first time it is called
+        default_a85 = rl_config.useA85
+        rl_config.useA85 = 1
+        for lead in leads:
+            build(pipeline, lead, ReportTemplate())
+        before = measure(pipeline, leads, args.reports, ReportTemplate)
+        rl_config.useA85 = default_a85
+
+        template = report_template()
+        for lead in leads:
+            build(pipeline, lead, template)
+        after = measure(pipeline, leads, args.reports, lambda: template)
+
+        for mode, (rate, per_report, size) in (('per-report setup', before), ('compiled template', after)):
+            print(f"{backend:>7} {mode:>18} {rate:>15.1f} {per_report*1000:>9.1f}ms {size/1024:>7.1f}KB")
+        print(f"{backend:>7} {'speedup':>18} {after[0] / before[0]:>14.2f}x")
+    tmp.cleanup()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
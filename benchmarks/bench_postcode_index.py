@@ -0,0 +1,117 @@
+"""Postcode index lookups: open time, per-lookup cost and geocoder tier.
+
+    python benchmarks/bench_postcode_index.py [postcodes.npy] [num_lookups]
+
+Without an index path a synthetic one (200,000 postcodes) is built in a
+temporary directory. Times opening the memory-mapped index against
+parsing it into a dict at boot, lookups of full postcodes (canonical and
+as typed: lower case, no space), sectors, outward codes and misses, and
+Geocoder.geocode_address() answering from the index. Checks that every
+postcode resolves to its stored centroid and that a sector centroid is
+the mean of its postcodes.
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'scripts'))
+
+from utils.geocoder import Geocoder
+from utils.postcode_index import PostcodeIndex, decode_key, precision, save_index
+
+
+def synthetic_path(directory):
+    from build_postcode_index import synthetic_centroids
+
+    path = os.path.join(directory, 'postcodes.npy')
+    save_index(path, *synthetic_centroids(200000), source='synthetic')
+    return path
+
+
+def per_lookup(fn, queries):
+    start = time.perf_counter()
+    results = [fn(q) for q in queries]
+    return (time.perf_counter() - start) / len(queries), results
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else None
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    tmp = tempfile.TemporaryDirectory()
+    if path is None:
+        path = synthetic_path(tmp.name)
+
+    start = time.perf_counter()
+    index = PostcodeIndex(path)
+    open_s = time.perf_counter() - start
+
+    # What "load the dataset at boot" would cost instead
+    start = time.perf_counter()
+    keys = np.load(path)
+    coords = np.load(os.path.splitext(path)[0] + '.coords.npy')
+    parsed = dict(zip((decode_key(k) for k in keys.tolist()), map(tuple, coords.tolist())))
+    parse_s = time.perf_counter() - start
+
+    by_precision = {'postcode': [], 'sector': [], 'outward': []}
+    for key in parsed:
+        by_precision[precision(key)].append(key)
+    rng = np.random.default_rng(7)
+
+    def sample(level, size=n):
+        return [by_precision[level][i] for i in rng.integers(len(by_precision[level]), size=size)]
+
+    postcodes = sample('postcode')
+    queries = {
+        'postcode': postcodes,
+        'postcode (as typed)': [p.replace(' ', '').lower() for p in postcodes],
+        'sector': sample('sector'),
+        'outward': sample('outward'),
+        'miss': [f'ZZ{i % 99 + 1} {i % 10}ZZ' for i in range(n)],
+        'street address': [f'{i} High Street, London' for i in range(n)]
+    }
+
+    print(f"Index:                  {index.meta.get('postcodes'):,} postcodes, {index.meta.get('sectors'):,} sectors, "
+          f"{index.meta.get('outward_codes'):,} outward codes ({index.meta.get('source')})")
+    print(f"Open (mmap):            {open_s*1000:8.2f} ms")
+    print(f"Parse into dict:        {parse_s*1000:8.2f} ms")
+    failed = False
+    for name, batch in queries.items():
+        seconds, results = per_lookup(index.lookup, batch)
+        found = sum(r is not None for r in results)
+        print(f"Lookup {name + ':':<20} {seconds*1e6:6.2f} µs  ({found:,}/{len(batch):,} found)")
+        if name.startswith('postcode'):
+            # Both batches are the same postcodes
+            for postcode, result in zip(postcodes, results):
+                expected = parsed[postcode]
+                if result is None or abs(result['latitude'] - expected[0]) > 1e-5:
+                    print(f"      ✗ {postcode}: {result} != {expected}")
+                    failed = True
+                    break
+        elif name in ('miss', 'street address') and found:
+            print(f"      ✗ {name} resolved")
+            failed = True
+
+    # A sector centroid is the mean of its postcodes
+    sector = by_precision['sector'][len(by_precision['sector']) // 2]
+    members = np.array([parsed[p] for p in by_precision['postcode'] if p.startswith(sector)])
+    error = float(np.abs(members.mean(axis=0) - np.array(parsed[sector])).max())
+    print(f"Sector {sector} centroid vs mean of {len(members)} postcodes: {error:.1e}°")
+    failed = failed or error > 1e-4
+
+    geocoder = Geocoder(postcode_index=index)
+    with contextlib.redirect_stdout(io.StringIO()):
+        seconds, results = per_lookup(geocoder.geocode_address, postcodes[:5000])
+    print(f"geocode_address:        {seconds*1e6:6.2f} µs  (no Google call: {all(r['success'] for r in results)})")
+    tmp.cleanup()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
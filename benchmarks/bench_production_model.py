@@ -0,0 +1,64 @@
+"""Production simulation throughput over many sites.
+
+    python benchmarks/bench_production_model.py [num_sites]
+
+Times a single site (the request path), a batch of sites on the typical-day
+grid and a smaller batch on the full 8760-hour grid, and reports how far the
+typical-day annual totals are from the hourly ones.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.production_model import simulate
+
+
+def make_sites(n, seed=42):
+    rng = np.random.default_rng(seed)
+    return {
+        'latitude': rng.uniform(49.9, 58.6, n),
+        'longitude': rng.uniform(-6.0, 1.8, n),
+        'tilt': rng.uniform(15, 50, n),
+        'azimuth': rng.uniform(90, 270, n),
+        'capacity_kw': rng.uniform(2, 8, n)
+    }
+
+
+def timed(fn, repeat=1):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    hourly_n = min(n, 200)
+    sites = make_sites(n)
+
+    _, single_s = timed(lambda: simulate(51.5, -0.13, 35, 180, 4.0), repeat=50)
+    typical, typical_s = timed(lambda: simulate(**sites), repeat=3)
+    hourly_sites = {key: values[:hourly_n] for key, values in sites.items()}
+    hourly, hourly_s = timed(lambda: simulate(resolution='hourly', **hourly_sites))
+
+    error = typical['annual_kwh'][:hourly_n] / hourly['annual_kwh'] - 1
+    yield_per_kw = typical['annual_kwh'] / sites['capacity_kw']
+
+    print(f"Single site (typical days): {single_s*1000:8.2f} ms")
+    print(f"{n:,} sites (typical days):  {typical_s*1000:8.1f} ms  ({n/typical_s:,.0f} sites/s)")
+    print(f"{hourly_n:,} sites (8760 hours):   {hourly_s*1000:8.1f} ms  ({hourly_n/hourly_s:,.0f} sites/s)")
+    print(f"Typical vs hourly annual:   mean {error.mean()*100:+.2f}%, max |{np.abs(error).max()*100:.2f}|%")
+    print(f"Specific yield:             {yield_per_kw.min():.0f}-{yield_per_kw.max():.0f} kWh/kWp "
+          f"(median {np.median(yield_per_kw):.0f})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""Load test: /quote vs /generate-report against a running server.
+
+    python benchmarks/bench_quote_load.py [--url http://127.0.0.1:5000] [--workers 1]
+        [--concurrency 8] [--duration 20] [--paths quote,report]
+
+Each path is driven by --concurrency client threads for --duration seconds
+with the same form (fixed coordinates, so geocoding is skipped and the
+geocode/solar caches are exercised as they are in production after the
+first lead). Throughput is divided by --workers, the number of server
+worker processes, to give requests/sec per worker. /quote latencies are
+also checked against the server's QUOTE_SLO_MS.
+
+/generate-report runs the whole pipeline (AI text if configured, PDF, and
+email if configured), so point this at a server whose mail goes to
+scripts/smtp_stub_server.py.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ENDPOINTS = {'quote': '/quote', 'report': '/generate-report'}
+
+
+def drive(url, form, concurrency, duration):
+    """Hammer `url` for `duration` seconds; returns (latencies_s, errors, slo_ms)."""
+    latencies = []
+    errors = []
+    slo = {}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        session = requests.Session()
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                response = session.post(url, data=form, timeout=120)
+                elapsed = time.perf_counter() - start
+                ok = response.status_code == 200 and response.json().get('success')
+                body = response.json() if ok else None
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+                continue
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                    if body.get('slo_ms'):
+                        slo['ms'] = body['slo_ms']
+                else:
+                    errors.append(f'HTTP {response.status_code}: {response.text[:120]}')
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return np.array(latencies), errors, slo.get('ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--workers', type=int, default=1, help='server worker processes, for per-worker rates')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--paths', default='quote,report')
+    parser.add_argument('--latitude', default='51.5034')
+    parser.add_argument('--longitude', default='-0.1276')
+    parser.add_argument('--monthly-bill', default='120')
+    parser.add_argument('--instant', action='store_true', help='ask /quote for irradiance grid estimates')
+    args = parser.parse_args()
+
+    form = {
+        'name': 'Load Test',
+        'email': 'loadtest@example.com',
+        'address': '10 Downing St, London',
+        'latitude': args.latitude,
+        'longitude': args.longitude,
+        'monthly_bill': args.monthly_bill,
+        'electricity_rate': '0.28'
+    }
+
+    print(f"{args.url}: {args.concurrency} clients x {args.duration:.0f}s per path, {args.workers} server worker(s)")
+    print(f"{'path':>8} {'ok':>6} {'errors':>7} {'req/s':>8} {'/worker':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'SLO':>7}")
+    failed = False
+    for name in [p.strip() for p in args.paths.split(',') if p.strip()]:
+        path_form = dict(form, instant='1') if name == 'quote' and args.instant else form
+        # One warm-up request fills the caches and starts worker pools
+        requests.post(args.url + ENDPOINTS[name], data=path_form, timeout=120)
+        latencies, errors, slo_ms = drive(args.url + ENDPOINTS[name], path_form, args.concurrency, args.duration)
+        if not len(latencies):
+            print(f"{name:>8} {0:>6} {len(errors):>7}  no successful requests ({errors[:1]})")
+            failed = True
+            continue
+        rate = len(latencies) / args.duration
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+        slo = f"{(latencies * 1000 <= slo_ms).mean():.0%}" if slo_ms else '-'
+        print(f"{name:>8} {len(latencies):>6} {len(errors):>7} {rate:>8.1f} {rate / args.workers:>8.1f} "
+              f"{p50:>6.0f}ms {p95:>6.0f}ms {p99:>6.0f}ms {slo:>7}")
+        if slo_ms:
+            print(f"{'':>8} /quote p95 {p95:.0f} ms vs SLO {slo_ms:.0f} ms: {'met' if p95 <= slo_ms else 'MISSED'}")
+        failed = failed or bool(errors)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
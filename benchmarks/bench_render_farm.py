@@ -0,0 +1,104 @@
+"""PDF render farm throughput against the number of worker processes.
+
+    python benchmarks/bench_render_farm.py [--reports 200] [--workers 1,2,4]
+        [--backend raster|vector] [--threads]
+
+Renders complete PDF reports for --reports distinct synthetic leads (see
+bench_pdf_template.py), as in a campaign where no two charts are alike,
+through PDFRenderFarm.render_many() for each worker count once the pool
+has started, and compares them with rendering in this process. --workers
+defaults to 1, 2, 4, ... up to the cores available to this process.
+--threads also renders on a thread pool of the largest size, which the
+GIL holds to about one core.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_pdf_template import AI_CONTENT, make_leads, make_pipeline
+from utils.pdf_generator import PDFReportGenerator
+from utils.render_farm import PDFRenderFarm
+
+
+def available_cores():
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def render_local(pipeline, payload):
+    return PDFReportGenerator(chart_renderer=pipeline.chart_renderer).generate(
+        payload['user_data'], payload['location_data'], payload['solar_data'], payload['report_data'],
+        payload['ai_content'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reports', type=int, default=200)
+    parser.add_argument('--workers', help='comma-separated worker counts')
+    parser.add_argument('--backend', default='raster', choices=['raster', 'vector'])
+    parser.add_argument('--max-jobs-per-worker', type=int, default=200)
+    parser.add_argument('--threads', action='store_true')
+    args = parser.parse_args()
+
+    cores = available_cores()
+    if args.workers:
+        counts = [int(n) for n in args.workers.split(',')]
+    else:
+        counts = [1]
+        while counts[-1] * 2 <= cores:
+            counts.append(counts[-1] * 2)
+        if counts[-1] != cores:
+            counts.append(cores)
+
+    tmp = tempfile.TemporaryDirectory()
+    pipeline = make_pipeline(tmp.name, args.backend)
+    # One extra lead warms this process; it is not timed
+    leads = make_leads(pipeline, args.reports + 1)
+    payloads = [pipeline.pdf_payload(params, location, solar_data, report_data, AI_CONTENT)
+                for params, location, solar_data, report_data in leads]
+    warmup, jobs = payloads[0], payloads[1:]
+
+    print(f"{args.reports} reports ({args.backend} charts), {cores} core(s) available")
+    print(f"{'mode':>14} {'reports/s':>10} {'per worker':>11} {'speedup':>8} {'errors':>7}")
+
+    render_local(pipeline, warmup)
+    start = time.perf_counter()
+    for payload in jobs:
+        render_local(pipeline, payload)
+    local_rate = args.reports / (time.perf_counter() - start)
+    print(f"{'in-process':>14} {local_rate:>10.1f} {local_rate:>11.1f} {1.0:>7.2f}x {0:>7}")
+
+    if args.threads:
+        # A cold chart cache, like the workers'
+        pipeline.chart_renderer = type(pipeline.chart_renderer)(backend=args.backend)
+        with ThreadPoolExecutor(max_workers=max(counts)) as executor:
+            start = time.perf_counter()
+            list(executor.map(lambda payload: render_local(pipeline, payload), jobs))
+            rate = args.reports / (time.perf_counter() - start)
+        print(f"{f'{max(counts)} threads':>14} {rate:>10.1f} {rate / max(counts):>11.1f} {rate / local_rate:>7.2f}x {0:>7}")
+
+    failed = False
+    for workers in counts:
+        farm = PDFRenderFarm(workers=workers, chart={'backend': args.backend},
+                             max_jobs_per_worker=args.max_jobs_per_worker).start()
+        start = time.perf_counter()
+        errors = [error for _, error in farm.render_many(jobs) if error is not None]
+        rate = args.reports / (time.perf_counter() - start)
+        farm.shutdown()
+        label = f"{workers} worker{'s' if workers > 1 else ''}"
+        print(f"{label:>14} {rate:>10.1f} {rate / workers:>11.1f} {rate / local_rate:>7.2f}x {len(errors):>7}")
+        if errors:
+            print(f"{'':>14} first error: {errors[0]!r}")
+            failed = True
+    tmp.cleanup()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
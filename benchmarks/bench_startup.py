@@ -0,0 +1,103 @@
+"""Worker start-up cost: import time and memory.
+
+    python benchmarks/bench_startup.py [runs]
+
+Each scenario runs in a fresh interpreter:
+
+  lazy     `import app` as a gunicorn worker does without preload; heavy
+           modules load on the first report
+  eager    `import app` plus pipeline.preload(), i.e. everything imported
+           up front (what every worker paid before imports were made lazy)
+
+Then, for preload_app, a master imports everything and forks workers; each
+worker runs a full GC pass and reports its unique (private) memory, with and
+without gc.freeze() in the master. Linux only for the memory figures.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ('numpy', 'reportlab.platypus', 'matplotlib', 'openai')
+
+MEASURE = """
+import json, sys, time
+start = time.perf_counter()
+import app
+if {preload}:
+    app.pipeline.preload()
+elapsed = time.perf_counter() - start
+rss = 0
+with open('/proc/self/status') as f:
+    for line in f:
+        if line.startswith('VmRSS:'):
+            rss = int(line.split()[1]) * 1024
+print(json.dumps({{'seconds': elapsed, 'rss': rss,
+                  'loaded': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+FORK = """
+import gc, json, os
+import app
+app.pipeline.preload()
+gc.collect()
+if {freeze}:
+    gc.freeze()
+results = []
+for _ in range({workers}):
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        app.reset_after_fork()
+        gc.collect()
+        private = 0
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                if line.startswith(('Private_Clean:', 'Private_Dirty:')):
+                    private += int(line.split()[1]) * 1024
+        os.write(write_fd, str(private).encode())
+        os._exit(0)
+    os.close(write_fd)
+    results.append(int(os.read(read_fd, 64)))
+    os.close(read_fd)
+    os.waitpid(pid, 0)
+print(json.dumps({{'private': results}}))
+"""
+
+
+def run_python(code, workdir):
+    env = dict(os.environ, PYTHONPATH=ROOT, GOOGLE_API_KEY='bench', OPENAI_API_KEY='bench',
+               GMAIL_USER='', GMAIL_APP_PASSWORD='')
+    output = subprocess.run([sys.executable, '-c', code], cwd=workdir, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    workdir = tempfile.mkdtemp(prefix='bench_startup_')
+    print(f"Runs per scenario: {runs}\n")
+
+    print(f"{'scenario':<10} {'import ms':>10} {'RSS MB':>8}  heavy modules loaded")
+    for name, preload in (('lazy', False), ('eager', True)):
+        samples = [run_python(MEASURE.format(preload=preload, heavy=HEAVY_MODULES), workdir) for _ in range(runs)]
+        seconds = statistics.median(s['seconds'] for s in samples)
+        rss = statistics.median(s['rss'] for s in samples)
+        print(f"{name:<10} {seconds*1000:10.0f} {rss/2**20:8.1f}  {', '.join(samples[-1]['loaded']) or '-'}")
+
+    if not os.path.exists('/proc/self/smaps_rollup'):
+        return 0
+    print("\nPreloaded master, 4 forked workers, private MB per worker after a full GC:")
+    for label, freeze in (('without gc.freeze()', False), ('with gc.freeze()', True)):
+        private = run_python(FORK.format(freeze=freeze, workers=4), workdir)['private']
+        print(f"  {label:<20} {statistics.median(private)/2**20:6.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,64 @@
+"""Monte Carlo financial bands: per-lead runtime and reproducibility.
+
+    python benchmarks/bench_uncertainty.py [num_leads]
+
+Times FinancialUncertainty.analyze() per lead at several scenario counts
+(the draws are made once per instance, so the first lead is timed apart),
+and checks that two instances with the same seed give identical bands.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.uncertainty import FinancialUncertainty
+
+
+def make_leads(n, seed=7):
+    rng = np.random.default_rng(seed)
+    size_kw = rng.uniform(2, 8, n)
+    return {
+        'installation_cost': size_kw * 3000,
+        'annual_production_kwh': size_kw * rng.uniform(750, 1000, n),
+        'annual_consumption_kwh': rng.uniform(2000, 8000, n),
+        'electricity_rate': rng.uniform(0.18, 0.35, n)
+    }
+
+
+def run(model, leads):
+    results = []
+    for i in range(len(leads['installation_cost'])):
+        results.append(model.analyze(*(float(leads[key][i]) for key in leads)))
+    return results
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    leads = make_leads(n)
+
+    print(f"{'scenarios':>10} {'first lead':>11} {'per lead':>10} {'leads/s':>9}")
+    for scenarios in (1000, 5000, 20000):
+        model = FinancialUncertainty(scenarios=scenarios)
+        first = {key: values[:1] for key, values in leads.items()}
+        start = time.perf_counter()
+        run(model, first)
+        first_s = time.perf_counter() - start
+        start = time.perf_counter()
+        run(model, leads)
+        per_lead = (time.perf_counter() - start) / n
+        print(f"{scenarios:>10,} {first_s*1000:>9.1f}ms {per_lead*1000:>8.2f}ms {1/per_lead:>9,.0f}")
+
+    again = run(FinancialUncertainty(scenarios=5000), leads)
+    reference = run(FinancialUncertainty(scenarios=5000), leads)
+    identical = again == reference
+    sample = reference[0]
+    print(f"Reproducible with a fixed seed: {'yes' if identical else 'NO'}")
+    print(f"Lead 0: payback {sample['payback_years']}, NPV {sample['npv']}")
+    return 0 if identical else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""Score a lead list from the command line.
+
+    python bulk_report.py leads.csv -o scores.csv --output-format csv
+    python bulk_report.py leads.jsonl --concurrency 16 > scores.ndjson
+
+Input columns: address or latitude/longitude, monthly_bill or
+annual_consumption_kwh, and optionally id, name, email, electricity_rate,
+generate_pdf, send_email. Uses the same .env configuration as app.py.
+"""
+import argparse
+import contextlib
+import sys
+import time
+
+from app import PIPELINE_CONFIG, BULK_CONCURRENCY, BULK_BATCH_SIZE
+from utils.bulk import BulkScorer, read_leads, detect_format, format_csv, format_ndjson
+from utils.report_pipeline import get_pipeline
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk solar lead scoring')
+    parser.add_argument('input', help='CSV or JSONL file of leads ("-" for stdin)')
+    parser.add_argument('-o', '--output', default='-', help='output file (default: stdout)')
+    parser.add_argument('--input-format', choices=['csv', 'jsonl'], help='default: from file extension')
+    parser.add_argument('--output-format', choices=['ndjson', 'csv'], default='ndjson')
+    parser.add_argument('--concurrency', type=int, default=BULK_CONCURRENCY, help='parallel geocode/solar lookups')
+    parser.add_argument('--batch-size', type=int, default=BULK_BATCH_SIZE)
+    parser.add_argument('--pdf', action='store_true', help='honour the generate_pdf column')
+    parser.add_argument('--email', action='store_true', help='honour the send_email column')
+    parser.add_argument('--render-workers', type=int, default=PIPELINE_CONFIG['render_farm']['workers'],
+                        help='PDF render processes (0: render in this process)')
+    parser.add_argument('--pdf-dir', default='temp/reports', help='where generated PDFs are written (<report_id>.pdf)')
+    args = parser.parse_args(argv)
+
+    input_format = args.input_format or detect_format(args.input)
+    source = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8', newline='')
+    stdout = sys.stdout
+    sink = stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8', newline='')
+
+    # The pipeline's progress prints go to stderr, so stdout carries only results
+    with contextlib.redirect_stdout(sys.stderr):
+        return run(args, input_format, source, sink, stdout)
+
+
+def run(args, input_format, source, sink, stdout):
+    config = dict(PIPELINE_CONFIG, report_storage={'backend': 'local', 'directory': args.pdf_dir},
+                  render_farm=dict(PIPELINE_CONFIG['render_farm'], workers=args.render_workers))
+    pipeline = get_pipeline(config)
+    render_farm = pipeline.render_farm() if args.pdf else None
+    scorer = BulkScorer(
+        pipeline,
+        max_concurrency=args.concurrency,
+        batch_size=args.batch_size,
+        allow_pdf=args.pdf,
+        allow_email=args.email,
+        render_farm=render_farm
+    )
+    formatter = format_csv if args.output_format == 'csv' else format_ndjson
+
+    start = time.perf_counter()
+    try:
+        for chunk in formatter(scorer.score(read_leads(source, input_format))):
+            sink.write(chunk)
+            sink.flush()
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not stdout:
+            sink.close()
+        if render_farm is not None:
+            render_farm.shutdown()
+
+    elapsed = time.perf_counter() - start
+    stats = scorer.stats
+    print(f"Scored {stats['scored']}/{stats['rows']} leads ({stats['failed']} failed, "
+          f"{stats['pdfs']} PDFs, {stats['emails']} emails) in {elapsed:.1f}s", file=sys.stderr)
+    mail_stats = pipeline.mail_stats() if stats['emails'] else None
+    if mail_stats and mail_stats['queued']:
+        print(f"{mail_stats['queued']} emails still queued in {pipeline.mail_config['db_path']}; "
+              f"run mail_worker.py (or the app) to deliver them", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
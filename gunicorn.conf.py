@@ -0,0 +1,42 @@
+# gunicorn -c gunicorn.conf.py app:app
+#
+# With GUNICORN_PRELOAD=1 (default) the master imports the app and the heavy
+# report modules once, freezes the GC generations and forks workers from that
+# image, so those pages stay shared copy-on-write instead of being rebuilt in
+# every worker. With GUNICORN_PRELOAD=0 each worker imports the app itself and
+# loads reportlab/matplotlib/openai lazily on its first report.
+import gc
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', 2))
+# Tells app.py to keep jobs and PDFs where every worker can find them
+os.environ['SERVER_WORKERS'] = str(workers)
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+preload_app = os.getenv('GUNICORN_PRELOAD', '1').strip().lower() in ('1', 'true', 'yes')
+
+
+def when_ready(server):
+    if not server.cfg.preload_app:
+        return
+    import app
+    loaded = app.pipeline.preload()
+    # Move everything allocated so far out of the collector's reach: a full
+    # collection in a worker would otherwise write to (and un-share) every
+    # page holding a tracked object.
+    gc.collect()
+    gc.freeze()
+    server.log.info("Preloaded %s; %d objects frozen", ', '.join(loaded), gc.get_freeze_count())
+
+
+def post_fork(server, worker):
+    if server.cfg.preload_app:
+        import app
+        app.reset_after_fork()
+
+
+def post_worker_init(worker):
+    # Resume queued and interrupted jobs without waiting for a new one
+    import app
+    app.start_job_queue()
@@ -0,0 +1,64 @@
+"""Deliver queued report emails from the outbox.
+
+    python mail_worker.py                # send continuously (Ctrl-C to stop)
+    python mail_worker.py --once         # send everything due now, then exit
+    python mail_worker.py --dead         # list dead letters
+    python mail_worker.py --retry-dead   # move dead letters back to the outbox
+
+Uses the same .env configuration as app.py. Run it alongside the app with
+MAIL_SEND_IN_PROCESS=0 to keep SMTP traffic out of the web workers.
+"""
+import argparse
+import sys
+import time
+from datetime import datetime
+
+from app import PIPELINE_CONFIG
+from utils.report_pipeline import get_pipeline
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Outbound mail worker')
+    parser.add_argument('--once', action='store_true', help='drain due messages and exit')
+    parser.add_argument('--dead', action='store_true', help='list dead-lettered messages')
+    parser.add_argument('--retry-dead', nargs='?', const='all', metavar='ID',
+                        help='re-queue one dead letter, or all of them')
+    args = parser.parse_args(argv)
+
+    pipeline = get_pipeline(PIPELINE_CONFIG)
+    queue = pipeline.mail_queue()
+
+    if args.dead:
+        for letter in queue.dead_letters():
+            failed = datetime.fromtimestamp(letter['failed_at']).isoformat(timespec='seconds')
+            print(f"{letter['id']}  {failed}  {letter['recipient']}  attempts={letter['attempts']}  {letter['last_error']}")
+        return 0
+    if args.retry_dead:
+        count = queue.retry_dead(None if args.retry_dead == 'all' else args.retry_dead)
+        print(f"Re-queued {count} message(s)")
+        return 0
+    if not pipeline.email_configured():
+        print("Email is not configured (GMAIL_USER / GMAIL_APP_PASSWORD / SMTP_HOST)", file=sys.stderr)
+        return 1
+
+    sender = pipeline.mail_sender(start=False)
+    if args.once:
+        queue.requeue_stale()
+        sent = sender.drain()
+        print(f"Sent {sent} message(s); {sender.stats()}", file=sys.stderr)
+        return 0
+
+    sender.start()
+    print(f"[mail] Sending from {pipeline.mail_config['db_path']} "
+          f"via {pipeline.mail_config['host']}:{pipeline.mail_config['port']}", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(60)
+            print(f"[mail] {queue.stats()} {sender.stats()}", file=sys.stderr)
+    except KeyboardInterrupt:
+        sender.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,163 @@
+"""Build the offline irradiance grid used for instant estimates.
+
+    python scripts/build_irradiance_grid.py [--bounds 49.5 61 -8.5 2] [--out data/irradiance_grid.npy]
+    python scripts/build_irradiance_grid.py --input raw/*.json
+    python scripts/build_irradiance_grid.py --synthetic [--step 0.5]
+
+By default downloads the NASA POWER long-term monthly climatology (all-sky
+surface irradiance ALLSKY_SFC_SW_DWN and air temperature T2M, free and
+keyless) for the bounding box, in tiles of at most 10° as the regional API
+requires, and keeps POWER's native grid. --save-raw keeps the responses so
+a later --input build needs no network.
+
+--synthetic needs no data at all: irradiance comes from the production
+model's default clearness and temperature from a simple latitude lapse. It
+is for development only; the metadata records it as 'synthetic'.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.irradiance_grid import ANNUAL, FIELDS, IrradianceGrid, save_grid
+
+POWER_URL = 'https://power.larc.nasa.gov/api/temporal/climatology/regional'
+MONTH_KEYS = ['JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUN', 'JUL', 'AUG', 'SEP', 'OCT', 'NOV', 'DEC']
+UK_BOUNDS = (49.5, 61.0, -8.5, 2.0)
+MAX_TILE_DEGREES = 10.0
+
+
+def tiles(lat_min, lat_max, lon_min, lon_max, size=MAX_TILE_DEGREES):
+    """Split the box into tiles of at most `size` degrees (and at least 2,
+    the regional API's minimum)."""
+    def edges(low, high):
+        count = max(1, int(np.ceil((high - low) / size)))
+        points = np.linspace(low, high, count + 1)
+        return [(a, max(b, a + 2.0)) for a, b in zip(points[:-1], points[1:])]
+    return [(la, lb, oa, ob) for la, lb in edges(lat_min, lat_max) for oa, ob in edges(lon_min, lon_max)]
+
+
+def download(bounds, save_raw=None):
+    from utils.http_client import HttpClient
+
+    http = HttpClient(max_retries=3, backoff_base=2.0)
+    responses = []
+    for n, (la, lb, oa, ob) in enumerate(tiles(*bounds), 1):
+        params = {
+            'parameters': 'ALLSKY_SFC_SW_DWN,T2M',
+            'community': 'RE',
+            'latitude-min': la, 'latitude-max': lb,
+            'longitude-min': oa, 'longitude-max': ob,
+            'format': 'JSON'
+        }
+        print(f"Tile {n}: lat {la:.2f}..{lb:.2f}, lon {oa:.2f}..{ob:.2f}")
+        start = time.time()
+        response = http.get(POWER_URL, params=params, timeout=300)
+        if response.status_code != 200:
+            raise SystemExit(f"NASA POWER error {response.status_code}: {response.text[:300]}")
+        payload = response.json()
+        print(f"      → {len(payload.get('features', []))} points in {time.time() - start:.1f}s")
+        if save_raw:
+            os.makedirs(save_raw, exist_ok=True)
+            with open(os.path.join(save_raw, f'power_tile_{n}.json'), 'w') as f:
+                json.dump(payload, f)
+        responses.append(payload)
+    return responses
+
+
+def parse_points(responses):
+    """{(lat, lon): 25 values} from POWER regional GeoJSON responses."""
+    points = {}
+    for payload in responses:
+        fill = (payload.get('header') or {}).get('fill_value', -999.0)
+        for feature in payload.get('features', []):
+            lon, lat = feature['geometry']['coordinates'][:2]
+            parameters = feature['properties']['parameter']
+            ghi = parameters['ALLSKY_SFC_SW_DWN']
+            temperature = parameters['T2M']
+            row = [ghi[m] for m in MONTH_KEYS] + [ghi['ANN']] + [temperature[m] for m in MONTH_KEYS]
+            points[(round(lat, 6), round(lon, 6))] = [np.nan if v is None or v == fill else float(v) for v in row]
+    return points
+
+
+def grid_from_points(points):
+    """Arrange scattered points on a regular grid inferred from their
+    coordinates; cells with no point are NaN."""
+    if not points:
+        raise SystemExit("No grid points in the input")
+    lats = np.array(sorted({lat for lat, _ in points}))
+    lons = np.array(sorted({lon for _, lon in points}))
+    if len(lats) < 2 or len(lons) < 2:
+        raise SystemExit("Need at least 2 distinct latitudes and longitudes")
+    lat_step = float(np.diff(lats).min())
+    lon_step = float(np.diff(lons).min())
+    n_lat = int(round((lats[-1] - lats[0]) / lat_step)) + 1
+    n_lon = int(round((lons[-1] - lons[0]) / lon_step)) + 1
+    values = np.full((n_lat, n_lon, len(FIELDS)), np.nan, dtype=np.float32)
+    for (lat, lon), row in points.items():
+        values[int(round((lat - lats[0]) / lat_step)), int(round((lon - lons[0]) / lon_step))] = row
+    return values, float(lats[0]), lat_step, float(lons[0]), lon_step
+
+
+def synthetic_grid(bounds, step):
+    from utils.production_model import DEFAULT_TEMPERATURE, DAYS_IN_MONTH, simulate
+
+    lat_min, lat_max, lon_min, lon_max = bounds
+    lats = np.arange(lat_min, lat_max + step / 2, step)
+    lons = np.arange(lon_min, lon_max + step / 2, step)
+    lat, lon = np.meshgrid(lats, lons, indexing='ij')
+    # A flat panel sees the global horizontal irradiance
+    ghi = simulate(lat.ravel(), lon.ravel(), tilt=0.0)['monthly_poa']
+    annual = (ghi * DAYS_IN_MONTH).sum(axis=1) / 365.0
+    temperature = DEFAULT_TEMPERATURE[None, :] - 0.6 * (lat.ravel()[:, None] - 52.5)
+    values = np.concatenate([ghi, annual[:, None], temperature], axis=1)
+    return values.reshape(len(lats), len(lons), len(FIELDS)), lat_min, step, lon_min, step
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bounds', type=float, nargs=4, default=UK_BOUNDS,
+                        metavar=('LAT_MIN', 'LAT_MAX', 'LON_MIN', 'LON_MAX'))
+    parser.add_argument('--out', default=os.getenv('IRRADIANCE_GRID_PATH', 'data/irradiance_grid.npy'))
+    parser.add_argument('--input', nargs='+', help='build from saved NASA POWER regional JSON responses')
+    parser.add_argument('--save-raw', metavar='DIR', help='keep the downloaded responses in DIR')
+    parser.add_argument('--synthetic', action='store_true', help='model-only grid, no data download')
+    parser.add_argument('--step', type=float, default=0.5, help='grid step for --synthetic (degrees)')
+    args = parser.parse_args()
+
+    if args.synthetic:
+        values, lat_min, lat_step, lon_min, lon_step = synthetic_grid(args.bounds, args.step)
+        source = 'synthetic'
+    else:
+        if args.input:
+            paths = [p for pattern in args.input for p in sorted(glob.glob(pattern))]
+            responses = []
+            for path in paths:
+                with open(path) as f:
+                    responses.append(json.load(f))
+        else:
+            responses = download(args.bounds, args.save_raw)
+        values, lat_min, lat_step, lon_min, lon_step = grid_from_points(parse_points(responses))
+        source = 'nasa_power_climatology'
+
+    meta = save_grid(args.out, values, lat_min, lat_step, lon_min, lon_step, source=source,
+                     units={'ghi': 'kWh/m2/day', 'temperature': 'C'},
+                     built_at=datetime.now().isoformat(timespec='seconds'))
+    grid = IrradianceGrid(args.out)
+    missing = int(np.isnan(grid.values[:, :, ANNUAL]).sum())
+    print(f"Wrote {args.out}: {meta['n_lat']} x {meta['n_lon']} points "
+          f"({lat_step:g}° x {lon_step:g}°), {os.path.getsize(args.out) / 1024:.0f} KiB, {missing} missing")
+    annual = grid.values[:, :, ANNUAL]
+    print(f"Annual GHI {np.nanmin(annual):.2f}-{np.nanmax(annual):.2f} kWh/m²/day ({source})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,169 @@
+"""Build the offline postcode centroid index used to geocode postcodes.
+
+    python scripts/build_postcode_index.py --input ONSPD_MAY_2025_UK.zip [--out data/postcodes.npy]
+    python scripts/build_postcode_index.py --input postcodes.csv [--postcode-column pcds]
+    python scripts/build_postcode_index.py --synthetic [--count 200000]
+
+--input is a CSV of postcode centroids with latitude/longitude columns, or
+a zip holding one (its largest .csv is used). The ONS Postcode Directory
+(ONSPD, Open Government Licence) works as downloaded: postcode 'pcds',
+'lat', 'long', and 'doterm' marking terminated postcodes, which are
+skipped unless --include-terminated. Other datasets work if their columns
+are named like these, or with --postcode-column/--lat-column/--lon-column.
+Rows without a grid reference (ONSPD uses latitude 99.999999) are skipped.
+
+--synthetic needs no data at all: plausible-looking postcodes scattered
+around real area centres. It is for development only; the metadata
+records it as 'synthetic'.
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+import time
+import zipfile
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.postcode_index import PostcodeIndex, canonical_postcode, coords_path, save_index
+
+POSTCODE_COLUMNS = ('pcds', 'postcode', 'pcd', 'pcd7', 'pcd8')
+LAT_COLUMNS = ('lat', 'latitude')
+LON_COLUMNS = ('long', 'lon', 'lng', 'longitude')
+# Great Britain and Northern Ireland, with a margin
+UK_BOUNDS = (49.0, 61.5, -9.0, 2.5)
+# Approximate centres of some postcode areas, for --synthetic
+SYNTHETIC_AREAS = {
+    'AB': (57.15, -2.11), 'B': (52.48, -1.89), 'BS': (51.45, -2.59), 'CB': (52.21, 0.12),
+    'CF': (51.48, -3.18), 'EC': (51.52, -0.09), 'EH': (55.95, -3.19), 'EX': (50.72, -3.53),
+    'G': (55.86, -4.25), 'IP': (52.06, 1.16), 'L': (53.41, -2.98), 'LS': (53.80, -1.55),
+    'M': (53.48, -2.24), 'N': (51.56, -0.11), 'NE': (54.97, -1.61), 'NR': (52.63, 1.30),
+    'OX': (51.75, -1.26), 'PL': (50.38, -4.14), 'SE': (51.47, -0.06), 'SW': (51.47, -0.17),
+    'BT': (54.60, -5.93), 'TR': (50.26, -5.05), 'W': (51.51, -0.20), 'YO': (53.96, -1.08)
+}
+UNIT_LETTERS = 'ABDEFGHJLNPQRSTUWXYZ'
+
+
+def open_csv(path, member=None):
+    """A text stream over the CSV at `path`, or inside the zip at `path`."""
+    if not zipfile.is_zipfile(path):
+        return open(path, newline='', encoding='utf-8-sig')
+    archive = zipfile.ZipFile(path)
+    if member is None:
+        members = [info for info in archive.infolist() if info.filename.lower().endswith('.csv')]
+        if not members:
+            raise SystemExit(f"No .csv in {path}")
+        member = max(members, key=lambda info: info.file_size).filename
+    print(f"Reading {member} from {path}")
+    return io.TextIOWrapper(archive.open(member), newline='', encoding='utf-8-sig')
+
+
+def pick_column(fieldnames, requested, candidates, what):
+    by_name = {name.strip().lower(): name for name in fieldnames}
+    for name in ([requested] if requested else candidates):
+        if name.lower() in by_name:
+            return by_name[name.lower()]
+    raise SystemExit(f"No {what} column (tried {', '.join([requested] if requested else candidates)}); "
+                     f"columns are {', '.join(fieldnames)}")
+
+
+def read_centroids(stream, args):
+    """(postcodes, latitudes, longitudes, skipped) from a centroid CSV."""
+    reader = csv.DictReader(stream)
+    postcode_column = pick_column(reader.fieldnames, args.postcode_column, POSTCODE_COLUMNS, 'postcode')
+    lat_column = pick_column(reader.fieldnames, args.lat_column, LAT_COLUMNS, 'latitude')
+    lon_column = pick_column(reader.fieldnames, args.lon_column, LON_COLUMNS, 'longitude')
+    doterm = None if args.include_terminated else next(
+        (name for name in reader.fieldnames if name.strip().lower() == 'doterm'), None)
+    lat_min, lat_max, lon_min, lon_max = UK_BOUNDS
+
+    postcodes, latitudes, longitudes = [], [], []
+    skipped = 0
+    for row in reader:
+        if doterm and (row.get(doterm) or '').strip():
+            skipped += 1
+            continue
+        postcode = canonical_postcode(row.get(postcode_column))
+        try:
+            latitude = float(row[lat_column])
+            longitude = float(row[lon_column])
+        except (TypeError, ValueError):
+            postcode = None
+        if postcode is None or not (lat_min <= latitude <= lat_max and lon_min <= longitude <= lon_max):
+            skipped += 1
+            continue
+        postcodes.append(postcode)
+        latitudes.append(latitude)
+        longitudes.append(longitude)
+    return postcodes, latitudes, longitudes, skipped
+
+
+def synthetic_centroids(count, seed=0):
+    rng = np.random.default_rng(seed)
+    areas = np.array(list(SYNTHETIC_AREAS))
+    centres = np.array(list(SYNTHETIC_AREAS.values()))
+    units = np.array([a + b for a in UNIT_LETTERS for b in UNIT_LETTERS])
+    # Draw extra so enough survive de-duplication
+    n = count * 3 + 100
+    area = rng.integers(len(areas), size=n)
+    district = rng.integers(1, 30, size=n)
+    sector = rng.integers(0, 10, size=n)
+    codes = np.char.add(np.char.add(np.char.add(areas[area], district.astype(str)), ' '),
+                        np.char.add(sector.astype(str), units[rng.integers(len(units), size=n)]))
+    _, first = np.unique(codes, return_index=True)
+    keep = np.sort(rng.permutation(first)[:count])
+    # Districts within ~10 km of the area centre, sectors within ~2 km of
+    # their district, units within ~300 m of their sector
+    area, district, sector = area[keep], district[keep], sector[keep]
+    lat = (centres[area, 0] + ((district * 7919) % 100 / 100 - 0.5) * 0.2
+           + ((sector * 31) % 10 / 10 - 0.5) * 0.04 + rng.normal(0, 0.003, len(keep)))
+    lon = (centres[area, 1] + ((district * 104729) % 100 / 100 - 0.5) * 0.3
+           + ((sector * 17) % 10 / 10 - 0.5) * 0.06 + rng.normal(0, 0.004, len(keep)))
+    return codes[keep].tolist(), lat.tolist(), lon.tolist()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--out', default=os.getenv('POSTCODE_INDEX_PATH', 'data/postcodes.npy'))
+    parser.add_argument('--input', help='postcode centroid CSV, or a zip containing one')
+    parser.add_argument('--member', help='CSV inside the --input zip (default: the largest)')
+    parser.add_argument('--postcode-column')
+    parser.add_argument('--lat-column')
+    parser.add_argument('--lon-column')
+    parser.add_argument('--include-terminated', action='store_true', help='keep postcodes with a doterm')
+    parser.add_argument('--synthetic', action='store_true', help='made-up postcodes, no data needed')
+    parser.add_argument('--count', type=int, default=200000, help='postcodes for --synthetic')
+    args = parser.parse_args()
+
+    start = time.time()
+    if args.synthetic:
+        postcodes, latitudes, longitudes = synthetic_centroids(args.count)
+        skipped = 0
+        source = 'synthetic'
+    elif args.input:
+        with open_csv(args.input, args.member) as stream:
+            postcodes, latitudes, longitudes, skipped = read_centroids(stream, args)
+        source = os.path.basename(args.input)
+    else:
+        parser.error('give --input (a postcode centroid CSV or zip) or --synthetic')
+    if not postcodes:
+        raise SystemExit("No postcodes with coordinates in the input")
+    print(f"      → {len(postcodes):,} postcodes read, {skipped:,} skipped ({time.time() - start:.1f}s)")
+
+    meta = save_index(args.out, postcodes, latitudes, longitudes, source=source,
+                      built_at=datetime.now().isoformat(timespec='seconds'))
+    index = PostcodeIndex(args.out)
+    size = sum(os.path.getsize(p) for p in (args.out, coords_path(args.out)))
+    print(f"Wrote {args.out}: {meta['postcodes']:,} postcodes, {meta['sectors']:,} sectors, "
+          f"{meta['outward_codes']:,} outward codes, {size / 1024 / 1024:.1f} MiB ({source})")
+    sample = index.lookup(postcodes[0])
+    print(f"Check: {postcodes[0]} → {sample['latitude']}, {sample['longitude']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
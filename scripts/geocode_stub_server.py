@@ -0,0 +1,194 @@
+"""Local stand-in for the Google Geocoding and Solar APIs, for offline runs and load tests.
+
+    python scripts/geocode_stub_server.py [--port 8090] [--latency 0.08] [--jitter 0.04] [--qps 50] [--fail-rate 0]
+    GOOGLE_API_KEY=stub GOOGLE_GEOCODE_URL=http://127.0.0.1:8090/maps/api/geocode/json \
+        GOOGLE_SOLAR_URL=http://127.0.0.1:8090/v1/buildingInsights:findClosest python app.py
+
+Answers GET .../geocode/json?address=... after a simulated latency with a
+deterministic point in Great Britain for each address (ZERO_RESULTS for
+addresses containing 'nowhere'). Like Google it enforces a per-second
+quota: requests beyond --qps in any one-second window get
+OVER_QUERY_LIMIT. GET /stats returns the request count, the quota
+rejections and the busiest second seen.
+
+GET .../buildingInsights:findClosest answers with a plausible roof for the
+location (sized from its coordinates) after the same latency; it does not
+count towards the geocoding quota.
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def fake_location(address):
+    """The same point for the same address, whatever its case or commas."""
+    digest = hashlib.sha1(re.sub(r'[\s,]+', ' ', address.lower()).strip().encode()).digest()
+    lat = 50.5 + int.from_bytes(digest[:4], 'big') / 2**32 * 4.5
+    lng = -4.0 + int.from_bytes(digest[4:8], 'big') / 2**32 * 4.5
+    return round(lat, 7), round(lng, 7)
+
+
+def fake_building(latitude, longitude):
+    """A buildingInsights payload for a roof of 8-40 panels, the same for the same point."""
+    digest = hashlib.sha1(f'{latitude:.6f},{longitude:.6f}'.encode()).digest()
+    panels = 8 + digest[0] % 33
+    kwh_per_panel = 330 + digest[1] % 80
+    azimuth = 90 + digest[2] % 180
+    configs = []
+    for count in range(4, panels + 1, 2):
+        configs.append({
+            'panelsCount': count,
+            'yearlyEnergyDcKwh': round(count * kwh_per_panel, 1),
+            'roofSegmentSummaries': [{'pitchDegrees': 35, 'azimuthDegrees': azimuth, 'panelsCount': count,
+                                      'yearlyEnergyDcKwh': round(count * kwh_per_panel, 1), 'segmentIndex': 0}]
+        })
+    return {
+        'name': f"buildings/stub{digest[3:9].hex()}",
+        'center': {'latitude': latitude, 'longitude': longitude},
+        'solarPotential': {
+            'maxArrayPanelsCount': panels,
+            'maxArrayAreaMeters2': round(panels * 1.88, 2),
+            'maxSunshineHoursPerYear': 1000 + digest[4] % 300,
+            'panelCapacityWatts': 400,
+            'solarPanelConfigs': configs
+        }
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.08
+    jitter = 0.04
+    qps = 50
+    fail_rate = 0.0
+    lock = threading.Lock()
+    recent = deque()
+    stats = {'requests': 0, 'ok': 0, 'zero_results': 0, 'over_query_limit': 0, 'errors': 0, 'peak_qps': 0,
+             'solar_requests': 0}
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    @classmethod
+    def _admit(cls):
+        """Count a request; False if it is over the per-second quota."""
+        now = time.monotonic()
+        with cls.lock:
+            cls.stats['requests'] += 1
+            while cls.recent and cls.recent[0] <= now - 1.0:
+                cls.recent.popleft()
+            if cls.qps and len(cls.recent) >= cls.qps:
+                cls.stats['over_query_limit'] += 1
+                return False
+            cls.recent.append(now)
+            cls.stats['peak_qps'] = max(cls.stats['peak_qps'], len(cls.recent))
+            return True
+
+    @classmethod
+    def _count(cls, stat):
+        with cls.lock:
+            cls.stats[stat] += 1
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/stats':
+            with self.lock:
+                return self._send(200, dict(self.stats))
+        if url.path.endswith('buildingInsights:findClosest'):
+            return self._building(parse_qs(url.query))
+        if not url.path.rstrip('/').endswith('/geocode/json'):
+            return self._send(404, {'status': 'NOT_FOUND', 'error_message': f'Unknown path {url.path}'})
+        address = parse_qs(url.query).get('address', [''])[0]
+        if not self._admit():
+            return self._send(200, {'status': 'OVER_QUERY_LIMIT', 'results': [],
+                                    'error_message': 'You have exceeded your rate-limit for this API.'})
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+        if random.random() < self.fail_rate:
+            self._count('errors')
+            return self._send(500, {'status': 'UNKNOWN_ERROR', 'results': []})
+        if not address or 'nowhere' in address.lower():
+            self._count('zero_results')
+            return self._send(200, {'status': 'ZERO_RESULTS', 'results': []})
+
+        lat, lng = fake_location(address)
+        self._count('ok')
+        self._send(200, {
+            'status': 'OK',
+            'results': [{
+                'formatted_address': f"{address.strip()}, UK",
+                'geometry': {'location': {'lat': lat, 'lng': lng}, 'location_type': 'ROOFTOP'},
+                'place_id': hashlib.sha1(address.encode()).hexdigest()[:27],
+                'types': ['street_address']
+            }]
+        })
+
+    def _building(self, query):
+        self._count('solar_requests')
+        try:
+            latitude = float(query['location.latitude'][0])
+            longitude = float(query['location.longitude'][0])
+        except (KeyError, ValueError):
+            return self._send(400, {'error': {'code': 400, 'message': 'Invalid location', 'status': 'INVALID_ARGUMENT'}})
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+        if random.random() < self.fail_rate:
+            self._count('errors')
+            return self._send(500, {'error': {'code': 500, 'status': 'INTERNAL'}})
+        self._send(200, fake_building(latitude, longitude))
+
+
+def serve(host='127.0.0.1', port=8090, latency=0.08, jitter=0.04, qps=50, fail_rate=0.0):
+    """Start the stub on a background thread; returns the server (port 0
+    picks a free port, see server.server_port)."""
+    StubHandler.latency = latency
+    StubHandler.jitter = jitter
+    StubHandler.qps = qps
+    StubHandler.fail_rate = fail_rate
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='geocode-stub', daemon=True).start()
+    return server
+
+
+def reset_stats():
+    with StubHandler.lock:
+        StubHandler.recent.clear()
+        for key in StubHandler.stats:
+            StubHandler.stats[key] = 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--latency', type=float, default=0.08, help='mean seconds per lookup')
+    parser.add_argument('--jitter', type=float, default=0.04, help='± seconds of uniform jitter')
+    parser.add_argument('--qps', type=int, default=50, help='per-second quota (0 = unlimited)')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='fraction of calls answered with a 500')
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, args.latency, args.jitter, args.qps, args.fail_rate)
+    print(f"Geocoding stub listening on http://{args.host}:{args.port}/maps/api/geocode/json")
+    print(f"Solar API stub listening on http://{args.host}:{args.port}/v1/buildingInsights:findClosest")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
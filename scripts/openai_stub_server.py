@@ -0,0 +1,110 @@
+"""Local stand-in for the OpenAI chat completions API, for offline runs.
+
+    python scripts/openai_stub_server.py [--port 8089] [--latency 0.8] [--jitter 0.4] [--fail-rate 0]
+    OPENAI_API_KEY=stub OPENAI_BASE_URL=http://127.0.0.1:8089/v1 python app.py
+
+Answers POST /v1/chat/completions with schema-shaped JSON for the
+'solar_report' and 'solar_report_batch' response formats, after a simulated
+latency, with token usage estimated from the text length.
+"""
+import argparse
+import json
+import random
+import re
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SECTIONS = ('executive_summary', 'financial_insight', 'environmental_impact', 'recommendations')
+
+
+def fake_report(system):
+    size = system.get('size_kw', 'a few')
+    return {
+        'executive_summary': f"A system of around {size} kW suits this property and pays for itself in roughly "
+                             f"{system.get('payback_years', 'several')} years.",
+        'financial_insight': f"Expect savings of around £{system.get('annual_savings', 0):,} a year on electricity bills.",
+        'environmental_impact': f"The system avoids roughly {system.get('co2_tons', 0)} tonnes of CO2 every year.",
+        'recommendations': "Compare quotes from certified installers and check the roof before committing."
+    }
+
+
+def parse_system(prompt):
+    """Pull the banded figures back out of a single-report prompt."""
+    system = {}
+    for field, pattern in (('size_kw', r'about ([\d.]+) kW'), ('annual_savings', r'about £([\d,]+)'),
+                           ('payback_years', r'about ([\d.]+) years'), ('co2_tons', r'about ([\d.]+) tons')):
+        match = re.search(pattern, prompt)
+        if match:
+            system[field] = float(match.group(1).replace(',', ''))
+    return system
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.8
+    jitter = 0.4
+    fail_rate = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            return self._send(404, {'error': {'message': f'Unknown path {self.path}'}})
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+        if random.random() < self.fail_rate:
+            return self._send(500, {'error': {'message': 'Simulated upstream failure', 'type': 'server_error'}})
+
+        prompt = request['messages'][-1]['content']
+        schema_name = (request.get('response_format') or {}).get('json_schema', {}).get('name')
+        if schema_name == 'solar_report_batch':
+            systems = json.loads(prompt.split('Systems:\n', 1)[1])
+            content = {'reports': [dict(fake_report(system), id=system['id']) for system in systems]}
+        else:
+            content = fake_report(parse_system(prompt))
+        text = json.dumps(content)
+
+        prompt_tokens = sum(len(m['content']) for m in request['messages']) // 4
+        completion_tokens = len(text) // 4
+        self._send(200, {
+            'id': f'chatcmpl-{uuid.uuid4().hex[:24]}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'stub'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text}, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                      'total_tokens': prompt_tokens + completion_tokens}
+        })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=float, default=0.8, help='mean seconds per completion')
+    parser.add_argument('--jitter', type=float, default=0.4, help='± seconds of uniform jitter')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='fraction of calls answered with a 500')
+    args = parser.parse_args()
+
+    StubHandler.latency = args.latency
+    StubHandler.jitter = args.jitter
+    StubHandler.fail_rate = args.fail_rate
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    print(f"OpenAI stub listening on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
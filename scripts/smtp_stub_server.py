@@ -0,0 +1,90 @@
+"""Local SMTP sink for testing outbound mail offline (needs `pip install aiosmtpd`).
+
+    python scripts/smtp_stub_server.py [--port 8025] [--fail-rate 0] [--latency 0]
+    GMAIL_USER=reports@example.com SMTP_HOST=127.0.0.1 SMTP_PORT=8025 SMTP_SECURITY=none python app.py
+
+Accepts every message without authentication and discards it, answering a
+--fail-rate fraction of DATA commands with a transient 451. Prints the
+number of connections and messages every few seconds, so connection reuse
+is visible.
+"""
+import argparse
+import asyncio
+import random
+import sys
+import threading
+import time
+
+
+class CountingHandler:
+    fail_rate = 0.0
+    latency = 0.0
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.messages = 0
+        self.rejected = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        with self.lock:
+            self.connections += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_HELO(self, server, session, envelope, hostname):
+        with self.lock:
+            self.connections += 1
+        session.host_name = hostname
+        return '250 {}'.format(server.hostname)
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if random.random() < self.fail_rate:
+            with self.lock:
+                self.rejected += 1
+            return '451 4.3.0 Simulated temporary failure'
+        with self.lock:
+            self.messages += 1
+        return '250 OK'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8025)
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='fraction of messages answered with a 451')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds to wait before answering DATA')
+    parser.add_argument('--report-every', type=float, default=5.0)
+    args = parser.parse_args()
+
+    try:
+        from aiosmtpd.controller import Controller
+    except ImportError:
+        print("scripts/smtp_stub_server.py needs aiosmtpd: pip install aiosmtpd", file=sys.stderr)
+        return 1
+
+    CountingHandler.fail_rate = args.fail_rate
+    CountingHandler.latency = args.latency
+    handler = CountingHandler()
+    controller = Controller(handler, hostname=args.host, port=args.port)
+    controller.start()
+    print(f"SMTP stub listening on {args.host}:{args.port}")
+    last = None
+    try:
+        while True:
+            time.sleep(args.report_every)
+            current = (handler.connections, handler.messages, handler.rejected)
+            if current != last:
+                print(f"connections={current[0]} messages={current[1]} rejected={current[2]}")
+                last = current
+    except KeyboardInterrupt:
+        pass
+    finally:
+        controller.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,25 @@
-from .geocoder import Geocoder
-from .nasa_api import NasaPowerAPI
-from .calculations import SolarCalculator
-from .pdf_generator import PDFReportGenerator
-from .email_sender import EmailSender
+# Submodules are imported on first attribute access (PEP 562) so that
+# `import utils.x` does not drag in reportlab, matplotlib or the openai SDK.
+_EXPORTS = {
+    'Geocoder': '.geocoder',
+    'NasaPowerAPI': '.nasa_api',
+    'SolarCalculator': '.calculations',
+    'PDFReportGenerator': '.pdf_generator',
+    'EmailSender': '.email_sender',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+    value = getattr(import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
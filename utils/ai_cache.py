@@ -0,0 +1,57 @@
+import json
+import re
+
+from .ttl_cache import TTLCache
+
+# Bump when the prompt changes so old text is not served for the new prompt
+PROMPT_VERSION = 1
+
+UK_POSTCODE = re.compile(r'\b([A-Z]{1,2})\d[A-Z\d]?\s*\d[A-Z]{2}\b', re.IGNORECASE)
+
+
+def region_of(address):
+    """Coarse region for an address: the UK postcode area ('SW', 'M', ...)
+    if there is one, else the last meaningful part of the address."""
+    match = UK_POSTCODE.search(address or '')
+    if match:
+        return match.group(1).upper()
+    parts = [p.strip() for p in (address or '').split(',') if p.strip()]
+    parts = [p for p in parts if p.lower() not in ('uk', 'united kingdom', 'gb')]
+    return parts[-1].lower() if parts else ''
+
+
+def content_fingerprint(report_data, address):
+    """Quantized prompt inputs. Reports in the same bands get the same AI
+    text, so the prompt is built from these values rather than the exact
+    figures (which are in the PDF tables anyway)."""
+    system = report_data['system']
+    financial = report_data['financial']
+    environmental = report_data['environmental']
+    return {
+        'version': PROMPT_VERSION,
+        'region': region_of(address),
+        'size_kw': round(float(system['actual_size_kw'])),
+        'annual_savings': int(round(float(financial['annual_savings']) / 100.0)) * 100,
+        'payback_years': round(float(financial['payback_period_years'])),
+        'co2_tons': round(float(environmental['co2_offset_annual_tons']) * 2) / 2
+    }
+
+
+def fingerprint_key(fingerprint):
+    return json.dumps(fingerprint, sort_keys=True)
+
+
+class AIContentCache(TTLCache):
+    """Generated report text by content fingerprint: in-memory LRU in front
+    of an optional SQLite store, both expiring entries after `ttl` seconds."""
+
+    table = 'ai_content_cache'
+    value_column = 'content'
+    label = 'ai cache'
+
+    def get(self, fingerprint):
+        """Cached content for `fingerprint`, or None on a miss."""
+        return super().get(fingerprint_key(fingerprint))
+
+    def set(self, fingerprint, content):
+        super().set(fingerprint_key(fingerprint), content)
@@ -1,88 +1,392 @@
-from openai import OpenAI
+import asyncio
+import contextvars
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from .ai_cache import content_fingerprint, fingerprint_key
+from .metrics import AI_CALL_SECONDS, AI_TOKENS, current_request_id, log_event
+
+SECTIONS = ('executive_summary', 'financial_insight', 'environmental_impact', 'recommendations')
+
+_REPORT_PROPERTIES = {
+    'executive_summary': {'type': 'string', 'description': '2-3 sentences about system benefits and ROI'},
+    'financial_insight': {'type': 'string', 'description': '2-3 sentences about costs and savings'},
+    'environmental_impact': {'type': 'string', 'description': '2-3 sentences about CO2 and environmental benefits'},
+    'recommendations': {'type': 'string', 'description': '2-3 sentences about next steps'}
+}
+
+# Structured outputs: the model is constrained to these schemas, so replies
+# are always parseable JSON with every key present
+REPORT_FORMAT = {
+    'type': 'json_schema',
+    'json_schema': {
+        'name': 'solar_report',
+        'strict': True,
+        'schema': {
+            'type': 'object',
+            'properties': _REPORT_PROPERTIES,
+            'required': list(SECTIONS),
+            'additionalProperties': False
+        }
+    }
+}
+BATCH_FORMAT = {
+    'type': 'json_schema',
+    'json_schema': {
+        'name': 'solar_report_batch',
+        'strict': True,
+        'schema': {
+            'type': 'object',
+            'properties': {
+                'reports': {
+                    'type': 'array',
+                    'items': {
+                        'type': 'object',
+                        'properties': dict(_REPORT_PROPERTIES, id={'type': 'string'}),
+                        'required': ['id'] + list(SECTIONS),
+                        'additionalProperties': False
+                    }
+                }
+            },
+            'required': ['reports'],
+            'additionalProperties': False
+        }
+    }
+}
+
+SYSTEM_PROMPT = "You are a solar energy consultant writing short paragraphs for customer reports."
+STYLE_NOTE = "Quote figures approximately (\"around\", \"roughly\") and do not mention a street address."
+
+
+def _describe(fingerprint):
+    return (f"Region: {fingerprint['region'] or 'United Kingdom'}\n"
+            f"System: about {fingerprint['size_kw']} kW\n"
+            f"Annual Savings: about £{fingerprint['annual_savings']:,.0f}\n"
+            f"Payback: about {fingerprint['payback_years']} years\n"
+            f"CO2 Offset: about {fingerprint['co2_tons']} tons/year")
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+_loop = None
+_loop_lock = threading.Lock()
+# Sync-mode report calls run here rather than on the caller's thread
+_calls = None
+_calls_lock = threading.Lock()
+CALL_WORKERS = 32
+
+
+def shared_client(api_key, base_url=None, mode='sync'):
+    """One OpenAI (or AsyncOpenAI) client per process and key, so the
+    connection pool is reused across reports."""
+    key = (api_key, base_url, mode)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            # The openai SDK takes a few hundred ms to import; only pay for it once a report needs it
+            from openai import AsyncOpenAI, OpenAI
+
+            client_class = AsyncOpenAI if mode == 'async' else OpenAI
+            # SDK retries would run past the caller's deadline; fail fast instead
+            client = client_class(api_key=api_key, base_url=base_url, max_retries=0)
+            _clients[key] = client
+        return client
+
+
+def _event_loop():
+    """Background event loop that runs every async-mode call in this process."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name='ai-event-loop', daemon=True).start()
+        return _loop
+
+
+def _call_executor():
+    """Threads for sync-mode report calls, so a call that outlives its
+    caller's deadline holds one of these, not a request or stage thread."""
+    global _calls
+    with _calls_lock:
+        if _calls is None:
+            _calls = ThreadPoolExecutor(max_workers=CALL_WORKERS, thread_name_prefix='ai-call')
+        return _calls
+
+
+def reset_after_fork():
+    """Clients, the event loop and call threads are not usable in a forked child."""
+    global _clients_lock, _loop, _loop_lock, _calls, _calls_lock
+    _clients.clear()
+    _clients_lock = threading.Lock()
+    _loop = None
+    _loop_lock = threading.Lock()
+    _calls = None
+    _calls_lock = threading.Lock()
+
 
 class AIContentGenerator:
-    def __init__(self, api_key):
+    """Report narrative from the OpenAI chat API.
+
+    mode='sync' calls the blocking client on a small pool of call threads;
+    mode='async' runs calls on one background event loop per process, so
+    waiting on the model holds no thread and batch prompts run
+    concurrently. Every call has a hard deadline (at most `request_timeout`)
+    and a JSON schema response format.
+
+    A single report's caller waits only until its own `deadline` and then
+    gets template text; the model call carries on to `request_timeout` and
+    caches its reply for the next report in the same bands.
+    generate_report_content_async() serves coroutine callers (asgi.py) in
+    either mode.
+    """
+
+    def __init__(self, api_key, cache=None, request_timeout=60, mode='sync', model='gpt-4o',
+                 base_url=None, batch_size=10):
+        if mode not in ('sync', 'async'):
+            raise ValueError(f'Unknown AI client mode: {mode}')
         self.api_key = api_key
-        self.client = OpenAI(api_key=api_key)
-    
-    def generate_report_content(self, report_data, address, peak_sun_hours):
-        """Generate AI-powered content for the solar report"""
-        
+        self.cache = cache
+        self.request_timeout = request_timeout
+        self.mode = mode
+        self.model = model
+        self.base_url = base_url
+        self.batch_size = batch_size
+        self.client = shared_client(api_key, base_url, mode)
+
+    # --- CALLS ---
+    def _request(self, prompt, response_format, max_tokens):
+        return {
+            'model': self.model,
+            'messages': [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            'response_format': response_format,
+            'temperature': 0.7,
+            'max_tokens': max_tokens
+        }
+
+    def _deadline(self, deadline):
+        return min(deadline or self.request_timeout, self.request_timeout)
+
+    def _record(self, kind, outcome, started, response=None, items=1):
+        """Latency and token metrics for one call, plus an `ai_call` log line."""
+        duration = time.perf_counter() - started
+        AI_CALL_SECONDS.observe(duration, mode=self.mode, kind=kind, outcome=outcome)
+        usage = getattr(response, 'usage', None)
+        prompt_tokens = getattr(usage, 'prompt_tokens', 0) or 0
+        completion_tokens = getattr(usage, 'completion_tokens', 0) or 0
+        AI_TOKENS.inc(prompt_tokens, kind=kind, type='prompt')
+        AI_TOKENS.inc(completion_tokens, kind=kind, type='completion')
+        log_event('ai_call', request_id=current_request_id.get(), mode=self.mode, kind=kind, model=self.model,
+                  outcome=outcome, items=items, prompt_tokens=prompt_tokens,
+                  completion_tokens=completion_tokens, duration_ms=round(duration * 1000, 2))
+
+    def _complete(self, kind, request, deadline=None, items=1):
+        """Parsed JSON reply of one chat completion on the blocking client,
+        or raises within the deadline."""
+        deadline = self._deadline(deadline)
+        started = time.perf_counter()
+        response = None
+        try:
+            response = self.client.chat.completions.create(timeout=deadline, **request)
+            parsed = json.loads(response.choices[0].message.content)
+        except Exception:
+            self._record(kind, 'error', started, response, items)
+            raise
+        self._record(kind, 'ok', started, response, items)
+        return parsed
+
+    async def _acomplete(self, kind, request, deadline, items=1):
+        started = time.perf_counter()
+        response = None
         try:
-            system = report_data['system']
-            production = report_data['production']
-            financial = report_data['financial']
-            environmental = report_data['environmental']
-            
-            prompt = f"""Generate 4 short paragraphs for a solar energy report:
-
-Location: {address}
-System: {system['actual_size_kw']} kW ({system['num_panels']} panels)
-Annual Production: {production['annual_production_kwh']:,.0f} kWh
-Installation Cost: £{financial['installation_cost']:,.0f}
-Annual Savings: £{financial['annual_savings']:,.0f}
-Payback: {financial['payback_period_years']} years
-25-Year Profit: £{financial['net_25_year_savings']:,.0f}
-CO2 Offset: {environmental['co2_offset_annual_tons']} tons/year
-
-Return ONLY valid JSON with these keys:
-{{
-  "executive_summary": "2-3 sentences about system benefits and ROI",
-  "financial_insight": "2-3 sentences about costs and savings",
-  "environmental_impact": "2-3 sentences about CO2 and environmental benefits",
-  "recommendations": "2-3 sentences about next steps"
-}}"""
-
-            response = self.client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You are a solar energy consultant. Return ONLY valid JSON, no markdown, no explanations."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=600
-            )
-            
-            content = response.choices[0].message.content.strip()
-            
-            # Remove markdown if present
-            if '```' in content:
-                content = content.split('```')[1]
-                if content.startswith('json'):
-                    content = content[4:]
-                content = content.strip()
-            
-            # Parse JSON
-            parsed = json.loads(content)
-            
-            return {
-                'executive_summary': parsed.get('executive_summary', ''),
-                'financial_insight': parsed.get('financial_insight', ''),
-                'environmental_impact': parsed.get('environmental_impact', ''),
-                'recommendations': parsed.get('recommendations', '')
-            }
-            
-        except json.JSONDecodeError as e:
-            print(f"[AI] JSON parse error: {str(e)}")
-            print(f"[AI] Content: {content[:200]}")
-            return self._get_fallback_content(report_data, address)
+            try:
+                response = await asyncio.wait_for(self.client.chat.completions.create(timeout=deadline, **request),
+                                                  deadline)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f'AI call exceeded {deadline:g}s deadline')
+            parsed = json.loads(response.choices[0].message.content)
+        except Exception:
+            self._record(kind, 'error', started, response, items)
+            raise
+        self._record(kind, 'ok', started, response, items)
+        return parsed
+
+    # --- SINGLE REPORT ---
+    def generate_report_content(self, report_data, address, peak_sun_hours, deadline=None):
+        """Generate AI-powered content for the solar report, or template
+        text if the model has not answered within `deadline` seconds.
+
+        The prompt only sees banded figures and the region (see
+        content_fingerprint), so text generated for one report is reused
+        for every report in the same bands.
+        """
+        fingerprint, cached = self._cached_report(report_data, address)
+        if cached is not None:
+            return cached
+
+        deadline = self._deadline(deadline)
+        try:
+            return self._start_report(fingerprint).result(deadline)
+        except FutureTimeout:
+            print(f"[AI] No reply within {deadline:g}s, using template text (the reply will still be cached)")
         except Exception as e:
             print(f"[AI] Error: {str(e)}")
-            return self._get_fallback_content(report_data, address)
-    
-    def _get_fallback_content(self, report_data, address):
-        """Fallback content if AI fails"""
+        return self._get_fallback_content(report_data, address)
+
+    async def generate_report_content_async(self, report_data, address, peak_sun_hours, deadline=None):
+        """generate_report_content() for coroutines."""
+        fingerprint, cached = self._cached_report(report_data, address)
+        if cached is not None:
+            return cached
+
+        deadline = self._deadline(deadline)
+        future = asyncio.wrap_future(self._start_report(fingerprint))
+        # Left running past the deadline; nobody awaits it then, so consume its outcome
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        done, _ = await asyncio.wait({future}, timeout=deadline)
+        if future in done:
+            try:
+                return future.result()
+            except Exception as e:
+                print(f"[AI] Error: {str(e)}")
+        else:
+            print(f"[AI] No reply within {deadline:g}s, using template text (the reply will still be cached)")
+        return self._get_fallback_content(report_data, address)
+
+    def _start_report(self, fingerprint):
+        """Start the model call for one report; a concurrent Future of its
+        content. It runs on the AI event loop (async mode) or a call thread,
+        never the caller's, for up to `request_timeout` and caches the reply."""
+        request = self._report_request(fingerprint)
+        if self.mode == 'async':
+            return asyncio.run_coroutine_threadsafe(self._areport(fingerprint, request), _event_loop())
+        return _call_executor().submit(contextvars.copy_context().run, self._report, fingerprint, request)
+
+    def _report(self, fingerprint, request):
+        return self._store_report(fingerprint, self._complete('report', request, self.request_timeout))
+
+    async def _areport(self, fingerprint, request):
+        return self._store_report(fingerprint, await self._acomplete('report', request, self.request_timeout))
+
+    def _store_report(self, fingerprint, parsed):
+        result = {section: parsed[section] for section in SECTIONS}
+        if self.cache is not None:
+            self.cache.set(fingerprint, result)
+        return result
+
+    def _cached_report(self, report_data, address):
+        """(fingerprint, cached content or None)."""
+        fingerprint = content_fingerprint(report_data, address)
+        if self.cache is not None:
+            cached = self.cache.get(fingerprint)
+            if cached is not None:
+                print(f"      AI content cache hit: {fingerprint['region']} {fingerprint['size_kw']} kW")
+                return fingerprint, cached
+        return fingerprint, None
+
+    def _report_request(self, fingerprint):
+        prompt = (f"Write the four sections of a solar energy report for this system:\n\n"
+                  f"{_describe(fingerprint)}\n\n{STYLE_NOTE}")
+        return self._request(prompt, REPORT_FORMAT, 600)
+
+    # --- BATCH ---
+    def generate_batch_content(self, items, deadline=None):
+        """Content for many reports: `items` is a list of (report_data, address).
+
+        Reports are deduplicated by fingerprint and looked up in the cache;
+        the rest are written `batch_size` systems per prompt. Returns one
+        content dict per item, in order, with template text for any the
+        model did not supply.
+        """
+        fingerprints = [content_fingerprint(report_data, address) for report_data, address in items]
+        contents = {}
+        missing = {}
+        for fingerprint in fingerprints:
+            key = fingerprint_key(fingerprint)
+            if key in contents or key in missing:
+                continue
+            cached = self.cache.get(fingerprint) if self.cache is not None else None
+            if cached is not None:
+                contents[key] = cached
+            else:
+                missing[key] = fingerprint
+
+        keys = list(missing)
+        chunks = [keys[i:i + self.batch_size] for i in range(0, len(keys), self.batch_size)]
+        if chunks:
+            print(f"[AI] Batch: {len(items)} reports, {len(items) - len(keys)} cached or duplicate, "
+                  f"{len(keys)} to generate in {len(chunks)} prompt(s)")
+            deadline = self._deadline(deadline)
+            if self.mode == 'async':
+                future = asyncio.run_coroutine_threadsafe(self._agenerate_batches(chunks, missing, deadline),
+                                                          _event_loop())
+                results = future.result()
+            else:
+                results = [self._generate_batch(chunk, missing, deadline) for chunk in chunks]
+            for generated in results:
+                for key, result in generated.items():
+                    contents[key] = result
+                    if self.cache is not None:
+                        self.cache.set(missing[key], result)
+
+        return [contents.get(fingerprint_key(fingerprint)) or self._get_fallback_content(report_data, address)
+                for fingerprint, (report_data, address) in zip(fingerprints, items)]
+
+    def _batch_request(self, keys, fingerprints):
+        ids = {str(i): key for i, key in enumerate(keys)}
+        systems = [dict(fingerprints[key], id=i) for i, key in ids.items()]
+        prompt = ("Write the four sections of a solar energy report for each system below, "
+                  f"one entry per system with its id. {STYLE_NOTE}\n\n"
+                  f"Systems:\n{json.dumps(systems)}")
+        return ids, self._request(prompt, BATCH_FORMAT, 450 * len(keys))
+
+    @staticmethod
+    def _batch_contents(ids, parsed):
+        generated = {}
+        for report in parsed.get('reports', []):
+            key = ids.get(str(report.get('id')))
+            if key is not None and all(report.get(section) for section in SECTIONS):
+                generated[key] = {section: report[section] for section in SECTIONS}
+        return generated
+
+    def _generate_batch(self, keys, fingerprints, deadline):
+        """{fingerprint key: content} for one prompt's worth of systems ({} on failure)."""
+        ids, request = self._batch_request(keys, fingerprints)
+        try:
+            parsed = self._complete('batch', request, deadline, items=len(keys))
+        except Exception as e:
+            print(f"[AI] Batch error: {str(e)}")
+            return {}
+        return self._batch_contents(ids, parsed)
+
+    async def _agenerate_batches(self, chunks, fingerprints, deadline):
+        async def generate(keys):
+            ids, request = self._batch_request(keys, fingerprints)
+            try:
+                parsed = await self._acomplete('batch', request, deadline, items=len(keys))
+            except Exception as e:
+                print(f"[AI] Batch error: {str(e)}")
+                return {}
+            return self._batch_contents(ids, parsed)
+
+        return await asyncio.gather(*[generate(chunk) for chunk in chunks])
+
+    @staticmethod
+    def _get_fallback_content(report_data, address):
+        """Fallback content if AI fails or misses its latency budget"""
         system = report_data['system']
         financial = report_data['financial']
         environmental = report_data['environmental']
-        
+
         return {
             'executive_summary': f"Based on analysis for {address}, a {system['actual_size_kw']} kW solar system with {system['num_panels']} panels is recommended. This system offers excellent returns with a {financial['payback_period_years']}-year payback and £{financial['net_25_year_savings']:,.0f} net profit over 25 years.",
-            
+
             'financial_insight': f"Installation cost: £{financial['installation_cost']:,.0f}. Annual savings: £{financial['annual_savings']:,.0f}. Investment recovered in {financial['payback_period_years']} years with {financial['roi_percentage']}% ROI over system lifetime.",
-            
+
             'environmental_impact': f"Annual CO2 offset: {environmental['co2_offset_annual_tons']} metric tons, equivalent to planting {int(environmental['trees_equivalent'])} trees yearly. Significant long-term carbon footprint reduction.",
-            
+
             'recommendations': "Get quotes from 3+ certified installers. Check UK government solar incentives and grants. Consider battery storage. Verify roof structural capacity for 25+ year installation."
-        }
\ No newline at end of file
+        }
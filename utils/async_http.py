@@ -0,0 +1,170 @@
+import asyncio
+import importlib.util
+import random
+import threading
+from urllib.parse import urlparse
+
+from .http_client import RETRY_STATUSES, CircuitBreaker, CircuitOpenError
+
+
+class AsyncHttpError(Exception):
+    """Network error (connect, read, timeout) once retries are exhausted."""
+
+
+class AsyncHttpClient:
+    """HttpClient for coroutines, on httpx.AsyncClient (ASGI mode, see asgi.py).
+
+    Same policy as HttpClient: pooled keep-alive connections (`pool_size`),
+    retries of 429/5xx/timeouts with jittered exponential backoff honouring
+    Retry-After, at most `max_per_host` requests in flight per host, and a
+    circuit breaker per host. Waiting never blocks the event loop, so one
+    process can hold hundreds of calls in flight.
+
+    httpx is imported on first use. Connections and semaphores belong to
+    the event loop that created them; a call from another loop (e.g. a
+    script's asyncio.run()) gets a fresh pool.
+    """
+
+    def __init__(self, pool_size=100, max_retries=3, backoff_base=0.5, backoff_max=8.0,
+                 max_per_host=100, failure_threshold=5, reset_timeout=30.0, retry_statuses=RETRY_STATUSES):
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_per_host = max_per_host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.retry_statuses = retry_statuses
+
+        self.reset()
+
+    def reset(self):
+        """Drop the pool, breakers and counters (forked workers)."""
+        self._loop = None
+        self._client = None
+        self._host_slots = {}
+        self._lock = threading.Lock()
+        self._breakers = {}
+        self._stats = {'requests': 0, 'retries': 0, 'failures': 0, 'circuit_rejections': 0,
+                       'in_flight': 0, 'peak_in_flight': 0}
+
+    def _count(self, stat, value=1):
+        with self._lock:
+            self._stats[stat] += value
+            if stat == 'in_flight':
+                self._stats['peak_in_flight'] = max(self._stats['peak_in_flight'], self._stats['in_flight'])
+
+    def _session(self):
+        """httpx.AsyncClient for the running loop, created on first use."""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            import httpx
+
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+            )
+            self._loop = loop
+            self._host_slots = {}
+        return self._client
+
+    def _slots(self, host):
+        if host not in self._host_slots:
+            self._host_slots[host] = asyncio.Semaphore(self.max_per_host)
+        return self._host_slots[host]
+
+    def breaker(self, host):
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return self._breakers[host]
+
+    def _backoff(self, attempt, response=None):
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        if response is not None and response.status_code == 429:
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                return min(self.backoff_max, float(retry_after))
+        return random.uniform(0, delay)
+
+    async def get(self, url, params=None, timeout=10, **kwargs):
+        """GET with retries. Returns the final httpx.Response (which may still
+        be a 429/5xx once retries are exhausted) or raises AsyncHttpError."""
+        import httpx
+
+        host = urlparse(url).netloc
+        breaker = self.breaker(host)
+        if not breaker.allow():
+            self._count('circuit_rejections')
+            raise CircuitOpenError(f'{host} is failing, not retrying for {self.reset_timeout:.0f}s (circuit open)')
+
+        response = None
+        last_error = None
+        # Settled in `finally` so a half-open trial always ends; a cancelled
+        # call gives its trial back instead of counting as a failure
+        outcome = None
+        try:
+            session = self._session()
+            slots = self._slots(host)
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    self._count('retries')
+                    await asyncio.sleep(self._backoff(attempt - 1, response))
+                response = None
+                async with slots:
+                    self._count('requests')
+                    self._count('in_flight')
+                    try:
+                        response = await session.get(url, params=params, timeout=timeout, **kwargs)
+                    except httpx.TransportError as e:
+                        last_error = e
+                        continue
+                    finally:
+                        self._count('in_flight', -1)
+                if response.status_code not in self.retry_statuses:
+                    outcome = 'success'
+                    return response
+
+            outcome = 'failure'
+            if response is not None:
+                return response
+            raise AsyncHttpError(f'{type(last_error).__name__}: {last_error}') from last_error
+        except Exception:
+            # Not retried: TooManyRedirects, InvalidURL, ...
+            outcome = 'failure'
+            raise
+        finally:
+            if outcome == 'failure':
+                self._count('failures')
+            breaker.settle(outcome)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self._stats)
+            breakers = {host: b.state for host, b in self._breakers.items()}
+            opened = sum(b.times_opened for b in self._breakers.values())
+        stats['circuits'] = breakers
+        stats['circuit_opened'] = opened
+        return stats
+
+
+def available():
+    """True if httpx is installed (the async methods need it)."""
+    return importlib.util.find_spec('httpx') is not None
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def default_async_http_client():
+    """Process-wide client used when none is passed to Geocoder/NasaPowerAPI."""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = AsyncHttpClient()
+        return _default_client
@@ -0,0 +1,228 @@
+"""Self-consumption and battery sizing.
+
+Every (system size, battery capacity) candidate is simulated at once: the
+hourly load and PV output of the average day of each month are dispatched
+through each candidate's battery with arrays shaped (candidates, 12), so the
+only Python loop is over the 24 hours of the day. Each day is run twice and
+the second pass kept, so the battery starts the day with the charge it
+carried over from the evening before.
+"""
+import numpy as np
+
+from .production_model import DAYS_IN_MONTH
+
+# Share of a day's household consumption in each clock hour: low overnight,
+# a morning bump and an early-evening peak (typical UK domestic profile)
+DEFAULT_LOAD_SHAPE = np.array([
+    0.030, 0.026, 0.024, 0.023, 0.023, 0.026, 0.034, 0.045, 0.047, 0.042, 0.040, 0.040,
+    0.041, 0.040, 0.039, 0.041, 0.048, 0.060, 0.066, 0.064, 0.058, 0.052, 0.044, 0.037
+])
+# Relative daily consumption per month (heating and lighting in winter)
+DEFAULT_LOAD_SEASONALITY = np.array([1.20, 1.12, 1.05, 0.96, 0.89, 0.84, 0.84, 0.86, 0.91, 1.00, 1.12, 1.21])
+DEFAULT_BATTERY_SIZES = (0.0, 2.5, 5.0, 7.5, 10.0, 13.5, 15.0, 20.0)
+
+
+def typical_load(annual_kwh, hourly_shape=None, seasonality=None):
+    """Household load in kW for the average day of each month, (12, 24)."""
+    shape = np.asarray(DEFAULT_LOAD_SHAPE if hourly_shape is None else hourly_shape, dtype=float)
+    season = np.asarray(DEFAULT_LOAD_SEASONALITY if seasonality is None else seasonality, dtype=float)
+    daily = season / (season * DAYS_IN_MONTH).sum() * annual_kwh
+    return daily[:, None] * (shape / shape.sum())[None, :]
+
+
+def dispatch(pv_kw, load_kw, capacity_kwh, power_kw, round_trip_efficiency=0.9):
+    """Run each candidate's battery through the typical days.
+
+    `pv_kw` is (candidates, 12, 24), `load_kw` (12, 24), `capacity_kwh` and
+    `power_kw` (candidates,). Batteries charge only from PV surplus and
+    discharge only to cover the household load. Returns annual kWh arrays
+    (candidates,): 'pv', 'load', 'self_consumed', 'imported', 'exported'
+    and 'discharged'.
+    """
+    one_way = np.sqrt(round_trip_efficiency)
+    capacity = capacity_kwh[:, None]
+    power = power_kw[:, None]
+    m = pv_kw.shape[0]
+    charge = np.zeros((m, 12))
+    imported = exported = discharged = None
+
+    for _ in range(2):
+        imported = np.zeros((m, 12))
+        exported = np.zeros((m, 12))
+        discharged = np.zeros((m, 12))
+        for hour in range(24):
+            net = pv_kw[:, :, hour] - load_kw[None, :, hour]
+            surplus = np.maximum(net, 0.0)
+            deficit = np.maximum(-net, 0.0)
+
+            stored = np.minimum(np.minimum(surplus, power), (capacity - charge) / one_way)
+            charge += stored * one_way
+            exported += surplus - stored
+
+            supplied = np.minimum(np.minimum(deficit, power), charge * one_way)
+            charge -= supplied / one_way
+            discharged += supplied
+            imported += deficit - supplied
+
+    def annual(daily):
+        return (daily * DAYS_IN_MONTH[None, :]).sum(axis=1)
+
+    pv = annual(pv_kw.sum(axis=2))
+    load = float((load_kw.sum(axis=1) * DAYS_IN_MONTH).sum())
+    return {
+        'pv': pv,
+        'load': np.full(m, load),
+        'self_consumed': pv - annual(exported),
+        'imported': annual(imported),
+        'exported': annual(exported),
+        'discharged': annual(discharged)
+    }
+
+
+class BatteryOptimizer:
+    """Picks the PV size and battery capacity with the highest NPV.
+
+    Savings are valued at the import `electricity_rate` for PV and battery
+    energy used in the home and at `export_rate` for energy exported. Import
+    prices rise by `escalation` a year, output degrades by `degradation` a
+    year and cash flows are discounted at `discount_rate` over `lifetime`
+    years, with the battery replaced every `battery_lifetime` years.
+    """
+
+    def __init__(self, electricity_rate=0.25, export_rate=0.15, installation_cost_per_kw=3000,
+                 battery_cost_per_kwh=450, battery_fixed_cost=1000, battery_power_ratio=0.5,
+                 round_trip_efficiency=0.9, escalation=0.03, discount_rate=0.05, lifetime=25,
+                 battery_lifetime=15, degradation=0.005, panel_wattage=400):
+        self.electricity_rate = electricity_rate
+        self.export_rate = export_rate
+        self.installation_cost_per_kw = installation_cost_per_kw
+        self.battery_cost_per_kwh = battery_cost_per_kwh
+        self.battery_fixed_cost = battery_fixed_cost
+        self.battery_power_ratio = battery_power_ratio
+        self.round_trip_efficiency = round_trip_efficiency
+        self.escalation = escalation
+        self.discount_rate = discount_rate
+        self.lifetime = lifetime
+        self.battery_lifetime = battery_lifetime
+        self.degradation = degradation
+        self.panel_wattage = panel_wattage
+
+    def battery_cost(self, capacity_kwh):
+        capacity_kwh = np.asarray(capacity_kwh, dtype=float)
+        return np.where(capacity_kwh > 0, capacity_kwh * self.battery_cost_per_kwh + self.battery_fixed_cost, 0.0)
+
+    def _present_value_factors(self):
+        years = np.arange(1, self.lifetime + 1)
+        discount = (1 + self.discount_rate) ** -years
+        output = (1 - self.degradation) ** (years - 1)
+        import_factor = float((output * (1 + self.escalation) ** (years - 1) * discount).sum())
+        export_factor = float((output * discount).sum())
+        replacements = np.arange(self.battery_lifetime, self.lifetime, self.battery_lifetime)
+        replacement_factor = float(((1 + self.discount_rate) ** -replacements).sum())
+        return import_factor, export_factor, replacement_factor
+
+    def evaluate(self, annual_consumption_kwh, pv_profile_kw, panel_counts, battery_sizes=DEFAULT_BATTERY_SIZES,
+                 annual_yield_per_kw=None, load_kw=None):
+        """Simulate and price every combination of `panel_counts` and
+        `battery_sizes`.
+
+        `pv_profile_kw` is (12, 24) output per installed kW for the average
+        day of each month; if `annual_yield_per_kw` is given the profile is
+        scaled so a kW produces that much a year. Returns a dict of arrays,
+        one entry per candidate.
+        """
+        profile = np.asarray(pv_profile_kw, dtype=float)
+        if annual_yield_per_kw:
+            profile_yield = float((profile.sum(axis=1) * DAYS_IN_MONTH).sum())
+            if profile_yield > 0:
+                profile = profile * (annual_yield_per_kw / profile_yield)
+        if load_kw is None:
+            load_kw = typical_load(annual_consumption_kwh)
+
+        panels, batteries = np.meshgrid(np.asarray(panel_counts, dtype=float),
+                                        np.asarray(battery_sizes, dtype=float), indexing='ij')
+        panels = panels.ravel()
+        batteries = batteries.ravel()
+        size_kw = panels * self.panel_wattage / 1000.0
+
+        flows = dispatch(size_kw[:, None, None] * profile[None, :, :], load_kw, batteries,
+                         batteries * self.battery_power_ratio, self.round_trip_efficiency)
+
+        import_savings = (flows['load'] - flows['imported']) * self.electricity_rate
+        export_income = flows['exported'] * self.export_rate
+        annual_savings = import_savings + export_income
+
+        pv_cost = size_kw * self.installation_cost_per_kw
+        battery_cost = self.battery_cost(batteries)
+        investment = pv_cost + battery_cost
+        import_factor, export_factor, replacement_factor = self._present_value_factors()
+        npv = (import_savings * import_factor + export_income * export_factor
+               - investment - battery_cost * replacement_factor)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            payback = np.where(annual_savings > 0, investment / annual_savings, self.lifetime + 1)
+            self_consumption = np.where(flows['pv'] > 0, flows['self_consumed'] / flows['pv'], 0.0)
+        self_sufficiency = (flows['load'] - flows['imported']) / flows['load']
+
+        return {
+            'num_panels': panels.astype(int),
+            'system_size_kw': size_kw,
+            'battery_kwh': batteries,
+            'annual_production_kwh': flows['pv'],
+            'self_consumption_ratio': self_consumption,
+            'self_sufficiency_ratio': self_sufficiency,
+            'annual_import_kwh': flows['imported'],
+            'annual_export_kwh': flows['exported'],
+            'export_income': export_income,
+            'annual_savings': annual_savings,
+            'investment': investment,
+            'payback_period_years': np.minimum(payback, self.lifetime),
+            'npv': npv
+        }
+
+    def optimize(self, annual_consumption_kwh, pv_profile_kw, panel_counts, battery_sizes=DEFAULT_BATTERY_SIZES,
+                 annual_yield_per_kw=None, load_kw=None):
+        """Evaluate the grid and return {'best', 'battery_options', 'candidates'}.
+
+        'best' is the candidate with the highest NPV; 'battery_options' are
+        the candidates at the best system size, one per battery capacity;
+        'candidates' is every candidate, all as plain rounded dicts.
+        """
+        grid = self.evaluate(annual_consumption_kwh, pv_profile_kw, panel_counts, battery_sizes,
+                             annual_yield_per_kw, load_kw)
+        candidates = [self._row(grid, i) for i in range(len(grid['npv']))]
+        best = int(np.argmax(grid['npv']))
+        return {
+            'best': candidates[best],
+            'battery_options': [c for c in candidates if c['num_panels'] == candidates[best]['num_panels']],
+            'candidates': candidates
+        }
+
+    @staticmethod
+    def _row(grid, i):
+        return {
+            'num_panels': int(grid['num_panels'][i]),
+            'system_size_kw': round(float(grid['system_size_kw'][i]), 2),
+            'battery_kwh': round(float(grid['battery_kwh'][i]), 1),
+            'annual_production_kwh': round(float(grid['annual_production_kwh'][i]), 0),
+            'self_consumption_ratio': round(float(grid['self_consumption_ratio'][i]), 3),
+            'self_sufficiency_ratio': round(float(grid['self_sufficiency_ratio'][i]), 3),
+            'annual_import_kwh': round(float(grid['annual_import_kwh'][i]), 0),
+            'annual_export_kwh': round(float(grid['annual_export_kwh'][i]), 0),
+            'export_income': round(float(grid['export_income'][i]), 0),
+            'annual_savings': round(float(grid['annual_savings'][i]), 0),
+            'investment': round(float(grid['investment'][i]), 0),
+            'payback_period_years': round(float(grid['payback_period_years'][i]), 1),
+            'npv': round(float(grid['npv'][i]), 0)
+        }
+
+
+def panel_grid(recommended_panels, max_panels=None, steps=9):
+    """Candidate panel counts from half to one and a half times the
+    recommended system, capped at what fits on the roof."""
+    low = max(1, int(round(recommended_panels * 0.5)))
+    high = max(low, int(round(recommended_panels * 1.5)))
+    if max_panels:
+        high = max(1, min(high, int(max_panels)))
+        low = min(low, high)
+    return np.unique(np.linspace(low, high, steps).round().astype(int))
@@ -0,0 +1,334 @@
+import csv
+import io
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+TRUE_VALUES = ('1', 'true', 'yes', 'y')
+
+# Columns written for every scored lead, in CSV order
+OUTPUT_COLUMNS = [
+    'row', 'id', 'success', 'error',
+    'address', 'formatted_address', 'latitude', 'longitude', 'peak_sun_hours',
+    'annual_consumption_kwh', 'electricity_rate',
+    'system_recommended_size_kw', 'system_actual_size_kw', 'system_num_panels', 'system_panel_wattage',
+    'system_required_roof_area_sqm',
+    'production_annual_production_kwh', 'production_daily_production_kwh', 'production_monthly_production_kwh',
+    'financial_installation_cost', 'financial_annual_savings', 'financial_monthly_savings',
+    'financial_payback_period_years', 'financial_total_25_year_savings', 'financial_net_25_year_savings',
+    'financial_roi_percentage',
+    'environmental_co2_offset_annual_tons', 'environmental_co2_offset_25_years_tons',
+    'environmental_trees_equivalent',
+    'report_id', 'email_sent'
+]
+
+
+def _float_or_none(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        if not value:
+            return None
+    return float(value)
+
+
+def _flag(value):
+    if isinstance(value, bool):
+        return value
+    return str(value or '').strip().lower() in TRUE_VALUES
+
+
+def detect_format(filename=None, content_type=None, default='csv'):
+    """'csv' or 'jsonl' from a filename or content type."""
+    name = (filename or '').lower()
+    content_type = (content_type or '').lower()
+    if name.endswith(('.jsonl', '.ndjson', '.json')) or 'json' in content_type:
+        return 'jsonl'
+    if name.endswith('.csv') or 'csv' in content_type:
+        return 'csv'
+    return default
+
+
+class UnreadableLead(dict):
+    """A failed output row yielded by read_leads() in place of a lead that
+    could not be parsed; BulkScorer.score() passes it through."""
+
+
+def read_leads(stream, fmt='csv'):
+    """Yield raw lead dicts from a text stream of CSV or JSONL. A JSONL line
+    that is not valid JSON yields an UnreadableLead instead."""
+    if fmt == 'jsonl':
+        row_number = 0
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            row_number += 1
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield UnreadableLead(row=row_number, success=False, error='invalid JSON')
+    else:
+        for row in csv.DictReader(stream):
+            yield row
+
+
+def normalize_lead(raw, default_electricity_rate):
+    """Turn a raw CSV/JSONL row into pipeline params. Returns (params, error)."""
+    try:
+        latitude = _float_or_none(raw.get('latitude'))
+        longitude = _float_or_none(raw.get('longitude'))
+        address = str(raw.get('address') or '').strip()
+        monthly_bill = _float_or_none(raw.get('monthly_bill')) or 0.0
+        annual_consumption_kwh = _float_or_none(raw.get('annual_consumption_kwh'))
+        electricity_rate = _float_or_none(raw.get('electricity_rate')) or default_electricity_rate
+    except (TypeError, ValueError) as e:
+        return None, f'Invalid input: {str(e)}'
+
+    if not address and (latitude is None or longitude is None):
+        return None, 'Address or latitude/longitude required'
+    if monthly_bill <= 0 and not annual_consumption_kwh:
+        return None, 'Monthly bill (>£0) or annual consumption required'
+
+    params = {
+        'id': raw.get('id'),
+        'name': str(raw.get('name') or '').strip(),
+        'email': str(raw.get('email') or '').strip(),
+        'address': address or f'{latitude}, {longitude}',
+        'latitude': latitude if longitude is not None else None,
+        'longitude': longitude if latitude is not None else None,
+        'monthly_bill': monthly_bill,
+        'annual_consumption_kwh': annual_consumption_kwh,
+        'electricity_rate': electricity_rate,
+        'generate_pdf': _flag(raw.get('generate_pdf')),
+        'send_email': _flag(raw.get('send_email'))
+    }
+    return params, None
+
+
+class BulkScorer:
+    """Scores lead lists: concurrent geocode + solar lookups, batched calculation.
+
+    Lookups run on a bounded thread pool; finished leads are collected and
+    scored with SolarCalculator.generate_batch_report() `batch_size` at a
+    time, and results are yielded as each batch completes (so output order
+    follows completion, with `row` giving the input position). With a
+    `render_farm` (utils/render_farm.py) a batch's PDFs are rendered in
+    parallel on its worker processes.
+    """
+
+    def __init__(self, pipeline, max_concurrency=8, batch_size=200, allow_pdf=False, allow_email=False,
+                 render_farm=None):
+        self.pipeline = pipeline
+        self.render_farm = render_farm
+        self.max_concurrency = max_concurrency
+        self.batch_size = batch_size
+        self.allow_pdf = allow_pdf
+        self.allow_email = allow_email
+        self.stats = {'rows': 0, 'scored': 0, 'failed': 0, 'pdfs': 0, 'emails': 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, stat):
+        with self._stats_lock:
+            self.stats[stat] += 1
+
+    def _lookup(self, row_number, raw):
+        """Geocode and fetch solar data for one lead (runs on the pool)."""
+        if not isinstance(raw, dict):
+            return {'row': row_number, 'success': False, 'error': 'Lead must be an object'}
+        base = {'row': row_number, 'id': raw.get('id'), 'address': raw.get('address')}
+        params, error = normalize_lead(raw, self.pipeline.config['default_electricity_rate'])
+        if error:
+            return dict(base, success=False, error=error)
+
+        location = self.pipeline.locate(params)
+        if not location['success']:
+            return dict(base, success=False, error=f"Address not found: {location['error']}")
+
+        solar_result = self.pipeline.fetch_solar(location['latitude'], location['longitude'])
+        if not solar_result['success']:
+            return dict(base, success=False, error=f"Solar data error: {solar_result['error']}",
+                        latitude=location['latitude'], longitude=location['longitude'])
+
+        return dict(base, success=True, error=None, params=params, location=location, solar_data=solar_result['data'])
+
+    @staticmethod
+    def _lookup_result(future, row_number):
+        """A finished lookup's row; an unexpected error fails only that lead."""
+        try:
+            return future.result()
+        except Exception as e:
+            print(f"[bulk] Row {row_number} failed: {str(e)}")
+            return {'row': row_number, 'success': False, 'error': f'Lookup failed: {str(e)}'}
+
+    def _score_batch(self, batch):
+        """Run the batch calculator over successful lookups and build output rows."""
+        results = []
+        ok = [item for item in batch if item['success']]
+        for item in batch:
+            if not item['success']:
+                self._count('failed')
+                results.append(item)
+
+        if ok:
+            import numpy as np
+
+            consumption = np.array([self.pipeline.annual_consumption(item['params']) for item in ok])
+            psh = np.array([item['solar_data']['annual_average_kwh_m2_day'] for item in ok])
+            rates = np.array([item['params']['electricity_rate'] for item in ok])
+            yields = np.array([item['solar_data'].get('annual_yield_kwh_per_kw') or np.nan for item in ok])
+            calculator = self.pipeline.make_calculator(self.pipeline.config['default_electricity_rate'])
+            report = calculator.generate_batch_report(consumption, psh, rates, annual_yield_kwh_per_kw=yields)
+
+            scored = []
+            for i, item in enumerate(ok):
+                row = {
+                    'row': item['row'],
+                    'id': item['id'],
+                    'success': True,
+                    'error': None,
+                    'address': item['params']['address'],
+                    'formatted_address': item['location']['formatted_address'],
+                    'latitude': item['location']['latitude'],
+                    'longitude': item['location']['longitude'],
+                    'peak_sun_hours': float(psh[i]),
+                    'annual_consumption_kwh': round(float(consumption[i]), 2),
+                    'electricity_rate': float(rates[i])
+                }
+                for section, fields in report.items():
+                    for field, values in fields.items():
+                        row[f"{section}_{field}"] = values[i].item()
+                self._count('scored')
+                results.append(row)
+                scored.append((item, row))
+            self._deliver_batch(scored)
+        return results
+
+    def _deliver_batch(self, scored):
+        """Optional per-lead PDF and email for (item, row) pairs; failures are
+        recorded on the row. The AI text for the whole batch is requested at
+        once (see AIContentGenerator.generate_batch_content)."""
+        deliveries = []
+        for item, row in scored:
+            params = item['params']
+            want_pdf = self.allow_pdf and (params['generate_pdf'] or params['send_email'])
+            want_email = self.allow_email and params['send_email']
+            if not want_pdf:
+                continue
+            if not params['name']:
+                row['error'] = 'Name required for PDF report'
+                continue
+            if want_email and '@' not in params['email']:
+                row['error'] = 'Valid email required to send report'
+                want_email = False
+            try:
+                report_data = self.pipeline.calculate(params, item['solar_data'])
+            except Exception as e:
+                row['error'] = f'Report delivery failed: {str(e)}'
+                continue
+            deliveries.append((item, row, report_data, want_email))
+        if not deliveries:
+            return
+
+        try:
+            ai_contents = self.pipeline.generate_ai_batch(
+                [(report_data, item['location']['formatted_address']) for item, _, report_data, _ in deliveries]
+            )
+        except Exception as e:
+            print(f"[bulk] AI batch failed: {str(e)}")
+            ai_contents = [{} for _ in deliveries]
+
+        rendered = self._render_pdfs(deliveries, ai_contents)
+        for (item, row, report_data, want_email), (pdf_bytes, filename, error) in zip(deliveries, rendered):
+            params = item['params']
+            if error is not None:
+                row['error'] = f'Report delivery failed: {str(error)}'
+                continue
+            try:
+                row['report_id'] = self.pipeline.store_pdf(pdf_bytes, filename)
+                self._count('pdfs')
+                if want_email and self.pipeline.email_configured():
+                    email_result = self.pipeline.send_email(params, pdf_bytes, filename)
+                    row['email_sent'] = email_result['success']
+                    if email_result['success']:
+                        self._count('emails')
+                    else:
+                        row['error'] = email_result['error']
+            except Exception as e:
+                row['error'] = f'Report delivery failed: {str(e)}'
+
+    def _render_pdfs(self, deliveries, ai_contents):
+        """Yield (pdf_bytes, filename, error) for each delivery, in order."""
+        if self.render_farm is None:
+            for (item, _, report_data, _), ai_content in zip(deliveries, ai_contents):
+                try:
+                    pdf_bytes, filename = self.pipeline.build_pdf(item['params'], item['location'], item['solar_data'],
+                                                                  report_data, ai_content)
+                except Exception as e:
+                    yield None, None, e
+                    continue
+                yield pdf_bytes, filename, None
+            return
+
+        payloads = [
+            self.pipeline.pdf_payload(item['params'], item['location'], item['solar_data'], report_data, ai_content)
+            for (item, _, report_data, _), ai_content in zip(deliveries, ai_contents)
+        ]
+        for payload, (pdf_bytes, error) in zip(payloads, self.render_farm.render_many(payloads)):
+            yield pdf_bytes, payload['filename'], error
+
+    def score(self, leads):
+        """Yield one output row per input lead as batches complete."""
+        leads = iter(leads)
+        max_in_flight = self.max_concurrency * 4
+        ready = []
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='bulk') as executor:
+            in_flight = {}
+            exhausted = False
+            row_number = 0
+            while in_flight or not exhausted:
+                # Keep the pool fed without reading the whole input into memory
+                while not exhausted and len(in_flight) < max_in_flight:
+                    try:
+                        raw = next(leads)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    row_number += 1
+                    self._count('rows')
+                    if isinstance(raw, UnreadableLead):
+                        ready.append(dict(raw, row=row_number))
+                        continue
+                    in_flight[executor.submit(self._lookup, row_number, raw)] = row_number
+
+                if in_flight:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        ready.append(self._lookup_result(future, in_flight.pop(future)))
+
+                if len(ready) >= self.batch_size:
+                    batch, ready = ready[:self.batch_size], ready[self.batch_size:]
+                    for row in self._score_batch(batch):
+                        yield row
+            while ready:
+                batch, ready = ready[:self.batch_size], ready[self.batch_size:]
+                for row in self._score_batch(batch):
+                    yield row
+
+
+def format_ndjson(rows):
+    for row in rows:
+        yield json.dumps({column: row.get(column) for column in OUTPUT_COLUMNS if column in row}) + '\n'
+
+
+def format_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=OUTPUT_COLUMNS, extrasaction='ignore')
+    writer.writeheader()
+    yield buffer.getvalue()
+    for row in rows:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(row)
+        yield buffer.getvalue()
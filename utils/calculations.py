@@ -1,3 +1,23 @@
+import numpy as np
+
+
+def _round(values, ndigits):
+    """Vectorised round() that matches Python's built-in bit for bit.
+
+    np.round scales by 10**ndigits first, which can tip values sitting next
+    to a .5 boundary the other way; those few are re-rounded with round().
+    """
+    values = np.asarray(values, dtype=float)
+    rounded = np.round(values, ndigits)
+    if ndigits > 0:
+        scaled = values * (10.0 ** ndigits)
+        suspect = np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5) < 1e-6
+        if suspect.any():
+            idx = np.nonzero(suspect)
+            rounded[idx] = [round(float(v), ndigits) for v in values[idx]]
+    return rounded
+
+
 class SolarCalculator:
     def __init__(self, electricity_rate=0.12, panel_efficiency=0.18, installation_cost_per_kw=3000, panel_wattage=400, co2_per_kwh=0.0007):
         # Configuration parameters
@@ -8,12 +28,22 @@ class SolarCalculator:
         self.co2_per_kwh = co2_per_kwh
         self.system_lifetime = 25 # Years
 
-    def calculate_system_size(self, annual_consumption_kwh, peak_sun_hours, roof_area=None, derate_factor=0.75):
+    def annual_yield(self, peak_sun_hours, annual_yield_kwh_per_kw=None, derate_factor=0.75):
+        """kWh a year from each installed kW: the simulated yield when the
+        solar data has one (see utils/production_model.py), otherwise
+        365 * Peak Sun Hours * Performance Ratio."""
+        if annual_yield_kwh_per_kw and annual_yield_kwh_per_kw > 0:
+            return annual_yield_kwh_per_kw
+        return 365 * peak_sun_hours * derate_factor
+
+    def calculate_system_size(self, annual_consumption_kwh, peak_sun_hours, roof_area=None, derate_factor=0.75,
+                              annual_yield_kwh_per_kw=None):
         if peak_sun_hours <= 0:
             peak_sun_hours = 4.0
         
-        # CORRECT FORMULA: Consumption / (365 * Peak Sun Hours * Performance Ratio)
-        recommended_size_kw = annual_consumption_kwh / (365 * peak_sun_hours * derate_factor) 
+        # Consumption / annual yield per kW
+        recommended_size_kw = annual_consumption_kwh / self.annual_yield(peak_sun_hours, annual_yield_kwh_per_kw,
+                                                                         derate_factor)
         num_panels = int(recommended_size_kw * 1000 / self.panel_wattage) + 1
         actual_size_kw = (num_panels * self.panel_wattage) / 1000
         
@@ -27,17 +57,28 @@ class SolarCalculator:
             'required_roof_area_sqm': round(required_roof_area_sqm, 2)
         }
 
-    def calculate_energy_production(self, system_size_kw, peak_sun_hours, monthly_solar_data=None):
-        derate_factor = 0.75 # Standard performance ratio
+    def calculate_energy_production(self, system_size_kw, peak_sun_hours, monthly_solar_data=None,
+                                    annual_yield_kwh_per_kw=None):
+        derate_factor = 0.75 # Standard performance ratio, when there is no simulated yield
         
-        annual_production_kwh = system_size_kw * 365 * peak_sun_hours * derate_factor
+        annual_production_kwh = system_size_kw * self.annual_yield(peak_sun_hours, annual_yield_kwh_per_kw,
+                                                                   derate_factor)
 
-        return {
+        production = {
             'annual_production_kwh': round(annual_production_kwh, 0),
             'daily_production_kwh': round(annual_production_kwh / 365, 1),
             'monthly_production_kwh': round(annual_production_kwh / 12, 0)
         }
 
+        # Spread the annual figure over the months in proportion to the
+        # simulated monthly production (see utils/production_model.py)
+        if monthly_solar_data:
+            shares = [float(m.get('production_kwh', 0)) for m in monthly_solar_data]
+            total = sum(shares)
+            if total > 0:
+                production['monthly_kwh'] = [round(annual_production_kwh * share / total, 0) for share in shares]
+        return production
+
     def calculate_financial_analysis(self, annual_consumption_kwh, annual_production_kwh, actual_size_kw, electricity_rate):
         
         # 1. Calculate installation cost dynamically based on system size.
@@ -94,13 +135,16 @@ class SolarCalculator:
         
     # 🚨 MISSING METHOD FIX 🚨
     # This method is called by your app.py to generate the full report data.
-    def generate_complete_report(self, annual_consumption_kwh, peak_sun_hours, electricity_rate, monthly_solar_data=None):
+    def generate_complete_report(self, annual_consumption_kwh, peak_sun_hours, electricity_rate, monthly_solar_data=None,
+                                 annual_yield_kwh_per_kw=None):
         # 1. System Size
-        system_data = self.calculate_system_size(annual_consumption_kwh, peak_sun_hours)
+        system_data = self.calculate_system_size(annual_consumption_kwh, peak_sun_hours,
+                                                 annual_yield_kwh_per_kw=annual_yield_kwh_per_kw)
         actual_size_kw = system_data['actual_size_kw']
 
         # 2. Energy Production
-        production_data = self.calculate_energy_production(actual_size_kw, peak_sun_hours, monthly_solar_data)
+        production_data = self.calculate_energy_production(actual_size_kw, peak_sun_hours, monthly_solar_data,
+                                                           annual_yield_kwh_per_kw)
         annual_production_kwh = production_data['annual_production_kwh']
 
         # 3. Financial Analysis
@@ -117,4 +161,140 @@ class SolarCalculator:
             'environmental': environmental_data
         }
         
-        return report_data
\ No newline at end of file
+        return report_data
+
+    # --- BATCH ENGINE ---
+    # Column-at-a-time version of generate_complete_report() for scoring large
+    # lead lists. Every step mirrors the scalar methods above operation for
+    # operation (including where rounded intermediates are reused), so the
+    # results are numerically identical to calling the scalar path per lead.
+    def generate_batch_report(self, annual_consumption_kwh, peak_sun_hours=None, electricity_rate=None, installation_cost_per_kw=None,
+                              annual_yield_kwh_per_kw=None):
+        """Vectorised generate_complete_report() over arrays of leads.
+
+        Accepts NumPy arrays (or scalars, broadcast; NaN annual_yield_kwh_per_kw
+        falls back to peak sun hours like None does) and returns
+        {'system': {...}, 'production': {...}, 'financial': {...},
+        'environmental': {...}} with one array per field. If a DataFrame is
+        passed as the first argument its columns are used for the inputs and
+        a flat DataFrame of `<section>_<field>` columns is returned.
+        """
+        frame = None
+        if hasattr(annual_consumption_kwh, 'columns'):
+            frame = annual_consumption_kwh
+            annual_consumption_kwh = frame['annual_consumption_kwh']
+            peak_sun_hours = frame['peak_sun_hours']
+            if 'electricity_rate' in frame.columns:
+                electricity_rate = frame['electricity_rate']
+            if 'installation_cost_per_kw' in frame.columns:
+                installation_cost_per_kw = frame['installation_cost_per_kw']
+            if 'annual_yield_kwh_per_kw' in frame.columns:
+                annual_yield_kwh_per_kw = frame['annual_yield_kwh_per_kw']
+
+        consumption = np.asarray(annual_consumption_kwh, dtype=float)
+        psh = np.asarray(peak_sun_hours, dtype=float)
+        rate = np.asarray(self.electricity_rate if electricity_rate is None else electricity_rate, dtype=float)
+        cost_per_kw = np.asarray(self.installation_cost_per_kw if installation_cost_per_kw is None else installation_cost_per_kw, dtype=float)
+        yield_per_kw = np.asarray(np.nan if annual_yield_kwh_per_kw is None else annual_yield_kwh_per_kw, dtype=float)
+        consumption, psh, rate, cost_per_kw, yield_per_kw = np.broadcast_arrays(consumption, psh, rate, cost_per_kw,
+                                                                                yield_per_kw)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            system = self._batch_system_size(consumption, psh, yield_per_kw)
+            production = self._batch_energy_production(system['actual_size_kw'], psh, yield_per_kw)
+            financial = self._batch_financial_analysis(consumption, production['annual_production_kwh'], system['actual_size_kw'], rate, cost_per_kw)
+            environmental = self._batch_environmental_impact(production['annual_production_kwh'])
+
+        report = {
+            'system': system,
+            'production': production,
+            'financial': financial,
+            'environmental': environmental
+        }
+        if frame is not None:
+            return self.batch_report_to_frame(report, index=frame.index)
+        return report
+
+    @staticmethod
+    def batch_report_to_frame(report, index=None):
+        import pandas as pd
+
+        columns = {}
+        for section, fields in report.items():
+            for field, values in fields.items():
+                columns[f"{section}_{field}"] = values
+        return pd.DataFrame(columns, index=index)
+
+    def _batch_annual_yield(self, peak_sun_hours, annual_yield_kwh_per_kw, derate_factor=0.75):
+        simulated = np.nan_to_num(annual_yield_kwh_per_kw) > 0
+        return np.where(simulated, annual_yield_kwh_per_kw, 365 * peak_sun_hours * derate_factor)
+
+    def _batch_system_size(self, annual_consumption_kwh, peak_sun_hours, annual_yield_kwh_per_kw, derate_factor=0.75):
+        peak_sun_hours = np.where(peak_sun_hours <= 0, 4.0, peak_sun_hours)
+
+        recommended_size_kw = annual_consumption_kwh / self._batch_annual_yield(peak_sun_hours, annual_yield_kwh_per_kw,
+                                                                                derate_factor)
+        num_panels = np.trunc(recommended_size_kw * 1000 / self.panel_wattage).astype(np.int64) + 1
+        actual_size_kw = (num_panels * self.panel_wattage) / 1000
+
+        required_roof_area_sqm = num_panels * 2.0
+
+        return {
+            'recommended_size_kw': _round(recommended_size_kw, 2),
+            'actual_size_kw': _round(actual_size_kw, 2),
+            'num_panels': num_panels,
+            'panel_wattage': np.full(num_panels.shape, self.panel_wattage),
+            'required_roof_area_sqm': _round(required_roof_area_sqm, 2)
+        }
+
+    def _batch_energy_production(self, system_size_kw, peak_sun_hours, annual_yield_kwh_per_kw):
+        derate_factor = 0.75
+
+        annual_production_kwh = system_size_kw * self._batch_annual_yield(peak_sun_hours, annual_yield_kwh_per_kw,
+                                                                          derate_factor)
+
+        return {
+            'annual_production_kwh': _round(annual_production_kwh, 0),
+            'daily_production_kwh': _round(annual_production_kwh / 365, 1),
+            'monthly_production_kwh': _round(annual_production_kwh / 12, 0)
+        }
+
+    def _batch_financial_analysis(self, annual_consumption_kwh, annual_production_kwh, actual_size_kw, electricity_rate, installation_cost_per_kw):
+        installation_cost = actual_size_kw * installation_cost_per_kw
+
+        offset_kwh = np.minimum(annual_production_kwh, annual_consumption_kwh)
+        annual_savings = offset_kwh * electricity_rate
+
+        rate = 0.03
+        n = self.system_lifetime
+        annuity_factor = ((1 + rate)**n - 1) / rate
+
+        total_25_year_savings = annual_savings * annuity_factor
+
+        payback_period_years = np.where(annual_savings > 0, installation_cost / annual_savings, self.system_lifetime + 1)
+        payback_period_years = _round(np.minimum(payback_period_years, self.system_lifetime), 1)
+
+        net_25_year_savings = total_25_year_savings - installation_cost
+
+        roi_percentage = np.where(installation_cost > 0, (net_25_year_savings / installation_cost) * 100, 0)
+
+        return {
+            'installation_cost': _round(installation_cost, 0),
+            'annual_savings': _round(annual_savings, 0),
+            'monthly_savings': _round(annual_savings / 12, 0),
+            'payback_period_years': payback_period_years,
+            'total_25_year_savings': _round(total_25_year_savings, 0),
+            'net_25_year_savings': _round(net_25_year_savings, 0),
+            'roi_percentage': _round(roi_percentage, 1)
+        }
+
+    def _batch_environmental_impact(self, annual_production_kwh):
+        TREES_PER_TON_CO2 = 48
+
+        co2_offset_annual_tons = annual_production_kwh * self.co2_per_kwh
+
+        return {
+            'co2_offset_annual_tons': _round(co2_offset_annual_tons, 1),
+            'co2_offset_25_years_tons': _round(co2_offset_annual_tons * self.system_lifetime, 1),
+            'trees_equivalent': _round(co2_offset_annual_tons * TREES_PER_TON_CO2, 0)
+        }
@@ -0,0 +1,238 @@
+import hashlib
+import io
+import json
+import threading
+from collections import OrderedDict
+
+from reportlab.lib.units import inch
+
+CHART_WIDTH = 5 * inch
+CHART_HEIGHT = 2.5 * inch
+BAR_COLOR = '#1E3A8A'
+HIGHLIGHT_COLOR = '#F59E0B'
+
+
+def monthly_series(solar_data):
+    """(months, irradiance) from solar data, or None if there is nothing to chart."""
+    if solar_data is None or not solar_data.get('monthly'):
+        return None
+    months = [d['month'] for d in solar_data['monthly']]
+    irradiance = [d['solar_irradiance'] for d in solar_data['monthly']]
+    return months, irradiance
+
+
+class ChartRenderer:
+    """Monthly production bar chart for the PDF report.
+
+    backend='raster' draws with matplotlib's object-oriented Figure API (no
+    pyplot global state, so it is safe on threaded workers) and caches the
+    PNG keyed on a hash of the series. backend='vector' draws the same chart
+    with ReportLab graphics primitives: no rasterisation and no matplotlib
+    import at all.
+    """
+
+    def __init__(self, backend='raster', cache_size=256, dpi=150):
+        if backend not in ('raster', 'vector'):
+            raise ValueError(f'Unknown chart backend: {backend}')
+        self.backend = backend
+        self.cache_size = cache_size
+        self.dpi = dpi
+        self._png_cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0}
+
+    def render(self, solar_data):
+        """Flowable for the chart (a spacer when there is no monthly data)."""
+        from reportlab.platypus import Image, Spacer
+
+        series = monthly_series(solar_data)
+        if series is None:
+            return Spacer(1, 0.1*inch)
+        months, irradiance = series
+        if self.backend == 'vector':
+            return self.render_vector(months, irradiance)
+        return Image(io.BytesIO(self.render_png(months, irradiance)), width=CHART_WIDTH, height=CHART_HEIGHT)
+
+    def _cache_key(self, *series):
+        payload = json.dumps([*series, self.dpi]).encode()
+        return hashlib.sha256(payload).hexdigest()
+
+    def _cached_png(self, key, draw):
+        with self._lock:
+            png = self._png_cache.get(key)
+            if png is not None:
+                self._png_cache.move_to_end(key)
+                self._stats['hits'] += 1
+                return png
+            self._stats['misses'] += 1
+
+        png = draw()
+        with self._lock:
+            self._png_cache[key] = png
+            while len(self._png_cache) > self.cache_size:
+                self._png_cache.popitem(last=False)
+        return png
+
+    def render_png(self, months, irradiance):
+        return self._cached_png(self._cache_key(months, irradiance), lambda: self._draw_png(months, irradiance))
+
+    def _draw_png(self, months, irradiance):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        fig = Figure(figsize=(7, 3))
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot(1, 1, 1)
+        bars = ax.bar(months, irradiance, color=BAR_COLOR, alpha=0.7)
+        bars[irradiance.index(max(irradiance))].set_color(HIGHLIGHT_COLOR)
+
+        ax.set_title('Monthly Solar Production', fontsize=12, fontweight='bold', color=BAR_COLOR)
+        ax.set_ylabel('kWh/m²/day', fontsize=10)
+        ax.tick_params(axis='x', rotation=45, labelsize=9)
+        ax.tick_params(axis='y', labelsize=9)
+        ax.grid(axis='y', alpha=0.3)
+
+        buf = io.BytesIO()
+        fig.tight_layout()
+        fig.savefig(buf, format='png', dpi=self.dpi)
+        return buf.getvalue()
+
+    def render_vector(self, months, irradiance):
+        from reportlab.lib import colors
+        from reportlab.graphics.shapes import Drawing, Group, String
+        from reportlab.graphics.charts.barcharts import VerticalBarChart
+
+        drawing = Drawing(CHART_WIDTH, CHART_HEIGHT)
+        drawing.add(String(CHART_WIDTH / 2, CHART_HEIGHT - 14, 'Monthly Solar Production',
+                           fontName='Helvetica-Bold', fontSize=12, fillColor=colors.HexColor(BAR_COLOR),
+                           textAnchor='middle'))
+        y_label = Group(String(0, 0, 'kWh/m²/day', fontName='Helvetica', fontSize=8,
+                               fillColor=colors.HexColor('#374151'), textAnchor='middle'))
+        y_label.translate(12, CHART_HEIGHT / 2)
+        y_label.rotate(90)
+        drawing.add(y_label)
+
+        chart = VerticalBarChart()
+        chart.x = 40
+        chart.y = 35
+        chart.width = CHART_WIDTH - 55
+        chart.height = CHART_HEIGHT - 65
+        chart.data = [irradiance]
+        chart.categoryAxis.categoryNames = months
+        chart.categoryAxis.labels.angle = 45
+        chart.categoryAxis.labels.boxAnchor = 'ne'
+        chart.categoryAxis.labels.fontSize = 7
+        chart.valueAxis.valueMin = 0
+        chart.valueAxis.labels.fontSize = 7
+        chart.valueAxis.visibleGrid = True
+        chart.valueAxis.gridStrokeColor = colors.Color(0, 0, 0, alpha=0.15)
+        chart.bars.strokeColor = None
+        chart.bars[0].fillColor = colors.HexColor(BAR_COLOR)
+        chart.bars[(0, irradiance.index(max(irradiance)))].fillColor = colors.HexColor(HIGHLIGHT_COLOR)
+        drawing.add(chart)
+        return drawing
+
+    # --- FAN CHART ---
+    # Cumulative net cash position per year from utils/uncertainty.py:
+    # p10-p90 and p25-p75 bands around the p50 line.
+    def render_fan(self, fan):
+        """Flowable for the uncertainty fan chart."""
+        from reportlab.platypus import Image
+
+        if self.backend == 'vector':
+            return self.render_fan_vector(fan)
+        png = self._cached_png(self._cache_key('fan', fan), lambda: self._draw_fan_png(fan))
+        return Image(io.BytesIO(png), width=CHART_WIDTH, height=CHART_HEIGHT)
+
+    def _draw_fan_png(self, fan):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        years, bands = fan['years'], fan['bands']
+        fig = Figure(figsize=(7, 3.5))
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot(1, 1, 1)
+        ax.fill_between(years, bands['p10'], bands['p90'], color=BAR_COLOR, alpha=0.15, linewidth=0,
+                        label='80% of scenarios')
+        ax.fill_between(years, bands['p25'], bands['p75'], color=BAR_COLOR, alpha=0.3, linewidth=0,
+                        label='50% of scenarios')
+        ax.plot(years, bands['p50'], color=HIGHLIGHT_COLOR, linewidth=2, label='Median')
+        ax.axhline(0, color='#374151', linewidth=0.8)
+
+        ax.set_title('Cumulative Net Savings', fontsize=12, fontweight='bold', color=BAR_COLOR)
+        ax.set_xlabel('Year', fontsize=10)
+        ax.set_ylabel('£', fontsize=10)
+        ax.set_xlim(years[0], years[-1])
+        ax.tick_params(labelsize=9)
+        ax.yaxis.set_major_formatter(lambda value, _: f'{value:,.0f}')
+        ax.grid(alpha=0.3)
+        ax.legend(fontsize=8, loc='upper left', frameon=False)
+
+        buf = io.BytesIO()
+        fig.tight_layout()
+        fig.savefig(buf, format='png', dpi=self.dpi)
+        return buf.getvalue()
+
+    def render_fan_vector(self, fan):
+        from reportlab.lib import colors
+        from reportlab.graphics.shapes import Drawing, Line, PolyLine, Polygon, String
+
+        years, bands = fan['years'], fan['bands']
+        left, bottom, right, top = 50, 25, CHART_WIDTH - 10, CHART_HEIGHT - 25
+        low = min(min(bands['p10']), 0)
+        high = max(max(bands['p90']), 0)
+        span = (high - low) or 1.0
+
+        def x(year):
+            return left + (year - years[0]) / ((years[-1] - years[0]) or 1) * (right - left)
+
+        def y(value):
+            return bottom + (value - low) / span * (top - bottom)
+
+        def band(lower, upper, alpha):
+            points = []
+            for year, value in zip(years, bands[upper]):
+                points += [x(year), y(value)]
+            for year, value in zip(reversed(years), reversed(bands[lower])):
+                points += [x(year), y(value)]
+            base = colors.HexColor(BAR_COLOR)
+            return Polygon(points, fillColor=colors.Color(base.red, base.green, base.blue, alpha=alpha),
+                           strokeColor=None)
+
+        drawing = Drawing(CHART_WIDTH, CHART_HEIGHT)
+        drawing.add(String(CHART_WIDTH / 2, CHART_HEIGHT - 14, 'Cumulative Net Savings',
+                           fontName='Helvetica-Bold', fontSize=12, fillColor=colors.HexColor(BAR_COLOR),
+                           textAnchor='middle'))
+        drawing.add(band('p10', 'p90', 0.15))
+        drawing.add(band('p25', 'p75', 0.3))
+        median = []
+        for year, value in zip(years, bands['p50']):
+            median += [x(year), y(value)]
+        drawing.add(PolyLine(median, strokeColor=colors.HexColor(HIGHLIGHT_COLOR), strokeWidth=2))
+        drawing.add(Line(left, y(0), right, y(0), strokeColor=colors.HexColor('#374151'), strokeWidth=0.8))
+
+        label_color = colors.HexColor('#374151')
+        for value in (low, 0, high):
+            drawing.add(String(left - 4, y(value) - 3, f'£{value:,.0f}', fontName='Helvetica', fontSize=7,
+                               fillColor=label_color, textAnchor='end'))
+        for year in years[::5]:
+            drawing.add(String(x(year), bottom - 12, str(year), fontName='Helvetica', fontSize=7,
+                               fillColor=label_color, textAnchor='middle'))
+        return drawing
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._png_cache))
+        return stats
+
+
+_default_renderer = None
+_default_renderer_lock = threading.Lock()
+
+
+def default_chart_renderer():
+    global _default_renderer
+    with _default_renderer_lock:
+        if _default_renderer is None:
+            _default_renderer = ChartRenderer()
+        return _default_renderer
@@ -1,39 +1,146 @@
 import smtplib
+import time
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
 from email import encoders
 import os
 
+
+class SMTPSession:
+    """One authenticated SMTP connection, opened on first use and reused for
+    every message until the server drops it, it has sent `max_messages`, or
+    it has been idle for `idle_timeout` seconds (then NOOP-checked first).
+
+    Not thread-safe: give each sending thread its own session.
+    """
+
+    def __init__(self, host='smtp.gmail.com', port=587, username=None, password=None, security='starttls',
+                 timeout=30, max_messages=100, idle_timeout=60):
+        if security not in ('starttls', 'ssl', 'none'):
+            raise ValueError(f'Unknown SMTP security: {security}')
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.security = security
+        self.timeout = timeout
+        self.max_messages = max_messages
+        self.idle_timeout = idle_timeout
+        self._server = None
+        self._sent = 0
+        self._last_used = 0.0
+        self.connections_opened = 0
+
+    def connect(self):
+        if self.security == 'ssl':
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.security == 'starttls':
+                server.starttls()
+        if self.username and self.password:
+            server.login(self.username, self.password)
+        self._server = server
+        self._sent = 0
+        self.connections_opened += 1
+
+    def _alive(self):
+        if time.monotonic() - self._last_used < self.idle_timeout:
+            return True
+        try:
+            return self._server.noop()[0] == 250
+        except smtplib.SMTPException:
+            return False
+        except OSError:
+            return False
+
+    def send(self, sender, recipients, message):
+        """Send one message (a string or bytes), reconnecting if needed.
+
+        SMTP errors propagate. The connection is kept after the server
+        rejects a message (smtplib resets the transaction) unless it is
+        closing (421), and dropped after any other failure.
+        """
+        if self._server is not None and (self._sent >= self.max_messages or not self._alive()):
+            self.close()
+        if self._server is None:
+            self.connect()
+        try:
+            self._server.sendmail(sender, recipients, message)
+        except smtplib.SMTPRecipientsRefused:
+            raise
+        except smtplib.SMTPResponseException as e:
+            if e.smtp_code == 421:
+                self.close()
+            raise
+        except Exception:
+            self.close()
+            raise
+        self._sent += 1
+        self._last_used = time.monotonic()
+
+    def close(self):
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except Exception:
+            try:
+                self._server.close()
+            except Exception:
+                pass
+        self._server = None
+
+
 class EmailSender:
-    def __init__(self, gmail_user, gmail_app_password):
+    def __init__(self, gmail_user, gmail_app_password, smtp_server="smtp.gmail.com", smtp_port=587,
+                 security='starttls', timeout=30):
         self.gmail_user = gmail_user
         self.gmail_app_password = gmail_app_password
-        self.smtp_server = "smtp.gmail.com"
-        self.smtp_port = 587
+        self.smtp_server = smtp_server
+        self.smtp_port = smtp_port
+        self.security = security
+        self.timeout = timeout
+
+    def session(self, **kwargs):
+        """A reusable SMTPSession with this sender's server and credentials."""
+        return SMTPSession(self.smtp_server, self.smtp_port, self.gmail_user, self.gmail_app_password,
+                           security=self.security, timeout=self.timeout, **kwargs)
+
+    def build_message(self, recipient_email, recipient_name, pdf_bytes, pdf_filename=None, subject=None):
+        """The report email as a MIME string, ready to send or queue."""
+        msg = MIMEMultipart()
+        msg['From'] = self.gmail_user
+        msg['To'] = recipient_email
+        msg['Subject'] = subject or f"Your Solar Energy Report - {recipient_name}"
+        body = self._create_email_body(recipient_name)
+        # utf-8 so the single-line HTML body is encoded within SMTP's line limit
+        msg.attach(MIMEText(body, 'html', 'utf-8'))
+        part = MIMEBase('application', 'octet-stream')
+        part.set_payload(pdf_bytes)
+        encoders.encode_base64(part)
+        part.add_header('Content-Disposition', f'attachment; filename= {pdf_filename or "solar_report.pdf"}')
+        msg.attach(part)
+        return msg.as_string()
     
-    def send_report(self, recipient_email, recipient_name, pdf_path, subject=None):
+    def send_report(self, recipient_email, recipient_name, pdf_path=None, subject=None, pdf_bytes=None, pdf_filename=None):
+        """Email the report now over a new connection, attaching `pdf_bytes`
+        if given, else the file at `pdf_path` (see utils/mail_queue.py for
+        the queued, pooled path)"""
         try:
-            msg = MIMEMultipart()
-            msg['From'] = self.gmail_user
-            msg['To'] = recipient_email
-            msg['Subject'] = subject or f"Your Solar Energy Report - {recipient_name}"
-            body = self._create_email_body(recipient_name)
-            msg.attach(MIMEText(body, 'html'))
-            if not os.path.exists(pdf_path):
-                return {'success': False, 'error': f'PDF file not found: {pdf_path}'}
-            with open(pdf_path, 'rb') as attachment:
-                part = MIMEBase('application', 'octet-stream')
-                part.set_payload(attachment.read())
-                encoders.encode_base64(part)
-                part.add_header('Content-Disposition', f'attachment; filename= {os.path.basename(pdf_path)}')
-                msg.attach(part)
-            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            server.starttls()
-            server.login(self.gmail_user, self.gmail_app_password)
-            text = msg.as_string()
-            server.sendmail(self.gmail_user, recipient_email, text)
-            server.quit()
+            if pdf_bytes is None:
+                if not pdf_path or not os.path.exists(pdf_path):
+                    return {'success': False, 'error': f'PDF file not found: {pdf_path}'}
+                with open(pdf_path, 'rb') as attachment:
+                    pdf_bytes = attachment.read()
+                pdf_filename = pdf_filename or os.path.basename(pdf_path)
+            text = self.build_message(recipient_email, recipient_name, pdf_bytes, pdf_filename, subject)
+            session = self.session()
+            try:
+                session.send(self.gmail_user, [recipient_email], text)
+            finally:
+                session.close()
             return {'success': True, 'error': None}
         except smtplib.SMTPAuthenticationError:
             return {'success': False, 'error': 'Gmail authentication failed. Please check your Gmail credentials and app password.'}
@@ -42,16 +149,42 @@ class EmailSender:
         except Exception as e:
             return {'success': False, 'error': f'Failed to send email: {str(e)}'}
     
+    async def send_report_async(self, recipient_email, recipient_name, pdf_bytes, pdf_filename=None, subject=None):
+        """send_report() for coroutines (ASGI mode, 'direct' mail): one
+        aiosmtplib connection per message, without blocking the event loop."""
+        import aiosmtplib  # only needed when asgi.py sends mail directly
+
+        try:
+            text = self.build_message(recipient_email, recipient_name, pdf_bytes, pdf_filename, subject)
+            await aiosmtplib.send(
+                text,
+                sender=self.gmail_user,
+                recipients=[recipient_email],
+                hostname=self.smtp_server,
+                port=self.smtp_port,
+                username=self.gmail_user if self.gmail_app_password else None,
+                password=self.gmail_app_password or None,
+                use_tls=self.security == 'ssl',
+                start_tls=self.security == 'starttls',
+                timeout=self.timeout
+            )
+            return {'success': True, 'error': None}
+        except aiosmtplib.SMTPAuthenticationError:
+            return {'success': False, 'error': 'Gmail authentication failed. Please check your Gmail credentials and app password.'}
+        except aiosmtplib.SMTPException as e:
+            return {'success': False, 'error': f'SMTP error: {str(e)}'}
+        except Exception as e:
+            return {'success': False, 'error': f'Failed to send email: {str(e)}'}
+
     def _create_email_body(self, recipient_name):
         html = f"""<html><head><style>body{{font-family:Arial,sans-serif;line-height:1.6;color:#333}}.header{{background:linear-gradient(135deg,#667eea 0%,#764ba2 100%);color:white;padding:20px;text-align:center;border-radius:10px 10px 0 0}}.content{{padding:30px;background-color:#f9f9f9}}.highlight{{background-color:#fff3cd;padding:15px;border-left:4px solid #ffc107;margin:20px 0}}.footer{{text-align:center;padding:20px;font-size:12px;color:#666;background-color:#f1f1f1;border-radius:0 0 10px 10px}}</style></head><body><div class="header"><h1>Your Solar Energy Report is Ready!</h1></div><div class="content"><p>Dear {recipient_name},</p><p>Thank you for your interest in solar energy! We've analyzed your property and prepared a comprehensive solar potential report just for you.</p><div class="highlight"><strong>Your personalized report includes:</strong><ul><li>Detailed solar potential analysis for your location</li><li>Recommended system size and specifications</li><li>Financial projections and savings estimates</li><li>Environmental impact calculations</li><li>Visual charts and graphs</li><li>Next steps and recommendations</li></ul></div><p>Your complete solar energy report is attached as a PDF file. Please review it carefully and don't hesitate to reach out if you have any questions.</p><p><strong>Next Steps:</strong></p><ol><li>Review your personalized report</li><li>Consider the financial and environmental benefits</li><li>Get quotes from certified solar installers</li><li>Check for available incentives and rebates</li></ol><p>Going solar is an investment in your future and our planet. We hope this report helps you make an informed decision!</p><p>Best regards,<br><strong>Solar Energy Analysis Team</strong></p></div><div class="footer"><p>This is an automated report. The estimates provided are based on available data and standard assumptions. Please consult with certified solar professionals for accurate assessments specific to your property.</p><p>2025 Solar Energy Report System</p></div></body></html>"""
         return html
     
     def test_connection(self):
         try:
-            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            server.starttls()
-            server.login(self.gmail_user, self.gmail_app_password)
-            server.quit()
+            session = self.session()
+            session.connect()
+            session.close()
             return {'success': True, 'error': None}
         except smtplib.SMTPAuthenticationError:
             return {'success': False, 'error': 'Authentication failed. Check your Gmail credentials and app password.'}
@@ -0,0 +1,211 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from .async_http import available as async_http_available
+from .geocode_cache import normalize_address
+from .rate_limit import TokenBucket
+
+_END = object()
+
+
+class GeocodeBatch:
+    """Geocodes a list of addresses, yielding one result per address in input order.
+
+    - addresses with the same normalize_address() key are looked up once
+    - the postcode index and the cache answer first, without using quota
+    - the rest go to Google, at most `concurrency` at a time, each taking a
+      token first: from TokenBucket(rate, burst) if `rate` is given, else
+      from the geocoder's shared rate_limiter, else unlimited
+    - results stream: address i is yielded once it and every address before
+      it are done, and lookups run at most `concurrency * 4` Google calls
+      ahead of the consumer
+
+    `for result in batch` runs the Google calls on a thread pool; `async for
+    result in batch` makes them from the event loop with the geocoder's async
+    HTTP client (or, without httpx, the blocking call on a thread pool of the
+    same size). `progress(stats)` is called every `progress_every` results
+    and once at the end.
+    """
+
+    def __init__(self, geocoder, addresses, concurrency=8, rate=None, burst=None, progress=None, progress_every=100):
+        self.geocoder = geocoder
+        self.addresses = addresses
+        self.concurrency = max(1, concurrency)
+        self.limiter = TokenBucket(rate, burst) if rate else geocoder.rate_limiter
+        self.progress = progress
+        self.progress_every = progress_every
+        self._results = {}
+        self._pending = deque()
+        self._outstanding = 0
+        self._started = None
+        self._finished = None
+        self._lock = threading.Lock()
+        self._stats = {'addresses': 0, 'duplicates': 0, 'postcode_index': 0, 'cache': 0, 'remote': 0,
+                       'succeeded': 0, 'failed': 0, 'yielded': 0, 'throttled_s': 0.0}
+
+    def _add(self, stat, value=1):
+        with self._lock:
+            self._stats[stat] += value
+
+    def _plan_ahead(self, addresses, launch):
+        """Read addresses until `concurrency * 4` Google lookups are waiting
+        to be consumed, calling launch(address) for each new one. Returns
+        False once the input is exhausted."""
+        window = self.concurrency * 4
+        while self._outstanding < window and len(self._pending) < window * 8:
+            address = next(addresses, _END)
+            if address is _END:
+                return False
+            self._add('addresses')
+            key = normalize_address(address)
+            if key in self._results:
+                self._add('duplicates')
+                self._pending.append((key, False))
+                continue
+            tier, result = self.geocoder.geocode_local(address)
+            if result is not None:
+                self._add(tier)
+                self._results[key] = result
+                self._pending.append((key, False))
+                continue
+            self._add('remote')
+            self._results[key] = launch(address)
+            self._outstanding += 1
+            self._pending.append((key, True))
+        return True
+
+    def _next_key(self):
+        key, launched = self._pending.popleft()
+        if launched:
+            self._outstanding -= 1
+        return key
+
+    def _emit(self, key, result):
+        self._results[key] = result
+        self._add('yielded')
+        if self.progress is not None and self._stats['yielded'] % self.progress_every == 0:
+            self.progress(self.stats())
+        return dict(result)
+
+    def _record(self, result):
+        self._add('succeeded' if result['success'] else 'failed')
+        return result
+
+    def _failure(self, error):
+        return {'success': False, 'error': f'Geocoding error: {str(error)}', 'latitude': None, 'longitude': None,
+                'formatted_address': None}
+
+    def _remote(self, address):
+        started = time.perf_counter()
+        if self.limiter is not None:
+            self.limiter.acquire()
+        self._add('throttled_s', time.perf_counter() - started)
+        try:
+            result = self.geocoder.geocode_remote(address)
+        except Exception as e:
+            result = self._failure(e)
+        return self._record(result)
+
+    async def _remote_async(self, semaphore, executor, address):
+        async with semaphore:
+            started = time.perf_counter()
+            if self.limiter is not None:
+                await self.limiter.acquire_async()
+            self._add('throttled_s', time.perf_counter() - started)
+            try:
+                if executor is None:
+                    result = await self.geocoder.geocode_remote_async(address)
+                else:
+                    result = await asyncio.get_running_loop().run_in_executor(executor, self.geocoder.geocode_remote,
+                                                                              address)
+            except Exception as e:
+                result = self._failure(e)
+            return self._record(result)
+
+    def _begin(self):
+        if self._started is not None:
+            raise RuntimeError('A GeocodeBatch can only be iterated once')
+        self._started = time.perf_counter()
+        return iter(self.addresses)
+
+    def _end(self):
+        self._finished = time.perf_counter()
+        stats = self.stats()
+        if self.progress is not None:
+            self.progress(stats)
+        print(f"      Batch geocoded {stats['addresses']} addresses: {stats['remote']} Google, "
+              f"{stats['postcode_index']} postcode index, {stats['cache']} cache, {stats['duplicates']} duplicate, "
+              f"{stats['failed']} failed in {stats['elapsed_s']:.1f}s")
+
+    def __iter__(self):
+        addresses = self._begin()
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='geocode')
+        try:
+            more = True
+            while True:
+                if more:
+                    more = self._plan_ahead(addresses, lambda address: executor.submit(self._remote, address))
+                if not self._pending:
+                    break
+                key = self._next_key()
+                result = self._results[key]
+                if isinstance(result, Future):
+                    result = result.result()
+                yield self._emit(key, result)
+            self._end()
+        finally:
+            # A consumer that stops early does not wait for the rest
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def __aiter__(self):
+        return self._aiterate()
+
+    async def _aiterate(self):
+        addresses = self._begin()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        executor = None
+        if not async_http_available():
+            executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='geocode')
+        tasks = set()
+
+        def launch(address):
+            task = asyncio.ensure_future(self._remote_async(semaphore, executor, address))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            return task
+
+        try:
+            more = True
+            while True:
+                if more:
+                    more = self._plan_ahead(addresses, launch)
+                if not self._pending:
+                    break
+                key = self._next_key()
+                result = self._results[key]
+                if isinstance(result, asyncio.Future):
+                    result = await result
+                yield self._emit(key, result)
+            self._end()
+        finally:
+            for task in list(tasks):
+                task.cancel()
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        end = self._finished or time.perf_counter()
+        elapsed = end - self._started if self._started is not None else 0.0
+        stats['unique'] = stats['addresses'] - stats['duplicates']
+        stats['throttled_s'] = round(stats['throttled_s'], 3)
+        stats['elapsed_s'] = round(elapsed, 3)
+        stats['per_second'] = round(stats['yielded'] / elapsed, 1) if elapsed > 0 else 0.0
+        stats['remote_per_second'] = round(stats['remote'] / elapsed, 1) if elapsed > 0 else 0.0
+        stats['concurrency'] = self.concurrency
+        stats['rate_limit'] = self.limiter.rate if self.limiter is not None else None
+        return stats
@@ -0,0 +1,36 @@
+import re
+
+from .ttl_cache import TTLCache
+
+
+def normalize_address(address):
+    """Cache key for an address: case, commas and repeated spaces don't matter."""
+    return re.sub(r'[\s,]+', ' ', (address or '').lower()).strip()
+
+
+class GeocodeCache(TTLCache):
+    """Two-tier geocoding cache: in-memory LRU in front of an optional SQLite store.
+
+    Successful lookups live for `ttl` seconds, negative results
+    (ZERO_RESULTS) for the shorter `negative_ttl`.
+    """
+
+    table = 'geocode_cache'
+    value_column = 'result'
+    label = 'geocode cache'
+    store_stats = ('stores', 'negative_stores')
+
+    def __init__(self, db_path=None, max_memory_entries=2048, max_disk_entries=200000,
+                 ttl=30 * 24 * 3600, negative_ttl=24 * 3600):
+        super().__init__(db_path, max_memory_entries, max_disk_entries, ttl)
+        self.negative_ttl = negative_ttl
+
+    def get(self, address):
+        """Cached geocode result for `address`, or None on a miss."""
+        return super().get(normalize_address(address))
+
+    def set(self, address, result, negative=False):
+        if negative:
+            super().set(normalize_address(address), result, ttl=self.negative_ttl, stat='negative_stores')
+        else:
+            super().set(normalize_address(address), result)
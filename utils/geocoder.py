@@ -1,72 +1,175 @@
-import requests
+from .async_http import default_async_http_client
+from .http_client import default_http_client
+
+GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
 
 class Geocoder:
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, cache=None, http_client=None, postcode_index=None, geocode_url=None,
+                 rate_limiter=None, async_http_client=None):
         self.api_key = api_key
-        self.geocode_url = "https://maps.googleapis.com/maps/api/geocode/json"
+        self.geocode_url = geocode_url or GEOCODE_URL
+        # Optional GeocodeCache; hits skip the Google round trip entirely
+        self.cache = cache
+        self.http = http_client or default_http_client()
+        # Used by the *_async methods (ASGI mode); httpx is only imported then
+        self.async_http = async_http_client or default_async_http_client()
+        # Optional PostcodeIndex: bare postcodes resolve offline, and an
+        # address Google cannot place falls back to its postcode's centroid
+        self.postcode_index = postcode_index
+        # Optional TokenBucket shared by every Google call from this
+        # process, so parallel lookups stay inside the QPS quota
+        self.rate_limiter = rate_limiter
     
     def geocode_address(self, address):
+        """Geocode an address: a bare postcode, sector or outward code from
+        the postcode index, anything else from the cache or Google."""
+        _, result = self.geocode_local(address)
+        if result is not None:
+            return result
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        return self.geocode_remote(address)
+
+    async def geocode_address_async(self, address):
+        """geocode_address() for coroutines: the Google call goes through
+        the async HTTP client and the rate limit is awaited."""
+        _, result = self.geocode_local(address)
+        if result is not None:
+            return result
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire_async()
+        return await self.geocode_remote_async(address)
+
+    def geocode_batch(self, addresses, concurrency=8, rate=None, burst=None, progress=None, progress_every=100):
+        """Geocode a list of addresses; see GeocodeBatch. Iterate the result
+        for threads, async-iterate it inside an event loop."""
+        from .geocode_batch import GeocodeBatch
+        return GeocodeBatch(self, addresses, concurrency=concurrency, rate=rate, burst=burst,
+                            progress=progress, progress_every=progress_every)
+
+    def geocode_local(self, address):
+        """(tier, result) without a network call: tier 'postcode_index' or
+        'cache', or (None, None) if Google is needed."""
+        if self.postcode_index is not None:
+            match = self.postcode_index.lookup(address)
+            if match is not None:
+                print(f"      Postcode index: {address} → {match['postcode']} ({match['precision']})")
+                return 'postcode_index', self._postcode_result(match)
+        if self.cache is not None:
+            cached = self.cache.get(address)
+            if cached is not None:
+                print(f"      Geocode cache hit: {address}")
+                if not cached['success']:
+                    # A remembered ZERO_RESULTS still falls back to the postcode
+                    result = self._postcode_fallback(address, cached)
+                    if result['success']:
+                        return 'postcode_index', result
+                return 'cache', cached
+        return None, None
+
+    def geocode_remote(self, address):
+        """Google lookup (not rate limited here), falling back to the
+        centroid of a postcode in the address if Google cannot place it."""
+        return self._postcode_fallback(address, self._geocode_google(address))
+
+    async def geocode_remote_async(self, address):
+        result = await self._geocode_google_async(address)
+        return self._postcode_fallback(address, result)
+
+    def _postcode_fallback(self, address, result):
+        if not result['success'] and self.postcode_index is not None:
+            match = self.postcode_index.lookup(address, search=True)
+            if match is not None:
+                print(f"      Postcode centroid fallback: {match['postcode']} ({result['error']})")
+                return self._postcode_result(match)
+        return result
+
+    def _postcode_result(self, match):
+        return {
+            'success': True,
+            'latitude': match['latitude'],
+            'longitude': match['longitude'],
+            'formatted_address': f"{match['postcode']}, UK",
+            'error': None,
+            'source': 'postcode_index',
+            'precision': match['precision']
+        }
+
+    def _geocode_google(self, address):
         """Geocode address using Google Geocoding API"""
         try:
             if not self.api_key:
-                return {
-                    'success': False,
-                    'error': 'Google API key required. Set GOOGLE_API_KEY in .env',
-                    'latitude': None,
-                    'longitude': None,
-                    'formatted_address': None
-                }
-            
+                return self._failure('Google API key required. Set GOOGLE_API_KEY in .env')
+
             print(f"      Geocoding: {address}")
             
-            params = {
-                'address': address,
-                'key': self.api_key
-            }
-            
-            response = requests.get(self.geocode_url, params=params, timeout=10)
-            
-            if response.status_code != 200:
-                return {
-                    'success': False,
-                    'error': f'Geocoding API error: {response.status_code}',
-                    'latitude': None,
-                    'longitude': None,
-                    'formatted_address': None
-                }
-            
-            data = response.json()
-            
-            if data.get('status') != 'OK' or not data.get('results'):
-                return {
-                    'success': False,
-                    'error': f"Address not found: {data.get('status', 'Unknown')}. Try full address: Street, City, Postcode, UK",
-                    'latitude': None,
-                    'longitude': None,
-                    'formatted_address': None
-                }
-            
-            result = data['results'][0]
-            location = result['geometry']['location']
-            
-            print(f"      Found: {location['lat']}, {location['lng']}")
-            
-            return {
-                'success': True,
-                'latitude': location['lat'],
-                'longitude': location['lng'],
-                'formatted_address': result['formatted_address'],
-                'error': None
-            }
+            response = self.http.get(self.geocode_url, params=self._google_params(address), timeout=10)
+            return self._google_result(address, response)
             
         except Exception as e:
-            return {
-                'success': False,
-                'error': f'Geocoding error: {str(e)}',
-                'latitude': None,
-                'longitude': None,
-                'formatted_address': None
-            }
+            return self._failure(f'Geocoding error: {str(e)}')
+
+    async def _geocode_google_async(self, address):
+        try:
+            if not self.api_key:
+                return self._failure('Google API key required. Set GOOGLE_API_KEY in .env')
+
+            print(f"      Geocoding: {address}")
+
+            response = await self.async_http.get(self.geocode_url, params=self._google_params(address), timeout=10)
+            return self._google_result(address, response)
+
+        except Exception as e:
+            return self._failure(f'Geocoding error: {str(e)}')
+
+    def _google_params(self, address):
+        return {
+            'address': address,
+            'key': self.api_key
+        }
+
+    def _google_result(self, address, response):
+        """Result dict for a Geocoding API response (requests or httpx)."""
+        if response.status_code != 200:
+            return self._failure(f'Geocoding API error: {response.status_code}')
+        
+        data = response.json()
+        
+        if data.get('status') != 'OK' or not data.get('results'):
+            not_found = self._failure(
+                f"Address not found: {data.get('status', 'Unknown')}. Try full address: Street, City, Postcode, UK"
+            )
+            # Only a definitive "no such address" is worth remembering;
+            # quota and server errors must be retried.
+            if self.cache is not None and data.get('status') == 'ZERO_RESULTS':
+                self.cache.set(address, not_found, negative=True)
+            return not_found
+        
+        result = data['results'][0]
+        location = result['geometry']['location']
+        
+        print(f"      Found: {location['lat']}, {location['lng']}")
+        
+        found = {
+            'success': True,
+            'latitude': location['lat'],
+            'longitude': location['lng'],
+            'formatted_address': result['formatted_address'],
+            'error': None
+        }
+        if self.cache is not None:
+            self.cache.set(address, found)
+        return found
+
+    @staticmethod
+    def _failure(error):
+        return {
+            'success': False,
+            'error': error,
+            'latitude': None,
+            'longitude': None,
+            'formatted_address': None
+        }
     
     def validate_coordinates(self, lat, lon):
         try:
@@ -0,0 +1,209 @@
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class CircuitOpenError(Exception):
+    """Raised without touching the network while a host's circuit is open."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    After `failure_threshold` failed requests in a row the circuit opens and
+    calls fail fast for `reset_timeout` seconds. Then a single trial request
+    is let through (half-open): success closes the circuit, failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self.times_opened += 1
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        """A call ended with no verdict (interrupted): give a half-open trial back."""
+        with self._lock:
+            if self.state == 'half_open':
+                self.state = 'open'
+                self.opened_at = time.monotonic() - self.reset_timeout
+
+    def settle(self, outcome):
+        """Record a call's outcome: 'success', 'failure' or None (interrupted)."""
+        if outcome == 'success':
+            self.record_success()
+        elif outcome == 'failure':
+            self.record_failure()
+        else:
+            self.release()
+
+
+class HttpClient:
+    """Shared keep-alive session for the Google APIs.
+
+    - connection pool sized to worker concurrency (`pool_size`)
+    - retries 429/5xx/timeouts with exponential backoff and full jitter,
+      honouring Retry-After
+    - at most `max_per_host` requests in flight per host
+    - a circuit breaker per host
+    """
+
+    def __init__(self, pool_size=16, max_retries=3, backoff_base=0.5, backoff_max=8.0,
+                 max_per_host=16, failure_threshold=5, reset_timeout=30.0, retry_statuses=RETRY_STATUSES):
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_per_host = max_per_host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.retry_statuses = retry_statuses
+
+        self.reset()
+
+    def reset(self):
+        """Fresh session, locks and counters. Called in forked workers so no
+        pooled socket or held lock is inherited from the parent process."""
+        self.adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+
+        self._lock = threading.Lock()
+        self._host_slots = {}
+        self._breakers = {}
+        self._stats = {'requests': 0, 'retries': 0, 'failures': 0, 'circuit_rejections': 0}
+
+    def _count(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def _slots(self, host):
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._host_slots[host]
+
+    def breaker(self, host):
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return self._breakers[host]
+
+    def _backoff(self, attempt, response=None):
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        if response is not None and response.status_code == 429:
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                return min(self.backoff_max, float(retry_after))
+        return random.uniform(0, delay)
+
+    def get(self, url, params=None, timeout=10, **kwargs):
+        """GET with retries. Returns the final response (which may still be a
+        429/5xx once retries are exhausted) or raises the last network error."""
+        host = urlparse(url).netloc
+        breaker = self.breaker(host)
+        if not breaker.allow():
+            self._count('circuit_rejections')
+            raise CircuitOpenError(f'{host} is failing, not retrying for {self.reset_timeout:.0f}s (circuit open)')
+
+        slots = self._slots(host)
+        response = None
+        last_error = None
+        # Settled in `finally` so a half-open trial always ends, whatever is raised
+        outcome = None
+        try:
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    self._count('retries')
+                    time.sleep(self._backoff(attempt - 1, response))
+                response = None
+                with slots:
+                    self._count('requests')
+                    try:
+                        response = self.session.get(url, params=params, timeout=timeout, **kwargs)
+                    except (requests.Timeout, requests.ConnectionError) as e:
+                        last_error = e
+                        continue
+                if response.status_code not in self.retry_statuses:
+                    outcome = 'success'
+                    return response
+
+            outcome = 'failure'
+            if response is not None:
+                return response
+            raise last_error
+        except Exception:
+            # Not retried: TooManyRedirects, InvalidURL, ...
+            outcome = 'failure'
+            raise
+        finally:
+            if outcome == 'failure':
+                self._count('failures')
+            breaker.settle(outcome)
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self._stats)
+            breakers = {host: b.state for host, b in self._breakers.items()}
+            opened = sum(b.times_opened for b in self._breakers.values())
+
+        connections = 0
+        pooled_requests = 0
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                connections += pool.num_connections
+                pooled_requests += pool.num_requests
+
+        stats['connections_opened'] = connections
+        stats['connections_reused'] = max(pooled_requests - connections, 0)
+        stats['circuits'] = breakers
+        stats['circuit_opened'] = opened
+        return stats
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def default_http_client():
+    """Process-wide client used when none is passed to Geocoder/NasaPowerAPI."""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = HttpClient()
+        return _default_client
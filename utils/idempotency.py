@@ -0,0 +1,328 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from contextlib import contextmanager
+
+
+def request_key(scope, fields, supplied_key=None):
+    """Idempotency key for a request to `scope` (the endpoint).
+
+    A client-supplied key (Idempotency-Key header) is used as is; otherwise
+    the key is a hash of the normalized form fields, so a double-click or a
+    refresh that re-posts the same form maps to the same key. Values are
+    compared case- and whitespace-insensitively and numbers by value
+    ('120' == '120.00').
+    """
+    if supplied_key:
+        material = ['header', scope, supplied_key.strip()]
+    else:
+        normalized = {}
+        for name, value in fields.items():
+            value = ' '.join(str(value).split()).lower()
+            if not value:
+                continue
+            try:
+                value = repr(float(value))
+            except ValueError:
+                pass
+            normalized[name] = value
+        material = ['form', scope, normalized]
+    return hashlib.sha256(json.dumps(material, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class _Flight:
+    """One in-progress execution that duplicate requests in this process wait on."""
+
+    def __init__(self):
+        # A Future rather than an Event so coroutines can await it too
+        self.done = Future()
+        self.body = None
+        self.status = None
+        self.outcome = 'busy'
+        self.error = None
+
+
+class IdempotencyStore:
+    """Runs each idempotency key once and shares the response.
+
+    Concurrent duplicates in the same process wait for the first request
+    and get its response ('coalesced'). Across processes the first request
+    claims the key in SQLite (`db_path`) and duplicates poll until it
+    finishes. Successful (2xx) responses are kept for `ttl` seconds and
+    replayed to later duplicates ('replayed'); failures are not kept, so a
+    retry runs again. A duplicate gives up after `wait_timeout` seconds
+    ('busy'), and a claim not finished after `stale_after` seconds (its
+    process died) is taken over.
+    """
+
+    def __init__(self, db_path=None, ttl=600, wait_timeout=120, stale_after=600, poll_interval=0.25,
+                 max_memory_entries=2048):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.wait_timeout = wait_timeout
+        self.stale_after = stale_after
+        self.poll_interval = poll_interval
+        self.max_memory_entries = max_memory_entries
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._memory = OrderedDict()
+        self._writes_since_prune = 0
+        self._stats = {'executed': 0, 'coalesced': 0, 'replayed': 0, 'busy': 0}
+
+        if db_path:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with self._connect() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS idempotency_keys (
+                        key TEXT PRIMARY KEY,
+                        status TEXT NOT NULL,
+                        status_code INTEGER,
+                        body TEXT,
+                        expires_at REAL NOT NULL,
+                        updated_at REAL NOT NULL
+                    )
+                """)
+                conn.execute("CREATE INDEX IF NOT EXISTS idempotency_keys_expiry ON idempotency_keys (expires_at)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _count(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def _recall(self, key):
+        """Completed response from memory; caller holds the lock."""
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        body, status, expires_at = entry
+        if expires_at <= time.time():
+            del self._memory[key]
+            return None
+        return body, status
+
+    def _remember(self, key, body, status, expires_at):
+        with self._lock:
+            self._memory[key] = (body, status, expires_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def run(self, key, fn):
+        """Call `fn()` -> (body, status_code) once per key.
+
+        Returns (body, status_code, outcome) with outcome 'executed',
+        'coalesced', 'replayed' or 'busy' (body and status are None).
+        """
+        cached, flight, leader = self._join(key)
+        if cached is not None:
+            return cached
+
+        if not leader:
+            try:
+                flight.done.result(self.wait_timeout)
+            except FutureTimeout:
+                self._count('busy')
+                return None, None, 'busy'
+            return self._follow(flight)
+
+        try:
+            flight.body, flight.status, flight.outcome = self._lead(key, fn)
+            return flight.body, flight.status, flight.outcome
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            self._land(key, flight)
+
+    async def run_async(self, key, fn):
+        """run() for coroutines: `await fn()` -> (body, status_code).
+        Duplicates wait on the loop, and SQLite calls run on its executor."""
+        cached, flight, leader = self._join(key)
+        if cached is not None:
+            return cached
+
+        if not leader:
+            try:
+                await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(flight.done)), self.wait_timeout)
+            except asyncio.TimeoutError:
+                self._count('busy')
+                return None, None, 'busy'
+            return self._follow(flight)
+
+        loop = asyncio.get_running_loop()
+        try:
+            claimed = await loop.run_in_executor(None, self._wait_for_claim, key) if self.db_path else None
+            if claimed is None:
+                self._count('executed')
+                try:
+                    body, status = await fn()
+                except Exception:
+                    await loop.run_in_executor(None, self._release, key)
+                    raise
+                await loop.run_in_executor(None, self._settle, key, body, status)
+                claimed = body, status, 'executed'
+            flight.body, flight.status, flight.outcome = claimed
+            return claimed
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            self._land(key, flight)
+
+    def _join(self, key):
+        """(replayed response or None, flight, True if this caller leads it)."""
+        with self._lock:
+            cached = self._recall(key)
+            if cached is not None:
+                self._stats['replayed'] += 1
+                return (cached[0], cached[1], 'replayed'), None, False
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            return None, flight, leader
+
+    def _follow(self, flight):
+        """The response a duplicate gets once the leader's flight is done."""
+        if flight.error is not None:
+            raise flight.error
+        if flight.outcome == 'busy':
+            self._count('busy')
+            return None, None, 'busy'
+        self._count('coalesced')
+        return flight.body, flight.status, 'coalesced'
+
+    def _land(self, key, flight):
+        with self._lock:
+            self._flights.pop(key, None)
+        flight.done.set_result(None)
+
+    def _lead(self, key, fn):
+        if self.db_path:
+            claimed = self._wait_for_claim(key)
+            if claimed is not None:
+                return claimed
+
+        self._count('executed')
+        try:
+            body, status = fn()
+        except Exception:
+            self._release(key)
+            raise
+        self._settle(key, body, status)
+        return body, status, 'executed'
+
+    def _wait_for_claim(self, key):
+        """Claim the key in SQLite, polling while another process holds it.
+        None once claimed, else (body, status, outcome) to answer with."""
+        deadline = time.time() + self.wait_timeout
+        claim = self._claim(key)
+        while claim[0] == 'running':
+            if time.time() >= deadline:
+                self._count('busy')
+                return None, None, 'busy'
+            time.sleep(self.poll_interval)
+            claim = self._claim(key)
+        if claim[0] == 'done':
+            _, body, status, expires_at = claim
+            self._remember(key, body, status, expires_at)
+            self._count('replayed')
+            return body, status, 'replayed'
+        return None
+
+    def _settle(self, key, body, status):
+        """Keep a successful response for replay; free the key otherwise."""
+        if 200 <= status < 300:
+            self._store(key, body, status)
+        else:
+            self._release(key)
+
+    def _claim(self, key):
+        """('done', body, status, expires_at), ('running',) if another process
+        holds the key, or ('owner',) once this process has claimed it."""
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    row = conn.execute(
+                        "SELECT status, status_code, body, expires_at, updated_at FROM idempotency_keys WHERE key = ?",
+                        (key,)
+                    ).fetchone()
+                    if row is not None:
+                        status, status_code, body, expires_at, updated_at = row
+                        if status == 'done' and expires_at > now:
+                            conn.execute("COMMIT")
+                            return 'done', json.loads(body), status_code, expires_at
+                        if status == 'running' and updated_at + self.stale_after > now:
+                            conn.execute("COMMIT")
+                            return ('running',)
+                    conn.execute(
+                        "INSERT OR REPLACE INTO idempotency_keys (key, status, status_code, body, expires_at, updated_at) "
+                        "VALUES (?, 'running', NULL, NULL, ?, ?)",
+                        (key, now + self.stale_after, now)
+                    )
+                    conn.execute("COMMIT")
+                    return ('owner',)
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+        except sqlite3.Error as e:
+            # Without the shared store, still dedupe within this process
+            print(f"      [idempotency] claim failed: {str(e)}")
+            return ('owner',)
+
+    def _store(self, key, body, status):
+        now = time.time()
+        expires_at = now + self.ttl
+        self._remember(key, body, status, expires_at)
+        if not self.db_path:
+            return
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO idempotency_keys (key, status, status_code, body, expires_at, updated_at) "
+                    "VALUES (?, 'done', ?, ?, ?, ?)",
+                    (key, status, json.dumps(body), expires_at, now)
+                )
+                with self._lock:
+                    self._writes_since_prune += 1
+                    prune = self._writes_since_prune >= 100
+                    if prune:
+                        self._writes_since_prune = 0
+                if prune:
+                    conn.execute("DELETE FROM idempotency_keys WHERE expires_at <= ?", (now,))
+        except sqlite3.Error as e:
+            print(f"      [idempotency] write failed: {str(e)}")
+
+    def _release(self, key):
+        if not self.db_path:
+            return
+        try:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM idempotency_keys WHERE key = ? AND status = 'running'", (key,))
+        except sqlite3.Error as e:
+            print(f"      [idempotency] release failed: {str(e)}")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._flights)
+            stats['memory_entries'] = len(self._memory)
+        return stats
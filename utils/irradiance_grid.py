@@ -0,0 +1,175 @@
+"""Precomputed irradiance grid for instant, offline solar estimates.
+
+A regular latitude/longitude grid of monthly climatology, built once by
+scripts/build_irradiance_grid.py and stored as two files:
+
+- `<name>.npy`: float32 array (lat, lon, 25) — mean daily horizontal
+  irradiation (kWh/m²/day = peak sun hours) for each month, the annual mean
+  and the monthly mean air temperature (°C); NaN where there is no data
+- `<name>.json`: the grid origin, step and provenance
+
+The array is memory-mapped, so opening it costs nothing and every process
+shares the same pages. A lookup interpolates bilinearly between the four
+surrounding grid points in a few microseconds.
+"""
+import json
+import os
+
+import numpy as np
+
+FIELDS = ([f'ghi_{m}' for m in range(1, 13)] + ['ghi_annual']
+          + [f'temperature_{m}' for m in range(1, 13)])
+GHI = slice(0, 12)
+ANNUAL = 12
+TEMPERATURE = slice(13, 25)
+
+
+def metadata_path(path):
+    return os.path.splitext(path)[0] + '.json'
+
+
+def save_grid(path, values, lat_min, lat_step, lon_min, lon_step, **info):
+    """Write a (lat, lon, 25) grid and its metadata next to it."""
+    values = np.asarray(values, dtype=np.float32)
+    if values.ndim != 3 or values.shape[2] != len(FIELDS):
+        raise ValueError(f"Expected a (lat, lon, {len(FIELDS)}) array, got {values.shape}")
+    if values.shape[0] < 2 or values.shape[1] < 2:
+        raise ValueError("The grid needs at least 2 points in each direction")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    np.save(path, values)
+    meta = dict(info, fields=FIELDS, lat_min=float(lat_min), lat_step=float(lat_step),
+                lon_min=float(lon_min), lon_step=float(lon_step),
+                n_lat=int(values.shape[0]), n_lon=int(values.shape[1]))
+    with open(metadata_path(path), 'w') as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+class IrradianceGrid:
+    """Read-only lookups on a grid written by save_grid()."""
+
+    def __init__(self, path):
+        with open(metadata_path(path)) as f:
+            self.meta = json.load(f)
+        self.path = path
+        # A plain ndarray view of the mapped pages: indexing a np.memmap
+        # directly costs several microseconds of subclass overhead
+        self.values = np.asarray(np.load(path, mmap_mode='r'))
+        self.lat_min = self.meta['lat_min']
+        self.lat_step = self.meta['lat_step']
+        self.lon_min = self.meta['lon_min']
+        self.lon_step = self.meta['lon_step']
+        self.n_lat, self.n_lon = self.values.shape[:2]
+        # Cells whose four corners all have data skip the NaN handling
+        present = ~np.isnan(self.values[:, :, ANNUAL])
+        complete = present[:-1, :-1] & present[:-1, 1:] & present[1:, :-1] & present[1:, 1:]
+        self._complete = complete.tolist()
+        self._complete_cells = complete
+        self.lookups = 0
+        self.misses = 0
+
+    @classmethod
+    def open(cls, path):
+        """The grid at `path`, or None if it has not been built."""
+        if not path or not os.path.exists(path) or not os.path.exists(metadata_path(path)):
+            return None
+        return cls(path)
+
+    @property
+    def bounds(self):
+        return {
+            'lat_min': self.lat_min,
+            'lat_max': self.lat_min + self.lat_step * (self.n_lat - 1),
+            'lon_min': self.lon_min,
+            'lon_max': self.lon_min + self.lon_step * (self.n_lon - 1)
+        }
+
+    def interpolate(self, latitude, longitude):
+        """The 25 interpolated fields at one point, or None outside the
+        grid or where all four neighbours are missing."""
+        self.lookups += 1
+        y = (latitude - self.lat_min) / self.lat_step
+        x = (longitude - self.lon_min) / self.lon_step
+        if not (0.0 <= y <= self.n_lat - 1 and 0.0 <= x <= self.n_lon - 1):
+            self.misses += 1
+            return None
+        i = min(int(y), self.n_lat - 2)
+        j = min(int(x), self.n_lon - 2)
+        ty = y - i
+        tx = x - j
+        corners = self.values[i:i + 2, j:j + 2].reshape(4, -1)
+        weights = np.array([(1 - ty) * (1 - tx), (1 - ty) * tx, ty * (1 - tx), ty * tx])
+        if self._complete[i][j]:
+            return weights @ corners
+        # Coast: use whichever neighbours have data
+        present = ~np.isnan(corners[:, ANNUAL])
+        weights = weights * present
+        if weights.sum() <= 0:
+            self.misses += 1
+            return None
+        corners = np.where(present[:, None], corners, 0.0)
+        return weights @ corners / weights.sum()
+
+    def interpolate_many(self, latitudes, longitudes):
+        """Vectorised interpolate(): returns (values (n, 25), found (n,)).
+        Rows that are not found are NaN."""
+        lat = np.atleast_1d(np.asarray(latitudes, dtype=float))
+        lon = np.atleast_1d(np.asarray(longitudes, dtype=float))
+        self.lookups += len(lat)
+        y = (lat - self.lat_min) / self.lat_step
+        x = (lon - self.lon_min) / self.lon_step
+        inside = (y >= 0) & (y <= self.n_lat - 1) & (x >= 0) & (x <= self.n_lon - 1)
+        i = np.clip(np.floor(np.where(inside, y, 0)).astype(int), 0, self.n_lat - 2)
+        j = np.clip(np.floor(np.where(inside, x, 0)).astype(int), 0, self.n_lon - 2)
+        ty = (np.where(inside, y, 0) - i)[:, None]
+        tx = (np.where(inside, x, 0) - j)[:, None]
+
+        # Rows of the flattened (points, fields) grid for the four corners
+        flat = self.values.reshape(-1, len(FIELDS))
+        k = i * self.n_lon + j
+        rows = (k, k + 1, k + self.n_lon, k + self.n_lon + 1)
+        weights = ((1 - ty) * (1 - tx), (1 - ty) * tx, ty * (1 - tx), ty * tx)
+        values = flat[rows[0]] * weights[0]
+        for row, weight in zip(rows[1:], weights[1:]):
+            values += flat[row] * weight
+
+        found = inside.copy()
+        coast = np.flatnonzero(inside & ~self._complete_cells[i, j])
+        if len(coast):
+            total = np.zeros((len(coast), len(FIELDS)))
+            weight_sum = np.zeros((len(coast), 1))
+            for row, weight in zip(rows, weights):
+                corner = flat[row[coast]]
+                weight = weight[coast] * ~np.isnan(corner[:, ANNUAL:ANNUAL + 1])
+                total += np.nan_to_num(corner) * weight
+                weight_sum += weight
+            found[coast] = weight_sum[:, 0] > 0
+            with np.errstate(divide='ignore', invalid='ignore'):
+                values[coast] = total / weight_sum
+        values[~found] = np.nan
+        self.misses += int((~found).sum())
+        return values, found
+
+    def lookup(self, latitude, longitude):
+        """Monthly climate at a point: {'ghi': 12 values, 'annual_ghi',
+        'temperature': 12 values}, or None if the point is not covered."""
+        values = self.interpolate(latitude, longitude)
+        if values is None:
+            return None
+        return {
+            'ghi': [round(float(v), 3) for v in values[GHI]],
+            'annual_ghi': round(float(values[ANNUAL]), 3),
+            'temperature': [round(float(v), 2) for v in values[TEMPERATURE]]
+        }
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'source': self.meta.get('source'),
+            'points': self.n_lat * self.n_lon,
+            'lat_step': self.lat_step,
+            'lon_step': self.lon_step,
+            **self.bounds,
+            'lookups': self.lookups,
+            'misses': self.misses
+        }
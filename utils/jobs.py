@@ -0,0 +1,382 @@
+import copy
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from .report_pipeline import get_pipeline, STAGES
+
+FINISHED = ('succeeded', 'failed')
+# Finished jobs past their retention are pruned every PRUNE_EVERY new jobs
+PRUNE_EVERY = 100
+
+
+def _now():
+    return datetime.now().isoformat()
+
+
+def _retention_cutoff(retention):
+    return (datetime.now() - timedelta(seconds=retention)).isoformat()
+
+
+def _new_job(job_id, params):
+    return {
+        'id': job_id,
+        'status': 'queued',
+        'params': params,
+        'stages': {stage: {'status': 'pending', 'detail': None, 'updated_at': None} for stage in STAGES},
+        'result': None,
+        'error': None,
+        'report_id': None,
+        'created_at': _now(),
+        'updated_at': _now()
+    }
+
+
+def public_job(job):
+    """Job record as exposed by the /jobs endpoints (no form PII)."""
+    if job is None:
+        return None
+    return {
+        'id': job['id'],
+        'status': job['status'],
+        'stages': job['stages'],
+        'result': job['result'],
+        'error': job['error'],
+        'created_at': job['created_at'],
+        'updated_at': job['updated_at']
+    }
+
+
+def run_job(pipeline_config, store, job_id, params):
+    """Execute one job against `store`. Runs in a worker thread or process."""
+    store.update(job_id, status='running')
+
+    def on_stage(stage, status, detail=None):
+        store.set_stage(job_id, stage, status, detail)
+
+    try:
+        result = get_pipeline(pipeline_config).run(params, on_stage=on_stage, request_id=job_id, report_id=job_id)
+    except Exception as e:
+        store.update(job_id, status='failed', error=f'Server error: {str(e)}')
+        return
+
+    if result['success']:
+        store.update(
+            job_id,
+            status='succeeded',
+            result={'message': result['message'], 'summary': result['summary']},
+            report_id=result['report_id']
+        )
+    else:
+        store.update(job_id, status='failed', error=result['error'])
+
+
+class MemoryJobStore:
+    """Job records held in a mapping. Pass Manager proxies to share across processes.
+
+    Finished jobs (which still hold the form's name, email and address) are
+    dropped `retention` seconds after their last update; None keeps them.
+    """
+
+    def __init__(self, jobs=None, lock=None, retention=24 * 3600):
+        self._jobs = jobs if jobs is not None else {}
+        self._lock = lock if lock is not None else threading.Lock()
+        self.retention = retention
+        self._writes_since_prune = 0
+
+    def create(self, params):
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._jobs[job_id] = _new_job(job_id, params)
+            self._writes_since_prune += 1
+            if self.retention and self._writes_since_prune >= PRUNE_EVERY:
+                self._writes_since_prune = 0
+                self._prune()
+        return job_id
+
+    def _prune(self):
+        """Drop finished jobs past retention (caller holds the lock)."""
+        cutoff = _retention_cutoff(self.retention)
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job['status'] in FINISHED and job['updated_at'] < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return copy.deepcopy(self._jobs.get(job_id))
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(fields)
+            job['updated_at'] = _now()
+            self._jobs[job_id] = job
+
+    def set_stage(self, job_id, stage, status, detail=None):
+        with self._lock:
+            job = self._jobs[job_id]
+            job['stages'][stage] = {'status': status, 'detail': detail, 'updated_at': _now()}
+            job['updated_at'] = _now()
+            self._jobs[job_id] = job
+
+
+class SQLiteJobStore:
+    """Durable job records and queue in a single SQLite file.
+
+    Finished jobs are deleted `retention` seconds after their last update;
+    None keeps them.
+    """
+
+    def __init__(self, db_path, retention=24 * 3600):
+        self.db_path = db_path
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._writes_since_prune = 0
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    stages TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    report_id TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _row_to_job(row):
+        if row is None:
+            return None
+        job_id, status, params, stages, result, error, report_id, created_at, updated_at = row
+        return {
+            'id': job_id,
+            'status': status,
+            'params': json.loads(params),
+            'stages': json.loads(stages),
+            'result': json.loads(result) if result else None,
+            'error': error,
+            'report_id': report_id,
+            'created_at': created_at,
+            'updated_at': updated_at
+        }
+
+    def create(self, params):
+        job_id = uuid.uuid4().hex
+        job = _new_job(job_id, params)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, params, stages, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, job['status'], json.dumps(params), json.dumps(job['stages']), job['created_at'], job['updated_at'])
+            )
+            with self._lock:
+                self._writes_since_prune += 1
+                prune = self.retention and self._writes_since_prune >= PRUNE_EVERY
+                if prune:
+                    self._writes_since_prune = 0
+            if prune:
+                conn.execute(
+                    f"DELETE FROM jobs WHERE status IN ({', '.join('?' for _ in FINISHED)}) AND updated_at < ?",
+                    (*FINISHED, _retention_cutoff(self.retention))
+                )
+        return job_id
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, status, params, stages, result, error, report_id, created_at, updated_at FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        return self._row_to_job(row)
+
+    def update(self, job_id, **fields):
+        columns = []
+        values = []
+        for key, value in fields.items():
+            if key in ('result', 'params', 'stages'):
+                value = json.dumps(value) if value is not None else None
+            columns.append(f"{key} = ?")
+            values.append(value)
+        columns.append("updated_at = ?")
+        values.extend([_now(), job_id])
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {', '.join(columns)} WHERE id = ?", values)
+
+    def set_stage(self, job_id, stage, status, detail=None):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT stages FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return
+            stages = json.loads(row[0])
+            stages[stage] = {'status': status, 'detail': detail, 'updated_at': _now()}
+            conn.execute("UPDATE jobs SET stages = ?, updated_at = ? WHERE id = ?", (json.dumps(stages), _now(), job_id))
+            conn.execute("COMMIT")
+
+    def claim_next(self):
+        """Atomically move the oldest queued job to 'running' and return it."""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return None
+            conn.execute("UPDATE jobs SET status = 'running', updated_at = ? WHERE id = ?", (_now(), row[0]))
+            conn.execute("COMMIT")
+        return self.get(row[0])
+
+    def requeue_interrupted(self, stale_after=600):
+        """Put jobs that were running when their process died back on the queue.
+
+        Only jobs with no progress for `stale_after` seconds are touched, so
+        jobs still owned by other live processes are left alone.
+        """
+        cutoff = (datetime.now() - timedelta(seconds=stale_after)).isoformat()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'queued', updated_at = ? WHERE status = 'running' AND updated_at < ?",
+                (_now(), cutoff)
+            )
+            return cursor.rowcount
+
+
+class InProcessJobQueue:
+    """Runs jobs on a local thread or process pool. Jobs are lost on restart."""
+
+    def __init__(self, pipeline_config, max_workers=4, executor='thread', retention=24 * 3600):
+        self.pipeline_config = pipeline_config
+        if executor == 'process':
+            self._manager = multiprocessing.Manager()
+            self.store = MemoryJobStore(self._manager.dict(), self._manager.Lock(), retention=retention)
+            self._executor = ProcessPoolExecutor(max_workers=max_workers)
+        elif executor == 'thread':
+            self._manager = None
+            self.store = MemoryJobStore(retention=retention)
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='report-job')
+        else:
+            raise ValueError(f"Unknown job executor: {executor}")
+
+    def start(self):
+        """Nothing to resume: the pool starts with the first job."""
+
+    def submit(self, params):
+        job_id = self.store.create(params)
+        self._executor.submit(run_job, self.pipeline_config, self.store, job_id, params)
+        return job_id
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+        if self._manager is not None:
+            self._manager.shutdown()
+
+
+class SQLiteJobQueue:
+    """Durable queue: jobs are persisted in SQLite and drained by worker threads.
+
+    Several processes may share one database file; each job is claimed by
+    exactly one worker. Call start() when the process boots so jobs left
+    queued by a restart are drained. Jobs interrupted by a crash are re-run
+    once they have made no progress for `stale_after` seconds; the workers
+    look for them every `requeue_interval` seconds. Finished jobs are kept
+    for `retention` seconds.
+    """
+
+    def __init__(self, pipeline_config, db_path, max_workers=2, poll_interval=1.0, stale_after=600,
+                 requeue_interval=60.0, retention=24 * 3600):
+        self.pipeline_config = pipeline_config
+        self.store = SQLiteJobStore(db_path, retention=retention)
+        self.max_workers = max_workers
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.requeue_interval = requeue_interval
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self._requeue_lock = threading.Lock()
+        self._next_requeue = 0.0
+
+    def start(self):
+        with self._start_lock:
+            if self._threads:
+                return
+            self._requeue_stale()
+            for i in range(self.max_workers):
+                thread = threading.Thread(target=self._worker_loop, name=f'report-job-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _requeue_stale(self):
+        """Re-queue stale running jobs, at most once per requeue_interval."""
+        with self._requeue_lock:
+            if time.monotonic() < self._next_requeue:
+                return
+            self._next_requeue = time.monotonic() + self.requeue_interval
+        requeued = self.store.requeue_interrupted(self.stale_after)
+        if requeued:
+            print(f"[jobs] Re-queued {requeued} interrupted job(s)")
+            self._wakeup.set()
+
+    def _worker_loop(self):
+        while not self._stopping.is_set():
+            self._requeue_stale()
+            job = self.store.claim_next()
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            run_job(self.pipeline_config, self.store, job['id'], job['params'])
+
+    def submit(self, params):
+        self.start()
+        job_id = self.store.create(params)
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def shutdown(self, wait=True):
+        self._stopping.set()
+        self._wakeup.set()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+        self._threads = []
+
+
+def create_job_queue(pipeline_config, backend='thread', max_workers=4, db_path='temp/jobs.sqlite3',
+                     retention=24 * 3600):
+    """Build a job queue for `backend`: 'thread', 'process' or 'sqlite'."""
+    if backend == 'sqlite':
+        return SQLiteJobQueue(pipeline_config, db_path, max_workers=max_workers, retention=retention)
+    return InProcessJobQueue(pipeline_config, max_workers=max_workers, executor=backend, retention=retention)
@@ -0,0 +1,333 @@
+import os
+import random
+import smtplib
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from .rate_limit import TokenBucket
+
+
+def is_transient(error):
+    """Whether an SMTP failure is worth retrying: 4xx replies, dropped or
+    refused connections, timeouts. Authentication failures count as
+    transient so queued mail waits for fixed credentials."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return True
+    if isinstance(error, smtplib.SMTPConnectError):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, (smtplib.SMTPServerDisconnected, OSError))
+
+
+class MailQueue:
+    """Outbound mail persisted in SQLite, shared by every process using `db_path`.
+
+    Messages move queued → sending → sent. Failed sends go back to queued
+    with a later next_attempt_at, or into the mail_dead_letters table once
+    they fail permanently or run out of attempts. Delivery is at-least-once:
+    a message claimed by a process that died mid-send is re-queued after
+    `stale_after` seconds.
+    """
+
+    def __init__(self, db_path='temp/mail_queue.sqlite3', keep_sent=7 * 24 * 3600):
+        self.db_path = db_path
+        self.keep_sent = keep_sent
+        self._lock = threading.Lock()
+        self._writes_since_prune = 0
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id TEXT PRIMARY KEY,
+                    sender TEXT NOT NULL,
+                    recipient TEXT NOT NULL,
+                    message TEXT NOT NULL,
+                    ref TEXT,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    last_error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    sent_at REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS mail_dead_letters (
+                    id TEXT PRIMARY KEY,
+                    sender TEXT NOT NULL,
+                    recipient TEXT NOT NULL,
+                    message TEXT NOT NULL,
+                    ref TEXT,
+                    attempts INTEGER NOT NULL,
+                    last_error TEXT,
+                    created_at REAL NOT NULL,
+                    failed_at REAL NOT NULL
+                )
+            """)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, sender, recipient, message, ref=None):
+        """Queue a MIME message (a string, so smtplib normalises line endings
+        when sending it) for delivery. Returns its id."""
+        message_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO outbox (id, sender, recipient, message, ref, status, next_attempt_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, 'queued', ?, ?, ?)",
+                (message_id, sender, recipient, message, ref, now, now, now)
+            )
+        return message_id
+
+    def claim_next(self):
+        """Atomically move the next due message to 'sending' and return it."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id, sender, recipient, message, ref, attempts FROM outbox "
+                "WHERE status = 'queued' AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return None
+            conn.execute("UPDATE outbox SET status = 'sending', updated_at = ? WHERE id = ?", (now, row[0]))
+            conn.execute("COMMIT")
+        message_id, sender, recipient, message, ref, attempts = row
+        return {'id': message_id, 'sender': sender, 'recipient': recipient, 'message': message,
+                'ref': ref, 'attempts': attempts}
+
+    def mark_sent(self, message_id):
+        now = time.time()
+        with self._connect() as conn:
+            # The body is no longer needed once delivered
+            conn.execute(
+                "UPDATE outbox SET status = 'sent', attempts = attempts + 1, message = '', last_error = NULL, "
+                "sent_at = ?, updated_at = ? WHERE id = ?",
+                (now, now, message_id)
+            )
+            with self._lock:
+                self._writes_since_prune += 1
+                prune = self._writes_since_prune >= 100
+                if prune:
+                    self._writes_since_prune = 0
+            if prune:
+                conn.execute("DELETE FROM outbox WHERE status = 'sent' AND sent_at < ?", (now - self.keep_sent,))
+
+    def mark_retry(self, message_id, error, delay):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE outbox SET status = 'queued', attempts = attempts + 1, next_attempt_at = ?, last_error = ?, "
+                "updated_at = ? WHERE id = ?",
+                (now + delay, error, now, message_id)
+            )
+
+    def release(self, message_id):
+        """Put a claimed message back untouched (e.g. on shutdown)."""
+        with self._connect() as conn:
+            conn.execute("UPDATE outbox SET status = 'queued', updated_at = ? WHERE id = ?", (time.time(), message_id))
+
+    def mark_dead(self, message_id, error):
+        """Move a message to the dead-letter table."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT OR REPLACE INTO mail_dead_letters "
+                "(id, sender, recipient, message, ref, attempts, last_error, created_at, failed_at) "
+                "SELECT id, sender, recipient, message, ref, attempts + 1, ?, created_at, ? FROM outbox WHERE id = ?",
+                (error, now, message_id)
+            )
+            conn.execute("DELETE FROM outbox WHERE id = ?", (message_id,))
+            conn.execute("COMMIT")
+
+    def requeue_stale(self, stale_after=300):
+        """Re-queue messages left in 'sending' by a process that died."""
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE outbox SET status = 'queued', updated_at = ? WHERE status = 'sending' AND updated_at < ?",
+                (now, now - stale_after)
+            )
+            return cursor.rowcount
+
+    def dead_letters(self, limit=100):
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, recipient, ref, attempts, last_error, created_at, failed_at FROM mail_dead_letters "
+                "ORDER BY failed_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        keys = ('id', 'recipient', 'ref', 'attempts', 'last_error', 'created_at', 'failed_at')
+        return [dict(zip(keys, row)) for row in rows]
+
+    def retry_dead(self, message_id=None):
+        """Move one dead letter (or all of them) back to the outbox. Returns the count."""
+        now = time.time()
+        where, params = ("WHERE id = ?", (message_id,)) if message_id else ("", ())
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            cursor = conn.execute(
+                "INSERT OR REPLACE INTO outbox "
+                "(id, sender, recipient, message, ref, status, attempts, next_attempt_at, last_error, created_at, updated_at) "
+                f"SELECT id, sender, recipient, message, ref, 'queued', 0, ?, last_error, created_at, ? FROM mail_dead_letters {where}",
+                (now, now) + params
+            )
+            count = cursor.rowcount
+            conn.execute(f"DELETE FROM mail_dead_letters {where}", params)
+            conn.execute("COMMIT")
+        return count
+
+    def stats(self):
+        with self._connect() as conn:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+            dead = conn.execute("SELECT COUNT(*) FROM mail_dead_letters").fetchone()[0]
+        return {
+            'queued': counts.get('queued', 0),
+            'sending': counts.get('sending', 0),
+            'sent': counts.get('sent', 0),
+            'dead': dead
+        }
+
+
+class MailSender:
+    """Background threads that drain a MailQueue over reused SMTP connections.
+
+    - each thread keeps one SMTPSession (from `session_factory`) open
+      between messages
+    - sends are limited to `rate_per_minute` per process, bursts of `burst`
+    - transient failures retry with exponential backoff and jitter, up to
+      `max_attempts`; permanent failures go straight to the dead letters
+    """
+
+    def __init__(self, queue, session_factory, workers=1, rate_per_minute=20, burst=5, max_attempts=6,
+                 backoff_base=30, backoff_max=3600, poll_interval=1.0):
+        self.queue = queue
+        self.session_factory = session_factory
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.poll_interval = poll_interval
+        self.bucket = TokenBucket(rate_per_minute / 60.0, burst)
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._sessions = []
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {'sent': 0, 'retried': 0, 'dead': 0}
+
+    def start(self):
+        with self._start_lock:
+            if self._threads:
+                return
+            requeued = self.queue.requeue_stale()
+            if requeued:
+                print(f"[mail] Re-queued {requeued} interrupted message(s)")
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker_loop, name=f'mail-sender-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def wake(self):
+        self._wakeup.set()
+
+    def _count(self, stat):
+        with self._stats_lock:
+            self._stats[stat] += 1
+
+    def _new_session(self):
+        session = self.session_factory()
+        with self._stats_lock:
+            self._sessions.append(session)
+        return session
+
+    def _backoff(self, attempts):
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (attempts - 1)))
+        return random.uniform(delay / 2, delay)
+
+    def deliver(self, session, item):
+        """Send one claimed message and record the outcome. Returns True if sent."""
+        try:
+            session.send(item['sender'], [item['recipient']], item['message'])
+        except Exception as e:
+            attempts = item['attempts'] + 1
+            error = f'{type(e).__name__}: {str(e)}'
+            if is_transient(e) and attempts < self.max_attempts:
+                delay = self._backoff(attempts)
+                self.queue.mark_retry(item['id'], error, delay)
+                self._count('retried')
+                print(f"[mail] {item['id']} to {item['recipient']} failed ({error}), retry {attempts} in {delay:.0f}s")
+            else:
+                self.queue.mark_dead(item['id'], error)
+                self._count('dead')
+                print(f"[mail] {item['id']} to {item['recipient']} dead-lettered after {attempts} attempt(s): {error}")
+            return False
+        self.queue.mark_sent(item['id'])
+        self._count('sent')
+        return True
+
+    def _worker_loop(self):
+        session = self._new_session()
+        try:
+            while not self._stopping.is_set():
+                item = self.queue.claim_next()
+                if item is None:
+                    self._wakeup.wait(self.poll_interval)
+                    self._wakeup.clear()
+                    continue
+                if not self.bucket.acquire(stop_event=self._stopping):
+                    self.queue.release(item['id'])
+                    break
+                self.deliver(session, item)
+        finally:
+            session.close()
+
+    def drain(self):
+        """Send every message that is due now on the calling thread (rate
+        limited). Returns the number sent."""
+        session = self._new_session()
+        sent = 0
+        try:
+            while True:
+                item = self.queue.claim_next()
+                if item is None:
+                    return sent
+                self.bucket.acquire()
+                sent += self.deliver(session, item)
+        finally:
+            session.close()
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+            stats['connections_opened'] = sum(s.connections_opened for s in self._sessions)
+        return stats
+
+    def shutdown(self, wait=True):
+        self._stopping.set()
+        self._wakeup.set()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+        self._threads = []
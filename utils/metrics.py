@@ -0,0 +1,259 @@
+import contextvars
+import glob
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 60.0)
+
+# Request id of the report being processed on this thread/task, so nested
+# stages (e.g. chart rendering inside the PDF build) are tagged correctly.
+current_request_id = contextvars.ContextVar('current_request_id', default=None)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return {'type': 'counter', 'values': [[list(k), v] for k, v in self._values.items()]}
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry['counts'][i] += 1
+            entry['sum'] += value
+            entry['count'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'type': 'histogram',
+                'buckets': list(self.buckets),
+                'values': [[list(k), {'counts': list(v['counts']), 'sum': v['sum'], 'count': v['count']}]
+                           for k, v in self._values.items()]
+            }
+
+
+class MetricsRegistry:
+    """Minimal Prometheus text-format registry.
+
+    With `multiprocess_dir` set (e.g. one directory shared by all gunicorn
+    workers) each process writes its snapshot there and render() sums the
+    snapshots of every process, so any worker can answer a scrape.
+    """
+
+    def __init__(self, multiprocess_dir=None, flush_interval=1.0):
+        self.multiprocess_dir = multiprocess_dir
+        self.flush_interval = flush_interval
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def register_collector(self, collector):
+        """`collector()` returns extra exposition lines (e.g. gauges read at scrape time)."""
+        self._collectors.append(collector)
+
+    def configure(self, multiprocess_dir=None):
+        self.multiprocess_dir = multiprocess_dir
+        if multiprocess_dir:
+            os.makedirs(multiprocess_dir, exist_ok=True)
+
+    def _snapshot(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {m.name: dict(m.snapshot(), help=m.help_text, labelnames=list(m.labelnames)) for m in metrics}
+
+    def maybe_flush(self, force=False):
+        if not self.multiprocess_dir:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_flush < self.flush_interval:
+            return
+        self._last_flush = now
+        path = os.path.join(self.multiprocess_dir, f'metrics_{os.getpid()}.json')
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def _merged_snapshots(self):
+        if not self.multiprocess_dir:
+            return [self._snapshot()]
+        self.maybe_flush(force=True)
+        snapshots = []
+        for path in glob.glob(os.path.join(self.multiprocess_dir, 'metrics_*.json')):
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render(self):
+        merged = {}
+        for snapshot in self._merged_snapshots():
+            for name, metric in snapshot.items():
+                target = merged.setdefault(name, {
+                    'type': metric['type'], 'help': metric['help'], 'labelnames': metric['labelnames'],
+                    'buckets': metric.get('buckets'), 'values': {}
+                })
+                for labels, value in metric['values']:
+                    key = tuple(labels)
+                    if metric['type'] == 'counter':
+                        target['values'][key] = target['values'].get(key, 0) + value
+                    else:
+                        entry = target['values'].setdefault(key, {'counts': [0] * len(metric['buckets']), 'sum': 0.0, 'count': 0})
+                        entry['counts'] = [a + b for a, b in zip(entry['counts'], value['counts'])]
+                        entry['sum'] += value['sum']
+                        entry['count'] += value['count']
+
+        lines = []
+        for name in sorted(merged):
+            metric = merged[name]
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['type']}")
+            for key, value in sorted(metric['values'].items()):
+                if metric['type'] == 'counter':
+                    lines.append(f"{name}{_label_text(metric['labelnames'], key)} {value}")
+                    continue
+                labels = _label_text(metric['labelnames'], key)
+                for bound, count in zip(metric['buckets'], value['counts']):
+                    bucket_labels = _label_text(metric['labelnames'], key, 'le="%s"' % bound)
+                    lines.append(f"{name}_bucket{bucket_labels} {count}")
+                inf_labels = _label_text(metric['labelnames'], key, 'le="+Inf"')
+                lines.append(f"{name}_bucket{inf_labels} {value['count']}")
+                lines.append(f"{name}_sum{labels} {value['sum']}")
+                lines.append(f"{name}_count{labels} {value['count']}")
+
+        for collector in self._collectors:
+            try:
+                lines.extend(collector())
+            except Exception as e:
+                lines.append(f"# collector error: {_escape(e)}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'solar_report_stage_duration_seconds',
+    'Time spent in each report pipeline stage',
+    ('stage', 'outcome')
+)
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'solar_http_request_duration_seconds',
+    'Flask request latency by endpoint',
+    ('endpoint', 'method', 'status')
+)
+QUOTE_REQUESTS = REGISTRY.counter(
+    'solar_quote_requests_total',
+    'Instant quotes by whether they met the latency SLO',
+    ('slo',)
+)
+AI_CALL_SECONDS = REGISTRY.histogram(
+    'solar_ai_call_duration_seconds',
+    'OpenAI chat completion latency',
+    ('mode', 'kind', 'outcome')
+)
+AI_TOKENS = REGISTRY.counter(
+    'solar_ai_tokens_total',
+    'OpenAI tokens used',
+    ('kind', 'type')
+)
+
+
+def log_event(event, **fields):
+    """One JSON line per event, so output from many workers stays parseable."""
+    record = {'ts': round(time.time(), 3), 'event': event, 'pid': os.getpid()}
+    record.update(fields)
+    print(json.dumps(record, default=str), flush=True)
+
+
+def make_request_id(header=None):
+    """The caller's X-Request-ID if it is a plain token (it ends up in log
+    lines and profile file names), else a new id."""
+    if header and re.fullmatch(r'[A-Za-z0-9_-]{1,64}', header):
+        return header
+    return uuid.uuid4().hex
+
+
+def record_stage(stage, outcome, duration, request_id=None):
+    """Record one finished stage: histogram sample plus a structured log line."""
+    STAGE_SECONDS.observe(duration, stage=stage, outcome=outcome)
+    log_event('stage', request_id=request_id or current_request_id.get(), stage=stage, outcome=outcome,
+              duration_ms=round(duration * 1000, 2))
+    REGISTRY.maybe_flush()
+
+
+@contextmanager
+def stage_timer(stage, request_id=None):
+    """Time a pipeline stage into STAGE_SECONDS and log it.
+
+    The `outcome` label is 'ok' unless the block raises, or sets
+    `timing['outcome']` itself (e.g. 'failed', 'skipped').
+    """
+    timing = {'outcome': 'ok'}
+    start = time.perf_counter()
+    try:
+        yield timing
+    except Exception:
+        timing['outcome'] = 'error'
+        raise
+    finally:
+        record_stage(stage, timing['outcome'], time.perf_counter() - start, request_id)
@@ -1,62 +1,202 @@
 import requests
 
+from .async_http import AsyncHttpError, default_async_http_client
+from .http_client import CircuitOpenError, default_http_client
+
+SOLAR_API_URL = "https://solar.googleapis.com/v1/buildingInsights:findClosest"
+
 class NasaPowerAPI:
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, cache=None, http_client=None, irradiance_grid=None, grid_fallback=True,
+                 solar_api_url=None, async_http_client=None):
         self.api_key = api_key
-        self.solar_api_url = "https://solar.googleapis.com/v1/buildingInsights:findClosest"
+        self.solar_api_url = solar_api_url or SOLAR_API_URL
+        # Optional SolarResponseCache; nearby lookups reuse the raw solarPotential
+        self.cache = cache
+        self.http = http_client or default_http_client()
+        # Used by get_solar_data_async (ASGI mode); httpx is only imported then
+        self.async_http = async_http_client or default_async_http_client()
+        # Optional IrradianceGrid for instant estimates; with `grid_fallback`
+        # it also answers when the Solar API cannot
+        self.irradiance_grid = irradiance_grid
+        self.grid_fallback = grid_fallback
     
     def get_solar_data(self, latitude, longitude):
         """Fetch solar data from Google Solar API"""
         try:
-            if not self.api_key:
-                return {
-                    'success': False,
-                    'error': 'Google API key required. Set GOOGLE_API_KEY in .env',
-                    'data': None
-                }
+            local = self._local_solar_data(latitude, longitude)
+            if local is not None:
+                return local
             
             print(f"      Fetching from Google Solar API...")
             
-            params = {
-                'location.latitude': latitude,
-                'location.longitude': longitude,
-                'requiredQuality': 'LOW',
-                'key': self.api_key
-            }
-            
-            response = requests.get(self.solar_api_url, params=params, timeout=30)
-            
-            if response.status_code == 400:
-                return {
-                    'success': False,
-                    'error': 'No building data at this location. Try a different address or enter exact building coordinates from Google Maps.',
-                    'data': None
-                }
-            
-            if response.status_code == 403:
-                return {
-                    'success': False,
-                    'error': 'Google API access denied. Enable Solar API and billing at console.cloud.google.com',
-                    'data': None
-                }
-            
-            if response.status_code != 200:
-                return {
-                    'success': False,
-                    'error': f'Google API error ({response.status_code})',
-                    'data': None
-                }
-            
-            data = response.json()
-            solar_potential = data.get('solarPotential', {})
-            
-            if not solar_potential:
-                return {
-                    'success': False,
-                    'error': 'No solar data available for this location',
-                    'data': None
-                }
+            response = self.http.get(self.solar_api_url, params=self._solar_params(latitude, longitude), timeout=30)
+            return self._solar_result(latitude, longitude, response)
             
+        except Exception as e:
+            return self._error_result(latitude, longitude, e)
+
+    async def get_solar_data_async(self, latitude, longitude):
+        """get_solar_data() for coroutines, over the async HTTP client."""
+        try:
+            local = self._local_solar_data(latitude, longitude)
+            if local is not None:
+                return local
+
+            print(f"      Fetching from Google Solar API...")
+
+            response = await self.async_http.get(self.solar_api_url, params=self._solar_params(latitude, longitude),
+                                                 timeout=30)
+            return self._solar_result(latitude, longitude, response)
+
+        except Exception as e:
+            return self._error_result(latitude, longitude, e)
+
+    def _local_solar_data(self, latitude, longitude):
+        """The answer when no Solar API call is needed (no key, or a cached
+        building nearby), else None."""
+        if not self.api_key:
+            return self._fallback(latitude, longitude, 'Google API key required. Set GOOGLE_API_KEY in .env')
+        
+        if self.cache is not None:
+            cached = self.cache.get(latitude, longitude)
+            if cached is not None:
+                print(f"      Solar cache hit: {cached['name']} ({cached['distance_m']:.1f} m)")
+                return self._process_solar_potential(cached['solar_potential'], latitude, longitude)
+        return None
+
+    def _solar_params(self, latitude, longitude):
+        return {
+            'location.latitude': latitude,
+            'location.longitude': longitude,
+            'requiredQuality': 'LOW',
+            'key': self.api_key
+        }
+
+    def _solar_result(self, latitude, longitude, response):
+        """Solar data for a buildingInsights response (requests or httpx)."""
+        if response.status_code == 400:
+            return self._fallback(
+                latitude, longitude,
+                'No building data at this location. Try a different address or enter exact building coordinates from Google Maps.'
+            )
+        
+        if response.status_code == 403:
+            return self._fallback(
+                latitude, longitude,
+                'Google API access denied. Enable Solar API and billing at console.cloud.google.com'
+            )
+        
+        if response.status_code != 200:
+            return self._fallback(latitude, longitude, f'Google API error ({response.status_code})')
+        
+        data = response.json()
+        solar_potential = data.get('solarPotential', {})
+        
+        if not solar_potential:
+            return self._fallback(latitude, longitude, 'No solar data available for this location')
+        
+        result = self._process_solar_potential(solar_potential, latitude, longitude)
+        if result['success'] and self.cache is not None:
+            center = data.get('center', {})
+            self.cache.set(
+                data.get('name') or f"{latitude:.6f},{longitude:.6f}",
+                solar_potential,
+                latitude, longitude,
+                center.get('latitude'), center.get('longitude')
+            )
+        return result
+
+    def _error_result(self, latitude, longitude, e):
+        if isinstance(e, (requests.RequestException, AsyncHttpError, CircuitOpenError)):
+            return self._fallback(latitude, longitude, f'Google Solar API unavailable: {str(e)}')
+        if isinstance(e, ValueError):
+            return {
+                'success': False,
+                'error': f'Data conversion error: {str(e)}',
+                'data': None
+            }
+        import traceback
+        print(traceback.format_exc())
+        return {
+            'success': False,
+            'error': f'Unexpected error: {str(e)}',
+            'data': None
+        }
+    
+    def _fallback(self, latitude, longitude, error):
+        """Grid estimate when the Solar API has no answer, else the error"""
+        if self.grid_fallback and self.irradiance_grid is not None:
+            estimate = self.estimate_from_grid(latitude, longitude)
+            if estimate['success']:
+                print(f"      Solar API: {error}")
+                print(f"      → Using irradiance grid estimate instead")
+                estimate['data']['fallback_reason'] = error
+                return estimate
+        return {
+            'success': False,
+            'error': error,
+            'data': None
+        }
+    
+    def estimate_from_grid(self, latitude, longitude, tilt=35.0, azimuth=None):
+        """Preliminary solar data from the precomputed irradiance grid, with
+        no network call: a notional roof at `tilt`, facing the equator unless
+        `azimuth` is given. Roof size and panel count are unknown (None)."""
+        if self.irradiance_grid is None:
+            return {'success': False, 'error': 'No irradiance grid configured', 'data': None}
+        climate = self.irradiance_grid.lookup(latitude, longitude)
+        if climate is None:
+            return {'success': False, 'error': 'Location is outside the irradiance grid', 'data': None}
+
+        from .production_model import DAYS_IN_MONTH, MONTHS, simulate
+
+        if azimuth is None:
+            azimuth = 180.0 if latitude >= 0 else 0.0
+        result = simulate(latitude, longitude, tilt=tilt, azimuth=azimuth,
+                          ghi=climate['ghi'], temperature=climate['temperature'])
+        poa = result['monthly_poa'][0]
+        monthly_production = []
+        for i, month in enumerate(MONTHS):
+            monthly_production.append({
+                'month': month,
+                'solar_irradiance': round(float(poa[i]), 2),
+                'production_kwh': round(float(result['monthly_kwh'][0, i]), 2),
+                'clear_sky_irradiance': round(float(result['monthly_clear_sky_poa'][0, i]), 2),
+                'temperature': round(float(climate['temperature'][i]), 1)
+            })
+        # Peak sun hours on the panel plane, averaged over the year
+        annual_avg_kwh_m2_day = float((poa * DAYS_IN_MONTH).sum() / 365.0)
+
+        return {
+            'success': True,
+            'error': None,
+            'data': {
+                'monthly': monthly_production,
+                'typical_day_profile': [[round(float(kw), 4) for kw in day] for day in result['hourly_kw'][0]],
+                'annual_average_kwh_m2_day': round(annual_avg_kwh_m2_day, 2),
+                'annual_total_kwh_m2': round(annual_avg_kwh_m2_day * 365, 2),
+                # Simulated AC output of 1 kW of panels on this roof
+                'annual_yield_kwh_per_kw': round(float(result['annual_kwh'][0]), 1),
+                'annual_horizontal_kwh_m2_day': climate['annual_ghi'],
+                'yearly_energy_dc_kwh': None,
+                'max_array_panels_count': None,
+                'max_array_area_meters2': None,
+                'max_sunshine_hours_per_year': None,
+                'panels_count': None,
+                'location': {
+                    'latitude': latitude,
+                    'longitude': longitude
+                },
+                'best_month': max(monthly_production, key=lambda x: x['production_kwh']),
+                'worst_month': min(monthly_production, key=lambda x: x['production_kwh']),
+                'source': 'irradiance_grid',
+                'preliminary': True
+            }
+        }
+    
+    def _process_solar_potential(self, solar_potential, latitude, longitude):
+        """Turn a raw solarPotential payload into the report's solar data"""
+        try:
             # CRITICAL FIX: Convert ALL values to float
             max_array_panels_count = int(solar_potential.get('maxArrayPanelsCount', 0))
             max_array_area_meters2 = float(solar_potential.get('maxArrayAreaMeters2', 0))
@@ -82,28 +222,36 @@ class NasaPowerAPI:
                     'data': None
                 }
             
-            # Generate monthly data
-            months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-            
-            # UK solar distribution (winter low, summer high)
-            uk_monthly_factors = [0.5, 0.7, 1.0, 1.3, 1.5, 1.6, 1.5, 1.3, 1.1, 0.8, 0.5, 0.4]
-            total_factor = sum(uk_monthly_factors)
-            
+            # Monthly breakdown: simulate each roof segment of the best
+            # configuration and spread the yearly estimate over the months
+            from .production_model import SYSTEM_LOSSES, roof_monthly_profile
+
+            segments = self._roof_segments(best_config, latitude)
+            profile = roof_monthly_profile(
+                latitude, longitude, segments,
+                panel_capacity_watts=float(solar_potential.get('panelCapacityWatts', 400)),
+                yearly_energy_kwh=yearly_energy_dc_kwh
+            )
+
             monthly_production = []
-            for i, month in enumerate(months):
-                month_kwh = (yearly_energy_dc_kwh * uk_monthly_factors[i]) / total_factor
-                solar_irradiance = month_kwh / max_array_area_meters2 / 30.0
-                
+            for i, month in enumerate(profile['months']):
                 monthly_production.append({
                     'month': month,
-                    'solar_irradiance': round(solar_irradiance, 2),
-                    'production_kwh': round(month_kwh, 2),
-                    'clear_sky_irradiance': 0,
-                    'temperature': 0
+                    'solar_irradiance': round(float(profile['poa'][i]), 2),
+                    'production_kwh': round(float(profile['monthly_kwh'][i]), 2),
+                    'clear_sky_irradiance': round(float(profile['clear_sky_poa'][i]), 2),
+                    'temperature': round(float(profile['temperature'][i]), 1)
                 })
+            # Output of 1 kW of these panels through the average day of each
+            # month, for self-consumption and battery sizing
+            typical_day_profile = [[round(float(kw), 4) for kw in day] for day in profile['typical_day_kw']]
             
-            # Calculate peak sun hours (kWh/m²/day)
-            annual_avg_kwh_m2_day = yearly_energy_dc_kwh / max_array_area_meters2 / 365.0
+            # Peak sun hours: daily yield per installed kW (kWh/kWp/day
+            # equals kWh/m²/day at the 1 kW/m² rating), the same quantity as
+            # estimate_from_grid(), net of the shading Google has priced in
+            panel_capacity_kw = float(solar_potential.get('panelCapacityWatts', 400)) / 1000.0
+            dc_yield_kwh_per_kw = yearly_energy_dc_kwh / (max(panels_count, 1) * panel_capacity_kw)
+            annual_avg_kwh_m2_day = dc_yield_kwh_per_kw / 365.0
             
             print(f"      → Panels: {max_array_panels_count}")
             print(f"      → Roof: {max_array_area_meters2:.1f} m²")
@@ -115,8 +263,11 @@ class NasaPowerAPI:
                 'error': None,
                 'data': {
                     'monthly': monthly_production,
+                    'typical_day_profile': typical_day_profile,
                     'annual_average_kwh_m2_day': round(annual_avg_kwh_m2_day, 2),
                     'annual_total_kwh_m2': round(annual_avg_kwh_m2_day * 365, 2),
+                    # AC output of 1 kW of panels on this roof
+                    'annual_yield_kwh_per_kw': round(dc_yield_kwh_per_kw * (1 - SYSTEM_LOSSES), 1),
                     'yearly_energy_dc_kwh': round(yearly_energy_dc_kwh, 2),
                     'max_array_panels_count': max_array_panels_count,
                     'max_array_area_meters2': round(max_array_area_meters2, 2),
@@ -127,7 +278,9 @@ class NasaPowerAPI:
                         'longitude': longitude
                     },
                     'best_month': max(monthly_production, key=lambda x: x['production_kwh']),
-                    'worst_month': min(monthly_production, key=lambda x: x['production_kwh'])
+                    'worst_month': min(monthly_production, key=lambda x: x['production_kwh']),
+                    'source': 'google_solar',
+                    'preliminary': False
                 }
             }
             
@@ -146,6 +299,28 @@ class NasaPowerAPI:
                 'data': None
             }
     
+    @staticmethod
+    def _roof_segments(config, latitude):
+        """Orientation and panel count of each roof segment in a panel config.
+        Without segment data, assume one equator-facing roof at 35°."""
+        segments = []
+        for summary in config.get('roofSegmentSummaries') or []:
+            panels = int(summary.get('panelsCount', 0))
+            if panels > 0:
+                segments.append({
+                    'pitch': float(summary.get('pitchDegrees', 35.0)),
+                    'azimuth': float(summary.get('azimuthDegrees', 180.0)),
+                    'panels': panels,
+                    'yearly_kwh': float(summary.get('yearlyEnergyDcKwh', 0))
+                })
+        if not segments:
+            segments.append({
+                'pitch': 35.0,
+                'azimuth': 180.0 if latitude >= 0 else 0.0,
+                'panels': max(int(config.get('panelsCount', 0)), 1)
+            })
+        return segments
+
     def get_peak_sun_hours(self, latitude, longitude):
         solar_data = self.get_solar_data(latitude, longitude)
         if solar_data['success']:
@@ -1,44 +1,177 @@
+from reportlab import rl_config
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image, PageBreak
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
-import matplotlib.pyplot as plt
-import matplotlib
-matplotlib.use('Agg')
-from datetime import datetime
+from reportlab.pdfbase import pdfmetrics
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
+from reportlab.lib.enums import TA_CENTER
+from datetime import date
 import io
+import threading
+from .metrics import stage_timer
+from .charts import default_chart_renderer
 
 SOLAR_BLUE = colors.HexColor('#1E3A8A')
 SOLAR_ORANGE = colors.HexColor('#F59E0B')
 LIGHT_GRAY = colors.HexColor('#F3F4F6')
 DARK_GRAY = colors.HexColor('#374151')
+FONTS = ('Helvetica', 'Helvetica-Bold')
+DISCLAIMER = "This report is for informational purposes only. Consult certified solar professionals for accurate assessments."
 
-class PDFReportGenerator:
-    def __init__(self, filename):
-        self.filename = filename
-        self.doc = SimpleDocTemplate(filename, pagesize=A4, rightMargin=60, leftMargin=60, topMargin=100, bottomMargin=60)
+
+class ReportTemplate:
+    """Everything in the report layout that is the same for every customer.
+
+    Paragraph styles, table styles, font metrics, the parsed markup of the
+    fixed headings and labels, and the page header are built once per
+    process (see report_template()); a PDFReportGenerator only binds the
+    customer's numbers to them. Nothing here is modified while a report is
+    built, so one template is shared by every report thread.
+    """
+
+    HEADER_FORM = 'report-header'
+
+    def __init__(self):
         self.styles = getSampleStyleSheet()
-        self.story = []
-        self._create_styles()
-    
-    def _create_styles(self):
         self.styles.add(ParagraphStyle(name='CustomHeading', fontSize=18, textColor=SOLAR_BLUE, spaceAfter=12, spaceBefore=20, fontName='Helvetica-Bold'))
         self.styles.add(ParagraphStyle(name='CustomSubHeading', fontSize=14, textColor=SOLAR_BLUE, spaceAfter=5, spaceBefore=5, fontName='Helvetica-Bold'))
         self.styles.add(ParagraphStyle(name='CustomBody', fontSize=11, textColor=DARK_GRAY, spaceAfter=12, fontName='Helvetica', leading=16))
         self.styles.add(ParagraphStyle(name='CustomSmall', fontSize=9, textColor=colors.gray, alignment=TA_CENTER, fontName='Helvetica'))
+        # Load the font metrics now rather than in the first report
+        for font in FONTS:
+            pdfmetrics.getFont(font)
+        self.table_styles = self._table_styles()
+        self._frags = {}
+        self._frags_lock = threading.Lock()
+
+    @staticmethod
+    def _table_styles():
+        return {
+            'kpis': TableStyle([
+                ('BACKGROUND', (0,0), (-1,0), LIGHT_GRAY),
+                ('ALIGN', (0,0), (-1,-1), 'CENTER'),
+                ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
+                ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+                ('FONTSIZE', (0,0), (-1,0), 16),
+                ('TEXTCOLOR', (0,0), (-1,0), SOLAR_BLUE),
+                ('TOPPADDING', (0,0), (-1,0), 15),
+                ('BOTTOMPADDING', (0,0), (-1,0), 5),
+                ('BOTTOMPADDING', (0,1), (-1,1), 10),
+                ('BOX', (0,0), (-1,-1), 1, colors.lightgrey),
+                ('GRID', (0,0), (-1,-1), 0.5, colors.lightgrey)
+            ]),
+            'system': TableStyle([
+                ('BACKGROUND', (0,0), (1,0), SOLAR_BLUE),
+                ('BACKGROUND', (0,6), (1,6), SOLAR_BLUE),
+                ('TEXTCOLOR', (0,0), (1,0), colors.white),
+                ('TEXTCOLOR', (0,6), (1,6), colors.white),
+                ('FONTNAME', (0,0), (1,0), 'Helvetica-Bold'),
+                ('FONTNAME', (0,6), (1,6), 'Helvetica-Bold'),
+                ('FONTNAME', (0,1), (0,5), 'Helvetica'),
+                ('FONTNAME', (0,7), (0,9), 'Helvetica'),
+                ('FONTSIZE', (0,0), (-1,-1), 10),
+                ('ALIGN', (1,1), (1,-1), 'RIGHT'), # Align values right
+                ('ALIGN', (0,0), (-1,-1), 'LEFT'),
+                ('BOTTOMPADDING', (0,0), (-1,-1), 6),
+                ('TOPPADDING', (0,0), (-1,-1), 6),
+                ('GRID', (0,0), (-1,-1), 0.5, colors.lightgrey)
+            ]),
+            'financial': TableStyle([
+                ('BACKGROUND', (0,0), (1,0), SOLAR_ORANGE),
+                ('TEXTCOLOR', (0,0), (1,0), colors.white),
+                ('FONTNAME', (0,0), (1,0), 'Helvetica-Bold'),
+                ('FONTNAME', (0,6), (1,7), 'Helvetica-Bold'), # Highlight Net Profit and ROI
+                ('FONTSIZE', (0,0), (-1,-1), 10),
+                ('ALIGN', (1,1), (1,-1), 'RIGHT'), # Align values right
+                ('ALIGN', (0,0), (-1,-1), 'LEFT'),
+                ('BOTTOMPADDING', (0,0), (-1,-1), 6),
+                ('TOPPADDING', (0,0), (-1,-1), 6),
+                ('GRID', (0,0), (-1,-1), 0.5, colors.lightgrey)
+            ]),
+            'columns': TableStyle([
+                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+                ('LEFTPADDING', (1, 0), (1, 0), 10), # Space between columns
+                ('RIGHTPADDING', (0, 0), (0, 0), 0),
+                ('LEFTPADDING', (0, 0), (0, 0), 0),
+            ]),
+            'battery': TableStyle([
+                ('BACKGROUND', (0,0), (-1,0), SOLAR_BLUE),
+                ('TEXTCOLOR', (0,0), (-1,0), colors.white),
+                ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+                ('FONTSIZE', (0,0), (-1,-1), 9),
+                ('ALIGN', (1,0), (-1,-1), 'RIGHT'),
+                ('BOTTOMPADDING', (0,0), (-1,-1), 5),
+                ('TOPPADDING', (0,0), (-1,-1), 5),
+                ('GRID', (0,0), (-1,-1), 0.5, colors.lightgrey)
+            ]),
+            'uncertainty': TableStyle([
+                ('BACKGROUND', (0,0), (-1,0), SOLAR_ORANGE),
+                ('TEXTCOLOR', (0,0), (-1,0), colors.white),
+                ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+                ('FONTNAME', (2,1), (2,-1), 'Helvetica-Bold'),
+                ('FONTSIZE', (0,0), (-1,-1), 10),
+                ('ALIGN', (1,0), (-1,-1), 'RIGHT'),
+                ('BOTTOMPADDING', (0,0), (-1,-1), 6),
+                ('TOPPADDING', (0,0), (-1,-1), 6),
+                ('GRID', (0,0), (-1,-1), 0.5, colors.lightgrey)
+            ])
+        }
+
+    def paragraph(self, text, style):
+        """Paragraph for fixed text. The markup is parsed on first use and
+        the fragments are reused; each call still returns a new flowable,
+        since layout stores its results on the flowable."""
+        key = (text, style)
+        frags = self._frags.get(key)
+        if frags is None:
+            frags = Paragraph(text, self.styles[style]).frags
+            with self._frags_lock:
+                self._frags[key] = frags
+        return Paragraph(text, self.styles[style], frags=frags)
+
+    def header(self, canvas, doc):
+        """Page header: drawn once per document as a form and placed on every page."""
+        if not canvas.hasForm(self.HEADER_FORM):
+            canvas.beginForm(self.HEADER_FORM)
+            canvas.setFillColor(SOLAR_BLUE)
+            canvas.rect(0, A4[1] - 60, A4[0], 60, fill=1, stroke=0)
+            canvas.setFillColor(colors.white)
+            canvas.setFont('Helvetica-Bold', 16)
+            canvas.drawString(60, A4[1] - 35, "Solar Energy Report")
+            canvas.setFont('Helvetica', 10)
+            canvas.drawRightString(A4[0] - 60, A4[1] - 35, date.today().strftime('%d %B %Y'))
+            canvas.endForm()
+        canvas.doForm(self.HEADER_FORM)
 
-    def _header(self, canvas, doc):
-        canvas.saveState()
-        canvas.setFillColor(SOLAR_BLUE)
-        canvas.rect(0, A4[1] - 60, A4[0], 60, fill=1, stroke=0)
-        canvas.setFillColor(colors.white)
-        canvas.setFont('Helvetica-Bold', 16)
-        canvas.drawString(60, A4[1] - 35, "Solar Energy Report")
-        canvas.setFont('Helvetica', 10)
-        canvas.drawRightString(A4[0] - 60, A4[1] - 35, datetime.now().strftime('%d %B %Y'))
-        canvas.restoreState()
+
+_template = None
+_template_lock = threading.Lock()
+
+
+def report_template():
+    """The process-wide ReportTemplate, built on first use."""
+    global _template
+    with _template_lock:
+        if _template is None:
+            # Page streams are written as compressed binary rather than
+            # ASCII85 text: smaller files, and no pure-Python encoding pass
+            # over every page
+            rl_config.useA85 = 0
+            _template = ReportTemplate()
+        return _template
+
+
+class PDFReportGenerator:
+    def __init__(self, filename=None, chart_renderer=None, template=None):
+        # With no filename the report is built in memory and generate() returns the PDF bytes
+        self.filename = filename
+        self.buffer = None if filename else io.BytesIO()
+        self.doc = SimpleDocTemplate(filename or self.buffer, pagesize=A4, rightMargin=60, leftMargin=60, topMargin=100, bottomMargin=60)
+        self.template = template or report_template()
+        self.styles = self.template.styles
+        self.story = []
+        self.chart_renderer = chart_renderer or default_chart_renderer()
 
     def add_title(self, user_data):
         self.story.append(Spacer(1, 0.3*inch))
@@ -66,36 +199,31 @@ class PDFReportGenerator:
                 f"£{financial['net_25_year_savings']:,.0f}"
             ],
             [
-                Paragraph("System Size", self.styles['CustomSmall']),
-                Paragraph("Annual Savings", self.styles['CustomSmall']),
-                Paragraph("Payback Period", self.styles['CustomSmall']),
-                Paragraph("25-Year Profit", self.styles['CustomSmall'])
+                self.template.paragraph("System Size", 'CustomSmall'),
+                self.template.paragraph("Annual Savings", 'CustomSmall'),
+                self.template.paragraph("Payback Period", 'CustomSmall'),
+                self.template.paragraph("25-Year Profit", 'CustomSmall')
             ]
         ]
         
         table = Table(data, colWidths=[2*inch]*4)
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0,0), (-1,0), LIGHT_GRAY),
-            ('ALIGN', (0,0), (-1,-1), 'CENTER'),
-            ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
-            ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'), 
-            ('FONTSIZE', (0,0), (-1,0), 16),               
-            ('TEXTCOLOR', (0,0), (-1,0), SOLAR_BLUE),     
-            ('TOPPADDING', (0,0), (-1,0), 15),
-            ('BOTTOMPADDING', (0,0), (-1,0), 5),           
-            ('BOTTOMPADDING', (0,1), (-1,1), 10),
-            ('BOX', (0,0), (-1,-1), 1, colors.lightgrey),
-            ('GRID', (0,0), (-1,-1), 0.5, colors.lightgrey)
-        ]))
+        table.setStyle(self.template.table_styles['kpis'])
         
         self.story.append(table)
         self.story.append(Spacer(1, 0.3*inch))
 
     def add_ai_summary(self, ai_content):
-        self.story.append(Paragraph("Executive Summary", self.styles['CustomHeading']))
+        self.story.append(self.template.paragraph("Executive Summary", 'CustomHeading'))
         self.story.append(Paragraph(ai_content.get('executive_summary', 'Based on our analysis, this solar system offers excellent returns.'), self.styles['CustomBody']))
         self.story.append(Spacer(1, 0.2*inch))
         
+    @staticmethod
+    def _monthly_range(production):
+        monthly = production.get('monthly_kwh')
+        if monthly:
+            return f"{min(monthly):,.0f}–{max(monthly):,.0f} kWh"
+        return f"{production['monthly_production_kwh']:,.0f} kWh"
+
     # --- HELPER 1: SYSTEM FLOWABLES ---
     def _get_system_flowables(self, report_data):
         system = report_data['system']
@@ -103,38 +231,23 @@ class PDFReportGenerator:
         
         # Data for the System Table
         data = [
-            [Paragraph("System Specifications", self.styles['CustomSubHeading']), ''],
+            [self.template.paragraph("System Specifications", 'CustomSubHeading'), ''],
             ['Number of Panels:', f"{system['num_panels']} panels"],
             ['Panel Wattage:', f"{system['panel_wattage']}W each"],
             ['Total System Size:', f"{system['actual_size_kw']} kW"],
             ['Required Roof Area:', f"{system['required_roof_area_sqm']} m²"],
             ['', ''],
-            [Paragraph("Energy Production", self.styles['CustomSubHeading']), ''],
+            [self.template.paragraph("Energy Production", 'CustomSubHeading'), ''],
             ['Daily Production:', f"{production['daily_production_kwh']:.1f} kWh"],
-            ['Monthly Production:', f"{production['monthly_production_kwh']:,.0f} kWh"],
+            ['Monthly Production:', self._monthly_range(production)],
             ['Annual Production:', f"{production['annual_production_kwh']:,.0f} kWh"],
         ]
         
         table = Table(data, colWidths=[1.8*inch, 1.45*inch])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0,0), (1,0), SOLAR_BLUE),
-            ('BACKGROUND', (0,6), (1,6), SOLAR_BLUE),
-            ('TEXTCOLOR', (0,0), (1,0), colors.white),
-            ('TEXTCOLOR', (0,6), (1,6), colors.white),
-            ('FONTNAME', (0,0), (1,0), 'Helvetica-Bold'),
-            ('FONTNAME', (0,6), (1,6), 'Helvetica-Bold'),
-            ('FONTNAME', (0,1), (0,5), 'Helvetica'),
-            ('FONTNAME', (0,7), (0,9), 'Helvetica'),
-            ('FONTSIZE', (0,0), (-1,-1), 10),
-            ('ALIGN', (1,1), (1,-1), 'RIGHT'), # Align values right
-            ('ALIGN', (0,0), (-1,-1), 'LEFT'),
-            ('BOTTOMPADDING', (0,0), (-1,-1), 6),
-            ('TOPPADDING', (0,0), (-1,-1), 6),
-            ('GRID', (0,0), (-1,-1), 0.5, colors.lightgrey)
-        ]))
+        table.setStyle(self.template.table_styles['system'])
         
         return [
-            Paragraph("System Details", self.styles['CustomSubHeading']),
+            self.template.paragraph("System Details", 'CustomSubHeading'),
             table
         ]
 
@@ -144,7 +257,7 @@ class PDFReportGenerator:
         
         # Data for the Financial Table
         data = [
-            [Paragraph("Financial Analysis", self.styles['CustomSubHeading']), ''],
+            [self.template.paragraph("Financial Analysis", 'CustomSubHeading'), ''],
             ['Installation Cost:', f"£{financial['installation_cost']:,.0f}"],
             ['Annual Savings:', f"£{financial['annual_savings']:,.0f}"],
             ['Monthly Savings:', f"£{financial['monthly_savings']:,.0f}"],
@@ -155,27 +268,16 @@ class PDFReportGenerator:
         ]
         
         table = Table(data, colWidths=[1.8*inch, 1.45*inch])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0,0), (1,0), SOLAR_ORANGE),
-            ('TEXTCOLOR', (0,0), (1,0), colors.white),
-            ('FONTNAME', (0,0), (1,0), 'Helvetica-Bold'),
-            ('FONTNAME', (0,6), (1,7), 'Helvetica-Bold'), # Highlight Net Profit and ROI
-            ('FONTSIZE', (0,0), (-1,-1), 10),
-            ('ALIGN', (1,1), (1,-1), 'RIGHT'), # Align values right
-            ('ALIGN', (0,0), (-1,-1), 'LEFT'),
-            ('BOTTOMPADDING', (0,0), (-1,-1), 6),
-            ('TOPPADDING', (0,0), (-1,-1), 6),
-            ('GRID', (0,0), (-1,-1), 0.5, colors.lightgrey)
-        ]))
+        table.setStyle(self.template.table_styles['financial'])
         
         return [
-            Paragraph("Financial Breakdown", self.styles['CustomSubHeading']),
+            self.template.paragraph("Financial Breakdown", 'CustomSubHeading'),
             table
         ]
         
     # --- MASTER LAYOUT: COMBINE TWO COLUMNS ---
     def add_system_and_financial_details(self, report_data):
-        self.story.append(Paragraph("System & Financial Details", self.styles['CustomHeading']))
+        self.story.append(self.template.paragraph("System & Financial Details", 'CustomHeading'))
         
         system_flowables = self._get_system_flowables(report_data)
         financial_flowables = self._get_financial_flowables(report_data)
@@ -190,71 +292,141 @@ class PDFReportGenerator:
             colWidths=[3.25*inch, 3.25*inch]
         )
         
-        master_table.setStyle(TableStyle([
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('LEFTPADDING', (1, 0), (1, 0), 10), # Space between columns
-            ('RIGHTPADDING', (0, 0), (0, 0), 0),
-            ('LEFTPADDING', (0, 0), (0, 0), 0),
-        ]))
+        master_table.setStyle(self.template.table_styles['columns'])
         
         self.story.append(master_table)
         self.story.append(Spacer(1, 0.3*inch))
 
 
+    def add_battery_options(self, report_data):
+        battery = report_data.get('battery')
+        if not battery:
+            return
+        best = battery['best']
+
+        self.story.append(self.template.paragraph("Battery Storage Options", 'CustomHeading'))
+        self.story.append(Paragraph(
+            f"For a {best['system_size_kw']} kW system, the table compares battery sizes over 25 years. "
+            f"<b>Best value:</b> {self._battery_label(best['battery_kwh'])}, using "
+            f"{best['self_consumption_ratio'] * 100:.0f}% of the solar output in the home.",
+            self.styles['CustomBody']
+        ))
+
+        data = [['Battery', 'Self-use', 'Annual Savings', 'Export Income', 'Payback', 'Net Value']]
+        best_row = None
+        for i, option in enumerate(battery['battery_options'], start=1):
+            if option['battery_kwh'] == best['battery_kwh']:
+                best_row = i
+            data.append([
+                self._battery_label(option['battery_kwh']),
+                f"{option['self_consumption_ratio'] * 100:.0f}%",
+                f"£{option['annual_savings']:,.0f}",
+                f"£{option['export_income']:,.0f}",
+                f"{option['payback_period_years']:.1f} yrs",
+                f"£{option['npv']:,.0f}"
+            ])
+
+        table = Table(data, colWidths=[1.0*inch, 0.9*inch, 1.2*inch, 1.2*inch, 0.9*inch, 1.3*inch])
+        table.setStyle(self.template.table_styles['battery'])
+        if best_row is not None:
+            table.setStyle([
+                ('BACKGROUND', (0,best_row), (-1,best_row), LIGHT_GRAY),
+                ('FONTNAME', (0,best_row), (-1,best_row), 'Helvetica-Bold')
+            ])
+        self.story.append(table)
+        self.story.append(Spacer(1, 0.2*inch))
+
+    @staticmethod
+    def _battery_label(capacity_kwh):
+        return f"{capacity_kwh:g} kWh" if capacity_kwh else "None"
+
+    def add_uncertainty(self, report_data):
+        uncertainty = report_data.get('uncertainty')
+        if not uncertainty:
+            return
+        payback = uncertainty['payback_years']
+        npv = uncertainty['npv']
+        net = uncertainty['net_savings']
+
+        self.story.append(self.template.paragraph("Financial Uncertainty", 'CustomHeading'))
+        self.story.append(Paragraph(
+            f"Results across {uncertainty['scenarios']:,} scenarios for energy prices, panel degradation, "
+            f"weather and installation cost. In 8 out of 10 scenarios the system pays for itself in "
+            f"{payback['p10']:.1f} to {payback['p90']:.1f} years.",
+            self.styles['CustomBody']
+        ))
+        data = [
+            ['', 'Pessimistic', 'Expected', 'Optimistic'],
+            ['Payback Period:', f"{payback['p90']:.1f} yrs", f"{payback['p50']:.1f} yrs", f"{payback['p10']:.1f} yrs"],
+            ['25-Year Net Savings:', f"£{net['p10']:,.0f}", f"£{net['p50']:,.0f}", f"£{net['p90']:,.0f}"],
+            ['Net Present Value:', f"£{npv['p10']:,.0f}", f"£{npv['p50']:,.0f}", f"£{npv['p90']:,.0f}"],
+        ]
+        table = Table(data, colWidths=[1.9*inch, 1.4*inch, 1.4*inch, 1.4*inch])
+        table.setStyle(self.template.table_styles['uncertainty'])
+        self.story.append(table)
+        self.story.append(Spacer(1, 0.2*inch))
+        self.story.append(self.chart_renderer.render_fan(uncertainty['fan']))
+
     def create_chart(self, solar_data):
-        # ... (Function remains the same)
-        # Check for None input
-        if solar_data is None or 'monthly' not in solar_data:
-             # Return an empty spacer if data is missing
-            return Spacer(1, 0.1*inch)
-            
-        months = [d['month'] for d in solar_data['monthly']]
-        irradiance = [d['solar_irradiance'] for d in solar_data['monthly']]
-        
-        fig, ax = plt.subplots(figsize=(7, 3))
-        bars = ax.bar(months, irradiance, color='#1E3A8A', alpha=0.7)
-        bars[irradiance.index(max(irradiance))].set_color('#F59E0B')
-        
-        ax.set_title('Monthly Solar Production', fontsize=12, fontweight='bold', color='#1E3A8A')
-        ax.set_ylabel('kWh/m²/day', fontsize=10)
-        ax.tick_params(axis='x', rotation=45, labelsize=9)
-        ax.tick_params(axis='y', labelsize=9)
-        ax.grid(axis='y', alpha=0.3)
-        
-        buf = io.BytesIO()
-        plt.tight_layout()
-        plt.savefig(buf, format='png', dpi=150)
-        plt.close()
-        buf.seek(0)
-        return Image(buf, width=5*inch, height=2.5*inch)
+        # Rendering (and PNG caching) lives in utils/charts.py
+        return self.chart_renderer.render(solar_data)
 
     def add_environmental(self, report_data):
         env = report_data['environmental']
         
-        self.story.append(Paragraph("Environmental Impact", self.styles['CustomHeading']))
+        self.story.append(self.template.paragraph("Environmental Impact", 'CustomHeading'))
         self.story.append(Paragraph(f"<b>Annual CO₂ Offset:</b> {env['co2_offset_annual_tons']:.1f} metric tons<br/><b>Equivalent to planting:</b> {int(env['trees_equivalent'])} trees per year<br/><b>25-Year CO₂ Offset:</b> {env['co2_offset_25_years_tons']:.1f} metric tons", self.styles['CustomBody']))
 
-    def generate(self, user_data, location_data, solar_data, report_data, ai_content=None):
-        self.add_title(user_data)
-        self.add_kpis(report_data)
+    def _collect(self, add, *args):
+        """Run an add_* method and return the flowables it produced."""
+        story, self.story = self.story, []
+        try:
+            add(*args)
+            return self.story
+        finally:
+            self.story = story
+
+    def build_sections(self, user_data, report_data):
+        """Flowables that need neither the AI text nor the chart, so they can be
+        laid out while those are still being generated."""
+        return {
+            'title': self._collect(self.add_title, user_data) + self._collect(self.add_kpis, report_data),
+            'details': self._collect(self.add_system_and_financial_details, report_data),
+            'battery': self._collect(self.add_battery_options, report_data),
+            'environmental': self._collect(self.add_environmental, report_data),
+            'uncertainty': self._collect(self.add_uncertainty, report_data)
+        }
+
+    def generate(self, user_data, location_data, solar_data, report_data, ai_content=None, chart=None, sections=None):
+        # `chart` and `sections` may be prepared concurrently by the caller
+        # (see ReportPipeline); otherwise they are built here
+        if sections is None:
+            sections = self.build_sections(user_data, report_data)
+        if chart is None:
+            with stage_timer('chart'):
+                chart = self.create_chart(solar_data)
+
+        self.story = list(sections['title'])
         self.add_ai_summary(ai_content or {})
         
         # Add Page Break to start System Details & Financial on a new page (Page 2)
         self.story.append(PageBreak()) 
-        
-        # FIXED: Call the new master layout function
-        self.add_system_and_financial_details(report_data)
+        self.story.extend(sections['details'])
+        self.story.extend(sections.get('battery', []))
         
         # Add Page Break to start Chart & Environmental on a new page (Page 3)
         self.story.append(PageBreak()) 
         
-        self.story.append(self.create_chart(solar_data))
+        self.story.append(chart)
         self.story.append(Spacer(1, 0.3*inch))
-        self.add_environmental(report_data)
+        self.story.extend(sections['environmental'])
+        self.story.extend(sections.get('uncertainty', []))
         
         self.story.append(Spacer(1, 0.5*inch))
-        self.story.append(Paragraph("This report is for informational purposes only. Consult certified solar professionals for accurate assessments.", self.styles['CustomSmall']))
+        self.story.append(self.template.paragraph(DISCLAIMER, 'CustomSmall'))
         
         # Build the document
-        self.doc.build(self.story, onFirstPage=self._header, onLaterPages=self._header)
+        self.doc.build(self.story, onFirstPage=self.template.header, onLaterPages=self.template.header)
+        if self.buffer is not None:
+            return self.buffer.getvalue()
         return self.filename
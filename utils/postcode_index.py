@@ -0,0 +1,192 @@
+"""Offline UK postcode geocoding from a precomputed centroid index.
+
+Built once by scripts/build_postcode_index.py from an open postcode
+centroid dataset (e.g. the ONS Postcode Directory) and stored as three
+files:
+
+- `<name>.npy`: sorted uint64 keys, one per full postcode ('SW1A 1AA'),
+  sector ('SW1A 1') and outward code ('SW1A'); each key is the canonical
+  text, space included, NUL-padded to 8 bytes and read as a big-endian
+  integer, so integer order is text order
+- `<name>.coords.npy`: float32 (n, 2) latitude/longitude for each key;
+  sectors and outward codes hold the mean of their postcodes
+- `<name>.json`: counts and provenance
+
+Both arrays are memory-mapped, so opening the index reads only the
+metadata and every process shares the same pages. A lookup is one binary
+search over the mapped keys and takes a few microseconds.
+"""
+import bisect
+import json
+import os
+import re
+
+import numpy as np
+
+OUTWARD = r'[A-Z]{1,2}[0-9][A-Z0-9]?'
+FULL_RE = re.compile(rf'^({OUTWARD})([0-9][A-Z]{{2}})$')
+SECTOR_RE = re.compile(rf'^({OUTWARD}) ?([0-9])$')
+OUTWARD_RE = re.compile(rf'^{OUTWARD}$')
+# A full postcode anywhere in a street address
+SEARCH_RE = re.compile(rf'\b({OUTWARD}) ?([0-9][A-Z]{{2}})\b')
+COUNTRY_RE = re.compile(r'[\s,]*\b(UK|U\.K\.|UNITED KINGDOM|GB|GREAT BRITAIN|ENGLAND|SCOTLAND|WALES|NORTHERN IRELAND)$')
+KEY_BYTES = 8
+
+
+def coords_path(path):
+    return os.path.splitext(path)[0] + '.coords.npy'
+
+
+def metadata_path(path):
+    return os.path.splitext(path)[0] + '.json'
+
+
+def encode_key(text):
+    return int.from_bytes(text.encode('ascii').ljust(KEY_BYTES, b'\0'), 'big')
+
+
+def decode_key(key):
+    return int(key).to_bytes(KEY_BYTES, 'big').rstrip(b'\0').decode('ascii')
+
+
+def precision(postcode):
+    """'postcode', 'sector' or 'outward' for a canonical key."""
+    if ' ' not in postcode:
+        return 'outward'
+    return 'sector' if len(postcode.split(' ')[1]) == 1 else 'postcode'
+
+
+def canonical_postcode(text):
+    """'SW1A 1AA' for a full postcode in any case/spacing, else None."""
+    match = FULL_RE.match(re.sub(r'\s+', '', (text or '').upper()))
+    return f'{match.group(1)} {match.group(2)}' if match else None
+
+
+def candidate_keys(text):
+    """Canonical keys `text` may stand for when it is nothing but a
+    postcode, sector or outward code (optionally followed by the country),
+    most specific first; [] for anything else, such as a street address."""
+    full = canonical_postcode(text) if text and len(text) <= 9 else None
+    if full:
+        return [full]
+    text = ' '.join((text or '').upper().replace(',', ' ').split())
+    text = COUNTRY_RE.sub('', text).strip()
+    if not text or len(text) > 9:
+        return []
+    compact = text.replace(' ', '')
+    full = canonical_postcode(compact)
+    if full:
+        return [full]
+    keys = []
+    if ' ' not in text and OUTWARD_RE.match(compact):
+        keys.append(compact)
+    sector = SECTOR_RE.match(text if ' ' in text else compact)
+    if sector:
+        # 'W11' is outward code W11, or sector W1 1
+        keys.append(f'{sector.group(1)} {sector.group(2)}')
+    return keys
+
+
+def save_index(path, postcodes, latitudes, longitudes, **info):
+    """Write the index for full postcodes and their centroids, adding a
+    mean centroid for every sector and outward code."""
+    canonical = [canonical_postcode(p) for p in postcodes]
+    if None in canonical:
+        raise ValueError(f"Not a full postcode: {postcodes[canonical.index(None)]!r}")
+    full = np.array(canonical)
+    coords = np.column_stack([np.asarray(latitudes, dtype=float), np.asarray(longitudes, dtype=float)])
+    if len(full) != len(coords) or not len(full):
+        raise ValueError("Expected one latitude and longitude per postcode")
+    full, first = np.unique(full, return_index=True)
+    coords = coords[first]
+
+    parts = np.char.partition(full, ' ')
+    outward, sector_digit = parts[:, 0], parts[:, 2].astype('U1')
+    levels = [(full, coords)]
+    for prefixes in (np.char.add(np.char.add(outward, ' '), sector_digit), outward):
+        groups, members = np.unique(prefixes, return_inverse=True)
+        counts = np.bincount(members)
+        means = np.column_stack([np.bincount(members, weights=coords[:, c]) / counts for c in (0, 1)])
+        levels.append((groups, means))
+
+    keys = np.array([encode_key(k) for level, _ in levels for k in level.tolist()], dtype=np.uint64)
+    values = np.concatenate([level_coords for _, level_coords in levels]).astype(np.float32)
+    order = np.argsort(keys, kind='stable')
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    np.save(path, keys[order])
+    np.save(coords_path(path), values[order])
+    meta = dict(info, postcodes=int(len(full)), sectors=int(len(levels[1][0])),
+                outward_codes=int(len(levels[2][0])), keys=int(len(keys)))
+    with open(metadata_path(path), 'w') as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+class PostcodeIndex:
+    """Read-only lookups on an index written by save_index()."""
+
+    def __init__(self, path):
+        with open(metadata_path(path)) as f:
+            self.meta = json.load(f)
+        self.path = path
+        # Plain ndarray views of the mapped pages (np.memmap indexing is slow)
+        self.keys = np.asarray(np.load(path, mmap_mode='r'))
+        self.coords = np.asarray(np.load(coords_path(path), mmap_mode='r'))
+        # bisect over a memoryview reads the mapped keys as Python ints;
+        # np.searchsorted costs more in call overhead than in the search
+        self._keys = memoryview(self.keys)
+        self.lookups = 0
+        self.misses = 0
+
+    @classmethod
+    def open(cls, path):
+        """The index at `path`, or None if it has not been built."""
+        if not path or not all(os.path.exists(p) for p in (path, coords_path(path), metadata_path(path))):
+            return None
+        return cls(path)
+
+    def _find(self, key):
+        code = encode_key(key)
+        i = bisect.bisect_left(self._keys, code)
+        if i < len(self._keys) and self._keys[i] == code:
+            return i
+        return None
+
+    def lookup(self, text, search=False):
+        """Centroid for a postcode, sector or outward code:
+        {'postcode', 'latitude', 'longitude', 'precision'}, or None.
+
+        `text` must be the code alone (a street address returns None); with
+        `search`, the first full postcode found anywhere in `text` is used.
+        """
+        if search:
+            match = SEARCH_RE.search((text or '').upper())
+            keys = [f'{match.group(1)} {match.group(2)}'] if match else []
+        else:
+            keys = candidate_keys(text)
+        if not keys:
+            return None
+        self.lookups += 1
+        for key in keys:
+            i = self._find(key)
+            if i is not None:
+                latitude, longitude = self.coords[i].tolist()
+                return {
+                    'postcode': key,
+                    'latitude': round(latitude, 6),
+                    'longitude': round(longitude, 6),
+                    'precision': precision(key)
+                }
+        self.misses += 1
+        return None
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'source': self.meta.get('source'),
+            'postcodes': self.meta.get('postcodes'),
+            'sectors': self.meta.get('sectors'),
+            'outward_codes': self.meta.get('outward_codes'),
+            'lookups': self.lookups,
+            'misses': self.misses
+        }
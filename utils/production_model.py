@@ -0,0 +1,227 @@
+"""Hourly PV production simulation.
+
+Vectorised over sites: every site argument may be a scalar or an array of
+length n, and results come back with a leading site axis. Two time grids:
+
+- 'typical': the recommended average day of each month (Klein), 12 × 24
+  hourly steps, each weighted by the days in its month; ~1 ms per site
+- 'hourly': all 8760 hours of a non-leap year
+
+Per step: solar position (Spencer declination, equation of time) → clear-sky
+GHI (Haurwitz) scaled to the month's clearness index → Erbs diffuse split →
+isotropic-sky plane-of-array irradiance → cell temperature (NOCT) derate →
+AC output after `system_losses`. Clock times are local standard time.
+"""
+import numpy as np
+
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+DAYS_IN_MONTH = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+# Day of year whose extraterrestrial irradiance is closest to the month's mean
+TYPICAL_DAYS = np.array([17, 47, 75, 105, 135, 162, 198, 228, 258, 288, 318, 344])
+
+# Fallback climate when no site data is given: mean clearness index and air
+# temperature (°C) per month for a mid-latitude maritime (UK) climate
+DEFAULT_CLEARNESS = np.array([0.33, 0.38, 0.41, 0.45, 0.47, 0.47, 0.47, 0.46, 0.44, 0.39, 0.34, 0.31])
+DEFAULT_TEMPERATURE = np.array([4.5, 4.8, 6.8, 9.0, 12.2, 15.1, 17.3, 17.0, 14.6, 11.2, 7.5, 5.0])
+
+SOLAR_CONSTANT = 1361.0  # W/m²
+# Inverter, wiring, soiling and mismatch: DC at the panels to AC delivered
+SYSTEM_LOSSES = 0.14
+
+
+def time_grid(resolution='typical'):
+    """(day_of_year, month_index, day_weight) for each simulated day.
+
+    Every day is simulated at the 24 clock-hour midpoints.
+    """
+    if resolution == 'typical':
+        return TYPICAL_DAYS, np.arange(12), DAYS_IN_MONTH.astype(float)
+    if resolution == 'hourly':
+        days = np.arange(1, 366)
+        return days, np.repeat(np.arange(12), DAYS_IN_MONTH), np.ones(365)
+    raise ValueError(f"Unknown resolution: {resolution}")
+
+
+def _sun(day_of_year):
+    """Declination (rad), equation of time (minutes) and extraterrestrial
+    normal irradiance (W/m²) for each day."""
+    b = 2 * np.pi * (day_of_year - 1) / 365.0
+    declination = (0.006918 - 0.399912 * np.cos(b) + 0.070257 * np.sin(b) - 0.006758 * np.cos(2 * b)
+                   + 0.000907 * np.sin(2 * b) - 0.002697 * np.cos(3 * b) + 0.00148 * np.sin(3 * b))
+    equation_of_time = 229.18 * (0.000075 + 0.001868 * np.cos(b) - 0.032077 * np.sin(b)
+                                 - 0.014615 * np.cos(2 * b) - 0.04089 * np.sin(2 * b))
+    distance = (1.000110 + 0.034221 * np.cos(b) + 0.001280 * np.sin(b)
+                + 0.000719 * np.cos(2 * b) + 0.000077 * np.sin(2 * b))
+    return declination, equation_of_time, SOLAR_CONSTANT * distance
+
+
+def solar_position(latitude, longitude, day_of_year, utc_offset=None):
+    """Sun position at the clock-hour midpoints of each day.
+
+    Returns (cos_zenith, azimuth, extraterrestrial) shaped (sites, days, 24);
+    azimuth is in radians from south, positive towards west. `utc_offset`
+    (hours) defaults to the nearest whole time zone for the longitude.
+    """
+    lat = np.radians(np.asarray(latitude, dtype=float)).reshape(-1, 1, 1)
+    lon = np.asarray(longitude, dtype=float).reshape(-1, 1, 1)
+    offset = np.round(lon / 15.0) if utc_offset is None else np.asarray(utc_offset, dtype=float).reshape(-1, 1, 1)
+    declination, equation_of_time, extraterrestrial = _sun(np.asarray(day_of_year, dtype=float))
+    declination = declination.reshape(1, -1, 1)
+    equation_of_time = equation_of_time.reshape(1, -1, 1)
+
+    clock = np.arange(24) + 0.5
+    solar_time = clock + (4 * (lon - 15 * offset) + equation_of_time) / 60.0
+    hour_angle = np.radians(15.0 * (solar_time - 12.0))
+
+    cos_zenith = (np.sin(lat) * np.sin(declination)
+                  + np.cos(lat) * np.cos(declination) * np.cos(hour_angle))
+    azimuth = np.arctan2(np.sin(hour_angle),
+                         np.cos(hour_angle) * np.sin(lat) - np.tan(declination) * np.cos(lat))
+    return cos_zenith, azimuth, extraterrestrial.reshape(1, -1, 1)
+
+
+def _erbs_diffuse_fraction(kt):
+    poly = 0.9511 - 0.1604 * kt + 4.388 * kt ** 2 - 16.638 * kt ** 3 + 12.336 * kt ** 4
+    return np.where(kt <= 0.22, 1.0 - 0.09 * kt, np.where(kt <= 0.8, poly, 0.165))
+
+
+def _plane_of_array(ghi, horizontal_extra, cos_zenith, cos_incidence, tilt, albedo):
+    """Isotropic-sky irradiance on the panel plane from GHI (all W/m²)."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        kt = np.where(horizontal_extra > 0, np.clip(ghi / horizontal_extra, 0.0, 1.0), 0.0)
+        diffuse = ghi * _erbs_diffuse_fraction(kt)
+        # Near the horizon the beam component is unreliable; treat it all as diffuse
+        beam_normal = np.where(cos_zenith > 0.065, (ghi - diffuse) / cos_zenith, 0.0)
+    diffuse = np.where(cos_zenith > 0.065, diffuse, ghi)
+    return (beam_normal * cos_incidence
+            + diffuse * (1 + np.cos(tilt)) / 2
+            + ghi * albedo * (1 - np.cos(tilt)) / 2)
+
+
+def _monthly(values, months, n):
+    """Broadcast a per-month climate input to (sites, 12), then pick each day's month."""
+    values = np.broadcast_to(np.asarray(values, dtype=float), (n, 12))
+    return values[:, months]
+
+
+def simulate(latitude, longitude, tilt=35.0, azimuth=180.0, capacity_kw=1.0, clearness=None, ghi=None,
+             temperature=None, resolution='typical', albedo=0.2, system_losses=SYSTEM_LOSSES,
+             temp_coefficient=-0.004, noct=45.0, diurnal_swing=4.0, utc_offset=None):
+    """Simulate PV output for n sites.
+
+    `tilt` and `azimuth` are degrees (azimuth clockwise from north, 180 =
+    south). Climate inputs are 12 monthly values, shared or one row per
+    site: `ghi` (mean daily horizontal irradiation, kWh/m²/day) takes
+    precedence over `clearness` (monthly clearness index); both default to
+    DEFAULT_CLEARNESS. `temperature` is the monthly mean air temperature.
+
+    Returns a dict of arrays:
+        hourly_kw       (n, days, 24) AC output at each clock hour
+        daily_kwh       (n, days)
+        monthly_kwh     (n, 12)
+        annual_kwh      (n,)
+        monthly_poa     (n, 12) mean daily plane-of-array irradiation, kWh/m²/day
+        monthly_clear_sky_poa (n, 12) the same under clear skies
+        monthly_temperature   (n, 12)
+    """
+    latitude, longitude, tilt, azimuth, capacity_kw = np.broadcast_arrays(
+        *(np.atleast_1d(np.asarray(v, dtype=float)) for v in (latitude, longitude, tilt, azimuth, capacity_kw))
+    )
+    n = latitude.shape[0]
+    days, months, weights = time_grid(resolution)
+
+    cos_zenith, sun_azimuth, extraterrestrial = solar_position(latitude, longitude, days, utc_offset)
+    up = cos_zenith > 0
+    cos_zenith = np.where(up, cos_zenith, 0.0)
+    horizontal_extra = extraterrestrial * cos_zenith
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        clear_sky = np.where(up, 1098.0 * cos_zenith * np.exp(-0.057 / cos_zenith), 0.0)
+
+    # Scale the clear-sky day so its total matches the month's clearness
+    daily_extra_kwh = horizontal_extra.sum(axis=2) / 1000.0
+    if ghi is not None:
+        target_kwh = _monthly(ghi, months, n)
+    else:
+        target_kwh = _monthly(DEFAULT_CLEARNESS if clearness is None else clearness, months, n) * daily_extra_kwh
+    clear_kwh = clear_sky.sum(axis=2) / 1000.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scale = np.where(clear_kwh > 0, target_kwh / clear_kwh, 0.0)
+    global_horizontal = clear_sky * scale[:, :, None]
+
+    tilt_r = np.radians(tilt).reshape(-1, 1, 1)
+    panel_azimuth = np.radians(azimuth - 180.0).reshape(-1, 1, 1)
+    sin_zenith = np.sqrt(1.0 - cos_zenith ** 2)
+    cos_incidence = np.clip(cos_zenith * np.cos(tilt_r)
+                            + sin_zenith * np.sin(tilt_r) * np.cos(sun_azimuth - panel_azimuth), 0.0, None)
+    cos_incidence = np.where(up, cos_incidence, 0.0)
+
+    poa = _plane_of_array(global_horizontal, horizontal_extra, cos_zenith, cos_incidence, tilt_r, albedo)
+    clear_poa = _plane_of_array(clear_sky, horizontal_extra, cos_zenith, cos_incidence, tilt_r, albedo)
+
+    air = _monthly(DEFAULT_TEMPERATURE if temperature is None else temperature, months, n)
+    # Warmest mid-afternoon, coolest before dawn
+    air = air[:, :, None] + diurnal_swing * np.cos(2 * np.pi * (np.arange(24) + 0.5 - 15.0) / 24.0)
+    cell = air + poa * (noct - 20.0) / 800.0
+    derate = 1.0 + temp_coefficient * (cell - 25.0)
+
+    hourly_kw = capacity_kw.reshape(-1, 1, 1) * poa / 1000.0 * derate * (1.0 - system_losses)
+    daily_kwh = hourly_kw.sum(axis=2)
+
+    month_starts = np.concatenate(([0], np.cumsum(np.bincount(months, minlength=12))[:-1]))
+    days_per_month = np.add.reduceat(weights, month_starts)
+
+    def per_month(daily):
+        return np.add.reduceat(daily * weights, month_starts, axis=1)
+
+    monthly_kwh = per_month(daily_kwh)
+    return {
+        'hourly_kw': hourly_kw,
+        'daily_kwh': daily_kwh,
+        'monthly_kwh': monthly_kwh,
+        'annual_kwh': monthly_kwh.sum(axis=1),
+        'monthly_poa': per_month(poa.sum(axis=2) / 1000.0) / days_per_month,
+        'monthly_clear_sky_poa': per_month(clear_poa.sum(axis=2) / 1000.0) / days_per_month,
+        'monthly_temperature': per_month(air.mean(axis=2)) / days_per_month
+    }
+
+
+def roof_monthly_profile(latitude, longitude, segments, panel_capacity_watts=400.0, yearly_energy_kwh=None, **kwargs):
+    """Monthly production for one roof made of several panel segments.
+
+    `segments` is a list of dicts with 'pitch', 'azimuth', 'panels' and
+    optionally 'yearly_kwh' (Google's per-segment estimate). Each segment is
+    simulated for its orientation; if yearly estimates are given the
+    simulated monthly shape is scaled to them, so shading and local weather
+    already priced into the estimate are kept.
+
+    Returns a dict with 'months', 'monthly_kwh' (roof total), and the
+    capacity-weighted 'poa', 'clear_sky_poa', 'temperature' (per month) and
+    'typical_day_kw' (AC kW per installed kW for each simulated day and
+    hour: 12 × 24 on the default typical-day grid).
+    """
+    pitch = np.array([s['pitch'] for s in segments], dtype=float)
+    azimuth = np.array([s['azimuth'] for s in segments], dtype=float)
+    capacity = np.array([s['panels'] for s in segments], dtype=float) * panel_capacity_watts / 1000.0
+    result = simulate(latitude, longitude, tilt=pitch, azimuth=azimuth, capacity_kw=capacity, **kwargs)
+
+    monthly = result['monthly_kwh']
+    annual = result['annual_kwh']
+    seg_yearly = np.array([s.get('yearly_kwh') or 0.0 for s in segments], dtype=float)
+    if seg_yearly.sum() > 0:
+        monthly = monthly / np.where(annual > 0, annual, 1.0)[:, None] * seg_yearly[:, None]
+    total = monthly.sum(axis=0)
+    if yearly_energy_kwh and total.sum() > 0:
+        total = total * (yearly_energy_kwh / total.sum())
+
+    total_capacity = capacity.sum()
+    weights = capacity / total_capacity if total_capacity > 0 else np.full(len(segments), 1.0 / len(segments))
+    typical_day = result['hourly_kw'].sum(axis=0) / total_capacity if total_capacity > 0 else result['hourly_kw'][0]
+    return {
+        'months': MONTHS,
+        'monthly_kwh': total,
+        'poa': weights @ result['monthly_poa'],
+        'clear_sky_poa': weights @ result['monthly_clear_sky_poa'],
+        'temperature': weights @ result['monthly_temperature'],
+        'typical_day_kw': typical_day
+    }
@@ -0,0 +1,54 @@
+import cProfile
+import os
+import random
+import re
+import time
+
+
+class RequestProfiler:
+    """Profiles a sampled fraction of requests and dumps each profile to disk.
+
+    engine='cprofile' writes .prof files (open with snakeviz or pstats);
+    engine='pyinstrument' writes .html call trees if pyinstrument is installed.
+    Profiles only the thread that handles the request.
+    """
+
+    def __init__(self, sample_rate=0.0, output_dir='temp/profiles', engine='cprofile'):
+        self.sample_rate = sample_rate
+        self.output_dir = output_dir
+        self.engine = engine
+        if engine == 'pyinstrument':
+            try:
+                import pyinstrument  # noqa: F401
+            except ImportError:
+                print("[profiling] pyinstrument not installed, falling back to cProfile")
+                self.engine = 'cprofile'
+
+    def should_sample(self):
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self):
+        if self.engine == 'pyinstrument':
+            from pyinstrument import Profiler
+            profiler = Profiler()
+            profiler.start()
+            return profiler
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def stop(self, profiler, request_id, label='request'):
+        """Stop `profiler` and write it out. Returns the file path."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        name = re.sub(r'[^A-Za-z0-9_.-]', '_', f"{time.strftime('%Y%m%d_%H%M%S')}_{label}_{request_id}")
+        stem = os.path.join(self.output_dir, name.lstrip('.')[:200])
+        if self.engine == 'pyinstrument':
+            profiler.stop()
+            path = stem + '.html'
+            with open(path, 'w') as f:
+                f.write(profiler.output_html())
+            return path
+        profiler.disable()
+        path = stem + '.prof'
+        profiler.dump_stats(path)
+        return path
@@ -0,0 +1,214 @@
+"""Multi-process PDF rendering for batch report generation.
+
+ReportLab layout and matplotlib rasterisation are pure Python and hold the
+GIL, so threads cannot render more than one report at a time. A
+PDFRenderFarm renders on a pool of worker processes instead:
+
+- workers are started from a fork server that has already imported
+  ReportLab (and matplotlib for raster charts), and each one compiles the
+  report template and draws a throwaway chart before taking jobs
+- a job is a plain-data payload (ReportPipeline.pdf_payload()); the result
+  is the PDF bytes
+- at most `max_pending` jobs are queued or running; submit() blocks (or
+  raises RenderFarmBusy after `wait`) until a slot frees up
+- a job that runs longer than `timeout` is interrupted inside its worker
+  and fails with RenderTimeout; a worker that does not respond to that is
+  killed and the pool restarted
+- each worker is replaced after `max_jobs_per_worker` jobs, so memory
+  leaked by long campaigns is returned to the system
+
+Workers do not inherit the parent's threads or locks, but like any
+forkserver/spawn child they import the main script, so its entry point must
+be behind `if __name__ == '__main__'`.
+"""
+import multiprocessing
+import os
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+
+class RenderTimeout(Exception):
+    """A render job ran past the farm's per-job timeout."""
+
+
+class RenderFarmBusy(Exception):
+    """No render slot became free within the caller's wait."""
+
+
+# --- WORKER PROCESS ---
+_worker_renderer = None
+
+
+def _on_alarm(signum, frame):
+    raise RenderTimeout('PDF render timed out')
+
+
+def _init_worker(chart_config):
+    """Warm a worker: template, fonts and chart backend load before the first job."""
+    global _worker_renderer
+    from .charts import ChartRenderer
+    from .pdf_generator import report_template
+
+    report_template()
+    _worker_renderer = ChartRenderer(**chart_config)
+    _worker_renderer.render({'monthly': [{'month': 'Jan', 'solar_irradiance': 1.0},
+                                         {'month': 'Feb', 'solar_irradiance': 2.0}]})
+    signal.signal(signal.SIGALRM, _on_alarm)
+
+
+def _render(payload, timeout):
+    from .pdf_generator import PDFReportGenerator
+
+    if timeout:
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        generator = PDFReportGenerator(chart_renderer=_worker_renderer)
+        return generator.generate(payload['user_data'], payload['location_data'], payload['solar_data'],
+                                  payload['report_data'], payload.get('ai_content'))
+    finally:
+        if timeout:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+# --- FARM ---
+class PDFRenderFarm:
+    """Renders PDF reports on a pool of warm worker processes."""
+
+    def __init__(self, workers=None, max_pending=None, timeout=60, max_jobs_per_worker=200, chart=None,
+                 start_method='forkserver'):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 2
+        self.timeout = timeout
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.chart_config = dict(chart or {})
+        self.start_method = start_method
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'timeouts': 0, 'restarts': 0}
+
+    def _context(self):
+        context = multiprocessing.get_context(self.start_method)
+        if self.start_method == 'forkserver':
+            # New workers fork from a server that has these imported already
+            preload = ['utils.render_farm', 'utils.pdf_generator']
+            if self.chart_config.get('backend', 'raster') == 'raster':
+                preload += ['matplotlib.figure', 'matplotlib.backends.backend_agg']
+            context.set_forkserver_preload(preload)
+        return context
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=self._context(),
+                    initializer=_init_worker,
+                    initargs=(self.chart_config,),
+                    max_tasks_per_child=self.max_jobs_per_worker or None
+                )
+            return self._executor
+
+    def start(self):
+        """Start every worker now instead of on the first jobs."""
+        pool = self._pool()
+        for future in [pool.submit(os.getpid) for _ in range(self.workers)]:
+            future.result()
+        return self
+
+    def _restart(self, executor):
+        """Kill the workers of `executor` (hung or broken) so the next submit starts a new pool."""
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+            self._stats['restarts'] += 1
+        # ProcessPoolExecutor has no public way to stop a worker mid-job
+        for process in list((getattr(executor, '_processes', None) or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _count(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def submit(self, payload, wait=None):
+        """Queue one render. Returns a Future for the PDF bytes.
+
+        Blocks while `max_pending` jobs are outstanding; with `wait` set,
+        raises RenderFarmBusy if no slot frees up within `wait` seconds.
+        """
+        if not self._slots.acquire(timeout=wait):
+            raise RenderFarmBusy(f'{self.max_pending} renders already pending')
+        try:
+            try:
+                future = self._pool().submit(_render, payload, self.timeout)
+            except BrokenProcessPool:
+                # A worker died (killed, out of memory); start a fresh pool
+                self._restart(self._executor)
+                future = self._pool().submit(_render, payload, self.timeout)
+        except Exception:
+            self._slots.release()
+            raise
+        self._count('submitted')
+        future.add_done_callback(self._finished)
+        return future
+
+    def _finished(self, future):
+        self._slots.release()
+        if future.cancelled():
+            self._count('failed')
+            return
+        error = future.exception()
+        if error is None:
+            self._count('completed')
+        else:
+            self._count('timeouts' if isinstance(error, RenderTimeout) else 'failed')
+
+    def result(self, future):
+        """PDF bytes of a submitted job. Raises RenderTimeout if the job
+        overran (killing its worker if it did not stop by itself)."""
+        executor = self._executor
+        # Up to max_pending / workers jobs may be ahead of this one per worker
+        limit = self.timeout * (self.max_pending // self.workers + 1) + 10 if self.timeout else None
+        try:
+            return future.result(timeout=limit)
+        except FutureTimeoutError:
+            self._restart(executor)
+            raise RenderTimeout('PDF render timed out and its worker was restarted')
+
+    def render(self, payload):
+        return self.result(self.submit(payload))
+
+    def render_many(self, payloads):
+        """Render payloads in parallel, yielding (pdf_bytes, error) in input
+        order. Submission waits for free slots, so a long campaign never
+        holds more than `max_pending` payloads in the pool."""
+        pending = []
+        for payload in payloads:
+            while len(pending) >= self.max_pending:
+                yield self._outcome(pending.pop(0))
+            pending.append(self.submit(payload))
+        while pending:
+            yield self._outcome(pending.pop(0))
+
+    def _outcome(self, future):
+        try:
+            return self.result(future), None
+        except Exception as e:
+            return None, e
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update(workers=self.workers, max_pending=self.max_pending, timeout=self.timeout,
+                     max_jobs_per_worker=self.max_jobs_per_worker)
+        return stats
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=not wait)
@@ -0,0 +1,907 @@
+import asyncio
+import contextvars
+import json
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from .ai_cache import AIContentCache
+from .async_http import AsyncHttpClient
+from .geocoder import Geocoder
+from .geocode_cache import GeocodeCache
+from .http_client import HttpClient
+from .nasa_api import NasaPowerAPI
+from .solar_cache import SolarResponseCache
+from .email_sender import EmailSender
+from .mail_queue import MailQueue, MailSender
+from .rate_limit import TokenBucket
+from .metrics import current_request_id, record_stage
+from .report_storage import create_report_storage
+from .charts import ChartRenderer
+from .stage_graph import StageGraph
+
+STAGES = ['geocode', 'solar', 'calculate', 'ai', 'pdf', 'email']
+
+# Seconds each concurrent stage may take (see ReportPipeline._run). 'chart'
+# and 'layout' are sub-stages of 'pdf': rendering the chart and laying out
+# the tables that need neither the chart nor the AI text.
+DEFAULT_STAGE_TIMEOUTS = {'ai': 30, 'chart': 15, 'layout': 15, 'pdf': 60}
+
+# Outbound mail (see ReportPipeline.send_email). In 'queue' mode reports are
+# written to the SQLite outbox and delivered by MailSender threads over
+# reused SMTP connections; 'direct' sends inside the request as before.
+DEFAULT_MAIL_CONFIG = {
+    'mode': 'queue',
+    'db_path': 'temp/mail_queue.sqlite3',
+    'host': 'smtp.gmail.com',
+    'port': 587,
+    'security': 'starttls',
+    'timeout': 30,
+    'workers': 1,
+    'rate_per_minute': 20,
+    'burst': 5,
+    'max_attempts': 6,
+    'backoff_base': 30,
+    'backoff_max': 3600,
+    'start_sender': True
+}
+
+_pipelines = {}
+_pipelines_lock = threading.Lock()
+
+
+def get_pipeline(config):
+    """Process-wide ReportPipeline for `config`, so caches are shared between
+    the request handlers and job workers."""
+    key = json.dumps(config, sort_keys=True)
+    with _pipelines_lock:
+        pipeline = _pipelines.get(key)
+        if pipeline is None:
+            pipeline = ReportPipeline(config)
+            _pipelines[key] = pipeline
+        return pipeline
+
+
+def parse_report_params(form, default_electricity_rate, require_contact=True):
+    """Parse and validate the report form. Returns (params, error).
+
+    With `require_contact=False` (instant quotes) name and email may be
+    left blank.
+    """
+    name = form.get('name', '').strip()
+    email = form.get('email', '').strip()
+    address = form.get('address', '').strip()
+    latitude_input = form.get('latitude', '').strip()
+    longitude_input = form.get('longitude', '').strip()
+
+    monthly_bill_str = form.get('monthly_bill', '').strip()
+    monthly_bill = float(monthly_bill_str) if monthly_bill_str else 0.0
+
+    roof_area_str = form.get('roof_area', '').strip()
+    roof_area = float(roof_area_str) if roof_area_str else None
+
+    electricity_rate_str = form.get('electricity_rate', '').strip()
+    electricity_rate = float(electricity_rate_str) if electricity_rate_str else default_electricity_rate
+
+    if not require_contact:
+        if not address or monthly_bill <= 0:
+            return None, 'Address and Monthly Bill (>£0) are required'
+    elif not name or not email or not address or monthly_bill <= 0:
+        return None, 'Name, Email, Address and Monthly Bill (>£0) are required'
+
+    if email and '@' not in email:
+        return None, 'Invalid email address'
+
+    params = {
+        'name': name,
+        'email': email,
+        'address': address,
+        'latitude': float(latitude_input) if latitude_input and longitude_input else None,
+        'longitude': float(longitude_input) if latitude_input and longitude_input else None,
+        'monthly_bill': monthly_bill,
+        'roof_area': roof_area,
+        'electricity_rate': electricity_rate
+    }
+    return params, None
+
+
+class ReportPipeline:
+    """Runs the six report stages (geocode → email) for a single lead.
+
+    `config` is a plain dict so the pipeline can be rebuilt inside job
+    worker processes.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        # One pooled session shared by the geocoding and Solar API clients
+        self.http = HttpClient(**config.get('http', {}))
+        # Its non-blocking counterpart for the *_async stages (asgi.py), with
+        # its own pool size since one process holds many more calls in flight
+        self.async_http = AsyncHttpClient(**dict(config.get('http', {}), **(config.get('async_http') or {})))
+        geocode_cache = None
+        cache_config = config.get('geocode_cache')
+        if cache_config:
+            geocode_cache = GeocodeCache(**cache_config)
+        postcode_config = config.get('postcode_index') or {}
+        self.postcode_index = None
+        if postcode_config.get('path') and os.path.exists(postcode_config['path']):
+            from .postcode_index import PostcodeIndex  # numpy; only when an index has been built
+            self.postcode_index = PostcodeIndex.open(postcode_config['path'])
+        geocoder_config = config.get('geocoder') or {}
+        geocode_limiter = None
+        if geocoder_config.get('qps'):
+            geocode_limiter = TokenBucket(geocoder_config['qps'], geocoder_config.get('burst'))
+        self.geocoder = Geocoder(config.get('google_api_key'), cache=geocode_cache, http_client=self.http,
+                                 postcode_index=self.postcode_index, geocode_url=geocoder_config.get('url'),
+                                 rate_limiter=geocode_limiter, async_http_client=self.async_http)
+        solar_cache = None
+        solar_cache_config = config.get('solar_cache')
+        if solar_cache_config:
+            solar_cache = SolarResponseCache(**solar_cache_config)
+        grid_config = config.get('irradiance_grid') or {}
+        self.irradiance_grid = None
+        if grid_config.get('path') and os.path.exists(grid_config['path']):
+            from .irradiance_grid import IrradianceGrid  # numpy; only when a grid has been built
+            self.irradiance_grid = IrradianceGrid.open(grid_config['path'])
+        self.nasa_api = NasaPowerAPI(config.get('google_api_key'), cache=solar_cache, http_client=self.http,
+                                     irradiance_grid=self.irradiance_grid,
+                                     grid_fallback=grid_config.get('fallback', True),
+                                     solar_api_url=(config.get('solar_api') or {}).get('url'),
+                                     async_http_client=self.async_http)
+        self.storage = create_report_storage(**config.get('report_storage', {}))
+        self.chart_renderer = ChartRenderer(**config.get('chart', {}))
+        ai_cache_config = config.get('ai_cache')
+        self.ai_cache = AIContentCache(**ai_cache_config) if ai_cache_config else None
+        self._ai_generator = None
+        self._ai_generator_lock = threading.Lock()
+        stages_config = config.get('stages') or {}
+        self.stage_workers = stages_config.get('workers', 8)
+        self.stage_timeouts = dict(DEFAULT_STAGE_TIMEOUTS, **(stages_config.get('timeouts') or {}))
+        self._stage_executor = None
+        self._stage_executor_lock = threading.Lock()
+        self._uncertainty = None
+        self._uncertainty_lock = threading.Lock()
+        self.render_farm_config = dict(config.get('render_farm') or {})
+        self._render_farm = None
+        self._render_farm_lock = threading.Lock()
+        self.mail_config = dict(DEFAULT_MAIL_CONFIG, **(config.get('mail') or {}))
+        self._email_sender = None
+        self._mail_queue = None
+        self._mail_sender = None
+        self._mail_lock = threading.Lock()
+
+    # --- STARTUP ---
+    # numpy (calculator), reportlab (PDF), matplotlib (raster chart) and the
+    # openai SDK are imported by the stages that use them, so a worker boots
+    # without them. A preforking server calls preload() in the master instead,
+    # so the modules are imported once and shared copy-on-write by every worker.
+    def preload(self):
+        """Import the heavy modules this pipeline will need. Returns their names."""
+        from .calculations import SolarCalculator  # noqa: F401
+        from .pdf_generator import report_template
+        # Styles, fonts and the fixed report text, shared by every worker
+        report_template()
+        loaded = ['numpy', 'reportlab']
+        if self.chart_renderer.backend == 'raster':
+            import matplotlib.figure  # noqa: F401
+            import matplotlib.backends.backend_agg  # noqa: F401
+            loaded.append('matplotlib')
+        if self.config.get('openai_api_key'):
+            import openai  # noqa: F401
+            loaded.append('openai')
+        return loaded
+
+    def after_fork(self):
+        """Drop state a forked worker must not share with its parent."""
+        self.http.reset()
+        self.async_http.reset()
+        limiter = self.geocoder.rate_limiter
+        if limiter is not None:
+            # Its lock may have been held by a parent thread; the quota is per process
+            self.geocoder.rate_limiter = TokenBucket(limiter.rate, limiter.capacity)
+        # Pool threads do not survive fork
+        self._stage_executor = None
+        self._stage_executor_lock = threading.Lock()
+        self._ai_generator = None
+        self._ai_generator_lock = threading.Lock()
+        from .ai_generator import reset_after_fork
+        reset_after_fork()
+        self._mail_sender = None
+        self._mail_lock = threading.Lock()
+        # The render farm's processes belong to the parent
+        self._render_farm = None
+        self._render_farm_lock = threading.Lock()
+
+    def stage_executor(self):
+        """Thread pool shared by every report for its concurrent stages."""
+        with self._stage_executor_lock:
+            if self._stage_executor is None:
+                self._stage_executor = ThreadPoolExecutor(max_workers=self.stage_workers,
+                                                          thread_name_prefix='report-stage')
+            return self._stage_executor
+
+    async def offload(self, fn, *args):
+        """Run blocking or CPU-bound `fn(*args)` on the stage executor from a
+        coroutine, with the caller's contextvars (request id)."""
+        return await asyncio.get_running_loop().run_in_executor(self.stage_executor(), contextvars.copy_context().run,
+                                                                fn, *args)
+
+    def render_farm(self):
+        """Process pool for batch PDF rendering, or None when the config
+        gives it no workers (PDFs are then rendered in the calling thread)."""
+        if not self.render_farm_config.get('workers'):
+            return None
+        with self._render_farm_lock:
+            if self._render_farm is None:
+                from .render_farm import PDFRenderFarm
+                self._render_farm = PDFRenderFarm(chart=self.config.get('chart'), **self.render_farm_config)
+            return self._render_farm
+
+    def render_farm_stats(self):
+        """Stats of the render farm if it has been started."""
+        farm = self._render_farm
+        return farm.stats() if farm is not None else None
+
+    # --- STAGES ---
+    # Each stage is usable on its own so other entry points (bulk scoring,
+    # job workers) can run a subset of the pipeline.
+    def locate(self, params):
+        """Coordinates for a lead: the submitted lat/lon, else geocode the address."""
+        if params.get('latitude') is not None and params.get('longitude') is not None:
+            return {
+                'success': True,
+                'error': None,
+                'latitude': params['latitude'],
+                'longitude': params['longitude'],
+                'formatted_address': params['address'],
+                'geocoded': False
+            }
+        location_result = self.geocoder.geocode_address(params['address'])
+        location_result['geocoded'] = True
+        return location_result
+
+    async def locate_async(self, params):
+        if params.get('latitude') is not None and params.get('longitude') is not None:
+            return self.locate(params)
+        location_result = await self.geocoder.geocode_address_async(params['address'])
+        location_result['geocoded'] = True
+        return location_result
+
+    def fetch_solar(self, latitude, longitude):
+        return self.nasa_api.get_solar_data(latitude, longitude)
+
+    async def fetch_solar_async(self, latitude, longitude):
+        return await self.nasa_api.get_solar_data_async(latitude, longitude)
+
+    def preliminary_estimate(self, latitude, longitude):
+        """Solar data from the offline irradiance grid, without calling Google."""
+        return self.nasa_api.estimate_from_grid(latitude, longitude)
+
+    def annual_consumption(self, params):
+        """Annual kWh, from an explicit figure or estimated from the monthly bill."""
+        if params.get('annual_consumption_kwh'):
+            return params['annual_consumption_kwh']
+        return (params['monthly_bill'] / self.config['default_electricity_rate']) * 12
+
+    def make_calculator(self, electricity_rate):
+        from .calculations import SolarCalculator
+
+        return SolarCalculator(
+            electricity_rate=electricity_rate,
+            panel_efficiency=self.config['performance_ratio'],
+            installation_cost_per_kw=self.config['installation_cost_per_kw']
+        )
+
+    def calculate(self, params, solar_data):
+        annual_consumption_kwh = self.annual_consumption(params)
+        report_data = self.make_calculator(params['electricity_rate']).generate_complete_report(
+            annual_consumption_kwh=annual_consumption_kwh,
+            peak_sun_hours=solar_data['annual_average_kwh_m2_day'],
+            electricity_rate=params['electricity_rate'],
+            monthly_solar_data=solar_data['monthly'],
+            annual_yield_kwh_per_kw=solar_data.get('annual_yield_kwh_per_kw')
+        )
+        battery = self.optimize_battery(params, solar_data, report_data, annual_consumption_kwh)
+        if battery is not None:
+            report_data['battery'] = battery
+        uncertainty = self.financial_uncertainty()
+        if uncertainty is not None:
+            report_data['uncertainty'] = uncertainty.analyze(
+                report_data['financial']['installation_cost'],
+                report_data['production']['annual_production_kwh'],
+                annual_consumption_kwh,
+                params['electricity_rate']
+            )
+        return report_data
+
+    def financial_uncertainty(self):
+        """Shared FinancialUncertainty when uncertainty mode is on, else None."""
+        uncertainty_config = dict(self.config.get('uncertainty') or {})
+        if not uncertainty_config.pop('enabled', False):
+            return None
+        with self._uncertainty_lock:
+            if self._uncertainty is None:
+                from .uncertainty import FinancialUncertainty
+
+                self._uncertainty = FinancialUncertainty(**uncertainty_config)
+            return self._uncertainty
+
+    def optimize_battery(self, params, solar_data, report_data, annual_consumption_kwh):
+        """Best system size and battery capacity by NPV (see
+        utils/battery_optimizer.py), or None when disabled or there is no
+        hourly production profile."""
+        battery_config = dict(self.config.get('battery') or {})
+        if not battery_config.pop('enabled', False) or not solar_data.get('typical_day_profile'):
+            return None
+        from .battery_optimizer import DEFAULT_BATTERY_SIZES, BatteryOptimizer, panel_grid
+
+        sizes = battery_config.pop('sizes', None)
+        system = report_data['system']
+        optimizer = BatteryOptimizer(
+            electricity_rate=params['electricity_rate'],
+            installation_cost_per_kw=self.config['installation_cost_per_kw'],
+            panel_wattage=system['panel_wattage'],
+            **battery_config
+        )
+        result = optimizer.optimize(
+            annual_consumption_kwh,
+            solar_data['typical_day_profile'],
+            panel_grid(system['num_panels'], solar_data.get('max_array_panels_count')),
+            battery_sizes=sizes or DEFAULT_BATTERY_SIZES,
+            # Keep the energy figures consistent with the production estimate above
+            annual_yield_per_kw=report_data['production']['annual_production_kwh'] / system['actual_size_kw']
+        )
+        return {'best': result['best'], 'battery_options': result['battery_options']}
+
+    def ai_generator(self):
+        with self._ai_generator_lock:
+            if self._ai_generator is None:
+                from .ai_generator import AIContentGenerator
+
+                self._ai_generator = AIContentGenerator(
+                    self.config['openai_api_key'],
+                    cache=self.ai_cache,
+                    **self.config.get('ai', {})
+                )
+            return self._ai_generator
+
+    def generate_ai(self, report_data, formatted_address, peak_sun_hours, deadline=None):
+        """AI narrative (cached by content fingerprint), template text after
+        `deadline` seconds, or {} when OpenAI is not configured."""
+        if not self.config.get('openai_api_key'):
+            return {}
+        return self.ai_generator().generate_report_content(report_data, formatted_address, peak_sun_hours,
+                                                           deadline=deadline)
+
+    async def generate_ai_async(self, report_data, formatted_address, peak_sun_hours, deadline=None):
+        if not self.config.get('openai_api_key'):
+            return {}
+        return await self.ai_generator().generate_report_content_async(report_data, formatted_address,
+                                                                       peak_sun_hours, deadline=deadline)
+
+    def generate_ai_batch(self, items):
+        """AI narratives for many reports at once; `items` is a list of
+        (report_data, formatted_address); {} for each when OpenAI is not configured."""
+        if not self.config.get('openai_api_key'):
+            return [{} for _ in items]
+        return self.ai_generator().generate_batch_content(items)
+
+    @staticmethod
+    def fallback_ai(report_data, formatted_address):
+        """Template text used when the model misses its latency budget."""
+        from .ai_generator import AIContentGenerator
+
+        return AIContentGenerator._get_fallback_content(report_data, formatted_address)
+
+    @staticmethod
+    def _pdf_user_data(params, location):
+        return {
+            'name': params['name'],
+            'email': params['email'],
+            'address': location['formatted_address']
+        }
+
+    def layout_pdf(self, params, location, report_data):
+        """Start a PDF and lay out the sections that need neither the AI text
+        nor the chart. Returns (generator, sections) for build_pdf()."""
+        from .pdf_generator import PDFReportGenerator
+
+        pdf_generator = PDFReportGenerator(chart_renderer=self.chart_renderer)
+        sections = pdf_generator.build_sections(self._pdf_user_data(params, location), report_data)
+        return pdf_generator, sections
+
+    @staticmethod
+    def pdf_filename(params):
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        return f"solar_report_{params['name'].replace(' ', '_')}_{timestamp}.pdf"
+
+    def pdf_payload(self, params, location, solar_data, report_data, ai_content):
+        """Everything needed to render a lead's PDF, as plain data that can
+        be sent to a render farm worker (see utils/render_farm.py)."""
+        return {
+            'filename': self.pdf_filename(params),
+            'user_data': self._pdf_user_data(params, location),
+            'location_data': {
+                'latitude': location['latitude'],
+                'longitude': location['longitude'],
+                'annual_average': solar_data['annual_average_kwh_m2_day']
+            },
+            'solar_data': solar_data,
+            'report_data': report_data,
+            'ai_content': ai_content or {}
+        }
+
+    def build_pdf(self, params, location, solar_data, report_data, ai_content, chart=None, layout=None):
+        """Render the PDF report in memory. Returns (pdf_bytes, filename).
+
+        `chart` and `layout` (from layout_pdf()) are built here unless
+        prepared beforehand.
+        """
+        payload = self.pdf_payload(params, location, solar_data, report_data, ai_content)
+        pdf_generator, sections = layout or self.layout_pdf(params, location, report_data)
+        pdf_bytes = pdf_generator.generate(payload['user_data'], payload['location_data'], solar_data,
+                                           report_data, ai_content, chart=chart, sections=sections)
+        return pdf_bytes, payload['filename']
+
+    def store_pdf(self, pdf_bytes, filename, report_id=None):
+        """Keep the PDF in the configured storage for download. Returns its report id."""
+        report_id = report_id or uuid.uuid4().hex
+        self.storage.put(report_id, pdf_bytes, filename)
+        return report_id
+
+    def email_configured(self):
+        """A sender address plus a password, or a relay that needs none."""
+        if not self.config.get('gmail_user'):
+            return False
+        return bool(self.config.get('gmail_app_password') or self.mail_config['host'] != 'smtp.gmail.com')
+
+    def email_sender(self):
+        with self._mail_lock:
+            if self._email_sender is None:
+                self._email_sender = EmailSender(
+                    self.config.get('gmail_user'),
+                    self.config.get('gmail_app_password'),
+                    smtp_server=self.mail_config['host'],
+                    smtp_port=self.mail_config['port'],
+                    security=self.mail_config['security'],
+                    timeout=self.mail_config['timeout']
+                )
+            return self._email_sender
+
+    def mail_queue(self):
+        with self._mail_lock:
+            if self._mail_queue is None:
+                self._mail_queue = MailQueue(self.mail_config['db_path'])
+            return self._mail_queue
+
+    def mail_sender(self, start=None):
+        """This process's MailSender, started on first use unless the config
+        leaves delivery to a separate mail_worker.py process."""
+        queue = self.mail_queue()
+        email_sender = self.email_sender()
+        with self._mail_lock:
+            if self._mail_sender is None:
+                config = self.mail_config
+                self._mail_sender = MailSender(
+                    queue,
+                    email_sender.session,
+                    workers=config['workers'],
+                    rate_per_minute=config['rate_per_minute'],
+                    burst=config['burst'],
+                    max_attempts=config['max_attempts'],
+                    backoff_base=config['backoff_base'],
+                    backoff_max=config['backoff_max']
+                )
+            sender = self._mail_sender
+        if start is None:
+            start = self.mail_config['start_sender']
+        if start:
+            sender.start()
+        return sender
+
+    def send_email(self, params, pdf_bytes, filename):
+        email_sender = self.email_sender()
+        if self.mail_config['mode'] != 'queue':
+            return email_sender.send_report(params['email'], params['name'], pdf_bytes=pdf_bytes,
+                                            pdf_filename=filename)
+        try:
+            message = email_sender.build_message(params['email'], params['name'], pdf_bytes, filename)
+            message_id = self.mail_queue().enqueue(email_sender.gmail_user, params['email'], message, ref=filename)
+        except Exception as e:
+            return {'success': False, 'error': f'Failed to queue email: {str(e)}'}
+        self.mail_sender().wake()
+        return {'success': True, 'error': None, 'queued': True, 'message_id': message_id}
+
+    def mail_stats(self):
+        if self.mail_config['mode'] != 'queue' or not self.email_configured():
+            return None
+        stats = self.mail_queue().stats()
+        if self._mail_sender is not None:
+            stats['sender'] = self._mail_sender.stats()
+        return stats
+
+    async def send_email_async(self, params, pdf_bytes, filename):
+        """send_email() for coroutines: 'direct' mode sends over aiosmtplib,
+        'queue' mode writes the outbox off the event loop."""
+        if self.mail_config['mode'] != 'queue':
+            return await self.email_sender().send_report_async(params['email'], params['name'], pdf_bytes, filename)
+        return await self.offload(self.send_email, params, pdf_bytes, filename)
+
+    def run(self, params, on_stage=None, request_id=None, report_id=None):
+        """Run every stage and return a result dict.
+
+        `on_stage(stage, status, detail)` is called as each stage starts
+        ('running') and finishes ('done', 'skipped' or 'failed'). Stage
+        timings are recorded under `request_id`; the PDF is stored under
+        `report_id` (generated if not given).
+        """
+        token = current_request_id.set(request_id or uuid.uuid4().hex)
+        try:
+            return self._run(params, on_stage, report_id)
+        finally:
+            current_request_id.reset(token)
+
+    async def run_async(self, params, on_stage=None, request_id=None, report_id=None):
+        """run() for an event loop (asgi.py): Google, OpenAI and SMTP calls are
+        awaited, so a waiting report holds no thread, and the calculation
+        and PDF stages run on the stage executor."""
+        token = current_request_id.set(request_id or uuid.uuid4().hex)
+        try:
+            return await self._run_async(params, on_stage, report_id)
+        finally:
+            current_request_id.reset(token)
+
+    def quote(self, params, on_stage=None, request_id=None, instant=False):
+        """Geocode, solar lookup and calculation only (no AI, PDF or email).
+
+        Returns {'success', 'error', 'status_code', 'summary', 'location',
+        'solar_source', 'preliminary'}. With `instant` the solar data comes
+        from the offline irradiance grid when one is configured, so no
+        Google call is made after geocoding.
+        """
+        token = current_request_id.set(request_id or uuid.uuid4().hex)
+        try:
+            report, fail = self._stage_reporter(on_stage)
+            print(f"\n[quote] {params['address']}")
+            estimate = self._estimate(params, report, fail, instant=instant)
+        finally:
+            current_request_id.reset(token)
+        return self._quote_result(estimate)
+
+    async def quote_async(self, params, on_stage=None, request_id=None, instant=False):
+        """quote() for an event loop; see run_async()."""
+        token = current_request_id.set(request_id or uuid.uuid4().hex)
+        try:
+            report, fail = self._stage_reporter(on_stage)
+            print(f"\n[quote] {params['address']}")
+            estimate = await self._estimate_async(params, report, fail, instant=instant)
+        finally:
+            current_request_id.reset(token)
+        return self._quote_result(estimate)
+
+    @staticmethod
+    def _quote_result(estimate):
+        if not estimate['success']:
+            return estimate
+
+        location = estimate['location']
+        solar_data = estimate['solar_data']
+        uncertainty = estimate['report_data'].get('uncertainty')
+        if uncertainty:
+            uncertainty = {key: uncertainty[key] for key in ('payback_years', 'npv', 'net_savings')}
+        return {
+            'success': True,
+            'error': None,
+            'status_code': 200,
+            'summary': estimate['summary'],
+            'location': {
+                'latitude': location['latitude'],
+                'longitude': location['longitude'],
+                'formatted_address': location['formatted_address']
+            },
+            'solar_source': solar_data.get('source'),
+            'preliminary': bool(solar_data.get('preliminary')),
+            'uncertainty': uncertainty or None
+        }
+
+    @staticmethod
+    def _stage_reporter(on_stage):
+        """(report, fail) callables that time stages and forward them to `on_stage`."""
+        started = {}
+
+        def report(stage, status, detail=None):
+            now = time.perf_counter()
+            if status == 'running':
+                started[stage] = now
+            elif stage in started:
+                outcome = 'ok' if status == 'done' else status
+                record_stage(stage, outcome, now - started.pop(stage))
+            if on_stage and stage in STAGES:
+                on_stage(stage, status, detail)
+
+        def fail(stage, error, status_code):
+            report(stage, 'failed', error)
+            return {'success': False, 'error': error, 'status_code': status_code}
+
+        return report, fail
+
+    # _estimate() and _estimate_async() are the same steps; only the
+    # Google calls (awaited) and the calculation (offloaded) differ
+    def _estimate(self, params, report, fail, instant=False):
+        """Steps 1-3 (geocode → solar → calculate), shared by run() and quote()."""
+        # Step 1: Get coordinates
+        self._start_locate(params, report)
+        location = self.locate(params)
+        if not location['success']:
+            return fail('geocode', f"Address not found: {location['error']}", 400)
+        self._located(location, report)
+
+        # Step 2: Get solar data
+        solar_result = self._start_solar(location, report, instant)
+        if solar_result is None or not solar_result['success']:
+            print(f"[2/6] Fetching solar data from Google Solar API...")
+            solar_result = self.fetch_solar(location['latitude'], location['longitude'])
+        if not solar_result['success']:
+            return fail('solar', f"Solar data error: {solar_result['error']}", 500)
+        solar_data = self._solar_fetched(solar_result, report)
+
+        # Step 3: Calculate system
+        report_data, summary = self._calculate_step(params, solar_data, report)
+
+        return {
+            'success': True,
+            'location': location,
+            'solar_data': solar_data,
+            'report_data': report_data,
+            'summary': summary
+        }
+
+    async def _estimate_async(self, params, report, fail, instant=False):
+        self._start_locate(params, report)
+        location = await self.locate_async(params)
+        if not location['success']:
+            return fail('geocode', f"Address not found: {location['error']}", 400)
+        self._located(location, report)
+
+        solar_result = self._start_solar(location, report, instant)
+        if solar_result is None or not solar_result['success']:
+            print(f"[2/6] Fetching solar data from Google Solar API...")
+            solar_result = await self.fetch_solar_async(location['latitude'], location['longitude'])
+        if not solar_result['success']:
+            return fail('solar', f"Solar data error: {solar_result['error']}", 500)
+        solar_data = self._solar_fetched(solar_result, report)
+
+        report_data, summary = await self.offload(self._calculate_step, params, solar_data, report)
+
+        return {
+            'success': True,
+            'location': location,
+            'solar_data': solar_data,
+            'report_data': report_data,
+            'summary': summary
+        }
+
+    @staticmethod
+    def _start_locate(params, report):
+        report('geocode', 'running')
+        if params.get('latitude') is None or params.get('longitude') is None:
+            print(f"[1/6] Geocoding address...")
+
+    @staticmethod
+    def _located(location, report):
+        latitude = location['latitude']
+        longitude = location['longitude']
+        if location['geocoded']:
+            print(f"      → {latitude}, {longitude}")
+        else:
+            print(f"[1/6] Using coordinates: {latitude}, {longitude}")
+        report('geocode', 'done', {'latitude': latitude, 'longitude': longitude})
+
+    def _start_solar(self, location, report, instant):
+        """The irradiance grid estimate for an instant quote, else None."""
+        report('solar', 'running')
+        if instant and self.irradiance_grid is not None:
+            print(f"[2/6] Looking up the irradiance grid...")
+            return self.preliminary_estimate(location['latitude'], location['longitude'])
+        return None
+
+    @staticmethod
+    def _solar_fetched(solar_result, report):
+        solar_data = solar_result['data']
+        peak_sun_hours = solar_data['annual_average_kwh_m2_day']
+        print(f"      → Peak sun: {peak_sun_hours} kWh/m²/day")
+        if solar_data.get('preliminary'):
+            print(f"      → Preliminary estimate ({solar_data['source']})")
+        report('solar', 'done', {'peak_sun_hours': peak_sun_hours, 'source': solar_data.get('source')})
+        return solar_data
+
+    def _calculate_step(self, params, solar_data, report):
+        """(report_data, summary)"""
+        report('calculate', 'running')
+        print(f"[3/6] Calculating solar system...")
+        print(f"      → Annual Consumption (estimated): {self.annual_consumption(params):,.0f} kWh")
+
+        report_data = self.calculate(params, solar_data)
+
+        print(f"      → System: {report_data['system']['actual_size_kw']} kW")
+        print(f"      → Production: {report_data['production']['annual_production_kwh']:,.0f} kWh/year")
+        print(f"      → Savings: £{report_data['financial']['annual_savings']:,.2f}/year")
+        summary = self.build_summary(report_data)
+        report('calculate', 'done', summary)
+        return report_data, summary
+
+    def _run(self, params, on_stage, report_id):
+        report, fail = self._stage_reporter(on_stage)
+        self._print_header(params)
+
+        estimate = self._estimate(params, report, fail)
+        if not estimate['success']:
+            return estimate
+
+        graph, on_event = self._report_graph(params, estimate, report, report_id)
+        try:
+            results = graph.run(self.stage_executor(), on_event)
+        except Exception as pdf_error:
+            print(traceback.format_exc())
+            return fail('pdf', f'PDF generation failed: {str(pdf_error)}', 500)
+        pdf_bytes, filename, report_id = results['pdf']
+        print(f"      → PDF created: {filename} ({len(pdf_bytes) / 1024:.0f} KB, report {report_id})")
+
+        # Step 6: Send email
+        if self.email_configured():
+            self._start_email(params, report)
+            try:
+                self._email_sent(self.send_email(params, pdf_bytes, filename), report)
+            except Exception as email_error:
+                print(f"      → Email ERROR: {str(email_error)}")
+                report('email', 'failed', str(email_error))
+        else:
+            print(f"[6/6] Email skipped (not configured)")
+            report('email', 'skipped')
+
+        return self._report_result(params, estimate, report_id, filename)
+
+    async def _run_async(self, params, on_stage, report_id):
+        report, fail = self._stage_reporter(on_stage)
+        self._print_header(params)
+
+        estimate = await self._estimate_async(params, report, fail)
+        if not estimate['success']:
+            return estimate
+
+        graph, on_event = self._report_graph(params, estimate, report, report_id, asynchronous=True)
+        try:
+            results = await graph.run_async(self.stage_executor(), on_event)
+        except Exception as pdf_error:
+            print(traceback.format_exc())
+            return fail('pdf', f'PDF generation failed: {str(pdf_error)}', 500)
+        pdf_bytes, filename, report_id = results['pdf']
+        print(f"      → PDF created: {filename} ({len(pdf_bytes) / 1024:.0f} KB, report {report_id})")
+
+        if self.email_configured():
+            self._start_email(params, report)
+            try:
+                self._email_sent(await self.send_email_async(params, pdf_bytes, filename), report)
+            except Exception as email_error:
+                print(f"      → Email ERROR: {str(email_error)}")
+                report('email', 'failed', str(email_error))
+        else:
+            print(f"[6/6] Email skipped (not configured)")
+            report('email', 'skipped')
+
+        return self._report_result(params, estimate, report_id, filename)
+
+    @staticmethod
+    def _print_header(params):
+        print(f"\n{'='*60}")
+        print(f"Processing: {params['name']} | {params['address']}")
+        print(f"{'='*60}")
+
+    def _report_graph(self, params, estimate, report, report_id, asynchronous=False):
+        """(StageGraph, on_event) for steps 4-5. With `asynchronous` the AI
+        stage is a coroutine, for StageGraph.run_async()."""
+        location = estimate['location']
+        solar_data = estimate['solar_data']
+        report_data = estimate['report_data']
+        peak_sun_hours = solar_data['annual_average_kwh_m2_day']
+
+        # Steps 4-5: the AI text, the chart and the static PDF sections only
+        # depend on the calculation, so they run concurrently and join at
+        # doc.build (geocode → solar → calculate is a strict chain and stays
+        # sequential above).
+        use_ai = bool(self.config.get('openai_api_key'))
+        timeouts = self.stage_timeouts
+        graph = StageGraph()
+        if use_ai:
+            # The stage waits at most its budget. The model call itself runs on
+            # the AI loop or call threads, not this pool, and after the budget
+            # carries on in the background to fill the AI cache for the next
+            # report in the same bands
+            if asynchronous:
+                async def generate(_):
+                    return await self.generate_ai_async(report_data, location['formatted_address'], peak_sun_hours,
+                                                        deadline=timeouts['ai'])
+            else:
+                def generate(_):
+                    return self.generate_ai(report_data, location['formatted_address'], peak_sun_hours,
+                                            deadline=timeouts['ai'])
+            graph.add('ai', generate, timeout=timeouts['ai'],
+                      fallback=lambda error: self.fallback_ai(report_data, location['formatted_address']))
+        graph.add('chart', lambda _: self.chart_renderer.render(solar_data),
+                  timeout=timeouts['chart'], fallback=lambda error: self.chart_renderer.render(None))
+        graph.add('layout', lambda _: self.layout_pdf(params, location, report_data), timeout=timeouts['layout'])
+
+        def render_pdf(inputs):
+            pdf_bytes, filename = self.build_pdf(params, location, solar_data, report_data, inputs.get('ai', {}),
+                                                 chart=inputs['chart'], layout=inputs['layout'])
+            return pdf_bytes, filename, self.store_pdf(pdf_bytes, filename, report_id)
+
+        graph.add('pdf', render_pdf, deps=('ai', 'chart', 'layout') if use_ai else ('chart', 'layout'),
+                  timeout=timeouts['pdf'])
+
+        def on_event(stage, status, detail=None):
+            if stage == 'ai':
+                if status == 'running':
+                    print(f"[4/6] Generating AI content...")
+                elif status == 'done':
+                    print(f"      → AI content generated")
+                else:
+                    print(f"      → AI failed: {detail}")
+            elif stage == 'layout' and status == 'running':
+                print(f"[5/6] Creating PDF report...")
+            elif stage in ('chart', 'layout', 'pdf') and status == 'failed':
+                print(f"      → {stage.upper()} ERROR: {detail}")
+            report(stage, status, detail)
+
+        if not use_ai:
+            print(f"[4/6] Skipping AI (no API key)")
+            report('ai', 'skipped')
+        return graph, on_event
+
+    @staticmethod
+    def _start_email(params, report):
+        report('email', 'running')
+        print(f"[6/6] Sending email to {params['email']}...")
+
+    @staticmethod
+    def _email_sent(email_result, report):
+        if email_result.get('queued'):
+            print(f"      → Email queued ({email_result['message_id']})")
+            report('email', 'done')
+        elif email_result['success']:
+            print(f"      → Email sent!")
+            report('email', 'done')
+        else:
+            print(f"      → Email failed: {email_result['error']}")
+            report('email', 'failed', email_result['error'])
+
+    @staticmethod
+    def _report_result(params, estimate, report_id, filename):
+        print(f"{'='*60}\n")
+
+        return {
+            'success': True,
+            'error': None,
+            'status_code': 200,
+            'message': f"Solar report generated and sent to {params['email']}!",
+            'summary': estimate['summary'],
+            'report_id': report_id,
+            'pdf_filename': filename
+        }
+
+    @staticmethod
+    def build_summary(report_data):
+        return {
+            'system_size': report_data['system']['actual_size_kw'],
+            'num_panels': report_data['system']['num_panels'],
+            'annual_production': round(report_data['production']['annual_production_kwh'], 2),
+            'annual_savings': round(report_data['financial']['annual_savings'], 2),
+            'payback_period': report_data['financial']['payback_period_years'],
+            'co2_offset': report_data['environmental']['co2_offset_annual_tons'],
+            'recommended_battery_kwh': report_data['battery']['best']['battery_kwh'] if 'battery' in report_data else None
+        }
@@ -0,0 +1,224 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+
+def _safe_id(report_id):
+    if not re.fullmatch(r'[A-Za-z0-9_-]{1,128}', report_id or ''):
+        raise ValueError(f'Invalid report id: {report_id!r}')
+    return report_id
+
+
+class MemoryReportStorage:
+    """Keeps recent PDFs in process memory, bounded by total size and age.
+
+    Nothing touches disk; reports are only downloadable from the process
+    that generated them.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, max_age=3600):
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._reports = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def put(self, report_id, data, filename):
+        report_id = _safe_id(report_id)
+        with self._lock:
+            if report_id in self._reports:
+                self._size -= len(self._reports.pop(report_id)[0])
+            self._reports[report_id] = (data, filename, time.time())
+            self._size += len(data)
+            self._evict()
+
+    def get(self, report_id):
+        """(pdf_bytes, filename) or None."""
+        with self._lock:
+            self._evict()
+            entry = self._reports.get(report_id)
+            if entry is None:
+                return None
+            return entry[0], entry[1]
+
+    def delete(self, report_id):
+        with self._lock:
+            entry = self._reports.pop(report_id, None)
+            if entry is not None:
+                self._size -= len(entry[0])
+
+    def _evict(self):
+        cutoff = time.time() - self.max_age
+        while self._reports:
+            oldest_id, (data, _, created_at) = next(iter(self._reports.items()))
+            if created_at >= cutoff and self._size <= self.max_bytes:
+                break
+            del self._reports[oldest_id]
+            self._size -= len(data)
+
+
+class LocalDirReportStorage:
+    """PDFs as files in a directory shared by all workers on the host.
+
+    Files older than `max_age` seconds are deleted, then the oldest until
+    the directory is under `max_bytes`. Eviction runs on every write.
+    """
+
+    def __init__(self, directory='temp/reports', max_bytes=1024 * 1024 * 1024, max_age=7 * 24 * 3600):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, report_id):
+        stem = os.path.join(self.directory, _safe_id(report_id))
+        return stem + '.pdf', stem + '.json'
+
+    def put(self, report_id, data, filename):
+        pdf_path, meta_path = self._paths(report_id)
+        tmp_path = pdf_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, pdf_path)
+        with open(meta_path, 'w') as f:
+            json.dump({'filename': filename}, f)
+        self.evict()
+
+    def get(self, report_id):
+        try:
+            pdf_path, meta_path = self._paths(report_id)
+        except ValueError:
+            return None
+        if not os.path.exists(pdf_path) or time.time() - os.path.getmtime(pdf_path) > self.max_age:
+            return None
+        with open(pdf_path, 'rb') as f:
+            data = f.read()
+        filename = os.path.basename(pdf_path)
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                filename = json.load(f).get('filename', filename)
+        return data, filename
+
+    def path(self, report_id):
+        """Path of the stored PDF on disk (for callers that need a file)."""
+        return self._paths(report_id)[0]
+
+    def delete(self, report_id):
+        for path in self._paths(report_id):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.pdf'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name[:-4]))
+
+        entries.sort()
+        cutoff = time.time() - self.max_age
+        total = sum(size for _, size, _ in entries)
+        for mtime, size, report_id in entries:
+            if mtime >= cutoff and total <= self.max_bytes:
+                break
+            self.delete(report_id)
+            total -= size
+
+
+class LocalObjectStoreClient:
+    """Stand-in for an S3/GCS bucket client, backed by a local directory.
+
+    Implements the three calls ObjectStoreReportStorage needs. Swap in a
+    thin adapter around boto3 or google-cloud-storage for production.
+    """
+
+    def __init__(self, root='temp/object_store'):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key):
+        path = os.path.normpath(os.path.join(self.root, key))
+        if not path.startswith(os.path.normpath(self.root) + os.sep):
+            raise ValueError(f'Invalid object key: {key!r}')
+        return path
+
+    def put_object(self, key, data, metadata=None):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        with open(path + '.meta', 'w') as f:
+            json.dump(metadata or {}, f)
+
+    def get_object(self, key):
+        """(data, metadata) or None."""
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            data = f.read()
+        metadata = {}
+        if os.path.exists(path + '.meta'):
+            with open(path + '.meta') as f:
+                metadata = json.load(f)
+        return data, metadata
+
+    def delete_object(self, key):
+        for path in (self._path(key), self._path(key) + '.meta'):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class ObjectStoreReportStorage:
+    """PDFs in an object store. Expiry is left to the bucket's lifecycle rules."""
+
+    def __init__(self, client, prefix='reports/'):
+        self.client = client
+        self.prefix = prefix
+
+    def put(self, report_id, data, filename):
+        self.client.put_object(f'{self.prefix}{_safe_id(report_id)}.pdf', data, {'filename': filename})
+
+    def get(self, report_id):
+        try:
+            entry = self.client.get_object(f'{self.prefix}{_safe_id(report_id)}.pdf')
+        except ValueError:
+            return None
+        if entry is None:
+            return None
+        data, metadata = entry
+        return data, metadata.get('filename', f'{report_id}.pdf')
+
+    def delete(self, report_id):
+        self.client.delete_object(f'{self.prefix}{_safe_id(report_id)}.pdf')
+
+
+def create_report_storage(backend='memory', directory='temp/reports', max_bytes=None, max_age=None,
+                          object_store_root='temp/object_store'):
+    """Storage for generated PDFs: 'memory', 'local' or 'object'."""
+    if backend == 'local':
+        return LocalDirReportStorage(
+            directory,
+            max_bytes=max_bytes or 1024 * 1024 * 1024,
+            max_age=max_age or 7 * 24 * 3600
+        )
+    if backend == 'object':
+        return ObjectStoreReportStorage(LocalObjectStoreClient(object_store_root))
+    if backend == 'memory':
+        return MemoryReportStorage(
+            max_bytes=max_bytes or 256 * 1024 * 1024,
+            max_age=max_age or 3600
+        )
+    raise ValueError(f'Unknown report storage backend: {backend}')
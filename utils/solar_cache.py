@@ -0,0 +1,183 @@
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+METERS_PER_DEGREE = 111320.0
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371000.0 * math.asin(math.sqrt(a))
+
+
+class SolarResponseCache:
+    """On-disk cache of buildingInsights `solarPotential` payloads, indexed spatially.
+
+    Every cached building is reachable from the points it is known at (its
+    centre and each query point that resolved to it). Points are bucketed
+    into square grid cells of `cell_size_m`, so a lookup only scans the cells
+    overlapping `radius_m` around the query and returns the nearest building
+    within that radius.
+
+    `radius_m` is the precision-vs-hit-rate knob: larger radii reuse more
+    responses but risk answering for the neighbouring roof.
+    """
+
+    def __init__(self, db_path, radius_m=15.0, cell_size_m=25.0, ttl=90 * 24 * 3600, max_buildings=50000):
+        self.db_path = db_path
+        self.radius_m = radius_m
+        self.cell_deg = cell_size_m / METERS_PER_DEGREE
+        self.ttl = ttl
+        self.max_buildings = max_buildings
+        self._lock = threading.Lock()
+        self._writes_since_prune = 0
+        self._stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS solar_buildings (
+                    name TEXT PRIMARY KEY,
+                    solar_potential TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS solar_points (
+                    cell_x INTEGER NOT NULL,
+                    cell_y INTEGER NOT NULL,
+                    latitude REAL NOT NULL,
+                    longitude REAL NOT NULL,
+                    name TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS solar_points_cell ON solar_points (cell_y, cell_x)")
+            conn.execute("CREATE INDEX IF NOT EXISTS solar_points_name ON solar_points (name)")
+            if not conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'solar_points_unique'"
+            ).fetchone():
+                # Files written before the index may hold repeated points
+                conn.execute("""
+                    DELETE FROM solar_points WHERE rowid NOT IN (
+                        SELECT MIN(rowid) FROM solar_points GROUP BY name, latitude, longitude
+                    )
+                """)
+                conn.execute(
+                    "CREATE UNIQUE INDEX IF NOT EXISTS solar_points_unique ON solar_points (name, latitude, longitude)"
+                )
+            conn.execute("CREATE INDEX IF NOT EXISTS solar_buildings_access ON solar_buildings (last_access)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _cell(self, latitude, longitude):
+        return int(math.floor(longitude / self.cell_deg)), int(math.floor(latitude / self.cell_deg))
+
+    def _count(self, stat, n=1):
+        with self._lock:
+            self._stats[stat] += n
+
+    def get(self, latitude, longitude):
+        """Nearest cached building within `radius_m`, or None.
+
+        Returns {'name', 'solar_potential', 'distance_m'}.
+        """
+        now = time.time()
+        cell_x, cell_y = self._cell(latitude, longitude)
+        span_y = int(math.ceil(self.radius_m / METERS_PER_DEGREE / self.cell_deg))
+        lon_scale = max(math.cos(math.radians(latitude)), 0.01)
+        span_x = int(math.ceil(self.radius_m / (METERS_PER_DEGREE * lon_scale) / self.cell_deg))
+
+        try:
+            with self._connect() as conn:
+                rows = conn.execute("""
+                    SELECT p.latitude, p.longitude, p.name, b.solar_potential
+                    FROM solar_points p JOIN solar_buildings b ON b.name = p.name
+                    WHERE p.cell_y BETWEEN ? AND ? AND p.cell_x BETWEEN ? AND ? AND b.expires_at > ?
+                """, (cell_y - span_y, cell_y + span_y, cell_x - span_x, cell_x + span_x, now)).fetchall()
+
+                best = None
+                for point_lat, point_lon, name, payload in rows:
+                    distance = haversine_m(latitude, longitude, point_lat, point_lon)
+                    if distance <= self.radius_m and (best is None or distance < best[0]):
+                        best = (distance, name, payload)
+
+                if best is None:
+                    self._count('misses')
+                    return None
+
+                conn.execute("UPDATE solar_buildings SET last_access = ? WHERE name = ?", (now, best[1]))
+        except sqlite3.Error as e:
+            print(f"      [solar cache] read failed: {str(e)}")
+            self._count('misses')
+            return None
+
+        self._count('hits')
+        return {'name': best[1], 'solar_potential': json.loads(best[2]), 'distance_m': best[0]}
+
+    def set(self, name, solar_potential, query_latitude, query_longitude, center_latitude=None, center_longitude=None):
+        """Store a building's payload, reachable from the query point and its centre."""
+        now = time.time()
+        points = [(query_latitude, query_longitude)]
+        if center_latitude is not None and center_longitude is not None:
+            points.append((center_latitude, center_longitude))
+
+        try:
+            with self._connect() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute(
+                    "INSERT OR REPLACE INTO solar_buildings (name, solar_potential, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                    (name, json.dumps(solar_potential), now + self.ttl, now)
+                )
+                for latitude, longitude in points:
+                    cell_x, cell_y = self._cell(latitude, longitude)
+                    conn.execute(
+                        "INSERT OR IGNORE INTO solar_points (cell_x, cell_y, latitude, longitude, name) VALUES (?, ?, ?, ?, ?)",
+                        (cell_x, cell_y, latitude, longitude, name)
+                    )
+                conn.execute("COMMIT")
+
+                with self._lock:
+                    self._stats['stores'] += 1
+                    self._writes_since_prune += 1
+                    prune = self._writes_since_prune >= 100
+                    if prune:
+                        self._writes_since_prune = 0
+                if prune:
+                    self._prune(conn, now)
+        except sqlite3.Error as e:
+            print(f"      [solar cache] write failed: {str(e)}")
+
+    def _prune(self, conn, now):
+        """Drop expired buildings, then the least recently used beyond max_buildings."""
+        conn.execute("BEGIN IMMEDIATE")
+        cursor = conn.execute("""
+            DELETE FROM solar_buildings WHERE expires_at <= ? OR name IN (
+                SELECT name FROM solar_buildings ORDER BY last_access DESC LIMIT -1 OFFSET ?
+            )
+        """, (now, self.max_buildings))
+        evicted = cursor.rowcount
+        conn.execute("DELETE FROM solar_points WHERE name NOT IN (SELECT name FROM solar_buildings)")
+        conn.execute("COMMIT")
+        if evicted:
+            self._count('evictions', evicted)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        return stats
@@ -0,0 +1,193 @@
+import asyncio
+import contextvars
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+# How often to look for queued stages that have started, to start their clock
+START_POLL = 0.05
+
+
+class StageTimeout(Exception):
+    """A stage did not finish within its timeout."""
+
+
+class Stage:
+    def __init__(self, name, fn, deps=(), timeout=None, fallback=None):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.timeout = timeout
+        self.fallback = fallback
+
+
+class StageGraph:
+    """Runs a small DAG of stages on a thread pool.
+
+    Each stage is `fn(inputs)`, where `inputs` maps the names of its
+    dependencies to their results. A stage is submitted as soon as all of
+    its dependencies have finished, so independent stages overlap and only
+    join where a later stage needs both.
+
+    A stage's `timeout` counts from when a worker starts running it, so time
+    spent queued behind other reports' stages in a busy pool does not use
+    up its budget. When it times out or raises, `fallback(error)` supplies
+    its result; a stage without a fallback aborts the run and the error is
+    re-raised from run(). Threads cannot be interrupted, so a timed-out
+    stage keeps running in the background and its result is discarded.
+
+    Stages run inside a copy of the caller's contextvars (e.g. the current
+    request id used to tag metrics).
+
+    run_async() runs the same graph from an event loop: `async def` stages
+    are awaited on the loop and plain ones go to the executor.
+    """
+
+    def __init__(self):
+        self.stages = {}
+
+    @staticmethod
+    def _started(fn, started):
+        """Call `fn(inputs)` once the worker picks it up, noting when."""
+        def call(inputs):
+            started.append(time.monotonic())
+            return fn(inputs)
+        return call
+
+    @staticmethod
+    def _next_wakeup(running):
+        """Seconds until the nearest deadline, a short poll while a timed
+        stage is still queued, or None."""
+        waits = []
+        now = time.monotonic()
+        for stage, started in running.values():
+            if stage.timeout:
+                waits.append(max(started[0] + stage.timeout - now, 0) if started else START_POLL)
+        return min(waits) if waits else None
+
+    @staticmethod
+    def _expired(stage, started, now):
+        return bool(stage.timeout and started and now >= started[0] + stage.timeout)
+
+    def add(self, name, fn, deps=(), timeout=None, fallback=None):
+        for dep in deps:
+            if dep not in self.stages:
+                raise ValueError(f'Stage {name!r} depends on unknown stage {dep!r}')
+        self.stages[name] = Stage(name, fn, deps, timeout, fallback)
+        return self
+
+    def run(self, executor, on_event=None):
+        """Run every stage. Returns {name: result}.
+
+        `on_event(name, status, detail)` is called from the calling thread
+        with status 'running', 'done' or 'failed' (detail is the error, and
+        the fallback result is used).
+        """
+        def emit(name, status, detail=None):
+            if on_event:
+                on_event(name, status, detail)
+
+        results = {}
+        pending = dict(self.stages)
+        running = {}
+
+        def resolve(stage, error):
+            if stage.fallback is None:
+                for future in running:
+                    future.cancel()
+                emit(stage.name, 'failed', str(error))
+                raise error
+            emit(stage.name, 'failed', str(error))
+            results[stage.name] = stage.fallback(error)
+
+        while pending or running:
+            for name, stage in list(pending.items()):
+                if all(dep in results for dep in stage.deps):
+                    del pending[name]
+                    emit(name, 'running')
+                    inputs = {dep: results[dep] for dep in stage.deps}
+                    started = []
+                    future = executor.submit(contextvars.copy_context().run, self._started(stage.fn, started), inputs)
+                    running[future] = (stage, started)
+
+            done, _ = wait(list(running), timeout=self._next_wakeup(running), return_when=FIRST_COMPLETED)
+
+            for future in done:
+                stage, _ = running.pop(future)
+                try:
+                    results[stage.name] = future.result()
+                except Exception as e:
+                    resolve(stage, e)
+                    continue
+                emit(stage.name, 'done')
+
+            now = time.monotonic()
+            for future, (stage, started) in list(running.items()):
+                if self._expired(stage, started, now) and not future.done():
+                    del running[future]
+                    future.cancel()
+                    resolve(stage, StageTimeout(f'{stage.name} timed out after {stage.timeout:g}s'))
+        return results
+
+    async def run_async(self, executor, on_event=None):
+        """run() for coroutines. Stages defined with `async def` run as tasks
+        on the running loop, the rest on `executor` (CPU-bound work such as
+        the PDF). Like a thread, a timed-out task is left to finish in the
+        background and its result is discarded; a failed run cancels the
+        other stages."""
+        def emit(name, status, detail=None):
+            if on_event:
+                on_event(name, status, detail)
+
+        loop = asyncio.get_running_loop()
+        results = {}
+        pending = dict(self.stages)
+        running = {}
+
+        def resolve(stage, error):
+            if stage.fallback is None:
+                for future in running:
+                    future.cancel()
+                emit(stage.name, 'failed', str(error))
+                raise error
+            emit(stage.name, 'failed', str(error))
+            results[stage.name] = stage.fallback(error)
+
+        while pending or running:
+            for name, stage in list(pending.items()):
+                if all(dep in results for dep in stage.deps):
+                    del pending[name]
+                    emit(name, 'running')
+                    inputs = {dep: results[dep] for dep in stage.deps}
+                    if asyncio.iscoroutinefunction(stage.fn):
+                        # Tasks copy the caller's contextvars themselves, and start at once
+                        future = asyncio.ensure_future(stage.fn(inputs))
+                        started = [time.monotonic()]
+                    else:
+                        started = []
+                        future = loop.run_in_executor(executor, contextvars.copy_context().run,
+                                                      self._started(stage.fn, started), inputs)
+                    running[future] = (stage, started)
+
+            done, _ = await asyncio.wait(list(running), timeout=self._next_wakeup(running),
+                                         return_when=asyncio.FIRST_COMPLETED)
+
+            for future in done:
+                stage, _ = running.pop(future)
+                try:
+                    results[stage.name] = future.result()
+                except Exception as e:
+                    resolve(stage, e)
+                    continue
+                emit(stage.name, 'done')
+
+            now = time.monotonic()
+            for future, (stage, started) in list(running.items()):
+                if self._expired(stage, started, now) and not future.done():
+                    del running[future]
+                    if isinstance(future, asyncio.Task):
+                        # Left to finish; nobody awaits it, so consume its outcome
+                        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+                    else:
+                        future.cancel()
+                    resolve(stage, StageTimeout(f'{stage.name} timed out after {stage.timeout:g}s'))
+        return results
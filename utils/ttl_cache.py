@@ -0,0 +1,141 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class TTLCache:
+    """JSON values by string key: in-memory LRU in front of an optional
+    SQLite store, both expiring entries after `ttl` seconds.
+
+    Subclasses set `table` (and the name of its value column), map their
+    own keys to strings and call get()/set() with those.
+    """
+
+    table = None
+    value_column = 'value'
+    label = 'cache'
+    store_stats = ('stores',)
+
+    def __init__(self, db_path=None, max_memory_entries=1024, max_disk_entries=50000, ttl=30 * 24 * 3600):
+        self.db_path = db_path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_prune = 0
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+        self._stats.update((stat, 0) for stat in self.store_stats)
+
+        if db_path:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with self._connect() as conn:
+                conn.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {self.table} (
+                        key TEXT PRIMARY KEY,
+                        {self.value_column} TEXT NOT NULL,
+                        expires_at REAL NOT NULL,
+                        last_access REAL NOT NULL
+                    )
+                """)
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_access ON {self.table} (last_access)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _remember(self, key, value, expires_at):
+        with self._lock:
+            self._memory[key] = (value, expires_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def _count(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def get(self, key):
+        """A copy of the cached value for `key`, or None on a miss."""
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._stats['memory_hits'] += 1
+                    return dict(value)
+                del self._memory[key]
+
+        if self.db_path:
+            try:
+                with self._connect() as conn:
+                    row = conn.execute(
+                        f"SELECT {self.value_column}, expires_at FROM {self.table} WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is not None and row[1] > now:
+                        conn.execute(f"UPDATE {self.table} SET last_access = ? WHERE key = ?", (now, key))
+                        value = json.loads(row[0])
+                        self._remember(key, value, row[1])
+                        self._count('disk_hits')
+                        return dict(value)
+            except sqlite3.Error as e:
+                print(f"      [{self.label}] read failed: {str(e)}")
+
+        self._count('misses')
+        return None
+
+    def set(self, key, value, ttl=None, stat='stores'):
+        """Store `value` for `ttl` seconds (default self.ttl), counted under `stat`."""
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        self._remember(key, value, expires_at)
+        self._count(stat)
+
+        if not self.db_path:
+            return
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (key, {self.value_column}, expires_at, last_access) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), expires_at, now)
+                )
+                with self._lock:
+                    self._writes_since_prune += 1
+                    prune = self._writes_since_prune >= 100
+                    if prune:
+                        self._writes_since_prune = 0
+                if prune:
+                    self._prune(conn, now)
+        except sqlite3.Error as e:
+            print(f"      [{self.label}] write failed: {str(e)}")
+
+    def _prune(self, conn, now):
+        """Drop expired rows, then the least recently used beyond max_disk_entries."""
+        conn.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (now,))
+        conn.execute(f"""
+            DELETE FROM {self.table} WHERE key IN (
+                SELECT key FROM {self.table} ORDER BY last_access DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_disk_entries,))
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._memory)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['memory_hits'] + stats['disk_hits']) / lookups, 3) if lookups else 0.0
+        return stats
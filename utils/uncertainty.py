@@ -0,0 +1,137 @@
+"""Monte Carlo uncertainty bands for the financial analysis.
+
+The deterministic figures in SolarCalculator assume a fixed 3% tariff
+escalation, no degradation and exactly the estimated output every year.
+Here each scenario draws its own escalation, degradation, long-run output
+bias, year-to-year irradiance and installation cost, and all scenarios ×
+years are evaluated as one (scenarios, years) array. With every spread set
+to zero and degradation 0 the P50 matches the deterministic 25-year savings.
+"""
+import numpy as np
+
+PERCENTILES = (10, 25, 50, 75, 90)
+
+
+class FinancialUncertainty:
+    """Draws `scenarios` futures from a fixed `seed`, so the same inputs
+    always give the same bands.
+
+    Spreads are standard deviations of normal distributions around the
+    central assumption: `escalation` ± `escalation_sd` a year,
+    `degradation` ± `degradation_sd` a year, output bias ±
+    `resource_bias_sd` (error in the yield estimate, fixed per scenario),
+    weather ± `interannual_sd` (independent each year) and installation
+    cost ± `cost_sd` (relative).
+    """
+
+    def __init__(self, scenarios=5000, seed=42, lifetime=25, discount_rate=0.05,
+                 escalation=0.03, escalation_sd=0.015, degradation=0.005, degradation_sd=0.0025,
+                 resource_bias_sd=0.04, interannual_sd=0.05, cost_sd=0.10):
+        self.scenarios = scenarios
+        self.seed = seed
+        self.lifetime = lifetime
+        self.discount_rate = discount_rate
+        self.escalation = escalation
+        self.escalation_sd = escalation_sd
+        self.degradation = degradation
+        self.degradation_sd = degradation_sd
+        self.resource_bias_sd = resource_bias_sd
+        self.interannual_sd = interannual_sd
+        self.cost_sd = cost_sd
+        self._draws = None
+
+    def draw(self):
+        """The random inputs, one row (or value) per scenario. The seed is
+        fixed, so they are drawn once and reused for every lead."""
+        if self._draws is None:
+            self._draws = self._draw()
+        return self._draws
+
+    def _draw(self):
+        rng = np.random.default_rng(self.seed)
+        n, years = self.scenarios, self.lifetime
+        t = np.arange(years)
+        escalation = rng.normal(self.escalation, self.escalation_sd, n)
+        degradation = np.clip(rng.normal(self.degradation, self.degradation_sd, n), 0.0, 0.03)
+        resource_bias = np.clip(rng.normal(1.0, self.resource_bias_sd, n), 0.5, 1.5)
+        weather = np.clip(rng.normal(1.0, self.interannual_sd, (n, years)), 0.5, 1.5)
+        cost_factor = np.clip(rng.normal(1.0, self.cost_sd, n), 0.5, 2.0)
+        # Everything that does not depend on the lead is folded into two
+        # (scenarios, years) multipliers
+        return {
+            'output': resource_bias[:, None] * weather * (1 - degradation[:, None]) ** t,
+            'tariff': (1 + escalation[:, None]) ** t,
+            'cost_factor': cost_factor,
+            'discount': (1 + self.discount_rate) ** -(t + 1.0)
+        }
+
+    def simulate(self, installation_cost, annual_production_kwh, annual_consumption_kwh, electricity_rate,
+                 export_rate=0.0):
+        """Cash flows for every scenario.
+
+        Returns arrays: 'savings' (scenarios, years), 'cumulative'
+        (scenarios, years + 1, net position from year 0), 'npv',
+        'net_savings' (undiscounted 25-year savings minus cost) and
+        'payback_years' (fractional year the position turns positive,
+        capped at the lifetime), each per scenario.
+        """
+        draws = self.draw()
+
+        production = annual_production_kwh * draws['output']
+        used = np.minimum(production, annual_consumption_kwh)
+        savings = used * draws['tariff'] * electricity_rate
+        if export_rate:
+            savings += (production - used) * export_rate
+
+        cost = installation_cost * draws['cost_factor']
+        cumulative = np.concatenate([-cost[:, None], np.cumsum(savings, axis=1) - cost[:, None]], axis=1)
+        npv = savings @ draws['discount'] - cost
+
+        # First year the position is >= 0, interpolated within that year
+        positive = cumulative >= 0
+        reached = positive.any(axis=1)
+        year = np.where(reached, positive.argmax(axis=1), self.lifetime)
+        rows = np.arange(len(cost))
+        before = cumulative[rows, np.maximum(year - 1, 0)]
+        gained = savings[rows, np.clip(year - 1, 0, self.lifetime - 1)]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            fraction = np.where(gained > 0, -before / gained, 0.0)
+        payback = np.where(reached & (year > 0), year - 1 + fraction, np.where(reached, 0.0, self.lifetime))
+
+        return {
+            'savings': savings,
+            'cumulative': cumulative,
+            'npv': npv,
+            'net_savings': cumulative[:, -1],
+            'payback_years': np.minimum(payback, self.lifetime)
+        }
+
+    def analyze(self, installation_cost, annual_production_kwh, annual_consumption_kwh, electricity_rate,
+                export_rate=0.0):
+        """P10/P50/P90 of payback, NPV and 25-year net savings, plus the
+        cumulative cash position percentiles per year for a fan chart.
+
+        'pNN' is the NN-th percentile of each metric: for NPV p10 is the
+        pessimistic case, for payback p90 is.
+        """
+        result = self.simulate(installation_cost, annual_production_kwh, annual_consumption_kwh,
+                               electricity_rate, export_rate)
+
+        def bands(values, ndigits):
+            p10, p50, p90 = np.percentile(values, [10, 50, 90])
+            return {'p10': round(float(p10), ndigits), 'p50': round(float(p50), ndigits),
+                    'p90': round(float(p90), ndigits)}
+
+        fan = np.percentile(result['cumulative'], PERCENTILES, axis=0)
+        return {
+            'scenarios': self.scenarios,
+            'seed': self.seed,
+            'payback_years': bands(result['payback_years'], 1),
+            'npv': bands(result['npv'], 0),
+            'net_savings': bands(result['net_savings'], 0),
+            'probability_of_payback': round(float((result['payback_years'] < self.lifetime).mean()), 3),
+            'fan': {
+                'years': list(range(self.lifetime + 1)),
+                'bands': {f'p{p}': [round(float(v), -1) for v in row] for p, row in zip(PERCENTILES, fan)}
+            }
+        }